@@ -0,0 +1,122 @@
+"""GUI-thread time per received message, one event per indication vs state deltas.
+
+Replays bench_replay.py's synthetic session into the real wx GUI: the
+AppController frame with every panel and its StateMachineDelegate. The
+state machine runs on the main thread and posts with wx.CallAfter; the
+time counted is the GUI thread working through those events
+(``ProcessPendingEvents``) and repainting what they invalidated
+(``Update``), so it covers wx's own event overhead and the Layout()
+passes the handlers trigger.
+
+``per-call`` posts every delegate call as its own wx.CallAfter, the path
+the state machine used before state deltas; ``delta`` is the current
+behaviour. Two workloads: the handshake, whose replies arrive as one
+burst before the GUI thread gets to run, and the steady stream, with the
+GUI thread catching up after every ``--window`` messages.
+
+Needs wxPython and a display; ``xvfb-run`` provides one on a headless
+machine. The firmware update check in deviceDetected is answered
+offline.
+
+    xvfb-run python benchmarks/bench_delegate.py [--frames N] [--window N]
+"""
+
+import argparse
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import wx  # noqa: E402
+from bench_replay import HANDSHAKE, synthetic  # noqa: E402
+
+from floocast.gui.app_controller import AppController  # noqa: E402
+from floocast.gui.delegate import StateMachineDelegate  # noqa: E402
+from floocast.protocol.replay import FlooReplay  # noqa: E402
+
+
+class BenchController(AppController):
+    """The application window without a state machine of its own; the replay drives it."""
+
+    def _setup_state_machine(self):
+        self.state_machine = None
+        self.metrics_exporters = []
+
+
+class GuiThread:
+    """Counts wx.CallAfter events and times the GUI thread running them."""
+
+    def __init__(self, ctrl: AppController):
+        self.ctrl = ctrl
+        self.events = 0
+        self.busy = 0.0
+
+    def call_after(self, func, *args):
+        self.events += 1
+        wx.CallAfter(func, *args)
+
+    def catch_up(self) -> None:
+        start = time.perf_counter()
+        self.ctrl.app.ProcessPendingEvents()
+        self.ctrl.frame.Update()
+        self.busy += time.perf_counter() - start
+
+
+def offline(*args, **kwargs):
+    raise OSError("benchmark runs offline")
+
+
+def run(ctrl: AppController, mode: str, frames: int, window: int):
+    gui = GuiThread(ctrl)
+    replay = FlooReplay(synthetic(frames), delegate=StateMachineDelegate(ctrl))
+    stats = replay.stats
+    sm = replay.stateMachine
+    if mode == "per-call":
+        # before state deltas: every delegate call was its own wx.CallAfter
+        sm._post = gui.call_after
+    else:
+        sm._callAfter = gui.call_after
+    handle = sm.handleMessage
+    received = 0
+
+    def handleMessage(message):
+        nonlocal received
+        handle(message)
+        received += 1
+        if received % window == 0:
+            gui.catch_up()
+
+    sm.handleMessage = handleMessage
+    replay.run()
+    gui.catch_up()
+    return gui, stats.messages
+
+
+def main() -> None:
+    argp = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argp.add_argument("--frames", type=int, default=5_000)
+    argp.add_argument("--window", type=int, default=1, help="messages per GUI thread turn")
+    args = argp.parse_args()
+
+    with patch.object(urllib.request, "urlopen", offline):
+        ctrl = BenchController()
+        ctrl.frame.Show(True)
+        ctrl.app.ProcessPendingEvents()
+        workloads = (
+            ("handshake", len(HANDSHAKE), len(HANDSHAKE)),
+            ("steady", args.frames, args.window),
+        )
+        print(f"{'workload':>9} {'mode':>9} {'events/msg':>11} {'GUI us/msg':>11}")
+        for workload, frames, window in workloads:
+            for mode in ("per-call", "delta"):
+                gui, n = run(ctrl, mode, frames, window)
+                print(f"{workload:>9} {mode:>9} {gui.events / n:11.2f} {gui.busy / n * 1e6:11.1f}")
+        ctrl.frame.Destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""End-to-end numbers against the pty FMA120 emulator; no dongle needed.
+
+- connect: FlooStateMachine from port open to CONNECTED (timeToReady),
+  found through ``FLOOCAST_PORT`` like a real dongle
+- rtt: FlooAsyncClient query round trips, median and p99
+- throughput: unsolicited AC reports the emulator can push through
+  FlooInterface to the state machine, in messages per second
+
+    python benchmarks/bench_emulator.py [--latency S] [--jitter S] [--connects N]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from floocast.protocol.async_client import FlooAsyncClient  # noqa: E402
+from floocast.protocol.emulator import FlooEmulator, FlooEmulatorProfile  # noqa: E402
+from floocast.protocol.manager import _call_inline, _call_later_thread  # noqa: E402
+from floocast.protocol.state_machine import FlooStateMachine  # noqa: E402
+from floocast.protocol.state_machine_delegate import FlooStateMachineDelegate  # noqa: E402
+
+
+def connect_once(emulator: FlooEmulator, timeout: float = 5.0) -> float | None:
+    os.environ["FLOOCAST_PORT"] = emulator.path
+    sm = FlooStateMachine(FlooStateMachineDelegate(), _call_inline, _call_later_thread)
+    sm.inf.hotplug_factory = None
+    sm.start()
+    deadline = time.monotonic() + timeout
+    while sm.state != FlooStateMachine.CONNECTED and time.monotonic() < deadline:
+        time.sleep(0.0005)
+    sm.inf.stop()
+    sm.join(timeout)
+    # stop() leaves the port open; release its lock for the next run
+    sm.inf.reset()
+    return sm.timeToReady
+
+
+def round_trips(emulator: FlooEmulator, count: int) -> list[float]:
+    async def scenario() -> list[float]:
+        client = await FlooAsyncClient.connect(emulator.path)
+        rtts = []
+        for _ in range(count):
+            start = time.perf_counter()
+            await client.read_source_state()
+            rtts.append(time.perf_counter() - start)
+        client.close()
+        return rtts
+
+    return asyncio.run(scenario())
+
+
+def throughput(profile: FlooEmulatorProfile, seconds: float) -> float:
+    with FlooEmulator(profile) as emulator:
+        os.environ["FLOOCAST_PORT"] = emulator.path
+        sm = FlooStateMachine(FlooStateMachineDelegate(), _call_inline, _call_later_thread)
+        sm.inf.hotplug_factory = None
+        sm.start()
+        time.sleep(0.2)
+        before = sm.inf.stats.dispatched
+        start = time.perf_counter()
+        time.sleep(seconds)
+        dispatched = sm.inf.stats.dispatched - before
+        elapsed = time.perf_counter() - start
+        sm.inf.stop()
+        sm.join(2.0)
+        sm.inf.reset()
+    return dispatched / elapsed
+
+
+def main() -> None:
+    argp = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argp.add_argument("--latency", type=float, default=0.001)
+    argp.add_argument("--jitter", type=float, default=0.0)
+    argp.add_argument("--connects", type=int, default=20)
+    argp.add_argument("--queries", type=int, default=500)
+    argp.add_argument("--seconds", type=float, default=2.0)
+    argp.add_argument("--burst", type=int, default=64, help="AC lines per 1 ms burst")
+    args = argp.parse_args()
+    # the state machine persists the streaming state; keep it out of the user's config
+    os.environ["XDG_CONFIG_HOME"] = tempfile.mkdtemp(prefix="floocast-bench-")
+    profile = FlooEmulatorProfile(latency=args.latency, jitter=args.jitter, seed=1)
+
+    with FlooEmulator(profile) as emulator:
+        ready = [t for t in (connect_once(emulator) for _ in range(args.connects)) if t]
+        rtts = sorted(round_trips(emulator, args.queries))
+    print(f"connect median:   {statistics.median(ready) * 1000:8.2f} ms ({len(ready)} runs)")
+    print(f"rtt median:       {statistics.median(rtts) * 1000:8.3f} ms")
+    print(f"rtt p99:          {rtts[int(len(rtts) * 0.99) - 1] * 1000:8.3f} ms")
+
+    # offered load is above what the dispatcher keeps up with; overflow is expected
+    logging.getLogger("floocast.protocol.dispatcher").setLevel(logging.ERROR)
+    burst = FlooEmulatorProfile(latency=args.latency, burst_rate=1000, burst_size=args.burst)
+    offered = 1000 * args.burst
+    rate = throughput(burst, args.seconds)
+    print(f"throughput:       {rate:8.0f} messages/s (offered {offered})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Allocation and time per parsed message, by message type.
+
+For each type, parses N copies of a typical line through FlooParser and
+keeps the results alive, then reports the blocks and bytes tracemalloc
+attributes to each message plus the parse time from timeit.
+
+    python benchmarks/bench_messages.py [--count N]
+"""
+
+import argparse
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from floocast.protocol.parser import FlooParser  # noqa: E402
+
+LINES = {
+    "OK": b"OK",
+    "ER": b"ER=04",
+    "ST": b"ST=06",
+    "LA": b"LA=02",
+    "AM": b"AM=02",
+    "BM": b"BM=36",
+    "FT": b"FT=0F",
+    "BN": b"BN=Living Room",
+    "VR": b"VR=1.2.3",
+    "AC": b"AC=07,C4,0100,1770,0640,2710,0BB8,9C40",
+    "FN": b"FN=00,001122334455,Headset",
+    "PL": b"PL=00,001122334455,Headset",
+    "AD": b"AD=001122334455",
+}
+
+
+def measure_allocations(parser: FlooParser, line: bytes, count: int) -> tuple[float, float]:
+    """Blocks and bytes still held per message after parsing ``count`` copies."""
+    lines = [bytes(line) for _ in range(count)]
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    messages = [parser.run(each) for each in lines]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    blocks = sum(s.count_diff for s in stats)
+    size = sum(s.size_diff for s in stats)
+    # the list holding the results is not part of the message
+    size -= sys.getsizeof(messages)
+    blocks -= 1
+    return blocks / count, size / count
+
+
+def measure_time(parser: FlooParser, line: bytes, number: int) -> float:
+    best = min(timeit.repeat(lambda: parser.run(line), repeat=5, number=number))
+    return best / number * 1e9
+
+
+def main() -> None:
+    argp = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argp.add_argument("--count", type=int, default=2000)
+    args = argp.parse_args()
+    parser = FlooParser()
+    print(f"{'type':<4} {'blocks/msg':>10} {'bytes/msg':>10} {'ns/parse':>10}")
+    for name, line in LINES.items():
+        blocks, size = measure_allocations(parser, line, args.count)
+        ns = measure_time(parser, line, args.count)
+        print(f"{name:<4} {blocks:>10.1f} {size:>10.0f} {ns:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Before/after microbenchmark for FlooParser.
+
+Decodes a recorded mix of ST, AC, FN and PL lines through
+``create_valid_message`` (str header lookup on a ``bytes`` line) and through
+the zero-copy ``parse`` path (integer header dispatch over a ``memoryview``).
+Both end in the decoders compiled from the message schemas; see
+bench_schema.py for the comparison against the decoders they replaced.
+
+It also times a whole capture: split by the framer and parsed line by line
+("framed", what offline glue used to do) against one ``parse_stream`` call.
+
+    python benchmarks/bench_parser.py [--repeat N]
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from floocast.protocol.framer import FlooFramer  # noqa: E402
+from floocast.protocol.parser import FlooParser  # noqa: E402
+
+# Lines as the dongle sends them while streaming to two LE Audio headsets:
+# periodic AC link reports dominate, with state changes and a device list.
+RECORDED = [
+    b"ST=04",
+    b"AC=07,C4,0100,1770,0640,2710,0BB8,9C40",
+    b"ST=06",
+    b"FN=00,001122334455,Headset",
+    b"FN=01,66778899AABB,Living Room Speaker",
+    b"FN=02",
+    b"AC=07,C2,0100,1770,0640,2710,0BB8,9C40",
+    b"PL=00,001122334455,Headset",
+    b"PL=01,66778899AABB,Living Room Speaker",
+    b"AC=07,BF,0100,1770,0640,2710,0BB8,9C40",
+    b"AC=07,C1,0100,1770,0640,2710,0BB8,9C40",
+    b"ST=06",
+    b"AC=07,C0,0100,1770,0640,2710,0BB8,9C40",
+    b"AC=07,C3,0100,1770,0640,2710,0BB8,9C40",
+    b"ST=01",
+    b"AC=00",
+]
+
+
+def bench(repeat: int, number: int) -> dict[str, float]:
+    parser = FlooParser()
+    lines = list(RECORDED)
+    views = [memoryview(line) for line in lines]
+
+    def before():
+        for line in lines:
+            parser.create_valid_message(line)
+
+    def after():
+        for view in views:
+            parser.parse(view)
+
+    capture = b"".join(line + b"\r\n" for line in lines) * number
+
+    def framed():
+        for frame in FlooFramer(max_frame_size=len(capture)).feed(capture):
+            parser.parse(frame)
+
+    def stream():
+        parser.parse_stream(capture)
+
+    # interleave them so clock and cache drift hit all equally
+    funcs = {"before": before, "after": after, "framed": framed, "stream": stream}
+    best = dict.fromkeys(funcs, float("inf"))
+    for _ in range(repeat):
+        for name, func in funcs.items():
+            runs = number if name in ("before", "after") else 1
+            best[name] = min(best[name], timeit.timeit(func, number=runs))
+    results = {name: t / (number * len(lines)) * 1e9 for name, t in best.items()}
+    return results
+
+
+def main() -> None:
+    argp = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argp.add_argument("--repeat", type=int, default=5)
+    argp.add_argument("--number", type=int, default=2000)
+    args = argp.parse_args()
+    results = bench(args.repeat, args.number)
+    for name, ns in results.items():
+        print(f"{name:>6}: {ns:8.0f} ns/line")
+    print(f"speedup: {results['before'] / results['after']:.2f}x")
+    print(f"stream speedup: {results['framed'] / results['stream']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""State machine throughput, replaying a trace headless in virtual time.
+
+Without ``--trace`` a synthetic session is replayed: a handshake, then a
+stream of AC link reports and ST changes with the FN list re-read every
+few hundred frames. With ``--trace`` a recorded FLOOCAST_TRACE file (and
+its rotated predecessors) is replayed instead, e.g. to reproduce a field
+issue at ``--speed 1`` with ``--verbose`` logging.
+
+    python benchmarks/bench_replay.py [--repeat N] [--frames N]
+    python benchmarks/bench_replay.py --trace ~/floocast.fltr [--speed X] [--verbose]
+"""
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from floocast.protocol.replay import FlooReplay  # noqa: E402
+from floocast.protocol.trace import INBOUND, FlooTraceRecord  # noqa: E402
+
+HANDSHAKE = [
+    b"VR=1.0.0",
+    b"AM=02",
+    b"ST=06",
+    b"LA=02",
+    b"LF=01",
+    b"BM=00",
+    b"BN=FlooCast",
+    b"FN=00,001122334455,Headset",
+    b"FN=01",
+    b"FT=01",
+    b"AC=07,C4,0100,1770,0640,2710,0BB8,9C40",
+]
+
+STEADY = [
+    b"AC=07,C4,0100,1770,0640,2710,0BB8,9C40",
+    b"AC=07,C2,0100,1770,0640,2710,0BB8,9C40",
+    b"ST=06",
+    b"AC=07,BF,0100,1770,0640,2710,0BB8,9C40",
+    b"LA=02",
+    b"AC=07,C1,0100,1770,0640,2710,0BB8,9C40",
+]
+
+# unsolicited FN entries, as sent when a headset (re)connects
+CHURN = [
+    b"FN=00,001122334455,Headset",
+    b"FN=01,66778899AABB,Living Room Speaker",
+    b"FN=02",
+]
+
+
+def synthetic(frames: int, step_ns: int = 10_000_000) -> list[FlooTraceRecord]:
+    lines = list(HANDSHAKE)
+    while len(lines) < frames:
+        lines.extend(STEADY * 50)
+        lines.extend(CHURN)
+    return [
+        FlooTraceRecord(i * step_ns, INBOUND, "ttyACM0", data)
+        for i, data in enumerate(lines[:frames])
+    ]
+
+
+def main() -> None:
+    argp = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argp.add_argument("--repeat", type=int, default=5)
+    argp.add_argument("--frames", type=int, default=100_000)
+    argp.add_argument("--trace", help="replay this trace instead of a synthetic one")
+    argp.add_argument("--speed", type=float, help="1 for real time; as fast as possible if unset")
+    argp.add_argument("--verbose", action="store_true")
+    args = argp.parse_args()
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG)
+
+    if args.trace:
+        stats = FlooReplay.from_trace(args.trace, speed=args.speed).run()
+        print(stats)
+        print(f"{stats.messages_per_second():10.0f} messages/s")
+        return
+
+    records = synthetic(args.frames)
+    best = None
+    for _ in range(args.repeat):
+        stats = FlooReplay(records, speed=args.speed).run()
+        if best is None or stats.wall_seconds < best.wall_seconds:
+            best = stats
+    assert best is not None
+    print(f"frames:        {best.frames:10d}")
+    print(f"virtual time:  {best.virtual_seconds:10.1f} s")
+    print(f"wall time:     {best.wall_seconds:10.3f} s")
+    print(f"throughput:    {best.messages_per_second():10.0f} messages/s")
+    print(f"sent:          {best.sent:10d}")
+    print(f"callbacks:     {best.callbacks:10d}")
+
+
+if __name__ == "__main__":
+    main()
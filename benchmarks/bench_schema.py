@@ -0,0 +1,258 @@
+"""Schema-compiled parsers against the decoders they replaced.
+
+Parses the ST, AC, FN and PL lines of bench_parser's recording through
+each message class's ``create_valid_msg`` and through the classes as they
+were before the digit-table decoder and the schema compiler: ``int(...,
+16)`` on a decoded slice, with the wire bytes rebuilt in the constructor.
+The original classes are copied below unchanged apart from their names.
+
+    python benchmarks/bench_schema.py [--repeat N] [--number N]
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_parser import RECORDED  # noqa: E402
+
+from floocast.protocol.messages import FlooMsgAc, FlooMsgFn, FlooMsgPl, FlooMsgSt  # noqa: E402
+
+
+class OriginalMessage:
+    def __init__(self, isSend, header, payload=None):
+        super().__init__()
+        self.isSend = isSend
+        self.header = header
+        self.bytes = bytearray()
+        if isSend:
+            self.bytes.extend(b"BC:")
+        self.bytes.extend(header.encode("ascii"))
+        if payload is not None:
+            self.bytes.extend(b"=")
+            self.bytes.extend(payload)
+        self.bytes.extend(b"\r\n")
+
+
+class OriginalSt(OriginalMessage):
+    HEADER = "ST"
+
+    def __init__(self, isSend, value=None):
+        self.state = value
+        if value is not None:
+            super().__init__(isSend, self.HEADER, b"%02X" % value)
+        else:
+            super().__init__(isSend, self.HEADER)
+
+    @classmethod
+    def create_valid_msg(cls, payload: bytes):
+        if len(payload) != 5:
+            return None
+        try:
+            return cls(False, int(payload[3:5].decode("ascii"), 16))
+        except (UnicodeDecodeError, ValueError):
+            return None
+
+
+class OriginalAc(OriginalMessage):
+    HEADER = "AC"
+
+    def __init__(
+        self,
+        isSend,
+        codec=None,
+        rssi=0,
+        rate=0,
+        spkSampleRate=0,
+        micSampleRate=0,
+        sduInterval=0,
+        transportDelay=0,
+        presentDelay=0,
+    ):
+        self.codec = codec
+        self.rssi = rssi
+        self.rate = rate
+        self.spkSampleRate = spkSampleRate * 10
+        self.micSampleRate = micSampleRate * 10
+        self.sduInterval = sduInterval
+        self.transportDelay = transportDelay
+        self.presentDelay = presentDelay
+        if codec is not None:
+            payload = (
+                f"{codec:02X},{rssi:02X},{rate:04X},{spkSampleRate:04X},"
+                f"{micSampleRate:04X},{sduInterval:04X},{transportDelay:04X},{presentDelay:04X}"
+            )
+            super().__init__(isSend, self.HEADER, payload.encode("ascii"))
+        else:
+            super().__init__(isSend, self.HEADER)
+
+    @classmethod
+    def create_valid_msg(cls, payload: bytes):
+        msgLen = len(payload)
+        try:
+            if msgLen == 5:
+                return cls(False, int(payload[3:5].decode("ascii"), 16))
+            elif msgLen == 13:
+                return cls(
+                    False,
+                    int(payload[3:5].decode("ascii"), 16),
+                    int(payload[6:8].decode("ascii"), 16),
+                    int(payload[9:13].decode("ascii"), 16),
+                )
+            elif msgLen == 18:
+                return cls(
+                    False,
+                    int(payload[3:5].decode("ascii"), 16),
+                    int(payload[6:8].decode("ascii"), 16),
+                    int(payload[9:13].decode("ascii"), 16),
+                    int(payload[14:18].decode("ascii"), 16),
+                )
+            elif msgLen == 23:
+                return cls(
+                    False,
+                    int(payload[3:5].decode("ascii"), 16),
+                    int(payload[6:8].decode("ascii"), 16),
+                    int(payload[9:13].decode("ascii"), 16),
+                    int(payload[14:18].decode("ascii"), 16),
+                    int(payload[19:23].decode("ascii"), 16),
+                )
+            elif msgLen == 38:
+                return cls(
+                    False,
+                    int(payload[3:5].decode("ascii"), 16),
+                    int(payload[6:8].decode("ascii"), 16),
+                    int(payload[9:13].decode("ascii"), 16),
+                    int(payload[14:18].decode("ascii"), 16),
+                    int(payload[19:23].decode("ascii"), 16),
+                    int(payload[24:28].decode("ascii"), 16),
+                    int(payload[29:33].decode("ascii"), 16),
+                    int(payload[34:38].decode("ascii"), 16),
+                )
+            else:
+                return cls(False, int(payload[3:5].decode("ascii"), 16))
+        except (UnicodeDecodeError, ValueError):
+            return None
+
+
+class OriginalFn(OriginalMessage):
+    HEADER = "FN"
+
+    def __init__(self, isSend, index=None, btAddress=None, name=None):
+        if isSend:
+            self.index = None
+            self.name = None
+            self.btAddress = None
+            super().__init__(isSend, self.HEADER)
+        else:
+            self.index = index
+            self.btAddress = btAddress
+            if btAddress is None:
+                self.name = None
+                paramStr = "%02X" % index
+            else:
+                self.name = "No Name" if name is None else name
+                paramStr = "%02X,%s,%s" % (index, btAddress, self.name)
+            super().__init__(isSend, self.HEADER, paramStr.encode("utf-8"))
+
+    @classmethod
+    def create_valid_msg(cls, payload: bytes):
+        msgLen = len(payload)
+        try:
+            if msgLen == 5:
+                return cls(False, int(payload[3:5].decode("ascii")))
+            elif msgLen == 18:
+                return cls(False, int(payload[3:5].decode("ascii")), payload[6:].decode("utf-8"))
+            elif msgLen > 19:
+                return cls(
+                    False,
+                    int(payload[3:5].decode("ascii")),
+                    payload[6:18].decode("utf-8"),
+                    payload[19:].decode("utf-8", errors="ignore"),
+                )
+        except (UnicodeDecodeError, ValueError):
+            return None
+        return None
+
+
+class OriginalPl(OriginalMessage):
+    HEADER = "PL"
+
+    def __init__(self, isSend, index=None, addr=None, name=None, payload=None):
+        self.index = index
+        self.addr = addr
+        self.name = name
+        if isSend:
+            super().__init__(isSend, self.HEADER)
+        else:
+            super().__init__(isSend, self.HEADER, payload)
+
+    @classmethod
+    def create_valid_msg(cls, payload: bytes):
+        if len(payload) < 20:
+            return None
+        try:
+            return cls(
+                False, int(payload[3:5].decode("utf-8")), payload[6:18], payload[19:], payload[3:]
+            )
+        except (UnicodeDecodeError, ValueError):
+            return None
+
+
+# header -> (original class, schema-compiled class)
+CLASSES = {
+    b"ST": (OriginalSt, FlooMsgSt),
+    b"AC": (OriginalAc, FlooMsgAc),
+    b"FN": (OriginalFn, FlooMsgFn),
+    b"PL": (OriginalPl, FlooMsgPl),
+}
+
+
+def bench(repeat: int, number: int) -> dict[str, float]:
+    """ns per line for the original and the compiled decoders, by header and overall."""
+    timed: dict[str, list] = {"original": [], "compiled": []}
+    by_header: dict[bytes, list[bytes]] = {}
+    for line in RECORDED:
+        if line[:2] in CLASSES:
+            by_header.setdefault(line[:2], []).append(line)
+    for header, lines in by_header.items():
+        original, compiled = CLASSES[header]
+        timed["original"].append((header, original.create_valid_msg, lines))
+        timed["compiled"].append((header, compiled.create_valid_msg, lines))
+
+    def runner(parse, lines):
+        def run():
+            for line in lines:
+                parse(line)
+
+        return run
+
+    results: dict[str, float] = {}
+    for name, cases in timed.items():
+        total = count = 0.0
+        for header, parse, lines in cases:
+            best = min(timeit.repeat(runner(parse, lines), repeat=repeat, number=number))
+            results[f"{name} {header.decode()}"] = best / (number * len(lines)) * 1e9
+            total += best
+            count += number * len(lines)
+        results[name] = total / count * 1e9
+    return results
+
+
+def main() -> None:
+    argp = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argp.add_argument("--repeat", type=int, default=5)
+    argp.add_argument("--number", type=int, default=2000)
+    args = argp.parse_args()
+    results = bench(args.repeat, args.number)
+    for header in CLASSES:
+        name = header.decode()
+        before, after = results[f"original {name}"], results[f"compiled {name}"]
+        print(f"{name}: {before:8.0f} -> {after:8.0f} ns/line ({before / after:.2f}x)")
+    print(f"speedup: {results['original'] / results['compiled']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
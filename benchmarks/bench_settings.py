@@ -0,0 +1,119 @@
+"""Settings persistence: the JSON document vs the append-only journal.
+
+Saves one frequently changing key (``last_streaming_state``) of a settings
+file the size the app writes, synchronously, and reports saves per second
+and bytes written per save (from /proc/self/io where there is one). Then
+times loading that file: the JSON document, and the journaled store with
+an empty journal and with one just short of compaction.
+
+    python benchmarks/bench_settings.py [--saves N] [--loads N] [--compact-bytes N]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from floocast.settings import (  # noqa: E402
+    DEFAULT_COMPACT_BYTES,
+    FlooJournaledSettings,
+    FlooSettings,
+)
+
+
+def document() -> dict:
+    """Settings as the app leaves them after a few dongles and devices."""
+    snapshot = {
+        "version": "1.2.0",
+        "audioMode": 2,
+        "preferLea": 1,
+        "broadcastMode": 0,
+        "broadcastName": "FlooCast",
+        "pairedDevices": [f"Headset {i}" for i in range(8)],
+        "feature": 0x1F,
+    }
+    return {
+        "start_minimized": False,
+        "handshake_mode": 1,
+        "aux_blocksize": 512,
+        "aux_input": {"name": "Line In (USB Audio)", "hostapi": "ALSA", "index": 4},
+        "device_snapshots": {f"/dev/ttyACM{i}": dict(snapshot) for i in range(3)},
+        "last_streaming_state": None,
+    }
+
+
+def written_bytes() -> int | None:
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def bench_saves(backend, saves: int) -> tuple[float, float | None]:
+    settings = backend()
+    settings.update(document())
+    settings.save()
+    before = written_bytes()
+    start = time.perf_counter()
+    for i in range(saves):
+        settings.set_item("last_streaming_state", 6 + i % 2)
+        settings.save()
+    elapsed = time.perf_counter() - start
+    after = written_bytes()
+    per_save = None if before is None or after is None else (after - before) / saves
+    return saves / elapsed, per_save
+
+
+def bench_load(backend, loads: int) -> float:
+    start = time.perf_counter()
+    for _ in range(loads):
+        backend()
+    return (time.perf_counter() - start) / loads
+
+
+def main() -> None:
+    argp = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argp.add_argument("--saves", type=int, default=2000)
+    argp.add_argument("--loads", type=int, default=500)
+    argp.add_argument("--compact-bytes", type=int, default=DEFAULT_COMPACT_BYTES)
+    args = argp.parse_args()
+
+    def journaled():
+        return FlooJournaledSettings(compact_bytes=args.compact_bytes)
+
+    with tempfile.TemporaryDirectory() as config:
+        os.environ["XDG_CONFIG_HOME"] = config
+        print(f"{'backend':>9} {'saves/s':>10} {'bytes/save':>11}")
+        for name, backend in (("json", FlooSettings), ("journal", journaled)):
+            rate, per_save = bench_saves(backend, args.saves)
+            size = "n/a" if per_save is None else f"{per_save:.0f}"
+            print(f"{name:>9} {rate:10.0f} {size:>11}")
+            Path(config, "FlooCast", "settings.json").unlink()
+            Path(config, "FlooCast", "settings.json.journal").unlink(missing_ok=True)
+
+        settings = FlooSettings()
+        settings.update(document())
+        settings.save()
+        print(f"\n{'load':>24} {'ms':>7}")
+        print(f"{'json':>24} {bench_load(FlooSettings, args.loads) * 1e3:7.3f}")
+        print(f"{'journal, empty':>24} {bench_load(journaled, args.loads) * 1e3:7.3f}")
+        # fill the journal to just short of compaction
+        settings = journaled()
+        state = 0
+        while state == 0 or settings.journal_path.stat().st_size < args.compact_bytes * 0.95:
+            state += 1
+            settings.set_item("last_streaming_state", state)
+            settings.save()
+        print(f"{'journal, before compact':>24} {bench_load(journaled, args.loads) * 1e3:7.3f}")
+
+
+if __name__ == "__main__":
+    main()
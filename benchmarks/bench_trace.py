@@ -0,0 +1,77 @@
+"""Cost of trace recording on the serial reader thread.
+
+Runs bursts of recorded frames through FlooInterface._handle_frames with and
+without a FlooTraceRecorder attached and reports the time per frame on the
+reader side, then how fast the background thread gets them to disk.
+
+    python benchmarks/bench_trace.py [--repeat N] [--burst N]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from floocast.protocol.interface import FlooInterface  # noqa: E402
+from floocast.protocol.interface_delegate import FlooInterfaceDelegate  # noqa: E402
+from floocast.protocol.trace import INBOUND, FlooTraceRecorder  # noqa: E402
+
+FRAMES = [
+    b"AC=07,C4,0100,1770,0640,2710,0BB8,9C40",
+    b"ST=06",
+    b"AC=07,C2,0100,1770,0640,2710,0BB8,9C40",
+    b"LA=02",
+]
+
+
+def reader_cost(recorder: FlooTraceRecorder | None, burst: list[bytes], number: int) -> float:
+    inf = FlooInterface(FlooInterfaceDelegate(), hotplug_factory=None, recorder=recorder)
+    inf.port_name = "ttyACM0"
+
+    def run():
+        inf._handle_frames(burst, time.monotonic_ns())
+        inf.dispatcher.clear()
+
+    return timeit.timeit(run, number=number) / (number * len(burst)) * 1e9
+
+
+def main() -> None:
+    argp = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argp.add_argument("--repeat", type=int, default=5)
+    argp.add_argument("--number", type=int, default=2000)
+    argp.add_argument("--burst", type=int, default=16)
+    args = argp.parse_args()
+    burst = (FRAMES * args.burst)[: args.burst]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "bench.fltr")
+        recorder = FlooTraceRecorder(path, max_bytes=1 << 30, max_queue=1 << 20)
+        recorder.start()
+        # interleave the two so clock and cache drift hit both equally
+        best = {"off": float("inf"), "on": float("inf")}
+        for _ in range(args.repeat):
+            best["off"] = min(best["off"], reader_cost(None, burst, args.number))
+            best["on"] = min(best["on"], reader_cost(recorder, burst, args.number))
+            recorder.flush()
+        print(f"reader, tracing off: {best['off']:8.0f} ns/frame")
+        print(f"reader, tracing on:  {best['on']:8.0f} ns/frame")
+        print(f"overhead:            {best['on'] - best['off']:8.0f} ns/frame")
+        print(f"record() mean:       {recorder.stats.mean_record_ns():8.0f} ns/call")
+
+        count = 200_000
+        start = time.perf_counter()
+        for i in range(0, count, len(burst)):
+            recorder.record_frames(INBOUND, "ttyACM0", burst, i)
+        recorder.flush()
+        elapsed = time.perf_counter() - start
+        print(f"writer throughput:   {count / elapsed:8.0f} frames/s")
+        print(f"dropped:             {recorder.stats.dropped:8d}")
+        recorder.stop()
+
+
+if __name__ == "__main__":
+    main()
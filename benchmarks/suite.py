@@ -0,0 +1,255 @@
+"""Protocol hot-path benchmark suite with a JSON report and a baseline check.
+
+Measures, on one machine and without a dongle:
+
+- parser:        messages/s decoded by FlooParser.parse_stream
+- schema:        speedup of the schema-compiled parsers over the original
+                 ``int(..., 16)`` ones (bench_schema.py)
+- framer:        bytes/s split by FlooFramer.feed in serial-read sized chunks
+- state_machine: messages/s through FlooStateMachine.handleMessage (FlooReplay)
+- rtt:           FlooAsyncClient query round trips, p50/p90/p99 in ms
+- handshake:     FlooAsyncClient pipelined handshake, median in ms
+
+RTT and handshake run against the FMA120 emulator, over its pty
+(``--transport pty``) or with its replies fed straight back to the client
+(``--transport memory``, the default, which leaves only our own stack in
+the numbers).
+
+Results are written as JSON (``--output``) and compared to a baseline
+(``--baseline``, default benchmarks/baseline.json); any metric worse than
+its baseline by more than ``--tolerance`` is reported and the exit status
+is 1. ``--update-baseline`` stores this run as the new baseline. Numbers
+only compare on the same machine: regenerate the baseline where the check
+runs.
+
+    python benchmarks/suite.py [--quick] [--transport memory|pty] [--output FILE]
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_parser import RECORDED  # noqa: E402
+from bench_replay import synthetic  # noqa: E402
+from bench_schema import bench as bench_schema_decoders  # noqa: E402
+
+from floocast.protocol.async_client import FlooAsyncClient  # noqa: E402
+from floocast.protocol.emulator import FlooEmulator, FlooEmulatorProfile  # noqa: E402
+from floocast.protocol.framer import FlooFramer  # noqa: E402
+from floocast.protocol.parser import FlooParser  # noqa: E402
+from floocast.protocol.replay import FlooReplay  # noqa: E402
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+TOLERANCE = 0.25
+
+# name -> (unit, higher is better)
+METRICS = {
+    "parser": ("messages/s", True),
+    "schema": ("x original", True),
+    "framer": ("bytes/s", True),
+    "state_machine": ("messages/s", True),
+    "rtt_p50": ("ms", False),
+    "rtt_p90": ("ms", False),
+    "rtt_p99": ("ms", False),
+    "handshake": ("ms", False),
+}
+
+
+def best_rate(func, count: int, repeat: int) -> float:
+    """``count`` units per second for the fastest of ``repeat`` runs of ``func``."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+
+def bench_parser(scale: int, repeat: int) -> float:
+    parser = FlooParser()
+    capture = b"".join(line + b"\r\n" for line in RECORDED) * scale
+    return best_rate(lambda: parser.parse_stream(capture), len(RECORDED) * scale, repeat)
+
+
+def bench_schema(repeat: int) -> float:
+    results = bench_schema_decoders(repeat, 2000)
+    return results["original"] / results["compiled"]
+
+
+def bench_framer(scale: int, repeat: int) -> float:
+    capture = b"".join(line + b"\r\n" for line in RECORDED) * scale
+    # what one read() of the port typically returns at 921600 baud
+    chunks = [capture[i : i + 64] for i in range(0, len(capture), 64)]
+
+    def run():
+        framer = FlooFramer()
+        for chunk in chunks:
+            framer.feed(chunk)
+
+    return best_rate(run, len(capture), repeat)
+
+
+def bench_state_machine(scale: int, repeat: int) -> float:
+    records = synthetic(scale * 10)
+    return max(FlooReplay(records).run().messages_per_second() for _ in range(repeat))
+
+
+class MemoryTransport(asyncio.Transport):
+    """Hands every written line to the emulator and its reply back to the client."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, emulator: FlooEmulator, protocol):
+        super().__init__()
+        self._loop = loop
+        self._emulator = emulator
+        self._protocol = protocol
+        self._framer = FlooFramer()
+        self._closing = False
+        protocol.connection_made(self)
+
+    def write(self, data) -> None:
+        for line in self._framer.feed(bytes(data)):
+            reply = self._emulator.answer(bytes(line))
+            if reply:
+                self._loop.call_soon(self._protocol.data_received, reply)
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def close(self) -> None:
+        if not self._closing:
+            self._closing = True
+            self._loop.call_soon(self._protocol.connection_lost, None)
+
+
+async def connect(emulator: FlooEmulator, transport: str) -> FlooAsyncClient:
+    if transport == "pty":
+        return await FlooAsyncClient.connect(emulator.path)
+    client = FlooAsyncClient()
+    MemoryTransport(asyncio.get_running_loop(), emulator, client)
+    return client
+
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def bench_client(transport: str, queries: int, handshakes: int) -> dict[str, float]:
+    # no artificial latency: the numbers are the host side of the round trip
+    profile = FlooEmulatorProfile(latency=0.0, seed=1)
+
+    async def scenario(emulator: FlooEmulator) -> tuple[list[float], list[float]]:
+        client = await connect(emulator, transport)
+        rtts = []
+        for _ in range(queries):
+            start = time.perf_counter()
+            await client.read_source_state()
+            rtts.append(time.perf_counter() - start)
+        ready = []
+        for _ in range(handshakes):
+            start = time.perf_counter()
+            await client.handshake()
+            ready.append(time.perf_counter() - start)
+        client.close()
+        return rtts, ready
+
+    with FlooEmulator(profile) as emulator:
+        rtts, ready = asyncio.run(scenario(emulator))
+    rtts.sort()
+    return {
+        "rtt_p50": percentile(rtts, 0.50) * 1000,
+        "rtt_p90": percentile(rtts, 0.90) * 1000,
+        "rtt_p99": percentile(rtts, 0.99) * 1000,
+        "handshake": statistics.median(ready) * 1000,
+    }
+
+
+def run(quick: bool, transport: str) -> dict[str, float]:
+    scale, repeat = (200, 3) if quick else (2000, 5)
+    results = {
+        "parser": bench_parser(scale, repeat),
+        "schema": bench_schema(repeat),
+        "framer": bench_framer(scale, repeat),
+        "state_machine": bench_state_machine(scale, repeat),
+    }
+    results.update(bench_client(transport, 200 if quick else 2000, 20 if quick else 100))
+    return results
+
+
+def compare(results: dict[str, float], baseline: dict[str, float], tolerance: float) -> list[str]:
+    """The metrics that got worse than ``baseline`` by more than ``tolerance``."""
+    regressions = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        if base is None or base <= 0:
+            continue
+        _, higher_is_better = METRICS[name]
+        change = value / base - 1 if higher_is_better else base / value - 1
+        if change < -tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def report(results: dict[str, float], baseline: dict[str, float], regressions: list[str]) -> None:
+    for name, value in results.items():
+        unit, _ = METRICS[name]
+        line = f"{name:>14}: {value:14.3f} {unit:<11}"
+        base = baseline.get(name)
+        if base:
+            line += f" baseline {base:14.3f} ({value / base - 1:+7.1%})"
+        if name in regressions:
+            line += "  REGRESSION"
+        print(line)
+
+
+def main() -> None:
+    argp = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argp.add_argument("--quick", action="store_true", help="fewer iterations, for CI smoke runs")
+    argp.add_argument("--transport", choices=("memory", "pty"), default="memory")
+    argp.add_argument("--output", help="write the results as JSON here")
+    argp.add_argument("--baseline", default=str(BASELINE))
+    argp.add_argument("--tolerance", type=float, default=TOLERANCE)
+    argp.add_argument("--update-baseline", action="store_true")
+    args = argp.parse_args()
+
+    results = run(args.quick, args.transport)
+    document: dict[str, Any] = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "transport": args.transport,
+        "quick": args.quick,
+        "results": results,
+        "units": {name: METRICS[name][0] for name in results},
+    }
+    baseline_path = Path(args.baseline)
+    baseline: dict[str, float] = {}
+    if baseline_path.exists():
+        stored = json.loads(baseline_path.read_text(encoding="utf-8"))
+        if stored.get("transport") == args.transport:
+            baseline = stored["results"]
+        else:
+            print(f"baseline was taken over {stored.get('transport')}; not comparing")
+    regressions = compare(results, baseline, args.tolerance)
+    document["regressions"] = regressions
+    report(results, baseline, regressions)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(document, indent=2) + "\n", encoding="utf-8")
+    if args.update_baseline:
+        baseline_path.write_text(json.dumps(document, indent=2) + "\n", encoding="utf-8")
+        print(f"baseline updated: {baseline_path}")
+    elif regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -179,6 +179,12 @@ class FlooAuxInput:
                 self.stop()
                 self._start_loop_internal(name_hint=hint)
 
+    @property
+    def xruns(self) -> int:
+        """Input overflows and output underflows since the loop was created."""
+        with self._lock:
+            return self._xruns
+
     def stop(self) -> None:
         if not self._running:
             return
@@ -0,0 +1,84 @@
+"""Change notification for files of one directory, from Linux inotify."""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+from collections.abc import Iterable
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# linux/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+
+# struct inotify_event without its name: wd, mask, cookie, len
+_EVENT = struct.Struct("iIII")
+
+
+class FlooFileWatch:
+    """Non-blocking inotify watch on a few files of one directory.
+
+    The directory is watched, not the files, so atomic replaces (which swap
+    the inode) are seen too. Use :meth:`open` to create one; it returns
+    ``None`` where inotify is not available so callers can fall back to
+    checking the file's stat.
+    """
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    READ_SIZE = 4096
+
+    def __init__(self, fd: int, names: Iterable[str]):
+        self._fd = fd
+        self._names = {os.fsencode(name) for name in names}
+
+    @classmethod
+    def open(cls, path: Path, *others: Path) -> FlooFileWatch | None:
+        """Watch ``path`` and ``others``, which are in the same directory."""
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            init1 = libc.inotify_init1
+            add_watch = libc.inotify_add_watch
+        except (OSError, AttributeError):
+            return None
+        add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        fd = init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            logger.info("inotify unavailable: %s", os.strerror(ctypes.get_errno()))
+            return None
+        if add_watch(fd, os.fsencode(path.parent), cls.MASK) < 0:
+            logger.info("Cannot watch %s: %s", path.parent, os.strerror(ctypes.get_errno()))
+            os.close(fd)
+            return None
+        return cls(fd, [path.name, *(other.name for other in others)])
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def changed(self) -> bool:
+        """Drain the queued events; True if any of them was about the files."""
+        changed = False
+        while True:
+            try:
+                data = os.read(self._fd, FlooFileWatch.READ_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return changed
+            offset = 0
+            while offset < len(data):
+                _wd, mask, _cookie, size = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset : offset + size].rstrip(b"\0")
+                offset += size
+                if mask & IN_Q_OVERFLOW or name in self._names:
+                    changed = True
+
+    def close(self) -> None:
+        os.close(self._fd)
@@ -37,8 +37,9 @@ from floocast.gui.panels import (
 from floocast.gui.state import GuiState
 from floocast.gui.toggle_switch import ToggleSwitchController
 from floocast.gui.tray_icon import FlooCastTrayIcon
+from floocast.metrics import FlooMetrics, exporters_from_environ
 from floocast.protocol.state_machine import FlooStateMachine
-from floocast.settings import FlooSettings
+from floocast.settings import DEFAULT_WRITE_BEHIND, FlooSettings
 
 logger = logging.getLogger(__name__)
 
@@ -46,7 +47,7 @@ logger = logging.getLogger(__name__)
 class AppController:
     def __init__(self):
         self.app = wx.App(False)
-        self.settings = FlooSettings()
+        self.settings = FlooSettings.shared(write_behind=DEFAULT_WRITE_BEHIND)
 
         self.state = GuiState(
             start_minimized=bool(self.settings.get_item("start_minimized") or False),
@@ -55,6 +56,9 @@ class AppController:
             saved_name=(self.settings.get_item("aux_input") or {}).get("name"),
         )
 
+        # sizers to lay out when the current state delta has been applied
+        self._dirty_sizers: list | None = None
+
         self._setup_localization()
         self._setup_frame()
         self._setup_panels()
@@ -367,6 +371,9 @@ class AppController:
         self.state_machine = FlooStateMachine(delegate)
         self.state_machine.daemon = True
         self.state_machine.start()
+        self.metrics_exporters = exporters_from_environ(
+            FlooMetrics(self.state_machine, self.state.looper)
+        )
 
     def run(self):
         if self.state.start_minimized:
@@ -376,6 +383,25 @@ class AppController:
             self.frame.Show(True)
         self.app.MainLoop()
 
+    def layout(self, sizer):
+        """Lay out ``sizer`` now, or once the current state delta is applied."""
+        if self._dirty_sizers is None:
+            sizer.Layout()
+        elif not any(dirty is sizer for dirty in self._dirty_sizers):
+            self._dirty_sizers.append(sizer)
+
+    def begin_state_delta(self):
+        self.frame.Freeze()
+        self._dirty_sizers = []
+
+    def end_state_delta(self):
+        dirty, self._dirty_sizers = self._dirty_sizers or [], None
+        try:
+            for sizer in dirty:
+                sizer.Layout()
+        finally:
+            self.frame.Thaw()
+
     def update_status_bar(self, info: str):
         self.status_bar.SetStatusText(info)
 
@@ -417,7 +443,7 @@ class AppController:
             settings_sizer.Show(self.settings_panel_obj.gatt_client_button)
             self.broadcast_panel.static_box.Enable()
         self._aux_input_broadcast_enable(self.state.audio_mode == 2)
-        settings_sizer.Layout()
+        self.layout(settings_sizer)
 
     def _on_audio_mode_select(self, event):
         selected_label = event.GetEventObject().GetLabel()
@@ -436,12 +462,15 @@ class AppController:
     def _on_quit_window(self, event):
         if self.state.looper:
             self.state.looper.stop()
+        for exporter in getattr(self, "metrics_exporters", []):
+            exporter.stop()
         if hasattr(self, "state_machine") and self.state_machine:
             if hasattr(self.state_machine, "cleanup"):
                 self.state_machine.cleanup()
             if hasattr(self.state_machine, "inf") and self.state_machine.inf:
                 if hasattr(self.state_machine.inf, "stop"):
                     self.state_machine.inf.stop()
+        self.settings.close()
         self.prefer_lea_toggle = None
         self.public_broadcast_toggle = None
         self.broadcast_high_quality_toggle = None
@@ -1,6 +1,7 @@
 """Codec display formatting for audio codec information."""
 
-RSSI_OFFSET = 0x100
+from floocast.protocol.messages import RSSI_OFFSET
+
 APTX_ADAPTIVE_CODEC = 6
 APTX_LOSSLESS_CODEC = 10
 
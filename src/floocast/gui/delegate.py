@@ -9,6 +9,8 @@ from typing import TYPE_CHECKING
 import certifi
 
 from floocast.gui.constants import LE_AUDIO_CODECS
+from floocast.protocol.paired_devices import ADD, MOVE, REMOVE, RENAME, apply_edits
+from floocast.protocol.state_machine import FeatureBit
 from floocast.protocol.state_machine_delegate import FlooStateMachineDelegate
 
 logger = logging.getLogger(__name__)
@@ -57,6 +59,15 @@ def _compare_versions(v1: str, v2: str) -> int:
     return 0
 
 
+def _firmware_variant(version: str) -> int:
+    """0 for the standard firmware, 1 for the Auracast receiver and 2 for the relay."""
+    if version.startswith("AS1"):
+        return 1
+    if version.startswith("AS2"):
+        return 2
+    return 0
+
+
 if TYPE_CHECKING:
     from floocast.gui.app_controller import AppController
 
@@ -65,15 +76,19 @@ class StateMachineDelegate(FlooStateMachineDelegate):
     def __init__(self, ctrl: AppController):
         self.ctrl = ctrl
 
+    def beginStateDelta(self):
+        self.ctrl.begin_state_delta()
+
+    def endStateDelta(self):
+        self.ctrl.end_state_delta()
+
     def deviceDetected(self, flag: bool, port: str, version: str | None = None):
         ctrl = self.ctrl
         if flag and version is not None:
+            ctrl.state.port_name = port
             ctrl.update_status_bar(ctrl._("Use FlooGoo dongle on ") + " " + port)
             ctrl.state.first_batch = "" if re.search(r"\d+$", version) else version[-1]
-            ctrl.state.firmware_variant = 1 if version.startswith("AS1") else 0
-            ctrl.state.firmware_variant = (
-                2 if version.startswith("AS2") else ctrl.state.firmware_variant
-            )
+            ctrl.state.firmware_variant = _firmware_variant(version)
             ctrl.state.firmware_version = version if ctrl.state.first_batch == "" else version[:-1]
             try:
                 ssl_context = ssl.create_default_context(cafile=certifi.where())
@@ -104,7 +119,7 @@ class StateMachineDelegate(FlooStateMachineDelegate):
                         "https://www.flairmesh.com/Dongle/FMA120.html"
                     )
                     version_sizer.Show(ctrl.version_panel_obj.new_firmware_url)
-                    version_sizer.Layout()
+                    ctrl.layout(version_sizer)
                 elif _compare_versions(latest, ctrl.state.firmware_version) > 0:
                     version_sizer.Hide(ctrl.version_panel_obj.dfu_info)
                     ctrl.version_panel_obj.new_firmware_url.SetLabelText(
@@ -128,7 +143,7 @@ class StateMachineDelegate(FlooStateMachineDelegate):
                             "A2DP - Auracast\u2122 " + ctrl._("Relay")
                         )
                         version_sizer.Show(ctrl.version_panel_obj.firmware_desc)
-                    version_sizer.Layout()
+                    ctrl.layout(version_sizer)
                 else:
                     ctrl.version_panel_obj.dfu_info.SetLabelText(
                         ctrl._("Firmware") + " " + ctrl.state.firmware_version
@@ -144,13 +159,48 @@ class StateMachineDelegate(FlooStateMachineDelegate):
                             "A2DP - Auracast\u2122 " + ctrl._("Relay")
                         )
                         version_sizer.Show(ctrl.version_panel_obj.firmware_desc)
-                    version_sizer.Layout()
+                    ctrl.layout(version_sizer)
         else:
+            ctrl.state.port_name = None
             ctrl.update_status_bar(ctrl._("Please insert your FlooGoo dongle"))
             ctrl.paired_device_listbox.Clear()
             ctrl.version_panel_obj.sizer.Hide(ctrl.version_panel_obj.dfu_info)
         ctrl._enable_settings_widgets(flag)
 
+    def cachedStateInd(self, port: str, snapshot: dict):
+        ctrl = self.ctrl
+        ctrl.state.port_name = port
+        ctrl.update_status_bar(ctrl._("Last known settings of the dongle on") + " " + port)
+        if snapshot.get("version"):
+            ctrl.state.firmware_variant = _firmware_variant(snapshot["version"])
+        if snapshot.get("audioMode") is not None:
+            self.audioModeInd(snapshot["audioMode"])
+        if snapshot.get("preferLea") is not None:
+            self.preferLeaInd(int(snapshot["preferLea"]))
+        if snapshot.get("broadcastMode") is not None:
+            self.broadcastModeInd(snapshot["broadcastMode"])
+        if snapshot.get("broadcastName") is not None:
+            self.broadcastNameInd(snapshot["broadcastName"])
+        self.pairedDevicesUpdateInd(snapshot.get("pairedDevices") or [])
+        feature = snapshot.get("feature")
+        if feature is not None:
+            self.ledEnabledInd(feature & FeatureBit.LED)
+            self.aptxLosslessEnabledInd(1 if feature & FeatureBit.APTX_LOSSLESS else 0)
+            self.gattClientEnabledInd(1 if feature & FeatureBit.GATT_CLIENT else 0)
+            self.audioSourceInd(1 if feature & FeatureBit.AUDIO_SOURCE else 0)
+
+    def staleStateInd(self, fields: list[str]):
+        ctrl = self.ctrl
+        ctrl.state.stale_fields = list(fields)
+        port = ctrl.state.port_name
+        if port is None or "version" in fields:
+            # not detected yet: the cached-state message stays up
+            return
+        status = ctrl._("Use FlooGoo dongle on ") + " " + port
+        if fields:
+            status += " (" + ctrl._("refreshing cached settings") + ")"
+        ctrl.update_status_bar(status)
+
     def audioModeInd(self, mode: int):
         ctrl = self.ctrl
         ctrl.state.hw_with_analog_input = 1 if (mode & 0x80) == 0x80 else 0
@@ -172,12 +222,12 @@ class StateMachineDelegate(FlooStateMachineDelegate):
     def sourceStateInd(self, state: int):
         ctrl = self.ctrl
         ctrl.audio_mode_panel.dongle_state_text.SetLabelText(ctrl.source_state_str[state])
-        ctrl.audio_mode_panel.dongle_state_sizer.Layout()
+        ctrl.layout(ctrl.audio_mode_panel.dongle_state_sizer)
 
     def leAudioStateInd(self, state: int):
         ctrl = self.ctrl
         ctrl.audio_mode_panel.lea_state_text.SetLabelText(ctrl.lea_state_str[state])
-        ctrl.audio_mode_panel.lea_state_sizer.Layout()
+        ctrl.layout(ctrl.audio_mode_panel.lea_state_sizer)
 
     def preferLeaInd(self, state: int):
         self.ctrl.prefer_lea_toggle.set(state == 1, True)
@@ -210,11 +260,37 @@ class StateMachineDelegate(FlooStateMachineDelegate):
     def pairedDevicesUpdateInd(self, pairedDevices):
         ctrl = self.ctrl
         ctrl.paired_device_listbox.Clear()
-        ctrl.state.paired_devices = list(pairedDevices)
         i = 0
         while i < len(pairedDevices):
             ctrl.paired_device_listbox.Append(pairedDevices[i])
             i = i + 1
+        self._paired_devices_changed(pairedDevices)
+
+    def pairedDevicesDiffInd(self, edits, pairedDevices):
+        listbox = self.ctrl.paired_device_listbox
+        try:
+            in_sync = apply_edits(list(listbox.GetItems()), edits) == list(pairedDevices)
+        except IndexError:
+            in_sync = False
+        if not in_sync:
+            # the listbox was not showing the list the edits start from
+            self.pairedDevicesUpdateInd(pairedDevices)
+            return
+        for edit in edits:
+            if edit.op == REMOVE:
+                listbox.Delete(edit.index)
+            elif edit.op == ADD:
+                listbox.Insert(edit.name, edit.index)
+            elif edit.op == RENAME:
+                listbox.SetString(edit.index, edit.name)
+            elif edit.op == MOVE:
+                listbox.Delete(edit.source)
+                listbox.Insert(edit.name, edit.index)
+        self._paired_devices_changed(pairedDevices)
+
+    def _paired_devices_changed(self, pairedDevices):
+        ctrl = self.ctrl
+        ctrl.state.paired_devices = list(pairedDevices)
         ctrl._update_new_pairing_button_state()
 
         if pairedDevices:
@@ -223,7 +299,7 @@ class StateMachineDelegate(FlooStateMachineDelegate):
         else:
             ctrl.state.connected_device_name = None
             ctrl.audio_mode_panel.connected_device_text.SetLabelText("")
-        ctrl.audio_mode_panel.codec_in_use_sizer.Layout()
+        ctrl.layout(ctrl.audio_mode_panel.codec_in_use_sizer)
 
     def audioCodecInUseInd(
         self, codec, rssi, rate, spkSampleRate, micSampleRate, sduInt, transportDelay, presentDelay
@@ -254,7 +330,7 @@ class StateMachineDelegate(FlooStateMachineDelegate):
             ctrl.state.device_is_le_audio_only = False
             ctrl.audio_mode_panel.codec_info_text.SetLabelText("")
 
-        ctrl.audio_mode_panel.codec_in_use_sizer.Layout()
+        ctrl.layout(ctrl.audio_mode_panel.codec_in_use_sizer)
 
     def ledEnabledInd(self, enabled):
         self.ctrl.led_toggle.set(enabled, True)
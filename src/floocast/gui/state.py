@@ -37,6 +37,9 @@ class GuiState:
     connected_device_name: str | None = None
 
     paired_devices: list = field(default_factory=list)
+    # dongle port, and the settings shown from its snapshot until confirmed
+    port_name: str | None = None
+    stale_fields: list = field(default_factory=list)
 
     looper: Any = None
     input_devices: list = field(default_factory=list)
@@ -0,0 +1,308 @@
+"""Dongle and audio health in the Prometheus text format.
+
+:class:`FlooMetrics` reads the live state of a FlooStateMachine, its
+interface and the aux input loop whenever it is rendered, so nothing is
+sampled or stored in between. Two optional exporters publish it:
+
+- :class:`FlooMetricsServer` serves ``/metrics`` over HTTP on localhost,
+  for a Prometheus scrape or an agent on the same host.
+- :class:`FlooMetricsTextfile` rewrites a ``.prom`` file every few seconds,
+  for node_exporter's textfile collector.
+
+Both are off unless configured, see :func:`exporters_from_environ`:
+``FLOOCAST_METRICS_PORT`` starts the server, ``FLOOCAST_METRICS_FILE`` the
+textfile writer and ``FLOOCAST_METRICS_INTERVAL`` sets its period.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from floocast.protocol.messages import RSSI_OFFSET
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(value) if isinstance(value, float) else str(int(value))
+
+
+class _Family:
+    """One metric name with its HELP/TYPE header and samples."""
+
+    def __init__(self, name: str, kind: str, help: str):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.lines: list[str] = []
+
+    def add(self, value: float | None, labels: dict[str, str], suffix: str = "") -> None:
+        if value is not None:
+            self.lines.append(f"{self.name}{suffix}{_labels(labels)} {_number(value)}")
+
+    def render(self) -> list[str]:
+        if not self.lines:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.lines]
+
+
+class FlooMetrics:
+    """Renders the state of one dongle and the aux input loop on demand.
+
+    Either source may be left out or set later, e.g. once the aux input
+    exists. Values that are unknown yet, like the codec before the first
+    AC report, are left out rather than exported as 0.
+    """
+
+    def __init__(self, state_machine: Any = None, aux_input: Any = None):
+        self.state_machine = state_machine
+        self.aux_input = aux_input
+
+    def render(self) -> str:
+        families: list[_Family] = []
+        if self.state_machine is not None:
+            families += self._dongle_families(self.state_machine)
+        if self.aux_input is not None:
+            xruns = _Family(
+                "floocast_audio_xruns_total",
+                "counter",
+                "Aux input overflows and output underflows.",
+            )
+            xruns.add(self.aux_input.xruns, {})
+            families.append(xruns)
+        lines = [line for family in families for line in family.render()]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def _dongle_families(self, sm: Any) -> list[_Family]:
+        inf = sm.inf
+        labels = {"port": inf.port_name or ""}
+        connected = _Family("floocast_connected", "gauge", "1 once the handshake has completed.")
+        connected.add(int(sm.state == sm.CONNECTED), labels)
+        source = _Family("floocast_source_state", "gauge", "Source state (ST) of the dongle.")
+        source.add(sm.sourceState, labels)
+        le_audio = _Family("floocast_le_audio_state", "gauge", "LE Audio state (LA).")
+        le_audio.add(sm.leAudioState, labels)
+        reconnects = _Family(
+            "floocast_reconnect_attempts_total", "counter", "Auto-reconnect attempts scheduled."
+        )
+        reconnects.add(sm.reconnectsScheduled, labels)
+        families = [connected, source, le_audio, reconnects]
+
+        ac = sm.codecInUse
+        if ac is not None:
+            for name, help, value in (
+                ("floocast_codec", "Codec in use (AC).", ac.codec),
+                ("floocast_codec_rate", "Codec bit rate as reported by AC.", ac.rate),
+                (
+                    "floocast_transport_delay",
+                    "Transport delay as reported by AC.",
+                    ac.transportDelay,
+                ),
+                (
+                    "floocast_presentation_delay",
+                    "Presentation delay as reported by AC.",
+                    ac.presentDelay,
+                ),
+            ):
+                family = _Family(name, "gauge", help)
+                family.add(value, labels)
+                families.append(family)
+            rssi = _Family("floocast_rssi_dbm", "gauge", "Link RSSI of the sink in dBm.")
+            rssi.add(ac.rssi - RSSI_OFFSET if ac.rssi else None, labels)
+            families.append(rssi)
+
+        stats = getattr(inf, "stats", None)
+        if stats is not None:
+            opens = _Family(
+                "floocast_serial_opens_total",
+                "counter",
+                "Times the serial port was opened; every one past the first is a reopen.",
+            )
+            opens.add(stats.port_opens, labels)
+            failures = _Family(
+                "floocast_parse_failures_total",
+                "counter",
+                "Frames from the dongle that did not parse.",
+            )
+            failures.add(stats.parse_failures, labels)
+            families += [opens, failures]
+        return families + self._command_families(sm.commandStats(), labels)
+
+    @staticmethod
+    def _command_families(command_stats: dict[str, Any], labels: dict[str, str]) -> list[_Family]:
+        rtt = _Family("floocast_command_rtt_seconds", "histogram", "Command round-trip times.")
+        outcomes = {
+            "errors": _Family("floocast_command_errors_total", "counter", "Commands answered ER."),
+            "timeouts": _Family(
+                "floocast_command_timeouts_total", "counter", "Commands that never got a reply."
+            ),
+            "retries": _Family(
+                "floocast_command_retries_total", "counter", "Commands resent after a deadline."
+            ),
+        }
+        for header, stats in sorted(command_stats.items()):
+            command = {**labels, "command": header}
+            histogram = stats.latency
+            seen = 0
+            for bound, n in zip(histogram.bounds_ms, histogram.counts, strict=False):
+                seen += n
+                rtt.add(seen, {**command, "le": _number(bound / 1000)}, "_bucket")
+            rtt.add(histogram.count, {**command, "le": "+Inf"}, "_bucket")
+            rtt.add(histogram.total_ms / 1000, command, "_sum")
+            rtt.add(histogram.count, command, "_count")
+            for attr, family in outcomes.items():
+                family.add(getattr(stats, attr), command)
+        return [rtt, *outcomes.values()]
+
+
+class FlooMetricsServer:
+    """Serves :meth:`FlooMetrics.render` at ``/metrics`` from a daemon thread.
+
+    Binds to localhost by default; port 0 picks a free one, see ``port``.
+    """
+
+    def __init__(self, metrics: FlooMetrics, port: int, host: str = "127.0.0.1"):
+        self.metrics = metrics
+        self._httpd = ThreadingHTTPServer((host, port), _handler_for(metrics))
+        self._httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_address[1]
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="FlooMetricsServer", daemon=True
+        )
+        self._thread.start()
+        logger.info("Serving metrics on http://%s:%d/metrics", *self._httpd.server_address[:2])
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+
+def _handler_for(metrics: FlooMetrics) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            try:
+                body = metrics.render().encode("utf-8")
+            except Exception:
+                logger.exception("Failed to render metrics")
+                self.send_error(500)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:
+            logger.debug("metrics: " + format, *args)
+
+    return Handler
+
+
+class FlooMetricsTextfile:
+    """Rewrites ``path`` with :meth:`FlooMetrics.render` every ``interval`` seconds.
+
+    The file is replaced atomically, so a collector never reads half of it.
+    """
+
+    INTERVAL = 15.0
+
+    def __init__(self, metrics: FlooMetrics, path: str, interval: float = INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def write(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", suffix=".prom", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.metrics.render())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="FlooMetricsTextfile", daemon=True)
+        self._thread.start()
+        logger.info("Writing metrics to %s every %.0f s", self.path, self.interval)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.write()
+            except Exception as e:
+                logger.warning("Failed to write metrics to %s: %s", self.path, e)
+            if self._stop_event.wait(self.interval):
+                return
+
+
+def exporters_from_environ(
+    metrics: FlooMetrics, environ: dict[str, str] | None = None
+) -> list[FlooMetricsServer | FlooMetricsTextfile]:
+    """Start the exporters configured by ``FLOOCAST_METRICS_*``; none by default."""
+    env = os.environ if environ is None else environ
+    exporters: list[FlooMetricsServer | FlooMetricsTextfile] = []
+    port = env.get("FLOOCAST_METRICS_PORT")
+    if port:
+        try:
+            exporters.append(FlooMetricsServer(metrics, int(port)))
+        except (OSError, ValueError) as e:
+            logger.error("Cannot serve metrics on port %s: %s", port, e)
+    path = env.get("FLOOCAST_METRICS_FILE")
+    if path:
+        interval = FlooMetricsTextfile.INTERVAL
+        value = env.get("FLOOCAST_METRICS_INTERVAL")
+        if value:
+            try:
+                interval = float(value)
+            except ValueError:
+                logger.warning(
+                    "Ignoring FLOOCAST_METRICS_INTERVAL=%r, writing every %.0f s", value, interval
+                )
+        exporters.append(FlooMetricsTextfile(metrics, path, interval))
+    for exporter in exporters:
+        exporter.start()
+    return exporters
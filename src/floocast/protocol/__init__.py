@@ -1,5 +1,15 @@
+from floocast.protocol.async_client import FlooAsyncClient
+from floocast.protocol.command_tracker import (
+    FlooCommandError,
+    FlooCommandTimeout,
+    FlooCommandTracker,
+    RetryPolicy,
+)
+from floocast.protocol.dispatcher import FlooDispatcher
+from floocast.protocol.framer import FlooFramer
 from floocast.protocol.interface import FlooInterface
 from floocast.protocol.interface_delegate import FlooInterfaceDelegate
+from floocast.protocol.manager import FlooDongle, FlooDongleManager
 from floocast.protocol.messages import (
     FlooMessage,
     FlooMsgAc,
@@ -26,10 +36,23 @@ from floocast.protocol.messages import (
     FlooMsgUnknown,
     FlooMsgVr,
 )
+from floocast.protocol.paired_devices import FlooPairedDevice, FlooPairedDeviceList
 from floocast.protocol.parser import FlooParser
+from floocast.protocol.pool import FlooWorkerPool
+from floocast.protocol.replay import FlooReplay
 from floocast.protocol.state_machine import FlooStateMachine
+from floocast.protocol.trace import FlooTraceRecord, FlooTraceRecorder
+from floocast.protocol.writer import FlooWriter
 
 __all__ = [
+    "FlooAsyncClient",
+    "FlooCommandError",
+    "FlooCommandTimeout",
+    "FlooCommandTracker",
+    "FlooDispatcher",
+    "FlooDongle",
+    "FlooDongleManager",
+    "FlooFramer",
     "FlooInterface",
     "FlooInterfaceDelegate",
     "FlooMessage",
@@ -56,6 +79,14 @@ __all__ = [
     "FlooMsgTc",
     "FlooMsgUnknown",
     "FlooMsgVr",
+    "FlooPairedDevice",
+    "FlooPairedDeviceList",
     "FlooParser",
+    "FlooReplay",
     "FlooStateMachine",
+    "FlooTraceRecord",
+    "FlooTraceRecorder",
+    "FlooWorkerPool",
+    "FlooWriter",
+    "RetryPolicy",
 ]
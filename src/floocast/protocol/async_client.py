@@ -0,0 +1,437 @@
+"""asyncio client for the FlooGoo BAI protocol.
+
+Runs the serial I/O on the caller's event loop instead of the reader
+thread used by FlooInterface, so a service that already has a loop can
+drive the dongle without extra threads or polling.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+from floocast.protocol.command_tracker import (
+    FlooCommandTracker,
+    FlooPendingCommand,
+    RetryPolicy,
+)
+from floocast.protocol.framer import FlooFramer
+from floocast.protocol.interface import open_port
+from floocast.protocol.messages import (
+    UNSOLICITED_HEADERS,
+    FlooMessage,
+    FlooMsgAc,
+    FlooMsgAm,
+    FlooMsgBe,
+    FlooMsgBm,
+    FlooMsgBn,
+    FlooMsgCp,
+    FlooMsgFn,
+    FlooMsgFt,
+    FlooMsgIq,
+    FlooMsgLa,
+    FlooMsgLf,
+    FlooMsgMd,
+    FlooMsgSt,
+    FlooMsgTc,
+    FlooMsgVr,
+)
+from floocast.protocol.parser import FlooParser
+from floocast.protocol.state_machine import BroadcastModeBit, FeatureBit
+
+logger = logging.getLogger(__name__)
+
+_M = TypeVar("_M", bound=FlooMessage)
+
+
+class FlooSerialTransport(asyncio.Transport):
+    """Non-blocking transport over an open serial port's file descriptor."""
+
+    max_size = 4096
+
+    def __init__(self, loop, port, protocol, waiter=None):
+        super().__init__()
+        self._loop = loop
+        self._port = port
+        self._fd = port.fileno()
+        self._protocol = protocol
+        self._buffer = bytearray()
+        self._closing = False
+        os.set_blocking(self._fd, False)
+        loop.call_soon(protocol.connection_made, self)
+        loop.call_soon(loop.add_reader, self._fd, self._read_ready)
+        if waiter is not None:
+            loop.call_soon(_set_result_unless_cancelled, waiter, None)
+
+    def _read_ready(self):
+        try:
+            data = os.read(self._fd, self.max_size)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as exc:
+            self._fatal_error(exc)
+            return
+        if not data:
+            self._fatal_error(EOFError("device reports readiness to read but returned no data"))
+            return
+        self._protocol.data_received(data)
+
+    def write(self, data):
+        if self._closing:
+            return
+        if not self._buffer:
+            try:
+                n = os.write(self._fd, data)
+            except (BlockingIOError, InterruptedError):
+                n = 0
+            except OSError as exc:
+                self._fatal_error(exc)
+                return
+            data = data[n:]
+            if not data:
+                return
+            self._loop.add_writer(self._fd, self._write_ready)
+        self._buffer += data
+
+    def _write_ready(self):
+        try:
+            n = os.write(self._fd, self._buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as exc:
+            self._fatal_error(exc)
+            return
+        del self._buffer[:n]
+        if not self._buffer:
+            self._loop.remove_writer(self._fd)
+
+    def get_write_buffer_size(self):
+        return len(self._buffer)
+
+    def is_closing(self):
+        return self._closing
+
+    def close(self):
+        self._close(None)
+
+    def abort(self):
+        self._close(None)
+
+    def _fatal_error(self, exc):
+        logger.warning("Serial transport error: %s", exc)
+        self._close(exc)
+
+    def _close(self, exc):
+        if self._closing:
+            return
+        self._closing = True
+        self._loop.remove_reader(self._fd)
+        self._loop.remove_writer(self._fd)
+        self._buffer.clear()
+        try:
+            self._port.close()
+        except OSError as e:
+            logger.warning("Error closing port: %s", e)
+        self._loop.call_soon(self._protocol.connection_lost, exc)
+
+
+def _set_result_unless_cancelled(fut, result):
+    if not fut.cancelled():
+        fut.set_result(result)
+
+
+class FlooAsyncClient(asyncio.Protocol):
+    """Awaitable FMA120 client.
+
+    Setters resolve when the dongle answers ``OK`` and raise
+    FlooCommandError on ``ER``; queries resolve with the matching data
+    reply. Commands may overlap: FlooCommandTracker credits replies in
+    order and raises FlooCommandTimeout when one never arrives. Every
+    received message, solicited or not, is also passed to the listeners
+    registered with :meth:`add_listener`.
+    """
+
+    DEFAULT_TIMEOUT = 2.0
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.transport: asyncio.Transport | None = None
+        self.parser = FlooParser()
+        self.framer = FlooFramer()
+        self.a2dpSink = False
+        self.audioMode: int | None = None
+        self.broadcastMode: int | None = None
+        self.feature: int | None = None
+        self._commands = FlooCommandTracker(
+            self._write, policy=RetryPolicy(timeout=timeout), unsolicited=UNSOLICITED_HEADERS
+        )
+        self._timer: asyncio.TimerHandle | None = None
+        self._listeners: list[Callable[[FlooMessage], Any]] = []
+        self._closed: asyncio.Future | None = None
+
+    @classmethod
+    async def connect(cls, path: str, **kwargs) -> FlooAsyncClient:
+        """Open the serial port at ``path`` and attach a client to it."""
+        loop = asyncio.get_running_loop()
+        client = cls(**kwargs)
+        waiter = loop.create_future()
+        FlooSerialTransport(loop, open_port(path), client, waiter)
+        await waiter
+        return client
+
+    # ---------- asyncio.Protocol ----------
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._closed = asyncio.get_running_loop().create_future()
+
+    def data_received(self, data):
+        for payload in self.framer.feed(data):
+            if len(payload) < 2:
+                continue
+            msg = self.parser.run(payload)
+            if msg is not None:
+                self._handle_message(msg)
+
+    def connection_lost(self, exc):
+        self.transport = None
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._commands.clear("serial port closed")
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(exc)
+
+    # ---------- Lifecycle ----------
+
+    def add_listener(self, callback: Callable[[FlooMessage], Any]) -> None:
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[FlooMessage], Any]) -> None:
+        self._listeners.remove(callback)
+
+    def close(self) -> None:
+        if self.transport is not None:
+            self.transport.close()
+
+    async def wait_closed(self) -> None:
+        if self._closed is not None:
+            await self._closed
+
+    # ---------- Dispatch ----------
+
+    def _handle_message(self, msg: FlooMessage) -> None:
+        logger.debug("received %s", msg.header)
+        if isinstance(msg, FlooMsgFn):
+            cmd = self._commands.match(msg, final=msg.btAddress is None)
+            if cmd is not None and msg.btAddress is not None:
+                cmd.param.append(msg)
+        else:
+            self._commands.match(msg)
+        self._arm_timer()
+        for listener in list(self._listeners):
+            try:
+                listener(msg)
+            except Exception:
+                # a broken listener must not stop the reader
+                logger.exception("Error in listener for %s", msg.header)
+
+    def _write(self, msg: FlooMessage) -> None:
+        if self.transport is None:
+            raise ConnectionError("not connected")
+        logger.debug("send %s", msg.header)
+        self.transport.write(bytes(msg.bytes))
+
+    def _arm_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        delay = self._commands.time_until_deadline()
+        if delay is not None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._commands.expire()
+        self._arm_timer()
+
+    async def _submit(
+        self, msg: FlooMessage, reply_header: str | None = None, param: Any = None
+    ) -> FlooPendingCommand:
+        cmd = self._commands.submit(msg, reply_header, param)
+        self._arm_timer()
+        await asyncio.wrap_future(cmd.future)
+        return cmd
+
+    async def _command(self, msg: FlooMessage, reply_header: str | None = None) -> Any:
+        cmd = await self._submit(msg, reply_header)
+        return cmd.future.result()
+
+    async def _query(self, msg: _M) -> _M:
+        reply: _M = await self._command(msg, msg.header)
+        return reply
+
+    # ---------- Queries ----------
+
+    async def read_version(self) -> str:
+        reply = await self._query(FlooMsgVr(True))
+        version: str = reply.verStr
+        self.a2dpSink = version.startswith("AS")
+        return version
+
+    async def read_audio_mode(self) -> int | None:
+        reply = await self._query(FlooMsgAm(True))
+        self.audioMode = reply.mode
+        return reply.mode
+
+    async def read_source_state(self) -> int | None:
+        return (await self._query(FlooMsgSt(True))).state
+
+    async def read_lea_state(self) -> int | None:
+        return (await self._query(FlooMsgLa(True))).state
+
+    async def read_prefer_lea(self) -> int | None:
+        return (await self._query(FlooMsgLf(True))).mode
+
+    async def read_broadcast_mode(self) -> int | None:
+        reply = await self._query(FlooMsgBm(True))
+        self.broadcastMode = reply.mode
+        return reply.mode
+
+    async def read_broadcast_name(self) -> str | None:
+        return (await self._query(FlooMsgBn(True))).name
+
+    async def read_paired_devices(self) -> list[FlooMsgFn]:
+        cmd = await self._submit(FlooMsgFn(True), FlooMsgFn.HEADER, [])
+        devices: list[FlooMsgFn] = cmd.param
+        return devices
+
+    async def read_feature(self) -> int | None:
+        reply = await self._query(FlooMsgFt(True))
+        self.feature = reply.feature
+        return reply.feature
+
+    async def read_codec_in_use(self) -> FlooMsgAc:
+        return await self._query(FlooMsgAc(True))
+
+    # ---------- Setters ----------
+
+    async def set_audio_mode(self, mode: int) -> None:
+        await self._command(FlooMsgAm(True, mode))
+        self.audioMode = mode
+
+    async def set_prefer_lea(self, enable: bool) -> None:
+        await self._command(FlooMsgLf(True, 1 if enable else 0))
+
+    async def set_broadcast_mode(self, mode: int) -> None:
+        await self._command(FlooMsgBm(True, mode))
+        self.broadcastMode = mode
+
+    async def _current_broadcast_mode(self) -> int:
+        if self.broadcastMode is None:
+            await self.read_broadcast_mode()
+        return self.broadcastMode or 0
+
+    async def _current_feature(self) -> int:
+        if self.feature is None:
+            await self.read_feature()
+        return self.feature or 0
+
+    async def _set_broadcast_flag(self, bit: int, enable: bool) -> None:
+        current = await self._current_broadcast_mode()
+        if (current & bit != 0) != enable:
+            await self.set_broadcast_mode(
+                (current & ~bit & BroadcastModeBit.ALL_MASK) | (bit if enable else 0)
+            )
+
+    async def set_public_broadcast(self, enable: bool) -> None:
+        await self._set_broadcast_flag(BroadcastModeBit.PUBLIC, enable)
+
+    async def set_broadcast_high_quality(self, enable: bool) -> None:
+        await self._set_broadcast_flag(BroadcastModeBit.HIGH_QUALITY, enable)
+
+    async def set_broadcast_encrypt(self, enable: bool) -> None:
+        await self._set_broadcast_flag(BroadcastModeBit.ENCRYPT, enable)
+
+    async def set_broadcast_stop_on_idle(self, enable: bool) -> None:
+        await self._set_broadcast_flag(BroadcastModeBit.STOP_ON_IDLE, enable)
+
+    async def set_broadcast_latency(self, mode: int) -> None:
+        current = await self._current_broadcast_mode()
+        if (current & BroadcastModeBit.LATENCY_MASK) >> BroadcastModeBit.LATENCY_SHIFT != mode:
+            await self.set_broadcast_mode(
+                (current & BroadcastModeBit.FLAGS_MASK) | (mode << BroadcastModeBit.LATENCY_SHIFT)
+            )
+
+    async def set_broadcast_name(self, name: str) -> None:
+        await self._command(FlooMsgBn(True, name))
+
+    async def set_broadcast_key(self, key: str) -> None:
+        await self._command(FlooMsgBe(True, key))
+
+    async def set_feature(self, feature: int) -> None:
+        await self._command(FlooMsgFt(True, feature))
+        self.feature = feature
+
+    async def _set_feature_bit(self, bit: int, enable: bool) -> None:
+        current = await self._current_feature()
+        await self.set_feature((current & FeatureBit.ALL_MASK & ~bit) | (bit if enable else 0))
+
+    async def enable_led(self, enable: bool) -> None:
+        await self._set_feature_bit(FeatureBit.LED, enable)
+
+    async def enable_aptx_lossless(self, enable: bool) -> None:
+        await self._set_feature_bit(FeatureBit.APTX_LOSSLESS, enable)
+
+    async def enable_gatt_client(self, enable: bool) -> None:
+        await self._set_feature_bit(FeatureBit.GATT_CLIENT, enable)
+
+    async def enable_usb_input(self, enable: bool) -> None:
+        await self._set_feature_bit(FeatureBit.AUDIO_SOURCE, enable)
+
+    async def set_new_pairing(self) -> None:
+        if self.a2dpSink:
+            await self._command(FlooMsgMd(True, 1))
+        else:
+            await self._command(FlooMsgIq())
+
+    async def clear_all_paired_devices(self) -> None:
+        await self._command(FlooMsgCp())
+
+    async def clear_indexed_device(self, index: int) -> None:
+        await self._command(FlooMsgCp(index))
+
+    async def toggle_connection(self, index: int) -> None:
+        await self._command(FlooMsgTc(index))
+
+    # ---------- Handshake ----------
+
+    async def handshake(self, pipelined: bool = True) -> dict[str, Any]:
+        """Run the same queries FlooStateMachine uses on connect.
+
+        With ``pipelined`` every query after VR is written back to back and
+        the replies are collected as they arrive; otherwise one at a time.
+        """
+        version = await self.read_version()
+        queries = {
+            "audioMode": self.read_audio_mode,
+            "sourceState": self.read_source_state,
+            "leAudioState": self.read_lea_state,
+            "preferLea": self.read_prefer_lea,
+            "broadcastMode": self.read_broadcast_mode,
+            "broadcastName": self.read_broadcast_name,
+            "pairedDevices": self.read_paired_devices,
+            "feature": self.read_feature,
+            "codec": self.read_codec_in_use,
+        }
+        if pipelined:
+            results = await asyncio.gather(*(query() for query in queries.values()))
+        else:
+            results = [await query() for query in queries.values()]
+        snapshot: dict[str, Any] = {"version": version}
+        snapshot.update(zip(queries, results, strict=True))
+        snapshot["pairedDevices"] = [m.name for m in snapshot["pairedDevices"]]
+        return snapshot
@@ -0,0 +1,359 @@
+"""Request/response correlation for commands sent to the dongle."""
+
+from __future__ import annotations
+
+import bisect
+import copy
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Collection
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any
+
+from floocast.protocol.messages import FlooMessage, FlooMsgEr, FlooMsgOk
+
+logger = logging.getLogger(__name__)
+
+
+class FlooCommandError(Exception):
+    """The dongle answered a command with ``ER=xx``."""
+
+    def __init__(self, header: str, error: int):
+        super().__init__(f"{header} failed with ER={error:02d}")
+        self.header = header
+        self.error = error
+
+
+class FlooCommandTimeout(Exception):
+    """No reply arrived for a command within its retry policy.
+
+    Not a TimeoutError: from Python 3.11 on that is an OSError, and the
+    ``except OSError`` handlers around port I/O must not swallow it.
+    ``timeout`` is the wait for each of the ``attempts``.
+    """
+
+    def __init__(self, header: str, attempts: int, timeout: float | None = None):
+        super().__init__(f"{header} timed out after {attempts} attempt(s)")
+        self.header = header
+        self.attempts = attempts
+        self.timeout = timeout
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How long to wait for a reply and how often to resend before giving up."""
+
+    timeout: float = 2.0
+    retries: int = 0
+
+
+# upper bounds of the round-trip histogram buckets; a last bucket holds the rest
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+
+@dataclass
+class FlooLatencyHistogram:
+    """Round-trip times counted in fixed buckets, so recording never allocates."""
+
+    bounds_ms: tuple[float, ...] = LATENCY_BUCKETS_MS
+    counts: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+    def record(self, seconds: float) -> None:
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(self.bounds_ms, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def mean_ms(self) -> float:
+        if self.count == 0:
+            return 0.0
+        return self.total_ms / self.count
+
+    def percentile_ms(self, fraction: float) -> float | None:
+        """Upper bound of the bucket holding ``fraction`` of the samples; max if past the last."""
+        if self.count == 0:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, n in zip(self.bounds_ms, self.counts, strict=False):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+
+@dataclass
+class FlooCommandStats:
+    """Outcomes and round-trip times of every command sent with one header."""
+
+    header: str
+    latency: FlooLatencyHistogram = field(default_factory=FlooLatencyHistogram)
+    ok: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    # resends after a missed deadline
+    retries: int = 0
+
+    def summary(self) -> str:
+        p50 = self.latency.percentile_ms(0.5)
+        p99 = self.latency.percentile_ms(0.99)
+        line = f"{self.header} ok={self.ok} er={self.errors} to={self.timeouts} re={self.retries}"
+        if p50 is not None and p99 is not None:
+            line += f" p50<={p50:.0f}ms p99<={p99:.0f}ms max={self.latency.max_ms:.1f}ms"
+        return line
+
+
+@dataclass(eq=False)
+class FlooPendingCommand:
+    """A command on the wire together with everything needed to match its reply."""
+
+    msg: FlooMessage
+    # header of the data reply a query waits for; None waits for OK
+    reply_header: str | None
+    policy: RetryPolicy
+    sent_at: float
+    deadline: float
+    # caller state that is applied once the command succeeds, e.g. the new mode
+    param: Any = None
+    attempts: int = 1
+    completed_at: float | None = None
+    future: Future = field(default_factory=Future)
+
+    @property
+    def header(self) -> str:
+        header: str = self.msg.header
+        return header
+
+    @property
+    def rtt(self) -> float | None:
+        """Seconds from the first send to the final reply."""
+        if self.completed_at is None:
+            return None
+        return self.completed_at - self.sent_at
+
+
+class FlooCommandTracker:
+    """FIFO of in-flight commands matched to replies in order.
+
+    The dongle answers commands in the order it receives them, so a data
+    reply belongs to the oldest outstanding command waiting for its header,
+    and any command still ahead of that one has lost its reply: it fails
+    at once instead of holding up the rest of a pipelined burst. Headers in
+    ``unsolicited`` are also pushed by the dongle unasked, so such a frame
+    only answers the oldest command and is unsolicited otherwise. ``ER``
+    and ``OK`` carry no header and always answer the oldest command. Each
+    command carries a deadline; :meth:`expire` resends or fails commands
+    whose deadline has passed, so a lost reply can no longer leave the
+    caller waiting forever. All methods are thread-safe.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[FlooMessage], None],
+        clock: Callable[[], float] = time.monotonic,
+        policy: RetryPolicy | None = None,
+        unsolicited: Collection[str] = (),
+    ):
+        self._send = send
+        self._clock = clock
+        self.policy = policy if policy is not None else RetryPolicy()
+        self.unsolicited = frozenset(unsolicited)
+        self._pending: deque[FlooPendingCommand] = deque()
+        # commands failed by match() because a later one was answered, for expire()
+        self._skipped: list[FlooPendingCommand] = []
+        self._lock = threading.RLock()
+        self._stats: dict[str, FlooCommandStats] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def head(self) -> FlooPendingCommand | None:
+        """The oldest command still waiting for a reply."""
+        with self._lock:
+            return self._pending[0] if self._pending else None
+
+    def tail(self) -> FlooPendingCommand | None:
+        """The most recently submitted command still waiting for a reply."""
+        with self._lock:
+            return self._pending[-1] if self._pending else None
+
+    def waiting_for(self, header: str) -> bool:
+        """True while a command sent with ``header`` has not been answered."""
+        with self._lock:
+            return any(cmd.header == header for cmd in self._pending)
+
+    def submit(
+        self,
+        msg: FlooMessage,
+        reply_header: str | None = None,
+        param: Any = None,
+        policy: RetryPolicy | None = None,
+    ) -> FlooPendingCommand:
+        """Send ``msg`` and start waiting for its reply."""
+        policy = policy if policy is not None else self.policy
+        with self._lock:
+            now = self._clock()
+            cmd = FlooPendingCommand(msg, reply_header, policy, now, now + policy.timeout, param)
+            self._pending.append(cmd)
+            self._send(msg)
+        return cmd
+
+    def match(self, msg: FlooMessage, final: bool = True) -> FlooPendingCommand | None:
+        """Credit ``msg`` to the oldest command waiting for it.
+
+        ``final=False`` marks one part of a multi-message reply (an ``FN``
+        list entry): the command stays pending and its deadline restarts.
+        Commands ahead of the matched one fail with FlooCommandTimeout and
+        are returned by the next :meth:`expire`, unless ``msg`` may be
+        unsolicited: then it is not matched at all. Returns the matched
+        command, or None if ``msg`` is unsolicited.
+        """
+        with self._lock:
+            if not self._pending:
+                return None
+            cmd = self._pending[0]
+            now = self._clock()
+            if isinstance(msg, FlooMsgEr):
+                self._pop_head(now)
+                stats = self._stats_for(cmd)
+                stats.errors += 1
+                stats.latency.record(now - cmd.sent_at)
+                _resolve(cmd.future, exc=FlooCommandError(cmd.header, msg.error))
+                return cmd
+            if isinstance(msg, FlooMsgOk):
+                if cmd.reply_header is not None:
+                    return None
+            else:
+                found = next((c for c in self._pending if c.reply_header == msg.header), None)
+                if found is None:
+                    return None
+                if found is not cmd and msg.header in self.unsolicited:
+                    # more likely pushed unasked than the reply to a later command
+                    return None
+                while self._pending[0] is not found:
+                    lost = self._fail_head(now)
+                    logger.warning("%s reply lost, %s answered after it", lost.header, msg.header)
+                    self._skipped.append(lost)
+                cmd = found
+            if not final:
+                cmd.deadline = now + cmd.policy.timeout
+                return cmd
+            self._pop_head(now)
+            stats = self._stats_for(cmd)
+            stats.ok += 1
+            stats.latency.record(now - cmd.sent_at)
+            _resolve(cmd.future, result=msg)
+            return cmd
+
+    def _fail_head(self, now: float) -> FlooPendingCommand:
+        """Pop the oldest command and fail it as timed out."""
+        cmd = self._pop_head(now)
+        self._stats_for(cmd).timeouts += 1
+        _resolve(cmd.future, exc=FlooCommandTimeout(cmd.header, cmd.attempts, cmd.policy.timeout))
+        return cmd
+
+    def _pop_head(self, now: float) -> FlooPendingCommand:
+        cmd = self._pending.popleft()
+        cmd.completed_at = now
+        if self._pending:
+            # the next command was queued behind this one; give it a full window
+            nxt = self._pending[0]
+            nxt.deadline = max(nxt.deadline, now + nxt.policy.timeout)
+        return cmd
+
+    def next_deadline(self) -> float | None:
+        with self._lock:
+            if self._skipped:
+                # failed already, expire() should hand them over now
+                return self._clock()
+            return self._pending[0].deadline if self._pending else None
+
+    def time_until_deadline(self) -> float | None:
+        deadline = self.next_deadline()
+        if deadline is None:
+            return None
+        return max(0.0, deadline - self._clock())
+
+    def expire(self) -> list[FlooPendingCommand]:
+        """Resend or fail overdue commands; returns the ones that failed.
+
+        Only the oldest command can be overdue: later commands are queued
+        behind it on the dongle, so their window restarts once it resolves.
+        Commands :meth:`match` failed since the last call are returned too.
+        """
+        with self._lock:
+            failed, self._skipped = self._skipped, []
+            now = self._clock()
+            while self._pending and self._pending[0].deadline <= now:
+                cmd = self._pending[0]
+                if cmd.attempts <= cmd.policy.retries:
+                    cmd.attempts += 1
+                    cmd.deadline = now + cmd.policy.timeout
+                    self._stats_for(cmd).retries += 1
+                    logger.debug("retry %s (attempt %d)", cmd.header, cmd.attempts)
+                    self._send(cmd.msg)
+                    break
+                self._fail_head(now)
+                logger.warning("%s timed out after %d attempt(s)", cmd.header, cmd.attempts)
+                failed.append(cmd)
+        return failed
+
+    def _stats_for(self, cmd: FlooPendingCommand) -> FlooCommandStats:
+        stats = self._stats.get(cmd.header)
+        if stats is None:
+            stats = self._stats[cmd.header] = FlooCommandStats(cmd.header)
+        return stats
+
+    def command_stats(self) -> dict[str, FlooCommandStats]:
+        """A copy of the per-header outcome counts and round-trip histograms."""
+        with self._lock:
+            return copy.deepcopy(self._stats)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def discard(self, msg: FlooMessage) -> FlooPendingCommand | None:
+        """Forget the command that sent ``msg``; it will never get a reply.
+
+        Used when the writer drops a setter superseded by a newer value.
+        The command's future is cancelled.
+        """
+        with self._lock:
+            for i, cmd in enumerate(self._pending):
+                if cmd.msg is msg:
+                    if i == 0:
+                        self._pop_head(self._clock())
+                    else:
+                        del self._pending[i]
+                    break
+            else:
+                return None
+        cmd.future.cancel()
+        return cmd
+
+    def clear(self, reason: str = "cancelled") -> None:
+        """Drop every pending command, e.g. when the port goes away."""
+        with self._lock:
+            pending, self._pending = self._pending, deque()
+            self._skipped = []
+        for cmd in pending:
+            _resolve(cmd.future, exc=ConnectionError(reason))
+
+
+def _resolve(future: Future, result: Any = None, exc: BaseException | None = None) -> None:
+    # the waiter may have cancelled the future (e.g. an asyncio timeout)
+    if future.done():
+        return
+    if exc is not None:
+        future.set_exception(exc)
+    else:
+        future.set_result(result)
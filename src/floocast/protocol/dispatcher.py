@@ -0,0 +1,353 @@
+"""Bounded handoff queue between the serial reader and the delegate."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from floocast.protocol.messages import FlooMessage
+from floocast.protocol.pool import FlooWorkerPool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FlooDispatchStats:
+    """Queue counters; written under the dispatcher's lock, readable from any thread."""
+
+    enqueued: int = 0
+    dispatched: int = 0
+    # messages thrown away on overflow
+    dropped: int = 0
+    # of those, status reports that a newer one of the same kind made redundant
+    coalesced: int = 0
+    # deepest the queue has been, and how often it crossed the warning mark
+    high_water: int = 0
+    high_water_events: int = 0
+    queue_latency_total_ns: int = 0
+    queue_latency_max_ns: int = 0
+    started_ns: int = field(default_factory=time.monotonic_ns)
+
+    def record_enqueue(self, depth: int) -> None:
+        self.enqueued += 1
+        if depth > self.high_water:
+            self.high_water = depth
+
+    def record_dispatch(self, latency_ns: int) -> None:
+        self.dispatched += 1
+        self.queue_latency_total_ns += latency_ns
+        if latency_ns > self.queue_latency_max_ns:
+            self.queue_latency_max_ns = latency_ns
+
+    def mean_queue_latency_ms(self) -> float:
+        if self.dispatched == 0:
+            return 0.0
+        return self.queue_latency_total_ns / self.dispatched / 1e6
+
+    def max_queue_latency_ms(self) -> float:
+        return self.queue_latency_max_ns / 1e6
+
+    def reset(self) -> None:
+        self.enqueued = 0
+        self.dispatched = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.high_water = 0
+        self.high_water_events = 0
+        self.queue_latency_total_ns = 0
+        self.queue_latency_max_ns = 0
+        self.started_ns = time.monotonic_ns()
+
+
+@dataclass(eq=False)
+class _DispatchItem:
+    received_ns: int
+    message: FlooMessage | None = None
+    call: Callable[..., Any] | None = None
+    args: tuple = ()
+
+
+class FlooDispatcher:
+    """Run the delegate on a worker thread fed by a bounded queue.
+
+    The reader only frames and parses, then hands each message over with
+    the time it was read, so a slow handler (a settings save, a GUI call)
+    no longer delays the next serial read. The worker also runs the
+    delegate's timers, which keeps every delegate callback on one thread.
+    Control callbacks posted with :meth:`call` share the queue so they stay
+    ordered with the messages around them.
+
+    Overflow policy when ``maxsize`` messages are waiting:
+
+    ``OVERFLOW_DROP_OLDEST`` (default)
+        Drop the oldest queued ``ST``/``LA``/``AC`` status report that a
+        newer report of the same kind supersedes; if there is none, drop the
+        oldest message. A dropped reply makes its command time out and go
+        through its retry policy. The reader never blocks.
+    ``OVERFLOW_BLOCK``
+        The reader waits for room. Nothing is lost here, but the kernel
+        buffer may overrun instead.
+
+    Posted callbacks are never dropped.
+
+    With a ``pool`` there is no worker thread: each wakeup submits one job
+    that drains the queue on a pool thread, and the delegate's next timer
+    is a timed callback on the pool.
+    """
+
+    OVERFLOW_DROP_OLDEST = "drop_oldest"
+    OVERFLOW_BLOCK = "block"
+
+    MAXSIZE = 256
+    # warn once each time the queue fills past this fraction of maxsize
+    HIGH_WATER_RATIO = 0.75
+    # status reports where only the latest value matters
+    SUPERSEDABLE_HEADERS = frozenset({"AC", "LA", "ST"})
+
+    def __init__(
+        self,
+        handler: Callable[[FlooMessage, int], None],
+        poll_timeout: Callable[[], float | None] = lambda: None,
+        poll_timers: Callable[[], None] = lambda: None,
+        maxsize: int = MAXSIZE,
+        overflow: str = OVERFLOW_DROP_OLDEST,
+        pool: FlooWorkerPool | None = None,
+    ):
+        self._handler = handler
+        self._poll_timeout = poll_timeout
+        self._poll_timers = poll_timers
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.stats = FlooDispatchStats()
+        self._queue: deque[_DispatchItem] = deque()
+        self._messages = 0
+        self._above_high_water = False
+        self._cond = threading.Condition()
+        self._woken = False
+        self._busy = False
+        self._stopped = False
+        self._thread: threading.Thread | None = None
+        self._pool = pool
+        self._started = False
+        # pooled: a drain job is queued or running, and the thread running it
+        self._scheduled = False
+        self._worker: threading.Thread | None = None
+        # pooled: when the timed callback for the delegate's next timer fires
+        self._timer_due: float | None = None
+
+    @property
+    def depth(self) -> int:
+        """Messages waiting to be dispatched."""
+        return self._messages
+
+    def is_running(self) -> bool:
+        if self._pool is not None:
+            return self._started and not self._stopped
+        return self._thread is not None and self._thread.is_alive()
+
+    def on_worker_thread(self) -> bool:
+        worker = self._worker if self._pool is not None else self._thread
+        return threading.current_thread() is worker
+
+    def start(self) -> None:
+        with self._cond:
+            if self.is_running():
+                return
+            self._stopped = False
+            if self._pool is not None:
+                self._started = True
+                self._woken = True
+                self._kick()
+                return
+            self._thread = threading.Thread(target=self._run, name="FlooDispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float | None = 1.0) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            if self._pool is not None:
+                if not self.on_worker_thread():
+                    # let a drain job that is running finish its batch
+                    self._cond.wait_for(lambda: not self._scheduled, timeout)
+                return
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def wake(self) -> None:
+        """Make the worker re-read the delegate's next timer deadline."""
+        with self._cond:
+            self._woken = True
+            self._cond.notify_all()
+            self._kick()
+
+    def put(self, message: FlooMessage, received_ns: int) -> None:
+        """Hand a parsed message to the worker (reader thread)."""
+        with self._cond:
+            if self._messages >= self.maxsize:
+                if self.overflow == FlooDispatcher.OVERFLOW_BLOCK:
+                    self._cond.wait_for(lambda: self._messages < self.maxsize or self._stopped)
+                else:
+                    self._drop_one()
+            self._queue.append(_DispatchItem(received_ns, message))
+            self._messages += 1
+            self.stats.record_enqueue(self._messages)
+            self._check_high_water()
+            self._cond.notify_all()
+            self._kick()
+
+    def call(self, func: Callable[..., Any], *args: Any) -> None:
+        """Run ``func(*args)`` on the worker after everything queued so far.
+
+        Runs inline when the worker is not started, so the interface also
+        works without one.
+        """
+        with self._cond:
+            if self.is_running() and not self.on_worker_thread():
+                self._queue.append(_DispatchItem(time.monotonic_ns(), call=func, args=args))
+                self._cond.notify_all()
+                self._kick()
+                return
+        func(*args)
+
+    def clear(self) -> int:
+        """Drop every queued message, e.g. because the port they came from closed."""
+        with self._cond:
+            kept = deque(item for item in self._queue if item.message is None)
+            dropped = self._messages
+            self._queue = kept
+            self._messages = 0
+            self._above_high_water = False
+            self._cond.notify_all()
+        return dropped
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until the queue is empty and nothing is being dispatched."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._busy, timeout)
+
+    def _drop_one(self) -> None:
+        victim = None
+        latest: dict[str, _DispatchItem] = {}
+        for item in reversed(self._queue):
+            msg = item.message
+            if msg is None or msg.header not in FlooDispatcher.SUPERSEDABLE_HEADERS:
+                continue
+            if msg.header in latest:
+                victim = item
+            else:
+                latest[msg.header] = item
+        if victim is not None:
+            self.stats.coalesced += 1
+        else:
+            victim = next(item for item in self._queue if item.message is not None)
+        self._queue.remove(victim)
+        self._messages -= 1
+        self.stats.dropped += 1
+        if self.stats.dropped == 1 or self.stats.dropped % 100 == 0:
+            logger.warning("Dispatch queue full, dropped %d message(s) so far", self.stats.dropped)
+
+    def _check_high_water(self) -> None:
+        mark = self.maxsize * FlooDispatcher.HIGH_WATER_RATIO
+        if not self._above_high_water and self._messages >= mark:
+            self._above_high_water = True
+            self.stats.high_water_events += 1
+            logger.warning("Dispatch queue above high-water mark: %d", self._messages)
+        elif self._above_high_water and self._messages < mark / 2:
+            self._above_high_water = False
+
+    def _run(self) -> None:
+        while True:
+            timeout = self._poll_timeout()
+            with self._cond:
+                if not self._queue and not self._woken and not self._stopped:
+                    self._cond.wait(timeout)
+                if self._stopped:
+                    return
+                batch = self._take_batch()
+            self._run_batch(batch)
+
+    def _kick(self) -> None:
+        """Queue a drain job on the pool unless one is pending (lock held)."""
+        if self._pool is None or not self._started or self._stopped or self._scheduled:
+            return
+        self._scheduled = True
+        self._pool.submit(self._drain)
+
+    def _drain(self) -> None:
+        """Pool job: dispatch until the queue is empty, then arm the next timer."""
+        with self._cond:
+            self._worker = threading.current_thread()
+        while True:
+            with self._cond:
+                if self._stopped or (not self._queue and not self._woken):
+                    self._worker = None
+                    self._scheduled = False
+                    self._cond.notify_all()
+                    stopped = self._stopped
+                    break
+                batch = self._take_batch()
+            self._run_batch(batch)
+        if not stopped:
+            self._arm_timer()
+
+    def _arm_timer(self) -> None:
+        timeout = self._poll_timeout()
+        if timeout is None or self._pool is None:
+            return
+        due = time.monotonic() + timeout
+        with self._cond:
+            if self._timer_due is not None and self._timer_due <= due:
+                # an earlier callback re-arms the timer when it fires
+                return
+            self._timer_due = due
+        self._pool.call_at(due, self._on_timer)
+
+    def _on_timer(self) -> None:
+        with self._cond:
+            self._timer_due = None
+        self.wake()
+
+    def _take_batch(self) -> list[_DispatchItem]:
+        batch = list(self._queue)
+        self._queue.clear()
+        self._messages = 0
+        self._woken = False
+        self._busy = True
+        # room for a blocked reader
+        self._cond.notify_all()
+        return batch
+
+    def _run_batch(self, batch: list[_DispatchItem]) -> None:
+        try:
+            self._dispatch(batch)
+            # replies are dispatched first so one that just made it is not timed out
+            self._poll_timers()
+        except Exception:
+            logger.exception("Error running delegate timers")
+        finally:
+            with self._cond:
+                self._busy = False
+                self._check_high_water()
+                self._cond.notify_all()
+
+    def _dispatch(self, batch: list[_DispatchItem]) -> None:
+        for item in batch:
+            try:
+                if item.message is None:
+                    assert item.call is not None
+                    item.call(*item.args)
+                    continue
+                now_ns = time.monotonic_ns()
+                with self._cond:
+                    self.stats.record_dispatch(now_ns - item.received_ns)
+                self._handler(item.message, item.received_ns)
+            except Exception:
+                # one bad message must not take the worker down
+                logger.exception("Error dispatching %s", item.message or item.call)
@@ -0,0 +1,391 @@
+"""A software FMA120 dongle on a pseudo-terminal.
+
+:class:`FlooEmulator` opens a pty pair and answers the BAI command set on
+the master side, so anything that opens a serial port (FlooInterface,
+FlooDongleManager, FlooAsyncClient) can talk to it through the slave path
+as if it were the ``0A12:4007`` port. Point FlooInterface at it with
+``FLOOCAST_PORT=<emulator.path>``, or hand :meth:`FlooEmulator.port_info`
+to FlooDongleManager's ``scan``.
+
+A :class:`FlooEmulatorProfile` sets how it behaves on the wire: reply
+latency and jitter, unsolicited AC report bursts, and the share of
+commands answered with ``ER`` or not answered at all. Replies keep the
+order of the commands, like the real firmware.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import os
+import random
+import select
+import threading
+import time
+import tty
+from dataclasses import dataclass, field
+
+from serial.tools.list_ports_common import ListPortInfo
+
+from floocast.protocol.framer import FlooFramer
+from floocast.protocol.messages import (
+    FlooMessage,
+    FlooMsgAc,
+    FlooMsgAm,
+    FlooMsgBe,
+    FlooMsgBm,
+    FlooMsgBn,
+    FlooMsgCp,
+    FlooMsgEr,
+    FlooMsgFn,
+    FlooMsgFt,
+    FlooMsgLa,
+    FlooMsgLf,
+    FlooMsgMd,
+    FlooMsgOk,
+    FlooMsgSt,
+    FlooMsgTc,
+    FlooMsgVr,
+    _ValueMessage,
+)
+from floocast.protocol.state_machine import SourceState
+
+logger = logging.getLogger(__name__)
+
+_PREFIX = b"BC:"
+
+# setters decoded with the message's own schema, and the state field each one sets
+_SETTERS: dict[bytes, tuple[type[_ValueMessage], str | None]] = {
+    b"AM": (FlooMsgAm, "audioMode"),
+    b"BE": (FlooMsgBe, "broadcastKey"),
+    b"BM": (FlooMsgBm, "broadcastMode"),
+    b"BN": (FlooMsgBn, "broadcastName"),
+    b"FT": (FlooMsgFt, "feature"),
+    b"LF": (FlooMsgLf, "preferLea"),
+    b"MD": (FlooMsgMd, None),
+}
+# commands that are acknowledged with OK and change nothing the host can read back
+_ACTIONS = {b"DC", b"FD", b"IQ"}
+
+
+@dataclass
+class FlooEmulatorProfile:
+    """How the emulated dongle behaves; times in seconds."""
+
+    # delay from reading a command to writing its reply, +/- up to ``jitter``
+    latency: float = 0.002
+    jitter: float = 0.0
+    # unsolicited AC reports: bursts per second (0 for none), lines per burst
+    burst_rate: float = 0.0
+    burst_size: int = 1
+    # share of commands answered with ER=<error_code>, and not answered at all
+    error_rate: float = 0.0
+    drop_rate: float = 0.0
+    error_code: int = 1
+    # from TC to the source state settling
+    connect_delay: float = 0.05
+    seed: int | None = None
+
+
+@dataclass
+class FlooEmulatorState:
+    """What the emulated dongle reports; setters update it."""
+
+    version: str = "1.0.0"
+    audioMode: int = 2
+    sourceState: int = SourceState.IDLE
+    leAudioState: int = 0
+    preferLea: int = 1
+    broadcastMode: int = 0
+    broadcastName: str = "FlooCast"
+    broadcastKey: str = ""
+    feature: int = 1
+    pairedDevices: list[tuple[str, str]] = field(
+        default_factory=lambda: [("001122334455", "Headset")]
+    )
+
+
+@dataclass
+class FlooEmulatorStats:
+    commands: int = 0
+    replies: int = 0
+    errors: int = 0
+    dropped: int = 0
+    unsolicited: int = 0
+
+
+class FlooEmulator:
+    """Emulated dongle answering on the master side of a pty, from its own thread."""
+
+    SELECT_TIMEOUT = 0.5
+
+    def __init__(
+        self,
+        profile: FlooEmulatorProfile | None = None,
+        state: FlooEmulatorState | None = None,
+    ):
+        self.profile = profile if profile is not None else FlooEmulatorProfile()
+        self.state = state if state is not None else FlooEmulatorState()
+        self.stats = FlooEmulatorStats()
+        self._random = random.Random(self.profile.seed)
+        self._master, self._slave = os.openpty()
+        # raw from the start: no echo or CR translation before the host opens the port
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        self.path = os.ttyname(self._slave)
+        self._framer = FlooFramer()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._lock = threading.Lock()
+        # (due, seq, data): replies and state changes waiting for their time
+        self._pending: list[tuple[float, int, bytes]] = []
+        self._seq = itertools.count()
+        self._last_due = 0.0
+        self._next_burst: float | None = None
+        self._out = bytearray()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def port_info(self) -> ListPortInfo:
+        """The emulator as a scan result, for FlooDongleManager."""
+        info = ListPortInfo(self.path, skip_link_detection=True)
+        info.vid, info.pid = 0x0A12, 0x4007
+        info.serial_number = f"EMU{self._slave}"
+        info.product = "FMA120 emulator"
+        return info
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        if self.profile.burst_rate > 0:
+            self._next_burst = time.monotonic() + 1 / self.profile.burst_rate
+        self._thread = threading.Thread(target=self._run, name="FlooEmulator", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 2.0) -> None:
+        self._stop_event.set()
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def close(self) -> None:
+        self.stop()
+        for fd in (self._master, self._slave, self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self) -> FlooEmulator:
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def send(self, data: bytes, delay: float = 0.0) -> None:
+        """Write an unsolicited line (no terminator) after ``delay``, in order with replies."""
+        self._schedule(data + FlooFramer.TERMINATOR, delay)
+
+    def _wake(self) -> None:
+        try:
+            os.write(self._wake_w, b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    def _schedule(self, data: bytes, delay: float) -> None:
+        with self._lock:
+            # never overtake an earlier reply, whatever the jitter
+            due = max(time.monotonic() + delay, self._last_due)
+            self._last_due = due
+            heapq.heappush(self._pending, (due, next(self._seq), data))
+        self._wake()
+
+    def _reply_delay(self) -> float:
+        profile = self.profile
+        if profile.jitter <= 0:
+            return profile.latency
+        return max(0.0, profile.latency + self._random.uniform(-profile.jitter, profile.jitter))
+
+    def _timeout(self, now: float) -> float:
+        due = [self._pending[0][0]] if self._pending else []
+        if self._next_burst is not None:
+            due.append(self._next_burst)
+        if not due:
+            return FlooEmulator.SELECT_TIMEOUT
+        return max(0.0, min(due) - now)
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            with self._lock:
+                timeout = self._timeout(time.monotonic())
+            writers = [self._master] if self._out else []
+            try:
+                readable, _, _ = select.select([self._master, self._wake_r], writers, [], timeout)
+            except (OSError, ValueError):
+                return
+            if self._wake_r in readable:
+                try:
+                    while os.read(self._wake_r, 64):
+                        pass
+                except (BlockingIOError, OSError):
+                    pass
+            if self._master in readable:
+                self._read()
+            self._release(time.monotonic())
+            if self._out:
+                self._flush()
+
+    def _read(self) -> None:
+        try:
+            data = os.read(self._master, 4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            # the host closed the slave; the pty stays usable once it reopens
+            return
+        for line in self._framer.feed(data):
+            self._command(bytes(line))
+
+    def _release(self, now: float) -> None:
+        with self._lock:
+            while self._pending and self._pending[0][0] <= now:
+                self._out += heapq.heappop(self._pending)[2]
+        if self._next_burst is not None and self._next_burst <= now:
+            self._burst()
+            self._next_burst = max(self._next_burst + 1 / self.profile.burst_rate, now)
+
+    def _flush(self) -> None:
+        try:
+            written = os.write(self._master, self._out)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logger.debug("emulator write failed: %s", e)
+            self._out.clear()
+            return
+        del self._out[:written]
+
+    def _burst(self) -> None:
+        lines = bytearray()
+        for _ in range(self.profile.burst_size):
+            lines += self._codec_report().bytes
+        self.stats.unsolicited += self.profile.burst_size
+        # straight to the port: link reports do not wait behind command replies
+        self._out += lines
+
+    def _codec_report(self) -> FlooMessage:
+        rssi = 0xB8 + self._random.randrange(16)
+        return FlooMsgAc(False, 7, rssi, 0x100, 4800, 1600, 10000, 3000, 40000)
+
+    def _command(self, line: bytes) -> None:
+        reply = self.answer(line)
+        if reply:
+            self._schedule(reply, self._reply_delay())
+            if line.startswith(b"BC:TC") and not reply.startswith(b"ER"):
+                # the source state changes after the OK
+                self._toggle()
+
+    def answer(self, line: bytes) -> bytes:
+        """The wire reply to one host line, with the profile's errors applied.
+
+        Empty for a dropped command or anything that is not a command. The
+        pty thread schedules the result; an in-memory transport can deliver
+        it directly.
+        """
+        if not line.startswith(_PREFIX):
+            return b""
+        self.stats.commands += 1
+        body = line[len(_PREFIX) :]
+        profile = self.profile
+        if profile.drop_rate > 0 and self._random.random() < profile.drop_rate:
+            self.stats.dropped += 1
+            return b""
+        replies = None
+        if profile.error_rate <= 0 or self._random.random() >= profile.error_rate:
+            replies = self._answer(body)
+        if replies is None:
+            replies = [FlooMsgEr(False, profile.error_code)]
+            self.stats.errors += 1
+        self.stats.replies += len(replies)
+        return b"".join(bytes(msg.bytes) for msg in replies)
+
+    def _answer(self, body: bytes) -> list[FlooMessage] | None:
+        """The replies to one command, or None to reject it."""
+        header = body[:2]
+        if len(body) == 2:
+            query = self._query(header)
+            if query is not None:
+                return query
+        state = self.state
+        if header in _SETTERS:
+            cls, attr = _SETTERS[header]
+            msg = cls.create_valid_msg(body)
+            if msg is None:
+                return None
+            if attr is not None:
+                setattr(state, attr, getattr(msg, cls.VALUE_ATTR))
+            return [FlooMsgOk(False)]
+        if header == b"CP":
+            if len(body) == 2:
+                state.pairedDevices.clear()
+                return [FlooMsgOk(False)]
+            cp = FlooMsgCp.create_valid_msg(body)
+            if not isinstance(cp, FlooMsgCp) or cp.index >= len(state.pairedDevices):
+                return None
+            del state.pairedDevices[cp.index]
+            return [FlooMsgOk(False)]
+        if header == b"TC":
+            tc = FlooMsgTc.create_valid_msg(body)
+            if not isinstance(tc, FlooMsgTc) or tc.index >= len(state.pairedDevices):
+                return None
+            return [FlooMsgOk(False)]
+        if header in _ACTIONS and len(body) == 2:
+            return [FlooMsgOk(False)]
+        return None
+
+    def _query(self, header: bytes) -> list[FlooMessage] | None:
+        state = self.state
+        if header == b"VR":
+            return [FlooMsgVr(False, state.version)]
+        if header == b"AM":
+            return [FlooMsgAm(False, state.audioMode)]
+        if header == b"ST":
+            return [FlooMsgSt(False, state.sourceState)]
+        if header == b"LA":
+            return [FlooMsgLa(False, state.leAudioState)]
+        if header == b"LF":
+            return [FlooMsgLf(False, state.preferLea)]
+        if header == b"BM":
+            return [FlooMsgBm(False, state.broadcastMode)]
+        if header == b"BN":
+            # FlooMsgBn only encodes its name when sent by the host
+            return [FlooMessage(False, FlooMsgBn.HEADER, state.broadcastName.encode("utf-8"))]
+        if header == b"FN":
+            names: list[FlooMessage] = [
+                FlooMsgFn(False, i, addr, name)
+                for i, (addr, name) in enumerate(state.pairedDevices)
+            ]
+            return [*names, FlooMsgFn(False, len(state.pairedDevices))]
+        if header == b"FT":
+            return [FlooMsgFt(False, state.feature)]
+        if header == b"AC":
+            return [self._codec_report()]
+        return None
+
+    def _toggle(self) -> None:
+        """Connect to or drop the headset; ST changes follow the OK."""
+        delay = self._reply_delay() + self.profile.connect_delay
+        if self.state.sourceState >= SourceState.STREAMING_START:
+            self.state.sourceState = SourceState.IDLE
+            steps = [SourceState.IDLE]
+        else:
+            self.state.sourceState = SourceState.STREAMING
+            steps = [SourceState.STREAMING_START, SourceState.STREAMING]
+        for i, step in enumerate(steps, start=1):
+            self.send(bytes(FlooMsgSt(False, step).bytes[:-2]), delay * i)
+            self.stats.unsolicited += 1
@@ -0,0 +1,72 @@
+"""Line framer for the FlooGoo serial receive path."""
+
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class FlooFramer:
+    """Split a byte stream into ``\\r\\n`` terminated frames.
+
+    Incoming bytes are read in bulk into a reusable scratch buffer and
+    appended to a pending buffer; every complete frame is cut out in one
+    pass and a partial tail is kept for the next read. Deleting consumed
+    bytes from the front of a ``bytearray`` only moves its start offset, so
+    the pending buffer behaves like a ring without per-read reallocation.
+    """
+
+    TERMINATOR = b"\r\n"
+    READ_SIZE = 4096
+    MAX_FRAME_SIZE = 1024
+
+    def __init__(self, read_size: int = READ_SIZE, max_frame_size: int = MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self.dropped_bytes = 0
+        self._buf = bytearray()
+        self._scratch = bytearray(read_size)
+        self._scratch_view = memoryview(self._scratch)
+
+    @property
+    def pending(self) -> int:
+        """Number of buffered bytes that do not yet form a complete frame."""
+        return len(self._buf)
+
+    def clear(self) -> None:
+        self._buf.clear()
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """Append ``data`` and return every frame completed by it, terminators stripped."""
+        self._buf += data
+        return self._split()
+
+    def read_from(self, fd: int) -> list[bytes]:
+        """Read whatever ``fd`` has available in a single syscall and frame it.
+
+        Raises EOFError when the descriptor reports end of file, which for a
+        tty means the device has gone away.
+        """
+        n = os.readv(fd, [self._scratch_view])
+        if n == 0:
+            raise EOFError("device reports readiness to read but returned no data")
+        self._buf += self._scratch_view[:n]
+        return self._split()
+
+    def _split(self) -> list[bytes]:
+        buf = self._buf
+        frames = []
+        start = 0
+        terminator = FlooFramer.TERMINATOR
+        while True:
+            end = buf.find(terminator, start)
+            if end < 0:
+                break
+            frames.append(bytes(buf[start:end]))
+            start = end + 2
+        if start:
+            del buf[:start]
+        if len(buf) > self.max_frame_size:
+            logger.warning("Dropping %d bytes without frame terminator", len(buf))
+            self.dropped_bytes += len(buf)
+            buf.clear()
+        return frames
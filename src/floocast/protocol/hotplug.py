@@ -0,0 +1,118 @@
+"""USB tty hotplug notifications from kernel netlink uevents."""
+
+from __future__ import annotations
+
+import logging
+import socket
+from dataclasses import dataclass, field
+from typing import Protocol
+
+logger = logging.getLogger(__name__)
+
+# linux/netlink.h; socket.NETLINK_KOBJECT_UEVENT is not exported on every build
+NETLINK_KOBJECT_UEVENT = 15
+# multicast group the kernel broadcasts raw uevents on (udevd rebroadcasts on 2)
+KERNEL_UEVENT_GROUP = 1
+
+
+@dataclass
+class FlooUEvent:
+    """A single kernel uevent, e.g. ``add@/devices/.../tty/ttyACM0``."""
+
+    action: str
+    devpath: str
+    env: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def subsystem(self) -> str | None:
+        return self.env.get("SUBSYSTEM")
+
+    @property
+    def devname(self) -> str | None:
+        return self.env.get("DEVNAME")
+
+    def is_tty_change(self) -> bool:
+        return self.subsystem == "tty" and self.action in ("add", "remove", "rescan")
+
+
+def parse_uevent(data: bytes) -> FlooUEvent | None:
+    """Parse a kernel uevent datagram: ``ACTION@DEVPATH\\0KEY=VALUE\\0...``."""
+    parts = data.split(b"\0")
+    try:
+        header = parts[0].decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    action, sep, devpath = header.partition("@")
+    if not sep:
+        # libudev-format messages start with "libudev\0" and carry a binary header
+        return None
+    env = {}
+    for part in parts[1:]:
+        key, sep, value = part.decode("utf-8", errors="replace").partition("=")
+        if sep:
+            env[key] = value
+    return FlooUEvent(action, devpath, env)
+
+
+class HotplugSource(Protocol):
+    """Anything that can be selected on and yields uevents when readable."""
+
+    def fileno(self) -> int: ...
+
+    def read_events(self) -> list[FlooUEvent]: ...
+
+    def close(self) -> None: ...
+
+
+class NetlinkUeventSource:
+    """Non-blocking reader for kernel uevents on a netlink socket.
+
+    Use :meth:`open` to create one; it returns ``None`` where netlink is not
+    available so callers can fall back to periodic port scanning.
+    """
+
+    RECV_SIZE = 8192
+
+    def __init__(self, sock: socket.socket):
+        self._sock = sock
+
+    @classmethod
+    def open(cls) -> NetlinkUeventSource | None:
+        af_netlink = getattr(socket, "AF_NETLINK", None)
+        if af_netlink is None:
+            return None
+        sock = None
+        try:
+            sock = socket.socket(af_netlink, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            sock.bind((0, KERNEL_UEVENT_GROUP))
+            sock.setblocking(False)
+        except OSError as e:
+            if sock is not None:
+                sock.close()
+            logger.info("Netlink uevents unavailable, falling back to port scanning: %s", e)
+            return None
+        return cls(sock)
+
+    def fileno(self) -> int:
+        return self._sock.fileno()
+
+    def read_events(self) -> list[FlooUEvent]:
+        """Drain every queued uevent without blocking."""
+        events = []
+        while True:
+            try:
+                data = self._sock.recv(NetlinkUeventSource.RECV_SIZE)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                # ENOBUFS: the kernel dropped events, ask the caller to rescan
+                logger.warning("Uevent socket error: %s", e)
+                events.append(FlooUEvent("rescan", "", {"SUBSYSTEM": "tty"}))
+                break
+            event = parse_uevent(data)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def close(self) -> None:
+        self._sock.close()
@@ -1,32 +1,174 @@
 import logging
+import os
+import select
 import threading
 import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
 
 import serial
 import serial.tools.list_ports
+from serial.tools.list_ports_common import ListPortInfo
 
+from floocast.protocol.dispatcher import FlooDispatcher
+from floocast.protocol.framer import FlooFramer
+from floocast.protocol.hotplug import HotplugSource, NetlinkUeventSource
 from floocast.protocol.messages import FlooMessage
 from floocast.protocol.parser import FlooParser
+from floocast.protocol.pool import FlooWorkerPool
+from floocast.protocol.trace import INBOUND, OUTBOUND, FlooTraceRecorder, recorder_from_environ
+from floocast.protocol.writer import FlooWriter
 
 logger = logging.getLogger(__name__)
 
+FMA120_PATTERN = "0A12:4007.*FMA120.*"
+
+
+def find_ports() -> list[Any]:
+    """Every FMA120 dongle currently enumerated, as pyserial ListPortInfo.
+
+    ``FLOOCAST_PORT=/dev/pts/N`` replaces the USB scan with that one port,
+    e.g. a FlooEmulator's.
+    """
+    path = os.environ.get("FLOOCAST_PORT")
+    if path:
+        return [ListPortInfo(path, skip_link_detection=True)] if os.path.exists(path) else []
+    return list(serial.tools.list_ports.grep(FMA120_PATTERN))
+
+
+def port_key(info: Any) -> str:
+    """Stable identity for a dongle: its USB serial number, else its hub location."""
+    return str(info.serial_number or info.location or info.name)
+
+
+def open_port(path: str) -> serial.Serial:
+    """Open the dongle's serial port with the BAI line settings."""
+    return serial.Serial(
+        port=path,
+        baudrate=921600,
+        bytesize=8,
+        timeout=2,
+        stopbits=serial.STOPBITS_ONE,
+        exclusive=True,
+    )
+
+
+@dataclass
+class FlooInterfaceStats:
+    """Reader loop counters for measuring idle cost and reply latency.
+
+    Wakeups are written by the reader thread and dispatches by the dispatch
+    worker; other threads may read them at any time for display or logging.
+    """
+
+    wakeups: int = 0
+    idle_wakeups: int = 0
+    dispatched: int = 0
+    dispatch_latency_total_ns: int = 0
+    dispatch_latency_max_ns: int = 0
+    started_ns: int = field(default_factory=time.monotonic_ns)
+    # lifetime counters for the metrics endpoint; reset() leaves them alone
+    port_opens: int = 0
+    parse_failures: int = 0
+
+    def record_wakeup(self, idle: bool) -> None:
+        self.wakeups += 1
+        if idle:
+            self.idle_wakeups += 1
+
+    def record_dispatch(self, latency_ns: int) -> None:
+        self.dispatched += 1
+        self.dispatch_latency_total_ns += latency_ns
+        if latency_ns > self.dispatch_latency_max_ns:
+            self.dispatch_latency_max_ns = latency_ns
+
+    def idle_wakeups_per_second(self, now_ns: int | None = None) -> float:
+        elapsed_ns = (time.monotonic_ns() if now_ns is None else now_ns) - self.started_ns
+        if elapsed_ns <= 0:
+            return 0.0
+        return self.idle_wakeups * 1e9 / elapsed_ns
+
+    def mean_dispatch_latency_ms(self) -> float:
+        if self.dispatched == 0:
+            return 0.0
+        return self.dispatch_latency_total_ns / self.dispatched / 1e6
+
+    def max_dispatch_latency_ms(self) -> float:
+        return self.dispatch_latency_max_ns / 1e6
+
+    def reset(self) -> None:
+        self.wakeups = 0
+        self.idle_wakeups = 0
+        self.dispatched = 0
+        self.dispatch_latency_total_ns = 0
+        self.dispatch_latency_max_ns = 0
+        self.started_ns = time.monotonic_ns()
+
 
 class FlooInterface:
     """FlooGoo Bluetooth USB Dongle Control Interface on USB COM port"""
 
-    def __init__(self, delegate):
+    READER_SELECT = "select"
+    READER_POLL = "poll"
+
+    POLL_INTERVAL = 0.01
+    # Upper bound on how long the select reader sleeps without traffic; stop()
+    # and setSleep() wake it immediately through the wake pipe.
+    SELECT_TIMEOUT = 5.0
+
+    # How long to let udev settle permissions on a new tty before opening it
+    HOTPLUG_SETTLE = 0.2
+
+    # Unparseable frames in a row before the port is considered to be garbage
+    MAX_PARSE_FAILURES = 3
+
+    def __init__(
+        self,
+        delegate,
+        reader_mode: str = READER_SELECT,
+        hotplug_factory: Callable[[], HotplugSource | None] | None = NetlinkUeventSource.open,
+        dispatch_overflow: str = FlooDispatcher.OVERFLOW_DROP_OLDEST,
+        recorder: FlooTraceRecorder | None = None,
+        pool: FlooWorkerPool | None = None,
+    ):
         super().__init__()
         self.delegate = delegate
         self.isSleep = False
-        self.port_name = None
+        self.port_name: str | None = None
+        # the dongle's port_key(); unlike port_name it stays with the dongle
+        self.port_key: str | None = None
         self.port_opened: bool = False
         self.port_locked = False
-        self.port = None
+        self.port: Any = None
         self.parser = FlooParser()
+        self.framer = FlooFramer()
+        self.reader_mode = reader_mode
+        self.stats = FlooInterfaceStats()
+        self.hotplug_factory = hotplug_factory
+        self.port_scans = 0
+        self._parse_failures = 0
+        # every frame in and out, when tracing is on (FLOOCAST_TRACE)
+        self.recorder = recorder if recorder is not None else recorder_from_environ()
+        # with a pool (FlooDongleManager) neither has a thread of its own
+        self.writer = FlooWriter(self._write_port, on_superseded=self._superseded, pool=pool)
+        self.dispatcher = FlooDispatcher(
+            self._dispatch,
+            poll_timeout=delegate.pollTimeout,
+            poll_timers=delegate.pollTimers,
+            overflow=dispatch_overflow,
+            pool=pool,
+        )
         self._stop_event = threading.Event()
+        # the thread in run(); None when a FlooDongleManager does the reading
+        self._reader: threading.Thread | None = None
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
 
     def setSleep(self, flag):
         self.isSleep = flag
+        self._wake()
 
     def reset(self):
         logger.debug("reset")
@@ -38,48 +180,43 @@ class FlooInterface:
             finally:
                 self.port_opened = False
                 self.port = None
-        self.delegate.interfaceState(False, None)
+        self.writer.clear()
+        # whatever the old port still had queued is stale now
+        self.dispatcher.clear()
+        self.dispatcher.call(self.delegate.interfaceState, False, None)
 
     def monitor_port(self) -> bool:
         if self.isSleep:
             return False
 
-        logger.debug(
-            "Ports: %s", [port.hwid for port in serial.tools.list_ports.grep("0A12:4007.*FMA120.*")]
-        )
-        ports = [
-            port.name for port in serial.tools.list_ports.grep("0A12:4007.*FMA120.*")
-        ]  # FMA120
-        if ports:
+        self.port_scans += 1
+        found = find_ports()
+        logger.debug("Ports: %s", [port.hwid for port in found])
+        if found:
             if not self.port_opened:
-                self.port_name = ports[0]
-                logger.debug("monitor_port: try open %s", self.port_name)
+                self.port_name = found[0].name
+                self.port_key = port_key(found[0])
+                logger.debug("monitor_port: try open %s", found[0].device)
                 try:
-                    self.port = serial.Serial(
-                        port="/dev/" + self.port_name,
-                        baudrate=921600,
-                        bytesize=8,
-                        timeout=2,
-                        stopbits=serial.STOPBITS_ONE,
-                        exclusive=True,
-                    )
+                    self.port = open_port(found[0].device)
                     self.port_opened = bool(self.port.is_open)
                     if self.port_opened:
                         self.port_locked = False
-                        self.delegate.interfaceState(True, self.port_name)
+                        self.stats.port_opens += 1
+                        self.dispatcher.call(self.delegate.interfaceState, True, self.port_name)
                     return self.port_opened
                 except serial.SerialException as e:
                     if "busy" in str(e).lower() or "lock" in str(e).lower():
-                        self.delegate.connectionError("port_busy")
+                        self.dispatcher.call(self.delegate.connectionError, "port_busy")
                         self.port_locked = True
                     else:
                         logger.error("Port error: %s", e)
-                        self.delegate.connectionError("port_error")
+                        self.dispatcher.call(self.delegate.connectionError, "port_error")
                         self.reset()
                     return False
                 except OSError as e:
                     logger.error("OS error: %s", e)
-                    self.delegate.connectionError("port_error")
+                    self.dispatcher.call(self.delegate.connectionError, "port_error")
                     self.reset()
                     return False
         else:
@@ -90,39 +227,207 @@ class FlooInterface:
 
     def stop(self):
         self._stop_event.set()
+        self.writer.stop()
+        self.dispatcher.stop()
+        self._wake()
+
+    def close(self, timeout: float | None = 2.0):
+        """Stop, wait for the reader to leave run() and release the wake pipe."""
+        self.stop()
+        reader = self._reader
+        if reader is not None and reader is not threading.current_thread():
+            reader.join(timeout)
+            if reader.is_alive():
+                logger.warning("Reader did not stop, keeping its wake pipe open")
+                return
+        if self._wake_r < 0:
+            return
+        wake_r, wake_w = self._wake_r, self._wake_w
+        # _wake() and _drain_wake_pipe() fail harmlessly on -1 from now on
+        self._wake_r = self._wake_w = -1
+        os.close(wake_r)
+        os.close(wake_w)
+
+    def _wake(self):
+        try:
+            os.write(self._wake_w, b"\0")
+        except (BlockingIOError, OSError):
+            # pipe already full (a wakeup is pending) or closed
+            pass
+
+    def _drain_wake_pipe(self):
+        try:
+            while os.read(self._wake_r, 64):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _use_select(self) -> bool:
+        return self.reader_mode == FlooInterface.READER_SELECT and hasattr(self.port, "fileno")
+
+    def _wait_readable(self) -> bool:
+        """Block until the port has data or the wake pipe fires."""
+        port_fd = self.port.fileno()
+        readable, _, _ = select.select(
+            [port_fd, self._wake_r], [], [], FlooInterface.SELECT_TIMEOUT
+        )
+        if self._wake_r in readable:
+            self._drain_wake_pipe()
+        return port_fd in readable
+
+    def _reading(self) -> bool:
+        return (
+            self.port is not None
+            and self.port.is_open
+            and not self.isSleep
+            and not self._stop_event.is_set()
+        )
+
+    def _read_frames(self, use_select: bool) -> list[bytes]:
+        if use_select:
+            return self.framer.read_from(self.port.fileno())
+        return self.framer.feed(self.port.read(self.port.in_waiting))
+
+    def _handle_frames(self, frames: list[bytes], woke_ns: int) -> bool:
+        """Parse ``frames`` and queue them for dispatch; False if the stream is garbage."""
+        if self.recorder is not None and frames:
+            self.recorder.record_frames(INBOUND, self.port_name, frames, woke_ns)
+        for payload in frames:
+            if len(payload) < 2:
+                continue
+            flooMsg = self.parser.run(payload)
+            if flooMsg is None:
+                self.stats.parse_failures += 1
+                self._parse_failures += 1
+                if self._parse_failures >= FlooInterface.MAX_PARSE_FAILURES:
+                    return False
+                continue
+            self._parse_failures = 0
+            self.dispatcher.put(flooMsg, woke_ns)
+        return True
+
+    def _read_loop(self):
+        use_select = self._use_select()
+        self.framer.clear()
+        self._parse_failures = 0
+        self.dispatcher.start()
+        while self._reading():
+            try:
+                ready = self._wait_readable() if use_select else self.port.in_waiting > 0
+                woke_ns = time.monotonic_ns()
+                self.stats.record_wakeup(not ready)
+                if ready and not self._handle_frames(self._read_frames(use_select), woke_ns):
+                    return
+                if not use_select:
+                    time.sleep(FlooInterface.POLL_INTERVAL)
+            except (serial.SerialException, OSError, ValueError, EOFError) as exec0:
+                logger.exception("Error reading from port: %s", exec0)
+                self.reset()
+
+    def attach(self, port: Any, name: str, key: str | None = None):
+        """Adopt a port opened by someone else, e.g. FlooDongleManager.
+
+        The owner does the waiting and calls :meth:`read_ready` when the
+        port is readable; this interface never starts its own reader.
+        ``key`` is the dongle's port_key(), the port name if not given.
+        """
+        self.port = port
+        self.port_name = name
+        self.port_key = key if key is not None else name
+        self.port_opened = bool(port.is_open)
+        self.port_locked = False
+        self.stats.port_opens += 1
+        self.framer.clear()
+        self._parse_failures = 0
+        self.dispatcher.start()
+        self.dispatcher.call(self.delegate.interfaceState, True, name)
+
+    def read_ready(self) -> bool:
+        """Read and queue whatever an attached port has; False if it should be dropped.
+
+        Raises the same serial/OS errors as the built-in reader.
+        """
+        woke_ns = time.monotonic_ns()
+        self.stats.record_wakeup(False)
+        return self._handle_frames(self.framer.read_from(self.port.fileno()), woke_ns)
+
+    def _open_hotplug_source(self) -> HotplugSource | None:
+        if self.hotplug_factory is None:
+            return None
+        return self.hotplug_factory()
+
+    def _wait_hotplug(self, source: HotplugSource, timeout: float | None) -> bool:
+        """Sleep until a tty add/remove uevent, a wakeup or the timeout; True means rescan."""
+        readable, _, _ = select.select([source.fileno(), self._wake_r], [], [], timeout)
+        if not readable:
+            # timed out: only used to retry a busy port
+            return True
+        rescan = False
+        if self._wake_r in readable:
+            self._drain_wake_pipe()
+            rescan = True
+        if source.fileno() in readable:
+            events = [e for e in source.read_events() if e.is_tty_change()]
+            for event in events:
+                logger.debug("hotplug: %s %s", event.action, event.devname)
+            if any(e.action == "add" for e in events):
+                self._stop_event.wait(FlooInterface.HOTPLUG_SETTLE)
+                # swallow the burst of events that accompanies a single plug-in
+                source.read_events()
+            rescan = rescan or bool(events)
+        return rescan
+
+    def _dispatch(self, msg: FlooMessage, received_ns: int):
+        self.delegate.handleMessage(msg)
+        self.stats.record_dispatch(time.monotonic_ns() - received_ns)
 
     def run(self):
-        MAX_CONSECUTIVE_FAILURES = 3
-        while not self._stop_event.is_set():
-            if self.monitor_port():
-                consecutive_failures = 0
-                while self.port is not None and self.port.is_open and not self.isSleep:
-                    try:
-                        if self.port.inWaiting() > 0:
-                            newLine = self.port.read_until(b"\r\n")
-                            payload = newLine[:-2]
-                            if len(payload) < 2:
-                                continue
-                            flooMsg = self.parser.run(payload)
-                            if flooMsg is None:
-                                consecutive_failures += 1
-                                if consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
-                                    break
-                                continue
-                            consecutive_failures = 0
-                            self.delegate.handleMessage(flooMsg)
-                        time.sleep(0.01)
-                    except (serial.SerialException, OSError, ValueError) as exec0:
-                        logger.exception("Error reading from port: %s", exec0)
+        self._reader = threading.current_thread()
+        self.dispatcher.start()
+        source = self._open_hotplug_source()
+        rescan = True
+        try:
+            while not self._stop_event.is_set():
+                if rescan:
+                    if self.monitor_port():
+                        self._read_loop()
+                        # the reader stopped (unplug, sleep or parse failures): look again shortly
+                        self._stop_event.wait(1)
+                        continue
+                    if not self.port_locked:
+                        was_open = self.port_opened
                         self.reset()
-            elif not self.port_locked:
-                self.reset()
-            time.sleep(5 if self.port_locked else 1)
+                        if was_open:
+                            self._stop_event.wait(1)
+                            continue
+                if source is None:
+                    # no hotplug notifications: fall back to periodic scanning
+                    self._stop_event.wait(5 if self.port_locked else 1)
+                    continue
+                # a busy port produces no uevent when it is released, so keep retrying it
+                rescan = self._wait_hotplug(source, 5 if self.port_locked else None)
+        finally:
+            if source is not None:
+                source.close()
 
     def sendMsg(self, msg: FlooMessage):
+        """Queue ``msg`` for the writer thread; never blocks on the port."""
         if self.port is not None and self.port.is_open and not self.isSleep:
-            try:
-                logger.debug("send %s", msg.header)
-                self.port.write(msg.bytes)
-            except (serial.SerialException, OSError) as exec0:
-                logger.exception("Error sending message: %s", exec0)
+            self.writer.start()
+            self.writer.submit(msg)
+            if not self.dispatcher.on_worker_thread():
+                # let the dispatch worker pick up the new reply deadline
+                self.dispatcher.wake()
+
+    def _write_port(self, data: bytes):
+        port = self.port
+        if port is None or not port.is_open:
+            raise serial.SerialException("port is closed")
+        sent_ns = time.monotonic_ns()
+        port.write(data)
+        if self.recorder is not None:
+            frames = data.split(FlooFramer.TERMINATOR)[:-1]
+            self.recorder.record_frames(OUTBOUND, self.port_name, frames, sent_ns)
+
+    def _superseded(self, msg: FlooMessage):
+        self.delegate.messageSuperseded(msg)
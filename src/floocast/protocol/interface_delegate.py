@@ -13,3 +13,15 @@ class FlooInterfaceDelegate:
     def connectionError(self, error: str):
         """Called when a connection error occurs."""
         pass
+
+    def pollTimeout(self) -> float | None:
+        """Seconds until the delegate's next timer is due, or None if nothing is pending."""
+        return None
+
+    def pollTimers(self):
+        """Called on the dispatch worker after every wakeup and batch to run timers that are due."""
+        pass
+
+    def messageSuperseded(self, message: FlooMessage):
+        """Called when a queued setter was dropped in favour of a newer value."""
+        pass
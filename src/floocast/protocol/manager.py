@@ -0,0 +1,294 @@
+"""Drive every attached FMA120 dongle from one reactor thread."""
+
+from __future__ import annotations
+
+import logging
+import os
+import select
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+import serial
+
+from floocast.protocol.hotplug import HotplugSource, NetlinkUeventSource
+from floocast.protocol.interface import FlooInterface, find_ports, open_port, port_key
+from floocast.protocol.pool import FlooWorkerPool
+from floocast.protocol.state_machine import FlooStateMachine
+from floocast.protocol.state_machine_delegate import FlooStateMachineDelegate
+
+logger = logging.getLogger(__name__)
+
+
+def _call_inline(func, *args):
+    func(*args)
+
+
+class _Timer(threading.Timer):
+    """threading.Timer with the wx.CallLater method the state machine uses."""
+
+    def Stop(self):
+        self.cancel()
+
+
+def _call_later_thread(delay_ms, func):
+    timer = _Timer(delay_ms / 1000, func)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+@dataclass(eq=False)
+class FlooDongle:
+    """One dongle known to the manager; kept across unplug so its key stays stable."""
+
+    key: str
+    state_machine: FlooStateMachine
+    path: str | None = None
+
+    @property
+    def interface(self) -> FlooInterface:
+        inf: FlooInterface = self.state_machine.inf
+        return inf
+
+    @property
+    def connected(self) -> bool:
+        return bool(self.interface.port_opened)
+
+    def snapshot(self) -> dict[str, Any]:
+        sm = self.state_machine
+        return {
+            "key": self.key,
+            "path": self.path,
+            "connected": self.connected,
+            "ready": sm.state == FlooStateMachine.CONNECTED,
+            "a2dpSink": sm.a2dpSink,
+            "audioMode": sm.audioMode,
+            "preferLea": sm.preferLea,
+            "sourceState": sm.sourceState,
+            "broadcastMode": sm.broadcastMode,
+            "broadcastName": sm.broadcastName,
+            "pairedDevices": list(sm.pairedDevices),
+            "feature": sm.feature,
+            "timeToReady": sm.timeToReady,
+        }
+
+
+class FlooDongleManager:
+    """Run an independent interface and state machine for every FMA120 dongle.
+
+    ``delegate_factory(key)`` supplies the state machine delegate for the
+    dongle with that key (its USB serial number). One reactor thread waits
+    on every open port, the hotplug socket and a wake pipe in a single
+    ``select`` and hands readable ports to their interface, so no dongle
+    has a reader thread of its own. Writes and delegate dispatch of every
+    dongle share one FlooWorkerPool of ``workers`` threads; each dongle's
+    queues are still drained in order, one job at a time. Its saved state
+    is filed under the dongle's key.
+
+    Delegate calls run on the dongle's dispatch worker unless ``callAfter``
+    and ``callLater`` marshal them elsewhere (pass wx.CallAfter and
+    wx.CallLater to drive a GUI).
+    """
+
+    # without hotplug events, how often to look for new dongles
+    RESCAN_INTERVAL = 1.0
+    # a busy port produces no uevent when it is released
+    BUSY_RETRY = 5.0
+    # after a read error, give the device a moment before reopening it
+    REOPEN_DELAY = 1.0
+
+    def __init__(
+        self,
+        delegate_factory: Callable[[str], FlooStateMachineDelegate],
+        hotplug_factory: Callable[[], HotplugSource | None] | None = NetlinkUeventSource.open,
+        scan: Callable[[], list[Any]] = find_ports,
+        opener: Callable[[str], Any] = open_port,
+        callAfter: Callable[..., Any] | None = _call_inline,
+        callLater: Callable[[int, Callable[[], Any]], Any] | None = _call_later_thread,
+        max_dongles: int | None = None,
+        workers: int = FlooWorkerPool.SIZE,
+    ):
+        self.delegate_factory = delegate_factory
+        self.hotplug_factory = hotplug_factory
+        self.scan = scan
+        self.opener = opener
+        self.callAfter = callAfter
+        self.callLater = callLater
+        self.max_dongles = max_dongles
+        self.pool = FlooWorkerPool(workers, name="FlooDongleWorker")
+        self.scans = 0
+        self._dongles: dict[str, FlooDongle] = {}
+        self._lock = threading.Lock()
+        self._rescan_at: float | None = 0.0
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+
+    def dongles(self) -> dict[str, FlooDongle]:
+        with self._lock:
+            return dict(self._dongles)
+
+    def get(self, key: str) -> FlooDongle | None:
+        with self._lock:
+            return self._dongles.get(key)
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Current state of every known dongle, keyed by USB serial number."""
+        return {key: dongle.snapshot() for key, dongle in self.dongles().items()}
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, name="FlooDongleManager", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 2.0) -> None:
+        """Stop reading, then close every dongle's interface and the wake pipe."""
+        self._stop_event.set()
+        self._wake()
+        thread = self._thread
+        if thread is not None:
+            if thread is threading.current_thread():
+                return
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.warning("Dongle manager did not stop, keeping its pipes open")
+                return
+        for dongle in self.dongles().values():
+            dongle.interface.close()
+        self.pool.stop()
+        if self._wake_r >= 0:
+            wake_r, wake_w = self._wake_r, self._wake_w
+            self._wake_r = self._wake_w = -1
+            os.close(wake_r)
+            os.close(wake_w)
+
+    def request_rescan(self) -> None:
+        self._schedule_rescan(0)
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            os.write(self._wake_w, b"\0")
+        except OSError:
+            pass
+
+    def _drain_wake_pipe(self) -> None:
+        try:
+            while os.read(self._wake_r, 64):
+                pass
+        except OSError:
+            pass
+
+    def _schedule_rescan(self, delay: float) -> None:
+        at = time.monotonic() + delay
+        if self._rescan_at is None or at < self._rescan_at:
+            self._rescan_at = at
+
+    def _new_dongle(self, key: str) -> FlooDongle:
+        sm = FlooStateMachine(
+            self.delegate_factory(key), self.callAfter, self.callLater, key=key, pool=self.pool
+        )
+        dongle = FlooDongle(key, sm)
+        with self._lock:
+            self._dongles[key] = dongle
+        return dongle
+
+    def rescan(self) -> None:
+        """Open every new dongle and let go of the ones that disappeared."""
+        self.scans += 1
+        found = {port_key(info): info for info in self.scan()}
+        for key, dongle in self.dongles().items():
+            if dongle.connected and key not in found:
+                logger.info("Dongle %s removed", key)
+                dongle.interface.reset()
+        connected = sum(1 for d in self.dongles().values() if d.connected)
+        for key, info in found.items():
+            known = self.get(key)
+            if known is not None and known.connected:
+                continue
+            if self.max_dongles is not None and connected >= self.max_dongles:
+                logger.warning("Ignoring dongle %s: limit of %d reached", key, self.max_dongles)
+                continue
+            dongle = known if known is not None else self._new_dongle(key)
+            if self._open(dongle, info):
+                connected += 1
+
+    def _open(self, dongle: FlooDongle, info: Any) -> bool:
+        inf = dongle.interface
+        try:
+            port = self.opener(info.device)
+        except serial.SerialException as e:
+            if "busy" in str(e).lower() or "lock" in str(e).lower():
+                inf.dispatcher.call(dongle.state_machine.connectionError, "port_busy")
+                self._schedule_rescan(FlooDongleManager.BUSY_RETRY)
+            else:
+                logger.error("Port error on %s: %s", info.device, e)
+                inf.dispatcher.call(dongle.state_machine.connectionError, "port_error")
+            return False
+        except OSError as e:
+            logger.error("OS error on %s: %s", info.device, e)
+            inf.dispatcher.call(dongle.state_machine.connectionError, "port_error")
+            return False
+        logger.info("Dongle %s on %s", dongle.key, info.device)
+        dongle.path = info.device
+        inf.attach(port, info.name, key=dongle.key)
+        return True
+
+    def _read(self, dongle: FlooDongle) -> None:
+        try:
+            ok = dongle.interface.read_ready()
+        except (serial.SerialException, OSError, ValueError, EOFError) as e:
+            logger.warning("Error reading from dongle %s: %s", dongle.key, e)
+            ok = False
+        if not ok:
+            dongle.interface.reset()
+            self._schedule_rescan(FlooDongleManager.REOPEN_DELAY)
+
+    def _on_hotplug(self, source: HotplugSource) -> None:
+        events = [e for e in source.read_events() if e.is_tty_change()]
+        if events:
+            # let udev settle permissions; later events in the burst fold into this rescan
+            self._schedule_rescan(FlooInterface.HOTPLUG_SETTLE)
+
+    def _timeout(self, source: HotplugSource | None) -> float | None:
+        if self._rescan_at is None:
+            if source is not None:
+                return None
+            # no hotplug notifications: fall back to periodic scanning
+            self._schedule_rescan(FlooDongleManager.RESCAN_INTERVAL)
+        assert self._rescan_at is not None
+        return max(0.0, self._rescan_at - time.monotonic())
+
+    def run(self) -> None:
+        source = self.hotplug_factory() if self.hotplug_factory is not None else None
+        try:
+            while not self._stop_event.is_set():
+                if self._rescan_at is not None and time.monotonic() >= self._rescan_at:
+                    self._rescan_at = None
+                    self.rescan()
+                ports = {
+                    d.interface.port.fileno(): d for d in self.dongles().values() if d.connected
+                }
+                watched = [self._wake_r, *ports]
+                if source is not None:
+                    watched.append(source.fileno())
+                readable, _, _ = select.select(watched, [], [], self._timeout(source))
+                for fd in readable:
+                    if fd == self._wake_r:
+                        self._drain_wake_pipe()
+                    elif source is not None and fd == source.fileno():
+                        self._on_hotplug(source)
+                    else:
+                        self._read(ports[fd])
+        finally:
+            if source is not None:
+                source.close()
+            for dongle in self.dongles().values():
+                if dongle.connected:
+                    dongle.interface.reset()
+                dongle.interface.stop()
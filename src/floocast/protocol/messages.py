@@ -1,4 +1,14 @@
-"""Protocol message classes for FlooGoo communication."""
+"""Protocol message classes for FlooGoo communication.
+
+Each class declares its wire layouts as a :class:`~floocast.protocol.schema.Schema`;
+``create_valid_msg`` and ``encode_payload`` are compiled from it when the
+class is created.
+"""
+
+from collections.abc import Callable
+from typing import ClassVar
+
+from floocast.protocol.schema import DEC, HEX, RAW, UTF8, Field, Layout, Schema, compile_schema
 
 __all__ = [
     "FlooMessage",
@@ -28,55 +38,93 @@ __all__ = [
 ]
 
 
+def _value(name: str, kind: str = HEX, strict: bool = True) -> Schema:
+    """``XX=vv``: one two-digit value, optionally followed by more bytes."""
+    field = Field(name, 3, 2, kind)
+    return Schema((Layout((field,), length=5) if strict else Layout((field,), min_length=5),))
+
+
+def _string(name: str, min_length: int = 4, **encode) -> Schema:
+    """``XX=<text>``: the rest of the line as UTF-8."""
+    return Schema((Layout((Field(name, 3, None, UTF8),), min_length=min_length),), **encode)
+
+
+# a bare header with no payload
+_BARE = Schema((Layout(length=2),))
+
+# reports the dongle also sends unasked whenever the value changes
+UNSOLICITED_HEADERS = frozenset({"ST", "LA", "AC"})
+
+
 class FlooMessage:
-    """FlooGoo BAI message base class."""
+    """FlooGoo BAI message base class.
+
+    Messages are slotted records. The wire encoding in :attr:`bytes` is only
+    built on first access, so received messages never pay for it; subclasses
+    provide their payload through :meth:`encode_payload`.
+    """
+
+    __slots__ = ("isSend", "header", "_payload", "_bytes")
 
     HEADER: str = ""
+    SCHEMA: ClassVar[Schema | None] = None
+    # compiled from SCHEMA: decode one received line, None if it is malformed
+    create_valid_msg: ClassVar[Callable[..., "FlooMessage | None"]]
+
+    isSend: bool
+    header: str
+    _payload: bytes | None
+    _bytes: bytearray | None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        schema = cls.__dict__.get("SCHEMA")
+        if schema is not None:
+            parse, encode = compile_schema(cls, schema)
+            cls.create_valid_msg = staticmethod(parse)
+            cls.encode_payload = encode
 
     def __init__(self, isSend, header, payload=None):
-        super().__init__()
         self.isSend = isSend
         self.header = header
-        self.bytes = bytearray()
-        if isSend:
-            self.bytes.extend(b"BC:")
-        self.bytes.extend(header.encode("ascii"))
-        if payload is not None:
-            self.bytes.extend(b"=")
-            self.bytes.extend(payload)
-        self.bytes.extend(b"\r\n")
+        self._payload = payload
+        self._bytes = None
+
+    def encode_payload(self) -> bytes | None:
+        """The bytes after ``=``, or None for a bare header."""
+        return self._payload
 
+    @property
+    def bytes(self) -> bytearray:
+        if self._bytes is None:
+            data = bytearray(b"BC:" if self.isSend else b"")
+            data += self.header.encode("ascii")
+            payload = self.encode_payload()
+            if payload is not None:
+                data += b"="
+                data += payload
+            data += b"\r\n"
+            self._bytes = data
+        return self._bytes
 
-class _HexValueMessage(FlooMessage):
-    """Base class for messages with a single hex-encoded value."""
+
+class _ValueMessage(FlooMessage):
+    """Base class for messages carrying a single value."""
+
+    __slots__ = ()
 
     VALUE_ATTR: str = "value"
-    STRICT_LENGTH: bool = True
-    ENCODING: str = "ascii"
 
     def __init__(self, isSend, value=None):
         setattr(self, self.VALUE_ATTR, value)
-        if value is not None:
-            super().__init__(isSend, self.HEADER, b"%02X" % value)
-        else:
-            super().__init__(isSend, self.HEADER)
-
-    @classmethod
-    def create_valid_msg(cls, payload: bytes):
-        msgLen = len(payload)
-        if cls.STRICT_LENGTH and msgLen != 5:
-            return None
-        if msgLen < 5:
-            return None
-        try:
-            return cls(False, int(payload[3:5].decode(cls.ENCODING), 16))
-        except (UnicodeDecodeError, ValueError):
-            return None
+        super().__init__(isSend, self.HEADER)
 
 
 class _SendOnlyCommand(FlooMessage):
     """Base class for send-only commands with no parameters."""
 
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(True, self.HEADER)
 
@@ -84,40 +132,50 @@ class _SendOnlyCommand(FlooMessage):
 class _IndexedCommand(FlooMessage):
     """Base class for commands with optional index parameter."""
 
+    __slots__ = ("index",)
+
     def __init__(self, index=None):
-        if index is None:
-            super().__init__(True, self.HEADER)
-        else:
-            super().__init__(True, self.HEADER, b"%02X" % index)
+        self.index = index
+        super().__init__(True, self.HEADER)
 
 
-class _StringPayloadMessage(FlooMessage):
-    """Base class for messages with string payload."""
+# AC reports grow with the firmware: codec, rssi, rate, speaker and mic
+# sample rates (in 10 Hz units), SDU interval, transport and presentation delay
+_AC_FIELDS = (
+    Field("codec", 3, 2),
+    Field("rssi", 6, 2),
+    Field("rate", 9, 4),
+    Field("spkSampleRate", 14, 4, scale=10),
+    Field("micSampleRate", 19, 4, scale=10),
+    Field("sduInterval", 24, 4),
+    Field("transportDelay", 29, 4),
+    Field("presentDelay", 34, 4),
+)
+_AC_DEFAULTS = {f.name: 0 for f in _AC_FIELDS}
 
-    VALUE_ATTR: str = "value"
-    MIN_LENGTH: int = 4
-
-    def __init__(self, isSend, value=None):
-        setattr(self, self.VALUE_ATTR, value)
-        if not isSend or value is None:
-            super().__init__(isSend, self.HEADER)
-        else:
-            super().__init__(isSend, self.HEADER, value.encode("utf-8"))
-
-    @classmethod
-    def create_valid_msg(cls, payload: bytes):
-        if len(payload) < cls.MIN_LENGTH:
-            return None
-        try:
-            return cls(False, payload[3:].decode("utf-8"))
-        except (UnicodeDecodeError, ValueError):
-            return None
+# AC reports RSSI as an offset from 256, 0 when the link does not report it
+RSSI_OFFSET = 0x100
 
 
 class FlooMsgAc(FlooMessage):
     """Audio Codec in Use - AC=xx with extended fields."""
 
+    __slots__ = tuple(f.name for f in _AC_FIELDS)
+
     HEADER = "AC"
+    SCHEMA = Schema(
+        (
+            Layout(_AC_FIELDS, length=38),
+            Layout(_AC_FIELDS[:1], length=5, defaults=_AC_DEFAULTS),
+            Layout(_AC_FIELDS[:3], length=13, defaults=_AC_DEFAULTS),
+            Layout(_AC_FIELDS[:4], length=18, defaults=_AC_DEFAULTS),
+            Layout(_AC_FIELDS[:5], length=23, defaults=_AC_DEFAULTS),
+            # unknown layout: only the codec, from whatever is there
+            Layout(_AC_FIELDS[:1], min_length=5, defaults=_AC_DEFAULTS),
+            Layout((Field("codec", 3, 1),), length=4, defaults=_AC_DEFAULTS),
+        ),
+        encode=(Layout(_AC_FIELDS),),
+    )
 
     def __init__(
         self,
@@ -139,67 +197,16 @@ class FlooMsgAc(FlooMessage):
         self.sduInterval = sduInterval
         self.transportDelay = transportDelay
         self.presentDelay = presentDelay
-        if codec is not None:
-            payload = (
-                f"{codec:02X},{rssi:02X},{rate:04X},{spkSampleRate:04X},"
-                f"{micSampleRate:04X},{sduInterval:04X},{transportDelay:04X},{presentDelay:04X}"
-            )
-            super().__init__(isSend, self.HEADER, payload.encode("ascii"))
-        else:
-            super().__init__(isSend, self.HEADER)
-
-    @classmethod
-    def create_valid_msg(cls, payload: bytes):
-        msgLen = len(payload)
-        try:
-            if msgLen == 5:
-                return cls(False, int(payload[3:5].decode("ascii"), 16))
-            elif msgLen == 13:
-                return cls(
-                    False,
-                    int(payload[3:5].decode("ascii"), 16),
-                    int(payload[6:8].decode("ascii"), 16),
-                    int(payload[9:13].decode("ascii"), 16),
-                )
-            elif msgLen == 18:
-                return cls(
-                    False,
-                    int(payload[3:5].decode("ascii"), 16),
-                    int(payload[6:8].decode("ascii"), 16),
-                    int(payload[9:13].decode("ascii"), 16),
-                    int(payload[14:18].decode("ascii"), 16),
-                )
-            elif msgLen == 23:
-                return cls(
-                    False,
-                    int(payload[3:5].decode("ascii"), 16),
-                    int(payload[6:8].decode("ascii"), 16),
-                    int(payload[9:13].decode("ascii"), 16),
-                    int(payload[14:18].decode("ascii"), 16),
-                    int(payload[19:23].decode("ascii"), 16),
-                )
-            elif msgLen == 38:
-                return cls(
-                    False,
-                    int(payload[3:5].decode("ascii"), 16),
-                    int(payload[6:8].decode("ascii"), 16),
-                    int(payload[9:13].decode("ascii"), 16),
-                    int(payload[14:18].decode("ascii"), 16),
-                    int(payload[19:23].decode("ascii"), 16),
-                    int(payload[24:28].decode("ascii"), 16),
-                    int(payload[29:33].decode("ascii"), 16),
-                    int(payload[34:38].decode("ascii"), 16),
-                )
-            else:
-                return cls(False, int(payload[3:5].decode("ascii"), 16))
-        except (UnicodeDecodeError, ValueError):
-            return None
+        super().__init__(isSend, self.HEADER)
 
 
 class FlooMsgAd(FlooMessage):
     """Address message - AD=addr(U48)."""
 
+    __slots__ = ("addr",)
+
     HEADER = "AD"
+    SCHEMA = Schema((Layout((Field("addr", 3, 12, RAW),), length=15),))
 
     def __init__(self, isSend, addr=None, payload=None):
         self.addr = addr
@@ -208,212 +215,233 @@ class FlooMsgAd(FlooMessage):
         else:
             super().__init__(isSend, self.HEADER, payload)
 
-    @classmethod
-    def create_valid_msg(cls, payload: bytes):
-        if len(payload) != 15:
-            return None
-        return cls(False, payload[3:15], payload[3:])
-
 
-class FlooMsgAm(_HexValueMessage):
+class FlooMsgAm(_ValueMessage):
     """Audio Mode - AM=xx (Bit 0~1: 00 high quality, 01 gaming, 02 broadcast)."""
 
+    __slots__ = ("mode",)
+
     HEADER = "AM"
     VALUE_ATTR = "mode"
-    STRICT_LENGTH = False
-    ENCODING = "utf-8"
+    SCHEMA = _value("mode", strict=False)
     mode: int | None
 
 
-class FlooMsgBe(_StringPayloadMessage):
+class FlooMsgBe(_ValueMessage):
     """Broadcast Encryption Key - BE=<KEY>."""
 
+    __slots__ = ("key",)
+
     HEADER = "BE"
     VALUE_ATTR = "key"
-    MIN_LENGTH = 5
-
-    @classmethod
-    def create_valid_msg(cls, payload: bytes):
-        if len(payload) < cls.MIN_LENGTH:
-            return None
-        try:
-            return cls(False, payload[3:].decode("utf-8"))
-        except (UnicodeDecodeError, ValueError):
-            return None
+    SCHEMA = _string("key", min_length=5, encode_received=False)
+    key: str | None
 
 
-class FlooMsgBm(_HexValueMessage):
+class FlooMsgBm(_ValueMessage):
     """Broadcast Mode - BM=xx (encryption, quality, latency bits)."""
 
+    __slots__ = ("mode",)
+
     HEADER = "BM"
     VALUE_ATTR = "mode"
+    SCHEMA = _value("mode")
     mode: int | None
 
 
-class FlooMsgBn(_StringPayloadMessage):
+class FlooMsgBn(_ValueMessage):
     """Broadcast Name - BN=<name>."""
 
+    __slots__ = ("name",)
+
     HEADER = "BN"
     VALUE_ATTR = "name"
+    SCHEMA = _string("name", encode_received=False)
     name: str | None
 
 
 class FlooMsgCp(_IndexedCommand):
     """Connect to Paired device - CP=xx."""
 
+    __slots__ = ()
+
     HEADER = "CP"
+    SCHEMA = _value("index")
 
 
 class FlooMsgCt(_IndexedCommand):
     """Connect and Trust - CT=xx."""
 
+    __slots__ = ()
+
     HEADER = "CT"
+    SCHEMA = _value("index")
 
 
 class FlooMsgDc(_SendOnlyCommand):
     """Disconnect - DC."""
 
+    __slots__ = ()
+
     HEADER = "DC"
+    SCHEMA = _BARE
 
 
-class FlooMsgEr(FlooMessage):
+class FlooMsgEr(_ValueMessage):
     """Error message - ER=xx."""
 
+    __slots__ = ("error",)
+
     HEADER = "ER"
+    VALUE_ATTR = "error"
+    SCHEMA = _value("error", DEC)
+    error: int
 
     def __init__(self, isSend, error):
-        self.error = error
-        super().__init__(isSend, self.HEADER, b"%02d" % error)
-
-    @classmethod
-    def create_valid_msg(cls, payload: bytes):
-        if len(payload) != 5:
-            return None
-        try:
-            return cls(False, int(payload[3:5].decode("ascii")))
-        except (UnicodeDecodeError, ValueError):
-            return None
+        super().__init__(isSend, error)
 
 
 class FlooMsgFd(_SendOnlyCommand):
     """Factory Default - FD."""
 
+    __slots__ = ()
+
     HEADER = "FD"
+    SCHEMA = _BARE
+
+
+_FN_INDEX = Field("index", 3, 2, DEC)
 
 
 class FlooMsgFn(FlooMessage):
     """Friendly Name - FN=<index>,<addr>,<name>."""
 
+    __slots__ = ("index", "btAddress", "name")
+
     HEADER = "FN"
+    SCHEMA = Schema(
+        (
+            # end of the list: index only
+            Layout((_FN_INDEX,), length=5, defaults={"btAddress": None, "name": None}),
+            Layout(
+                (_FN_INDEX, Field("btAddress", 6, None, UTF8)),
+                length=18,
+                defaults={"name": "No Name"},
+            ),
+            Layout(
+                (
+                    _FN_INDEX,
+                    Field("btAddress", 6, 12, UTF8),
+                    Field("name", 19, None, UTF8, errors="ignore"),
+                ),
+                min_length=20,
+            ),
+        ),
+        encode=(
+            Layout((_FN_INDEX, Field("btAddress", 6, 12, UTF8), Field("name", 19, None, UTF8))),
+            Layout((_FN_INDEX,)),
+        ),
+        encode_sent=False,
+    )
 
     def __init__(self, isSend, index=None, btAddress=None, name=None):
         if isSend:
             self.index = None
             self.name = None
             self.btAddress = None
-            super().__init__(isSend, self.HEADER)
         else:
             self.index = index
             self.btAddress = btAddress
             if btAddress is None:
                 self.name = None
-                paramStr = "%02X" % index
             else:
                 self.name = "No Name" if name is None else name
-                paramStr = "%02X,%s,%s" % (index, btAddress, self.name)
-            super().__init__(isSend, self.HEADER, paramStr.encode("utf-8"))
+        super().__init__(isSend, self.HEADER)
 
-    @classmethod
-    def create_valid_msg(cls, payload: bytes):
-        msgLen = len(payload)
-        try:
-            if msgLen == 5:
-                return cls(False, int(payload[3:5].decode("ascii")))
-            elif msgLen == 18:
-                return cls(False, int(payload[3:5].decode("ascii")), payload[6:].decode("utf-8"))
-            elif msgLen > 19:
-                return cls(
-                    False,
-                    int(payload[3:5].decode("ascii")),
-                    payload[6:18].decode("utf-8"),
-                    payload[19:].decode("utf-8", errors="ignore"),
-                )
-        except (UnicodeDecodeError, ValueError):
-            return None
-        return None
-
-
-class FlooMsgFt(_HexValueMessage):
+
+class FlooMsgFt(_ValueMessage):
     """Feature bits - FT=xx (LSB: LED ON/OFF)."""
 
+    __slots__ = ("feature",)
+
     HEADER = "FT"
     VALUE_ATTR = "feature"
-    STRICT_LENGTH = False
+    SCHEMA = _value("feature", strict=False)
     feature: int | None
 
 
 class FlooMsgIq(_SendOnlyCommand):
     """Inquiry - IQ."""
 
+    __slots__ = ()
+
     HEADER = "IQ"
+    SCHEMA = _BARE
 
 
-class FlooMsgLa(_HexValueMessage):
+class FlooMsgLa(_ValueMessage):
     """LE Audio state - LA=xx."""
 
+    __slots__ = ("state",)
+
     HEADER = "LA"
     VALUE_ATTR = "state"
+    SCHEMA = _value("state", DEC)
     state: int | None
 
-    @classmethod
-    def create_valid_msg(cls, payload: bytes):
-        if len(payload) != 5:
-            return None
-        try:
-            return cls(False, int(payload[3:5].decode("ascii")))
-        except (UnicodeDecodeError, ValueError):
-            return None
-
 
-class FlooMsgLf(_HexValueMessage):
+class FlooMsgLf(_ValueMessage):
     """LE Audio preference - LF=xx (00 prefer A2DP, 01 prefer LEA)."""
 
+    __slots__ = ("mode",)
+
     HEADER = "LF"
     VALUE_ATTR = "mode"
-    STRICT_LENGTH = False
-    ENCODING = "utf-8"
+    SCHEMA = _value("mode", strict=False)
     mode: int | None
 
 
-class FlooMsgMd(_HexValueMessage):
+class FlooMsgMd(_ValueMessage):
     """Discoverable Mode - MD=xx."""
 
+    __slots__ = ("mode",)
+
     HEADER = "MD"
     VALUE_ATTR = "mode"
-    STRICT_LENGTH = False
-    ENCODING = "utf-8"
+    SCHEMA = _value("mode", strict=False)
     mode: int | None
 
 
 class FlooMsgOk(FlooMessage):
     """OK response message."""
 
+    __slots__ = ()
+
     HEADER = "OK"
+    SCHEMA = _BARE
 
     def __init__(self, isSend):
         super().__init__(isSend, self.HEADER)
 
-    @classmethod
-    def create_valid_msg(cls, pkt: bytes):
-        if len(pkt) != 2:
-            return None
-        return cls(False)
-
 
 class FlooMsgPl(FlooMessage):
     """Paired device List - PL=index(U8),addr(U48),name(str)."""
 
+    __slots__ = ("index", "addr", "name")
+
     HEADER = "PL"
+    SCHEMA = Schema(
+        (
+            Layout(
+                (
+                    Field("index", 3, 2, DEC),
+                    Field("addr", 6, 12, RAW),
+                    Field("name", 19, None, RAW),
+                ),
+                min_length=20,
+            ),
+        )
+    )
 
     def __init__(self, isSend, index=None, addr=None, name=None, payload=None):
         self.index = index
@@ -424,35 +452,32 @@ class FlooMsgPl(FlooMessage):
         else:
             super().__init__(isSend, self.HEADER, payload)
 
-    @classmethod
-    def create_valid_msg(cls, payload: bytes):
-        if len(payload) < 20:
-            return None
-        try:
-            return cls(
-                False, int(payload[3:5].decode("utf-8")), payload[6:18], payload[19:], payload[3:]
-            )
-        except (UnicodeDecodeError, ValueError):
-            return None
-
-
-class FlooMsgSt(_HexValueMessage):
+
+class FlooMsgSt(_ValueMessage):
     """Source State - ST=xx."""
 
+    __slots__ = ("state",)
+
     HEADER = "ST"
     VALUE_ATTR = "state"
+    SCHEMA = _value("state")
     state: int | None
 
 
 class FlooMsgTc(_IndexedCommand):
     """Terminate Connection - TC=xx."""
 
+    __slots__ = ()
+
     HEADER = "TC"
+    SCHEMA = _value("index")
 
 
 class FlooMsgUnknown(FlooMessage):
     """Unknown message type."""
 
+    __slots__ = ()
+
     HEADER = "~~"
 
     def __init__(self, isSend):
@@ -463,26 +488,15 @@ class FlooMsgUnknown(FlooMessage):
         return cls(False)
 
 
-class FlooMsgVr(_StringPayloadMessage):
+class FlooMsgVr(_ValueMessage):
     """Version - VR=<version string>."""
 
+    __slots__ = ("verStr",)
+
     HEADER = "VR"
     VALUE_ATTR = "verStr"
+    SCHEMA = _string("verStr", encode_sent=False)
 
     def __init__(self, isSend, version=None):
         self.verStr = version
-        if isSend:
-            FlooMessage.__init__(self, isSend, self.HEADER)
-        else:
-            FlooMessage.__init__(
-                self, isSend, self.HEADER, version.encode("utf-8") if version else None
-            )
-
-    @classmethod
-    def create_valid_msg(cls, payload: bytes):
-        if len(payload) < 4:
-            return None
-        try:
-            return cls(False, payload[3:].decode("utf-8"))
-        except (UnicodeDecodeError, ValueError):
-            return None
+        FlooMessage.__init__(self, isSend, self.HEADER)
@@ -0,0 +1,113 @@
+"""The dongle's paired device list, indexed by Bluetooth address.
+
+``FN`` lists the paired devices most recently used first, so every stream
+start can reorder them. :meth:`FlooPairedDeviceList.diff` turns a refetched
+list into the few edits that take the old one there, which a list widget
+can apply in place instead of being rebuilt.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+
+# edit operations, see FlooPairedDeviceEdit
+ADD = "add"
+REMOVE = "remove"
+MOVE = "move"
+RENAME = "rename"
+
+
+@dataclass(frozen=True)
+class FlooPairedDevice:
+    address: str
+    name: str
+
+
+@dataclass(frozen=True)
+class FlooPairedDeviceEdit:
+    """One step of a diff, applied in order.
+
+    ``index`` is a position in the list as edited so far. ADD inserts
+    ``name`` there, REMOVE deletes it, RENAME replaces its name and MOVE
+    takes the entry at ``source`` out and inserts it, as ``name``, at
+    ``index``.
+    """
+
+    op: str
+    index: int
+    name: str
+    source: int | None = None
+
+
+class FlooPairedDeviceList:
+    """Paired devices in the dongle's order; an address is listed once."""
+
+    def __init__(self, devices: Iterable[FlooPairedDevice] = ()):
+        self._devices: list[FlooPairedDevice] = []
+        self._index: dict[str, int] = {}
+        for device in devices:
+            if device.address not in self._index:
+                self._index[device.address] = len(self._devices)
+                self._devices.append(device)
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def __iter__(self) -> Iterator[FlooPairedDevice]:
+        return iter(self._devices)
+
+    def __getitem__(self, index: int) -> FlooPairedDevice:
+        return self._devices[index]
+
+    def __contains__(self, address: object) -> bool:
+        return address in self._index
+
+    def index(self, address: str) -> int | None:
+        return self._index.get(address)
+
+    def names(self) -> list[str]:
+        return [device.name for device in self._devices]
+
+    def diff(self, new: FlooPairedDeviceList) -> list[FlooPairedDeviceEdit]:
+        """The edits that turn this list into ``new``; empty if nothing changed."""
+        edits = []
+        current = list(self._devices)
+        # back to front, so the indices of the removes stay valid
+        for i in range(len(current) - 1, -1, -1):
+            if current[i].address not in new:
+                edits.append(FlooPairedDeviceEdit(REMOVE, i, current[i].name))
+                del current[i]
+        for i, device in enumerate(new):
+            if i < len(current) and current[i].address == device.address:
+                if current[i].name != device.name:
+                    edits.append(FlooPairedDeviceEdit(RENAME, i, device.name))
+                    current[i] = device
+                continue
+            source = next(
+                (j for j in range(i + 1, len(current)) if current[j].address == device.address),
+                None,
+            )
+            if source is None:
+                edits.append(FlooPairedDeviceEdit(ADD, i, device.name))
+            else:
+                edits.append(FlooPairedDeviceEdit(MOVE, i, device.name, source))
+                del current[source]
+            current.insert(i, device)
+        return edits
+
+
+def apply_edits(names: list[str], edits: Iterable[FlooPairedDeviceEdit]) -> list[str]:
+    """``names`` with ``edits`` applied, the way a list widget would apply them."""
+    names = list(names)
+    for edit in edits:
+        if edit.op == REMOVE:
+            del names[edit.index]
+        elif edit.op == ADD:
+            names.insert(edit.index, edit.name)
+        elif edit.op == RENAME:
+            names[edit.index] = edit.name
+        elif edit.op == MOVE and edit.source is not None:
+            del names[edit.source]
+            names.insert(edit.index, edit.name)
+    return names
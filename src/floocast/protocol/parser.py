@@ -1,5 +1,8 @@
 import logging
+from collections.abc import Callable, Iterator
+from typing import BinaryIO
 
+from floocast.protocol.framer import FlooFramer
 from floocast.protocol.messages import (
     FlooMessage,
     FlooMsgAc,
@@ -21,30 +24,118 @@ from floocast.protocol.messages import (
 
 logger = logging.getLogger(__name__)
 
+# a received line without its terminator
+Buffer = bytes | bytearray | memoryview
+
+
+def header_key(header: str | bytes) -> int:
+    """The two header characters packed into an int, e.g. ``"ST"`` -> 0x5354."""
+    if isinstance(header, str):
+        header = header.encode("ascii")
+    return header[0] << 8 | header[1]
+
 
 class FlooParser:
     """FlooGoo message parser"""
 
-    MSG_HEADERS = {
-        FlooMsgOk.HEADER: FlooMsgOk.create_valid_msg,
-        FlooMsgPl.HEADER: FlooMsgPl.create_valid_msg,
-        FlooMsgAd.HEADER: FlooMsgAd.create_valid_msg,
-        FlooMsgAm.HEADER: FlooMsgAm.create_valid_msg,
-        FlooMsgLa.HEADER: FlooMsgLa.create_valid_msg,
-        FlooMsgSt.HEADER: FlooMsgSt.create_valid_msg,
-        FlooMsgBm.HEADER: FlooMsgBm.create_valid_msg,
-        FlooMsgBn.HEADER: FlooMsgBn.create_valid_msg,
-        FlooMsgFn.HEADER: FlooMsgFn.create_valid_msg,
-        FlooMsgEr.HEADER: FlooMsgEr.create_valid_msg,
-        FlooMsgAc.HEADER: FlooMsgAc.create_valid_msg,
-        FlooMsgLf.HEADER: FlooMsgLf.create_valid_msg,
-        FlooMsgVr.HEADER: FlooMsgVr.create_valid_msg,
-        FlooMsgFt.HEADER: FlooMsgFt.create_valid_msg,
+    # every message the dongle sends; create_valid_msg is compiled from each SCHEMA
+    RECEIVED = (
+        FlooMsgOk,
+        FlooMsgPl,
+        FlooMsgAd,
+        FlooMsgAm,
+        FlooMsgLa,
+        FlooMsgSt,
+        FlooMsgBm,
+        FlooMsgBn,
+        FlooMsgFn,
+        FlooMsgEr,
+        FlooMsgAc,
+        FlooMsgLf,
+        FlooMsgVr,
+        FlooMsgFt,
+    )
+
+    MSG_HEADERS = {cls.HEADER: cls.create_valid_msg for cls in RECEIVED}
+
+    # header_key(header) -> decoder, used by parse()
+    DISPATCH: dict[int, Callable[[Buffer], FlooMessage | None]] = {
+        header_key(cls.HEADER): cls.create_valid_msg for cls in RECEIVED
     }
 
     def __init__(self):
         super().__init__()
 
+    def parse(self, pkt: Buffer) -> FlooMessage | None:
+        """Decode one line straight from its bytes, e.g. a ``memoryview`` into a read buffer.
+
+        The header is looked up as an integer and numeric fields are read
+        digit by digit from the buffer, so no intermediate ``bytes`` slices
+        or ``str`` objects are created. Results match :meth:`create_valid_message`.
+        """
+        if len(pkt) < 2:
+            return None
+        decode = FlooParser.DISPATCH.get(pkt[0] << 8 | pkt[1])
+        if decode is None:
+            return FlooMsgUnknown(False)
+        return decode(pkt)
+
+    def parse_stream(self, buffer: Buffer) -> tuple[list[FlooMessage], int]:
+        """Frame and parse every complete line in ``buffer``.
+
+        Returns the messages and the number of bytes consumed, i.e. up to and
+        including the last ``\\r\\n``; the caller keeps ``buffer[consumed:]``
+        and prepends it to the next chunk. Lines that do not parse are skipped.
+        """
+        data = buffer if isinstance(buffer, bytes | bytearray) else bytes(buffer)
+        lines = data.split(FlooFramer.TERMINATOR)
+        consumed = len(data) - len(lines.pop())
+        return self._parse_lines(lines), consumed
+
+    def iter_stream(self, stream: BinaryIO, chunk_size: int = 1 << 16) -> Iterator[FlooMessage]:
+        """Yield every message in a binary file, e.g. a recorded serial capture.
+
+        The file is read ``chunk_size`` bytes at a time, so memory use stays
+        flat however long the capture is. As in the framer, a run of more than
+        ``FlooFramer.MAX_FRAME_SIZE`` bytes without a terminator is dropped;
+        the rest of that run, up to the next terminator, is dropped with it
+        so it does not come out as a message. A final line without a
+        terminator is ignored.
+        """
+        tail = b""
+        # inside a dropped run: discard up to the next terminator
+        resync = False
+        while chunk := stream.read(chunk_size):
+            data = tail + chunk if tail else chunk
+            if resync:
+                end = data.find(FlooFramer.TERMINATOR)
+                if end < 0:
+                    # keep a final CR, the terminator may straddle the chunks
+                    tail = b"\r" if data.endswith(b"\r") else b""
+                    continue
+                data = data[end + len(FlooFramer.TERMINATOR) :]
+                resync = False
+            lines = data.split(FlooFramer.TERMINATOR)
+            tail = lines.pop()
+            if len(tail) > FlooFramer.MAX_FRAME_SIZE:
+                logger.warning("Dropping %d bytes without frame terminator", len(tail))
+                tail = b"\r" if tail.endswith(b"\r") else b""
+                resync = True
+            yield from self._parse_lines(lines)
+
+    @staticmethod
+    def _parse_lines(lines: list[bytes] | list[bytearray]) -> list[FlooMessage]:
+        decoders = FlooParser.DISPATCH
+        messages = []
+        for line in lines:
+            if len(line) < 2:
+                continue
+            decode = decoders.get(line[0] << 8 | line[1])
+            msg = decode(line) if decode is not None else FlooMsgUnknown(False)
+            if msg is not None:
+                messages.append(msg)
+        return messages
+
     def create_valid_message(self, pkt: bytes) -> FlooMessage | None:
         msgLen = len(pkt)
         if msgLen < 2:
@@ -60,5 +151,5 @@ class FlooParser:
         else:
             return FlooMsgUnknown(False)
 
-    def run(self, pkt: bytes) -> FlooMessage | None:
-        return self.create_valid_message(pkt)
+    def run(self, pkt: Buffer) -> FlooMessage | None:
+        return self.parse(pkt)
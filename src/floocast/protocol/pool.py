@@ -0,0 +1,93 @@
+"""A fixed set of threads shared by the writers and dispatchers of many dongles."""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class FlooWorkerPool:
+    """Run jobs and timed callbacks on at most ``size`` threads.
+
+    A FlooWriter or FlooDispatcher given a pool submits one job that
+    drains its queue instead of keeping a thread of its own, and never has
+    more than one job queued or running, so its order is kept. Threads are
+    started on the first job, so an unused pool costs nothing.
+    """
+
+    SIZE = 4
+
+    def __init__(self, size: int = SIZE, name: str = "FlooWorker"):
+        self.size = size
+        self.name = name
+        self._jobs: deque[Callable[[], Any]] = deque()
+        # (due, seq, func) on the monotonic clock
+        self._timers: list[tuple[float, int, Callable[[], Any]]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._stopped = False
+
+    def submit(self, func: Callable[[], Any]) -> None:
+        """Run ``func()`` on a pool thread as soon as one is free."""
+        with self._cond:
+            self._jobs.append(func)
+            self._start_threads()
+            self._cond.notify()
+
+    def call_at(self, due: float, func: Callable[[], Any]) -> None:
+        """Run ``func()`` on a pool thread once ``time.monotonic()`` reaches ``due``."""
+        with self._cond:
+            heapq.heappush(self._timers, (due, next(self._seq), func))
+            self._start_threads()
+            # the new timer may be due before the one a thread is waiting for
+            self._cond.notify_all()
+
+    def stop(self, timeout: float | None = 1.0) -> None:
+        """Drop what is still queued and wait for the threads to finish their job."""
+        with self._cond:
+            self._stopped = True
+            self._jobs.clear()
+            self._timers.clear()
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def _start_threads(self) -> None:
+        if self._threads or self._stopped:
+            return
+        for i in range(self.size):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_job(self) -> Callable[[], Any] | None:
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                while self._timers and self._timers[0][0] <= now:
+                    self._jobs.append(heapq.heappop(self._timers)[2])
+                if self._jobs:
+                    return self._jobs.popleft()
+                self._cond.wait(self._timers[0][0] - now if self._timers else None)
+            return None
+
+    def _run(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                job()
+            except Exception:
+                logger.exception("Error in pooled job %s", job)
@@ -0,0 +1,282 @@
+"""Replay a recorded trace through FlooStateMachine without a dongle or wx.
+
+The inbound frames of a trace (see :mod:`floocast.protocol.trace`) are
+parsed and fed to :meth:`FlooStateMachine.handleMessage` in order. Time is
+virtual: a :class:`FlooVirtualClock` drives the command tracker's retry
+deadlines and a :class:`FlooReplayScheduler` stands in for
+``wx.CallAfter``/``wx.CallLater``, so reconnect back-off and handshake
+timeouts fire exactly when they would have between the recorded frames.
+
+``speed`` sets the pacing against the wall clock: :data:`REALTIME` (1.0)
+keeps the recorded gaps, a larger factor shrinks them, and
+:data:`AS_FAST_AS_POSSIBLE` (None) never sleeps, which is what the
+throughput benchmark uses.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+from typing import Any
+
+from floocast.protocol.messages import FlooMessage, FlooMsgUnknown
+from floocast.protocol.parser import FlooParser
+from floocast.protocol.state_machine import FlooStateMachine
+from floocast.protocol.state_machine_delegate import FlooStateMachineDelegate
+from floocast.protocol.trace import INBOUND, OUTBOUND, FlooTraceRecord, read_trace, trace_files
+
+logger = logging.getLogger(__name__)
+
+REALTIME = 1.0
+AS_FAST_AS_POSSIBLE = None
+
+
+class FlooVirtualClock:
+    """A monotonic clock in seconds that only moves when told to."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance_to(self, when: float) -> None:
+        if when > self.now:
+            self.now = when
+
+
+class FlooReplayTimer:
+    """Handle returned by :meth:`FlooReplayScheduler.callLater`, like ``wx.CallLater``."""
+
+    __slots__ = ("due", "func", "args", "running")
+
+    def __init__(self, due: float, func: Callable[..., Any], args: tuple[Any, ...]):
+        self.due = due
+        self.func = func
+        self.args = args
+        self.running = True
+
+    def Stop(self) -> None:
+        self.running = False
+
+    def IsRunning(self) -> bool:
+        return self.running
+
+
+class FlooReplayScheduler:
+    """Run posted calls and timers in virtual time order on the caller's thread.
+
+    ``callAfter`` and ``callLater`` have the signatures FlooStateMachine
+    expects. Nothing runs until :meth:`run_until`, which fires every call due
+    by then, in due order and first-posted first, moving the clock to each
+    one as it goes.
+    """
+
+    def __init__(self, clock: FlooVirtualClock):
+        self.clock = clock
+        self.fired = 0
+        self._heap: list[tuple[float, int, FlooReplayTimer]] = []
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def callAfter(self, func: Callable[..., Any], *args: Any) -> None:
+        self._push(FlooReplayTimer(self.clock.now, func, args))
+
+    def callLater(self, delay_ms: int, func: Callable[..., Any]) -> FlooReplayTimer:
+        timer = FlooReplayTimer(self.clock.now + delay_ms / 1000, func, ())
+        self._push(timer)
+        return timer
+
+    def _push(self, timer: FlooReplayTimer) -> None:
+        heapq.heappush(self._heap, (timer.due, next(self._seq), timer))
+
+    def next_due(self) -> float | None:
+        return self._heap[0][0] if self._heap else None
+
+    def run_until(self, when: float) -> None:
+        heap = self._heap
+        while heap and heap[0][0] <= when:
+            _, _, timer = heapq.heappop(heap)
+            if not timer.running:
+                continue
+            timer.running = False
+            self.clock.advance_to(timer.due)
+            self.fired += 1
+            timer.func(*timer.args)
+
+
+class FlooReplayInterface:
+    """What FlooStateMachine sees of the port: commands are recorded, not written."""
+
+    def __init__(self, clock: FlooVirtualClock):
+        self.clock = clock
+        self.port_name: str | None = None
+        # traces only record port names
+        self.port_key: str | None = None
+        self.sent: list[tuple[float, FlooMessage]] = []
+
+    def sendMsg(self, msg: FlooMessage) -> None:
+        self.sent.append((self.clock.now, msg))
+
+    def run(self) -> None:
+        pass
+
+
+class _ReplaySettings:
+    """In-memory FlooSettings, so a replay never touches the user's config."""
+
+    def __init__(self, data: dict[str, Any] | None = None):
+        self._data = dict(data or {})
+
+    def get_item(self, key: str) -> Any:
+        return self._data.get(key)
+
+    def set_item(self, key: str, value: Any) -> None:
+        self._data[key] = value
+
+    def save(self) -> None:
+        pass
+
+
+@dataclass
+class FlooReplayStats:
+    """What one :meth:`FlooReplay.run` did."""
+
+    frames: int = 0
+    messages: int = 0
+    # frames no decoder accepted, and headers no decoder knows
+    invalid: int = 0
+    unknown: int = 0
+    # commands the live app wrote, and the ones the replayed state machine sent
+    recorded_sent: int = 0
+    sent: int = 0
+    callbacks: int = 0
+    # port changes, each replayed as an unplug and a new handshake
+    reconnects: int = 0
+    virtual_seconds: float = 0.0
+    wall_seconds: float = 0.0
+
+    def messages_per_second(self) -> float:
+        if self.wall_seconds <= 0:
+            return 0.0
+        return self.messages / self.wall_seconds
+
+
+class FlooReplay:
+    """Drive a fresh FlooStateMachine with the inbound frames of ``records``.
+
+    The first frame of each port opens it (``interfaceState(True)``, which
+    starts the handshake) and a frame from another port closes the current
+    one first, so a trace spanning replugs replays as reconnects. Outbound
+    records are only counted: the state machine sends its own commands,
+    which end up in ``interface.sent``.
+    """
+
+    def __init__(
+        self,
+        records: Iterable[FlooTraceRecord],
+        delegate: FlooStateMachineDelegate | None = None,
+        speed: float | None = AS_FAST_AS_POSSIBLE,
+        settings: dict[str, Any] | None = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if speed is not None and speed <= 0:
+            raise ValueError("speed must be positive, or None for as fast as possible")
+        self.records = records
+        self.speed = speed
+        self.sleep = sleep
+        self.clock = FlooVirtualClock()
+        self.scheduler = FlooReplayScheduler(self.clock)
+        self.interface = FlooReplayInterface(self.clock)
+        self.parser = FlooParser()
+        self.stats = FlooReplayStats()
+        self.stateMachine = FlooStateMachine(
+            delegate if delegate is not None else FlooStateMachineDelegate(),
+            callAfter=self.scheduler.callAfter,
+            callLater=self.scheduler.callLater,
+            clock=self.clock,
+            interface=self.interface,
+            settings=_ReplaySettings(settings),
+        )
+
+    @classmethod
+    def from_trace(cls, path: str, **kwargs: Any) -> FlooReplay:
+        """Replay ``path`` and its rotated predecessors, oldest first."""
+        return cls(_chain_traces(trace_files(path)), **kwargs)
+
+    def run(self) -> FlooReplayStats:
+        sm = self.stateMachine
+        stats = self.stats
+        clock = self.clock
+        parse = self.parser.parse
+        start_ns: int | None = None
+        wall_start = time.perf_counter()
+        for record in self.records:
+            if start_ns is None:
+                start_ns = record.time_ns
+            # traces from two sessions can go back in time; never rewind
+            at = max(clock.now, (record.time_ns - start_ns) / 1e9)
+            self._advance(at)
+            if self.speed is not None:
+                lag = wall_start + at / self.speed - time.perf_counter()
+                if lag > 0:
+                    self.sleep(lag)
+            if record.direction == OUTBOUND:
+                stats.recorded_sent += 1
+                continue
+            if record.direction != INBOUND:
+                continue
+            stats.frames += 1
+            if record.port != self.interface.port_name:
+                self._switch_port(record.port)
+            msg = parse(record.data)
+            if msg is None:
+                stats.invalid += 1
+                continue
+            if isinstance(msg, FlooMsgUnknown):
+                stats.unknown += 1
+            stats.messages += 1
+            sm.handleMessage(msg)
+            self.scheduler.run_until(clock.now)
+        stats.wall_seconds = time.perf_counter() - wall_start
+        stats.virtual_seconds = clock.now
+        stats.sent = len(self.interface.sent)
+        stats.callbacks = self.scheduler.fired
+        return stats
+
+    def _advance(self, when: float) -> None:
+        """Fire the timers and command deadlines that fall before ``when``."""
+        sm = self.stateMachine
+        while True:
+            due = self.scheduler.next_due()
+            deadline = sm._commands.next_deadline()
+            if deadline is not None and (due is None or deadline < due):
+                due = deadline
+            if due is None or due > when:
+                break
+            self.clock.advance_to(due)
+            self.scheduler.run_until(due)
+            sm.pollTimers()
+        self.clock.advance_to(when)
+
+    def _switch_port(self, port: str) -> None:
+        sm = self.stateMachine
+        if self.interface.port_name is not None:
+            logger.info("Replay: %s replaced by %s", self.interface.port_name, port)
+            sm.interfaceState(False, self.interface.port_name)
+            self.scheduler.run_until(self.clock.now)
+            self.stats.reconnects += 1
+        self.interface.port_name = self.interface.port_key = port
+        sm.interfaceState(True, port)
+        self.scheduler.run_until(self.clock.now)
+
+
+def _chain_traces(paths: list[str]) -> Iterator[FlooTraceRecord]:
+    for path in paths:
+        yield from read_trace(path)
@@ -0,0 +1,282 @@
+"""Declarative line layouts for FlooGoo messages, compiled to parse/encode functions.
+
+A message class declares its wire format as a :class:`Schema`: one or more
+:class:`Layout` entries, each a list of :class:`Field` (name, offset, width,
+kind). :func:`compile_schema` turns a schema into Python source specialised
+for that layout, with offsets, widths and digit arithmetic inlined, and
+``exec``\\s it once at import. The generated parser reads fields straight
+from ``bytes`` or a ``memoryview`` and fills the message's slots without
+calling ``__init__``; the generated encoder formats the payload with a
+single ``%``.
+"""
+
+from __future__ import annotations
+
+import struct
+from binascii import unhexlify
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+HEX = "hex"
+DEC = "dec"
+UTF8 = "utf-8"
+RAW = "raw"
+
+# byte value -> digit value, -1 for anything that is not a digit
+HEX_DIGITS = [-1] * 256
+for _i, _c in enumerate(b"0123456789ABCDEF"):
+    HEX_DIGITS[_c] = _i
+for _i, _c in enumerate(b"abcdef", start=10):
+    HEX_DIGITS[_c] = _i
+DEC_DIGITS = [d if d < 10 else -1 for d in HEX_DIGITS]
+
+
+@dataclass(frozen=True)
+class Field:
+    """One field of a line, ``offset`` bytes from its start (``XX=`` is 3 bytes)."""
+
+    name: str
+    offset: int
+    # None runs to the end of the line
+    width: int | None = None
+    kind: str = HEX
+    # stored value = wire value * scale
+    scale: int = 1
+    # utf-8 decode error handling
+    errors: str = "strict"
+
+    def __post_init__(self):
+        if self.kind not in (HEX, DEC, UTF8, RAW):
+            raise ValueError(f"unknown field kind {self.kind!r}")
+        if self.kind in (HEX, DEC) and not self.width:
+            raise ValueError(f"numeric field {self.name!r} needs a width")
+
+
+@dataclass(frozen=True)
+class Layout:
+    """The fields of lines with exactly ``length`` bytes, or at least ``min_length``."""
+
+    fields: tuple[Field, ...] = ()
+    length: int | None = None
+    min_length: int | None = None
+    # values for the schema's other attributes when this layout is parsed
+    defaults: dict[str, Any] = field(default_factory=dict)
+    # written between fields by the encoder
+    separator: bytes = b","
+
+    def condition(self) -> str:
+        if self.length is not None:
+            return f"n == {self.length}"
+        if self.min_length is not None:
+            return f"n >= {self.min_length}"
+        return "True"
+
+
+@dataclass(frozen=True)
+class Schema:
+    """Every layout a message can have on the wire.
+
+    Parsing tries ``layouts`` in order and uses the first whose length
+    matches; a line that matches none, or has a bad digit in a matching
+    layout, is rejected. Encoding uses the first layout in ``encode`` (by
+    default all of them) whose fields are all set, or no payload.
+    """
+
+    layouts: tuple[Layout, ...] = ()
+    encode: tuple[Layout, ...] | None = None
+    # which direction carries a payload when encoding
+    encode_sent: bool = True
+    encode_received: bool = True
+
+    @property
+    def attributes(self) -> tuple[str, ...]:
+        names: dict[str, None] = {}
+        for layout in self.layouts:
+            for f in layout.fields:
+                names[f.name] = None
+            for name in layout.defaults:
+                names[name] = None
+        return tuple(names)
+
+
+def _parse_field(f: Field, line: list[str], digits: list[str]) -> str:
+    """Emit the statements reading ``f``; return the expression for its value."""
+    start = f.offset
+    end = "" if f.width is None else str(start + f.width)
+    if f.kind == UTF8:
+        errors = "" if f.errors == "strict" else f", {f.errors!r}"
+        return f'str(p[{start}:{end}], "utf-8"{errors})'
+    if f.kind == RAW:
+        return f"bytes(p[{start}:{end}])"
+    assert f.width is not None
+    table = "_H" if f.kind == HEX else "_D"
+    names = [f"_d{len(digits) + i}" for i in range(f.width)]
+    for i, name in enumerate(names):
+        line.append(f"{name} = {table}[p[{start + i}]]")
+    digits.extend(names)
+    if f.kind == HEX:
+        shifts = [
+            f"{name} << {4 * (f.width - 1 - i)}" if i < f.width - 1 else name
+            for i, name in enumerate(names)
+        ]
+        expr = " | ".join(shifts)
+    else:
+        expr = names[0]
+        for name in names[1:]:
+            expr = f"({expr}) * 10 + {name}"
+    if f.scale != 1:
+        expr = f"({expr}) * {f.scale}"
+    return expr
+
+
+def _packed(layout: Layout) -> tuple[str, list[int]] | None:
+    """Struct format and separator offsets if ``layout`` is separated 2/4-digit hex fields.
+
+    Such a line can be decoded with one ``unhexlify`` and one ``unpack``
+    instead of a table lookup per digit.
+    """
+    fields = layout.fields
+    if len(fields) < 3 or any(f.kind != HEX or f.width not in (2, 4) for f in fields):
+        return None
+    if len(layout.separator) != 1:
+        return None
+    separators = []
+    for prev, f in zip(fields, fields[1:], strict=False):
+        assert prev.width is not None
+        if f.offset != prev.offset + prev.width + 1:
+            return None
+        separators.append(f.offset - 1)
+    return ">" + "".join("B" if f.width == 2 else "H" for f in fields), separators
+
+
+def _build(
+    layout: Layout,
+    li: int,
+    values: dict[str, str],
+    attributes: tuple[str, ...],
+    ns: dict[str, Any],
+    indent: str,
+) -> list[str]:
+    """Emit the statements that fill a new message from ``values`` and return it."""
+    out = [
+        f"{indent}o = _new(_cls)",
+        f"{indent}o.isSend = False",
+        f"{indent}o.header = _HEADER",
+        f"{indent}o._payload = None",
+        f"{indent}o._bytes = None",
+    ]
+    for name in attributes:
+        if name in values:
+            out.append(f"{indent}o.{name} = {values[name]}")
+        else:
+            default = f"_default_{li}_{name}"
+            ns[default] = layout.defaults.get(name)
+            out.append(f"{indent}o.{name} = {default}")
+    out.append(f"{indent}return o")
+    return out
+
+
+def _parse_source(schema: Schema, ns: dict[str, Any]) -> str:
+    out = ["def parse(p):", "    n = len(p)", "    try:"]
+    attributes = schema.attributes
+    for li, layout in enumerate(schema.layouts):
+        out.append(f"        if {layout.condition()}:")
+        packed = _packed(layout)
+        if packed is not None:
+            fmt, separators = packed
+            ns[f"_unpack_{li}"] = struct.Struct(fmt).unpack
+            sep = layout.separator
+            first, last = layout.fields[0], layout.fields[-1]
+            assert last.width is not None
+            check = " and ".join(f"p[{i}] == {sep[0]}" for i in separators)
+            out.append(f"            if {check}:")
+            out.append("                try:")
+            out.append(
+                f"                    v = _unpack_{li}(_unhexlify("
+                f"bytes(p[{first.offset}:{last.offset + last.width}]).replace({sep!r}, b'')))"
+            )
+            out.append("                except (ValueError, _StructError):")
+            out.append("                    return None")
+            values = {}
+            for i, f in enumerate(layout.fields):
+                values[f.name] = f"v[{i}]" if f.scale == 1 else f"v[{i}] * {f.scale}"
+            out.extend(_build(layout, li, values, attributes, ns, "                "))
+        body: list[str] = []
+        digits: list[str] = []
+        values = {}
+        for f in layout.fields:
+            values[f.name] = _parse_field(f, body, digits)
+        out.extend(f"            {stmt}" for stmt in body)
+        if digits:
+            out.append(f"            if ({' | '.join(digits)}) < 0:")
+            out.append("                return None")
+        out.extend(_build(layout, li, values, attributes, ns, "            "))
+    out.append("        return None")
+    out.append("    except UnicodeDecodeError:")
+    out.append("        return None")
+    return "\n".join(out)
+
+
+def _encode_format(f: Field) -> tuple[str, str]:
+    value = f"self.{f.name}"
+    if f.scale != 1:
+        value = f"{value} // {f.scale}"
+    if f.kind == HEX:
+        return f"%0{f.width}X", value
+    if f.kind == DEC:
+        return f"%0{f.width}d", value
+    if f.kind == UTF8:
+        return "%s", f'{value}.encode("utf-8")'
+    return "%s", value
+
+
+def _encode_source(schema: Schema) -> str:
+    out = ["def encode_payload(self):", "    if self._payload is not None:"]
+    out.append("        return self._payload")
+    if not schema.encode_sent:
+        out.append("    if self.isSend:")
+        out.append("        return None")
+    if not schema.encode_received:
+        out.append("    if not self.isSend:")
+        out.append("        return None")
+    layouts = schema.layouts if schema.encode is None else schema.encode
+    for layout in layouts:
+        if not layout.fields:
+            continue
+        formats, values = zip(*(_encode_format(f) for f in layout.fields), strict=True)
+        fmt = layout.separator.join(s.encode("ascii") for s in formats)
+        condition = " and ".join(f"self.{f.name} is not None" for f in layout.fields)
+        out.append(f"    if {condition}:")
+        out.append(f"        return {fmt!r} % ({', '.join(values)},)")
+    out.append("    return None")
+    return "\n".join(out)
+
+
+def compile_schema(cls: type, schema: Schema) -> tuple[Callable[..., Any], Callable[..., Any]]:
+    """Build the ``(parse, encode_payload)`` pair for ``cls`` from ``schema``."""
+    slots = {name for klass in cls.__mro__ for name in getattr(klass, "__slots__", ())}
+    missing = [name for name in schema.attributes if name not in slots]
+    if missing:
+        raise TypeError(f"{cls.__name__} has no slot for {', '.join(missing)}")
+    ns: dict[str, Any] = {
+        "_cls": cls,
+        "_new": object.__new__,
+        "_HEADER": cls.HEADER,  # type: ignore[attr-defined]
+        "_H": HEX_DIGITS,
+        "_D": DEC_DIGITS,
+        "_unhexlify": unhexlify,
+        "_StructError": struct.error,
+    }
+    parse_src = _parse_source(schema, ns)
+    encode_src = _encode_source(schema)
+    filename = f"<schema {cls.__name__}>"
+    exec(compile(parse_src, filename, "exec"), ns)
+    exec(compile(encode_src, filename, "exec"), ns)
+    parse = ns["parse"]
+    parse.__qualname__ = f"{cls.__name__}.create_valid_msg"
+    parse.__source__ = parse_src
+    encode = ns["encode_payload"]
+    encode.__qualname__ = f"{cls.__name__}.encode_payload"
+    encode.__source__ = encode_src
+    return parse, encode
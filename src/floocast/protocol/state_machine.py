@@ -1,9 +1,19 @@
 import logging
-from threading import RLock, Thread
-
+import time
+from collections.abc import Callable
+from threading import Lock, RLock, Thread
+from typing import Any
+
+from floocast.protocol.command_tracker import (
+    FlooCommandStats,
+    FlooCommandTracker,
+    FlooPendingCommand,
+    RetryPolicy,
+)
 from floocast.protocol.interface import FlooInterface
 from floocast.protocol.interface_delegate import FlooInterfaceDelegate
 from floocast.protocol.messages import (
+    UNSOLICITED_HEADERS,
     FlooMessage,
     FlooMsgAc,
     FlooMsgAm,
@@ -23,7 +33,12 @@ from floocast.protocol.messages import (
     FlooMsgTc,
     FlooMsgVr,
 )
-from floocast.settings import FlooSettings
+from floocast.protocol.paired_devices import (
+    FlooPairedDevice,
+    FlooPairedDeviceEdit,
+    FlooPairedDeviceList,
+)
+from floocast.settings import DEFAULT_WRITE_BEHIND, FlooSettings
 
 logger = logging.getLogger(__name__)
 
@@ -63,6 +78,18 @@ class BroadcastModeBit:
     ALL_MASK = 0x3F
 
 
+# snapshot field each handshake reply confirms
+_SNAPSHOT_FIELD_OF = {
+    FlooMsgVr: "version",
+    FlooMsgAm: "audioMode",
+    FlooMsgLf: "preferLea",
+    FlooMsgBm: "broadcastMode",
+    FlooMsgBn: "broadcastName",
+    FlooMsgFn: "pairedDevices",
+    FlooMsgFt: "feature",
+}
+
+
 def _wx_call_after(func, *args):
     import wx
 
@@ -81,163 +108,483 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
     INIT = -1
     CONNECTED = 0
 
-    def __init__(self, delegate):
+    # queries are idempotent and safe to resend; setters (TC toggles!) are not
+    QUERY_POLICY = RetryPolicy(timeout=2.0, retries=2)
+    SET_POLICY = RetryPolicy(timeout=2.0, retries=0)
+
+    # seconds between command round-trip summaries in the log
+    STATS_LOG_INTERVAL = 300.0
+
+    # send every handshake query right after VR instead of one per round trip
+    HANDSHAKE_PIPELINED = "pipelined"
+    # one query at a time, for firmware that drops commands sent back to back
+    HANDSHAKE_SEQUENTIAL = "sequential"
+
+    INIT_SEQUENCE = (
+        FlooMsgVr,
+        FlooMsgAm,
+        FlooMsgSt,
+        FlooMsgLa,
+        FlooMsgLf,
+        FlooMsgBm,
+        FlooMsgBn,
+        FlooMsgFn,
+        FlooMsgFt,
+        FlooMsgAc,
+    )
+
+    # settings the dongle keeps until a host changes them: with a snapshot of
+    # the same firmware they are shown from cache and confirmed after CONNECTED
+    CONFIRM_SEQUENCE = (FlooMsgAm, FlooMsgLf, FlooMsgBm, FlooMsgBn, FlooMsgFt)
+    FAST_INIT_SEQUENCE = (FlooMsgVr, FlooMsgSt, FlooMsgLa, FlooMsgFn, FlooMsgAc)
+
+    # last known state per dongle, kept in the settings under SNAPSHOT_KEY
+    SNAPSHOT_KEY = "device_snapshots"
+    # per dongle, the streaming state to reconnect to after a restart
+    STREAMING_STATE_KEY = "last_streaming_states"
+    SNAPSHOT_FIELDS = (
+        "version",
+        "audioMode",
+        "preferLea",
+        "broadcastMode",
+        "broadcastName",
+        "pairedDevices",
+        "feature",
+    )
+
+    def __init__(
+        self,
+        delegate,
+        callAfter=None,
+        callLater=None,
+        clock=None,
+        interface=None,
+        settings=None,
+        key=None,
+        pool=None,
+    ):
         super().__init__()
         self.daemon = True
+        # the dongle's stable identity (see port_key); None takes the interface's
+        self.key: str | None = key
         self._lock = RLock()
         self.state = FlooStateMachine.INIT
-        self.lastCmd = None
         self.delegate = delegate
-        self.inf = FlooInterface(self)
-        self.pendingCmdPara = None
+        # how delegate calls and timers reach the GUI thread; wx when None
+        self._callAfter = callAfter
+        self._callLater = callLater
+        # delegate calls collected until the GUI thread gets to them
+        self._delta: list[tuple[Callable[..., Any], tuple[Any, ...]]] = []
+        self._deltaPosted = False
+        self._deltaLock = Lock()
+        # indications that carry a whole value: only the last one in a delta counts
+        self._replaceable = {
+            delegate.audioModeInd,
+            delegate.sourceStateInd,
+            delegate.leAudioStateInd,
+            delegate.broadcastModeInd,
+            delegate.preferLeaInd,
+            delegate.broadcastNameInd,
+            delegate.pairedDevicesUpdateInd,
+            delegate.audioCodecInUseInd,
+            delegate.ledEnabledInd,
+            delegate.aptxLosslessEnabledInd,
+            delegate.gattClientEnabledInd,
+            delegate.audioSourceInd,
+            delegate.staleStateInd,
+        }
+        # a virtual clock, port stand-in and settings store for offline replay
+        self._clock = clock if clock is not None else time.monotonic
+        self.inf = interface if interface is not None else FlooInterface(self, pool=pool)
+        self._commands: FlooCommandTracker = FlooCommandTracker(
+            self.inf.sendMsg,
+            clock=self._clock,
+            policy=FlooStateMachine.SET_POLICY,
+            unsolicited=UNSOLICITED_HEADERS,
+        )
+        self.version = None
         self.audioMode = None
         self.preferLea = None
         self.broadcastMode = None
         self.broadcastName = None
         self.broadcastKey = None
+        # names for display, and the same devices by address
         self.pairedDevices = []
+        self.pairedDeviceList: FlooPairedDeviceList = FlooPairedDeviceList()
+        # FN entries of the list being received
+        self._pairedFetch: list[FlooPairedDevice] = []
         self.sourceState = None
+        self.leAudioState = None
+        # the latest AC report: codec, RSSI, bitrate and delays
+        self.codecInUse: FlooMsgAc | None = None
         self.a2dpSink = False
         self.feature = None
         self._sourceStateBeforeDisconnect = None
         self._reconnectAttempts = 0
+        # every auto-reconnect attempt scheduled since start
+        self.reconnectsScheduled = 0
         self._reconnectTimer = None
-        self._settings = FlooSettings()
+        self._settings = (
+            settings
+            if settings is not None
+            else FlooSettings.shared(write_behind=DEFAULT_WRITE_BEHIND)
+        )
         self._lastSavedState = None
-        self._load_saved_state()
-
-    def _load_saved_state(self):
-        saved_state = self._settings.get_item("last_streaming_state")
+        self.handshakeMode = (
+            self._settings.get_item("handshake_mode") or FlooStateMachine.HANDSHAKE_PIPELINED
+        )
+        self._handshakeRemaining: set[type[FlooMessage]] = set()
+        self._handshakeSteps = FlooStateMachine.INIT_SEQUENCE
+        # snapshot fields shown from cache and not confirmed by the dongle yet
+        self.staleFields: set[str] = set()
+        self._snapshotVersion: str | None = None
+        self._handshakeStartedAt: float | None = None
+        # seconds from port open to CONNECTED for the last handshake
+        self.timeToReady: float | None = None
+        self._statsLoggedAt = self._clock()
+
+    def _savedStates(self) -> dict:
+        states = self._settings.get_item(FlooStateMachine.STREAMING_STATE_KEY)
+        return dict(states) if isinstance(states, dict) else {}
+
+    def _deviceKey(self) -> str | None:
+        """What the dongle's saved state is filed under; tty names move between dongles."""
+        if self.key is not None:
+            return self.key
+        key: str | None = self.inf.port_key
+        return key
+
+    def _load_saved_state(self, key: str):
+        """Reconnect to the stream dongle ``key`` had when the app last ran, once connected."""
+        if self._sourceStateBeforeDisconnect is not None:
+            # unplugged and back within this run; that state is newer
+            return
+        saved_state = self._savedStates().get(key)
         if saved_state is not None and saved_state >= SourceState.STREAMING_START:
-            logger.info("Restored last streaming state: %s", saved_state)
+            logger.info("Restored last streaming state of %s: %s", key, saved_state)
             self._sourceStateBeforeDisconnect = saved_state
-            self._clearSavedState()
+            self._clearSavedState(key)
+
+    def _post(self, func, *args):
+        """Queue a delegate call for the GUI thread.
+
+        Calls queued before the GUI thread runs the pending flush are
+        delivered together as one state delta, see :meth:`_flushDelta`.
+        """
+        with self._deltaLock:
+            self._delta.append((func, args))
+            if self._deltaPosted:
+                return
+            self._deltaPosted = True
+        if self._callAfter is not None:
+            self._callAfter(self._flushDelta)
+        else:
+            _wx_call_after(self._flushDelta)
+
+    def _flushDelta(self):
+        """Run the queued delegate calls between beginStateDelta and endStateDelta."""
+        with self._deltaLock:
+            delta, self._delta = self._delta, []
+            self._deltaPosted = False
+        replaceable = self._replaceable
+        last = {func: i for i, (func, _) in enumerate(delta) if func in replaceable}
+        self.delegate.beginStateDelta()
+        try:
+            for i, (func, args) in enumerate(delta):
+                if func in replaceable and last[func] != i:
+                    continue
+                try:
+                    func(*args)
+                except Exception:
+                    logger.exception("Delegate call %s failed", getattr(func, "__name__", func))
+        finally:
+            self.delegate.endStateDelta()
+
+    def _postLater(self, delay_ms, func):
+        if self._callLater is not None:
+            return self._callLater(delay_ms, func)
+        return _wx_call_later(delay_ms, func)
+
+    @property
+    def lastCmd(self) -> FlooMessage | None:
+        """The most recently sent command that is still waiting for its reply."""
+        cmd = self._commands.tail()
+        return cmd.msg if cmd is not None else None
 
     def reset(self):
         self.state = FlooStateMachine.INIT
-        self.lastCmd = None
-        self.pendingCmdPara = None
+        self._commands.clear("reset")
         self.a2dpSink = False
         self.feature = None
 
     def run(self):
         self.inf.run()
 
+    def _sendCommand(self, msg: FlooMessage, param=None) -> FlooPendingCommand:
+        return self._commands.submit(msg, param=param)
+
+    def _sendQuery(self, msg: FlooMessage) -> FlooPendingCommand:
+        return self._commands.submit(
+            msg, reply_header=msg.header, policy=FlooStateMachine.QUERY_POLICY
+        )
+
+    def _sendInitQuery(self, msgClass):
+        if msgClass is FlooMsgFn:
+            self._pairedFetch = []
+        self._sendQuery(msgClass(True))
+
+    def _pairedListDone(self) -> list[FlooPairedDeviceEdit]:
+        """Adopt the FN list just received; the edits from the previous one."""
+        fetched = FlooPairedDeviceList(self._pairedFetch)
+        self._pairedFetch = []
+        with self._lock:
+            edits = self.pairedDeviceList.diff(fetched)
+            self.pairedDeviceList = fetched
+            self.pairedDevices = fetched.names()
+        return edits
+
+    def _matchReply(self, message: FlooMessage) -> FlooPendingCommand | None:
+        if isinstance(message, FlooMsgFn):
+            # FN entries are parts of one reply; only the terminator completes it
+            return self._commands.match(message, final=message.btAddress is None)
+        return self._commands.match(message)
+
+    def _startHandshake(self):
+        self._handshakeStartedAt = self._clock()
+        self._handshakeRemaining.clear()
+        self._handshakeSteps = FlooStateMachine.INIT_SEQUENCE
+        self._sendInitQuery(FlooMsgVr)
+
+    def _handshakeSequence(self, version: str):
+        """The queries to wait for once the dongle reported ``version``."""
+        if (
+            self._snapshotVersion == version
+            and self.handshakeMode == FlooStateMachine.HANDSHAKE_PIPELINED
+        ):
+            return FlooStateMachine.FAST_INIT_SEQUENCE
+        return FlooStateMachine.INIT_SEQUENCE
+
+    def _restoreSnapshot(self, key: str, port: str):
+        """Show the last known state of dongle ``key`` until the handshake confirms it."""
+        self._snapshotVersion = None
+        snapshots = self._settings.get_item(FlooStateMachine.SNAPSHOT_KEY)
+        snapshot = snapshots.get(key) if isinstance(snapshots, dict) else None
+        if not isinstance(snapshot, dict):
+            return
+        names = list(snapshot.get("pairedDevices") or [])
+        addresses = list(snapshot.get("pairedAddresses") or [])
+        with self._lock:
+            for name in FlooStateMachine.SNAPSHOT_FIELDS:
+                setattr(self, name, snapshot.get(name))
+            if len(addresses) == len(names):
+                # the next FN list is diffed against these
+                self.pairedDeviceList = FlooPairedDeviceList(
+                    FlooPairedDevice(address, name)
+                    for address, name in zip(addresses, names, strict=True)
+                )
+                self.pairedDevices = self.pairedDeviceList.names()
+            else:
+                self.pairedDevices = names
+        self._snapshotVersion = self.version
+        logger.info("Restored last known state of %s (firmware %s)", key, self.version)
+        self._post(self.delegate.cachedStateInd, port, dict(snapshot))
+        self._setStale(set(FlooStateMachine.SNAPSHOT_FIELDS))
+
+    def _saveSnapshot(self):
+        """Persist the state of the connected dongle for the next plug-in; no-op if unchanged."""
+        key = self._deviceKey()
+        if self.state != FlooStateMachine.CONNECTED or key is None:
+            return
+        with self._lock:
+            snapshot = {name: getattr(self, name) for name in FlooStateMachine.SNAPSHOT_FIELDS}
+            snapshot["pairedDevices"] = list(self.pairedDevices)
+            snapshot["pairedAddresses"] = [device.address for device in self.pairedDeviceList]
+        snapshots = self._settings.get_item(FlooStateMachine.SNAPSHOT_KEY)
+        if not isinstance(snapshots, dict):
+            snapshots = {}
+        if snapshots.get(key) == snapshot:
+            return
+        self._settings.set_item(FlooStateMachine.SNAPSHOT_KEY, {**snapshots, key: snapshot})
+        self._settings.save()
+
+    def _setStale(self, fields: set[str]):
+        if fields != self.staleFields:
+            self.staleFields = fields
+            self._post(self.delegate.staleStateInd, sorted(fields))
+
+    def _confirm(self, step: type[FlooMessage]):
+        """The dongle reported the value ``step`` queries; it is no longer stale."""
+        name = _SNAPSHOT_FIELD_OF.get(step)
+        if name in self.staleFields:
+            self._setStale(self.staleFields - {name})
+
+    def _initStepDone(self, step: type[FlooMessage]):
+        """Move the handshake on once ``step`` was answered or given up on."""
+        if self.handshakeMode == FlooStateMachine.HANDSHAKE_PIPELINED:
+            if step is FlooMsgVr:
+                # the dongle is talking; the remaining queries are independent
+                self._handshakeRemaining = set(self._handshakeSteps[1:])
+                for msgClass in self._handshakeSteps[1:]:
+                    self._sendInitQuery(msgClass)
+                return
+            self._handshakeRemaining.discard(step)
+            if not self._handshakeRemaining:
+                self._handshakeDone()
+            return
+        index = self._handshakeSteps.index(step)
+        if index + 1 < len(self._handshakeSteps):
+            self._sendInitQuery(self._handshakeSteps[index + 1])
+        else:
+            self._handshakeDone()
+
+    def _handshakeDone(self):
+        self.state = FlooStateMachine.CONNECTED
+        if self._handshakeStartedAt is not None:
+            self.timeToReady = self._clock() - self._handshakeStartedAt
+            self._handshakeStartedAt = None
+            logger.info(
+                "Handshake (%s) ready in %.1f ms", self.handshakeMode, self.timeToReady * 1000
+            )
+        if self._handshakeSteps is FlooStateMachine.FAST_INIT_SEQUENCE:
+            # the cached settings are shown already; confirm them in the background
+            for msgClass in FlooStateMachine.CONFIRM_SEQUENCE:
+                self._sendQuery(msgClass(True))
+        self._saveSnapshot()
+        self._attemptAutoReconnect()
+
+    def _handshakeStepFailed(self, cmd: FlooPendingCommand):
+        """Skip a handshake query the dongle rejected or never answered."""
+        step = type(cmd.msg)
+        if step not in FlooStateMachine.INIT_SEQUENCE:
+            return
+        if step is FlooMsgVr:
+            # nothing works without the version; start over
+            logger.warning("Handshake: no version reply, restarting")
+            self._sendInitQuery(FlooMsgVr)
+            return
+        logger.warning("Handshake: %s failed, skipping", cmd.header)
+        self._initStepDone(step)
+
+    def commandStats(self) -> dict[str, FlooCommandStats]:
+        """Outcome counts and round-trip histograms per command header, since start."""
+        return self._commands.command_stats()
+
+    def _logCommandStats(self):
+        now = self._clock()
+        if now - self._statsLoggedAt < FlooStateMachine.STATS_LOG_INTERVAL:
+            return
+        self._statsLoggedAt = now
+        stats = self._commands.command_stats()
+        if stats:
+            logger.info(
+                "Command round trips: %s",
+                "; ".join(stats[header].summary() for header in sorted(stats)),
+            )
+
+    def pollTimeout(self) -> float | None:
+        return self._commands.time_until_deadline()
+
+    def pollTimers(self):
+        self._logCommandStats()
+        for cmd in self._commands.expire():
+            if self.state == FlooStateMachine.INIT:
+                self._handshakeStepFailed(cmd)
+            else:
+                self._commandFailed(cmd)
+
+    def messageSuperseded(self, message: FlooMessage):
+        # only the newest value will be acknowledged, and it carries its own param
+        self._commands.discard(message)
+
     def interfaceState(self, enabled: bool, port: str):
         if enabled and self.state == FlooStateMachine.INIT:
-            cmdReadVersion = FlooMsgVr(True)
-            self.inf.sendMsg(cmdReadVersion)
-            self.lastCmd = cmdReadVersion
+            key = self._deviceKey() or port
+            self._load_saved_state(key)
+            self._restoreSnapshot(key, port)
+            self._startHandshake()
         elif not enabled:
             logger.info("Device disconnected, saving sourceState=%s", self.sourceState)
             self._sourceStateBeforeDisconnect = self.sourceState
-            self.lastCmd = None
-            self.pendingCmdPara = None
+            self._commands.clear("device disconnected")
             self.state = FlooStateMachine.INIT
-            _wx_call_after(self.delegate.deviceDetected, False, None)
+            self._setStale(set())
+            self._post(self.delegate.deviceDetected, False, None)
 
     def connectionError(self, error: str):
-        _wx_call_after(self.delegate.connectionErrorInd, error)
+        self._post(self.delegate.connectionErrorInd, error)
 
     def handleMessage(self, message: FlooMessage):
         logger.debug("handleMessage %s", message.header)
+        cmd = self._matchReply(message)
+        self._logCommandStats()
+        cmdMsg = cmd.msg if cmd is not None else None
         if self.state == FlooStateMachine.INIT:
             if isinstance(message, FlooMsgVr):
-                if isinstance(self.lastCmd, FlooMsgVr):
+                if isinstance(cmdMsg, FlooMsgVr):
                     if message.verStr.startswith("AS"):
                         self.a2dpSink = True
                     else:
                         self.a2dpSink = False
-                    _wx_call_after(
+                    self.version = message.verStr
+                    self._post(
                         self.delegate.deviceDetected, True, self.inf.port_name, message.verStr
                     )
-                    cmdGetAudioMode = FlooMsgAm(True)
-                    self.inf.sendMsg(cmdGetAudioMode)
-                    self.lastCmd = cmdGetAudioMode
-            elif isinstance(message, FlooMsgAm):
-                if isinstance(self.lastCmd, FlooMsgAm):
-                    self.audioMode = message.mode
-                    _wx_call_after(self.delegate.audioModeInd, message.mode)
-                    cmdGetSourceState = FlooMsgSt(True)
-                    self.inf.sendMsg(cmdGetSourceState)
-                    self.lastCmd = cmdGetSourceState
+                    self._confirm(FlooMsgVr)
+                    self._handshakeSteps = self._handshakeSequence(message.verStr)
+                    self._initStepDone(FlooMsgVr)
+            elif isinstance(message, (FlooMsgAm, FlooMsgLf, FlooMsgBm, FlooMsgBn)):
+                if type(cmdMsg) is type(message):
+                    self._applySetting(message)
+                    self._initStepDone(type(message))
             elif isinstance(message, FlooMsgSt):
                 logger.debug("ST message: state=%s", message.state)
                 self.sourceState = message.state
-                _wx_call_after(self.delegate.sourceStateInd, message.state)
-                if isinstance(self.lastCmd, FlooMsgSt):
-                    cmdGetLeaState = FlooMsgLa(True)
-                    self.inf.sendMsg(cmdGetLeaState)
-                    self.lastCmd = cmdGetLeaState
+                self._post(self.delegate.sourceStateInd, message.state)
+                if isinstance(cmdMsg, FlooMsgSt):
+                    self._initStepDone(FlooMsgSt)
             elif isinstance(message, FlooMsgLa):
-                if isinstance(self.lastCmd, FlooMsgLa):
-                    _wx_call_after(self.delegate.leAudioStateInd, message.state)
-                    cmdGetPreferLea = FlooMsgLf(True)
-                    self.inf.sendMsg(cmdGetPreferLea)
-                    self.lastCmd = cmdGetPreferLea
-            elif isinstance(message, FlooMsgLf):
-                if isinstance(self.lastCmd, FlooMsgLf):
-                    _wx_call_after(self.delegate.preferLeaInd, message.mode)
-                    cmdGetBroadcastMode = FlooMsgBm(True)
-                    self.inf.sendMsg(cmdGetBroadcastMode)
-                    self.lastCmd = cmdGetBroadcastMode
-            elif isinstance(message, FlooMsgBm):
-                if isinstance(self.lastCmd, FlooMsgBm):
-                    self.broadcastMode = message.mode
-                    _wx_call_after(self.delegate.broadcastModeInd, message.mode)
-                    cmdGetBroadcastName = FlooMsgBn(True)
-                    self.inf.sendMsg(cmdGetBroadcastName)
-                    self.lastCmd = cmdGetBroadcastName
-            elif isinstance(message, FlooMsgBn):
-                if isinstance(self.lastCmd, FlooMsgBn):
-                    self.broadcastName = message.name
-                    _wx_call_after(self.delegate.broadcastNameInd, message.name)
-                    with self._lock:
-                        self.pairedDevices.clear()
-                    cmdGetDeviceName = FlooMsgFn(True)
-                    self.inf.sendMsg(cmdGetDeviceName)
-                    self.lastCmd = cmdGetDeviceName
+                if isinstance(cmdMsg, FlooMsgLa):
+                    self.leAudioState = message.state
+                    self._post(self.delegate.leAudioStateInd, message.state)
+                    self._initStepDone(FlooMsgLa)
             elif isinstance(message, FlooMsgFn):
-                if isinstance(self.lastCmd, FlooMsgFn):
+                if isinstance(cmdMsg, FlooMsgFn):
                     if message.btAddress is None:
                         # end of the device list
-                        _wx_call_after(
-                            self.delegate.pairedDevicesUpdateInd, list(self.pairedDevices)
-                        )
-                        cmdGetFeature = FlooMsgFt(True)
-                        self.inf.sendMsg(cmdGetFeature)
-                        self.lastCmd = cmdGetFeature
+                        self._pairedListDone()
+                        self._post(self.delegate.pairedDevicesUpdateInd, list(self.pairedDevices))
+                        self._confirm(FlooMsgFn)
+                        self._initStepDone(FlooMsgFn)
                     else:
-                        with self._lock:
-                            self.pairedDevices.append(message.name)
+                        self._pairedFetch.append(FlooPairedDevice(message.btAddress, message.name))
             elif isinstance(message, FlooMsgFt):
-                if isinstance(self.lastCmd, FlooMsgFt) and message.feature is not None:
+                if isinstance(cmdMsg, FlooMsgFt) and message.feature is not None:
                     self.feature = message.feature
-                    _wx_call_after(self.delegate.ledEnabledInd, message.feature & FeatureBit.LED)
-                    _wx_call_after(
+                    self._post(self.delegate.ledEnabledInd, message.feature & FeatureBit.LED)
+                    self._post(
                         self.delegate.aptxLosslessEnabledInd,
                         1
                         if (message.feature & FeatureBit.APTX_LOSSLESS) == FeatureBit.APTX_LOSSLESS
                         else 0,
                     )
-                    _wx_call_after(
+                    self._post(
                         self.delegate.gattClientEnabledInd,
                         1
                         if (self.feature & FeatureBit.GATT_CLIENT) == FeatureBit.GATT_CLIENT
                         else 0,
                     )
-                    _wx_call_after(
+                    self._post(
                         self.delegate.audioSourceInd,
                         1
                         if (self.feature & FeatureBit.AUDIO_SOURCE) == FeatureBit.AUDIO_SOURCE
                         else 0,
                     )
-                    cmdGetCodecInUse = FlooMsgAc(True)
-                    self.inf.sendMsg(cmdGetCodecInUse)
-                    self.lastCmd = cmdGetCodecInUse
-            elif isinstance(message, FlooMsgAc | FlooMsgEr):
-                if isinstance(self.lastCmd, FlooMsgAc) and isinstance(message, FlooMsgAc):
-                    _wx_call_after(
+                    self._confirm(FlooMsgFt)
+                    self._initStepDone(FlooMsgFt)
+            elif isinstance(message, FlooMsgAc):
+                if isinstance(cmdMsg, FlooMsgAc):
+                    self.codecInUse = message
+                    self._post(
                         self.delegate.audioCodecInUseInd,
                         message.codec,
                         message.rssi,
@@ -248,87 +595,61 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
                         message.transportDelay,
                         message.presentDelay,
                     )
-                    self.lastCmd = None
-                    self.state = FlooStateMachine.CONNECTED
-                    self._attemptAutoReconnect()
+                    self._initStepDone(FlooMsgAc)
+            elif isinstance(message, FlooMsgEr):
+                if cmd is not None:
+                    self._handshakeStepFailed(cmd)
 
         elif self.state == FlooStateMachine.CONNECTED:
             if isinstance(message, FlooMsgOk):
-                if isinstance(self.lastCmd, FlooMsgAm):
-                    self.audioMode = self.pendingCmdPara
-                    self.lastCmd = None
-                elif isinstance(self.lastCmd, FlooMsgLf):
-                    self.preferLea = self.pendingCmdPara
-                    self.lastCmd = None
-                elif isinstance(self.lastCmd, FlooMsgBm):
-                    self.broadcastMode = self.pendingCmdPara
-                    self.lastCmd = None
-                elif isinstance(self.lastCmd, FlooMsgBn):
-                    self.broadcastName = self.pendingCmdPara
-                    self.lastCmd = None
-                elif isinstance(self.lastCmd, FlooMsgBe):
-                    self.lastCmd = None
-                elif isinstance(self.lastCmd, FlooMsgCp):
-                    with self._lock:
-                        self.pairedDevices.clear()
-                    _wx_call_after(self.delegate.pairedDevicesUpdateInd, [])
-                elif isinstance(self.lastCmd, FlooMsgFt):
-                    self.feature = self.lastCmd.feature
-                    self.lastCmd = None
-                else:
-                    self.lastCmd = None
-                self.pendingCmdPara = None
+                if cmd is not None:
+                    self._commandSucceeded(cmd)
             elif isinstance(message, FlooMsgEr):
-                if isinstance(self.lastCmd, FlooMsgAm):
-                    _wx_call_after(self.delegate.audioModeInd, self.audioMode)
-                elif isinstance(self.lastCmd, FlooMsgLf):
-                    _wx_call_after(self.delegate.preferLeaInd, self.preferLea)
-                elif isinstance(self.lastCmd, FlooMsgBm):
-                    _wx_call_after(self.delegate.broadcastModeInd, self.broadcastMode)
-                elif isinstance(self.lastCmd, FlooMsgBn):
-                    _wx_call_after(self.delegate.broadcastNameInd, self.broadcastName)
-                elif isinstance(self.lastCmd, FlooMsgFt):
-                    _wx_call_after(self.delegate.ledEnabledInd, self.feature & FeatureBit.LED)
-                    _wx_call_after(
-                        self.delegate.aptxLosslessEnabledInd,
-                        1
-                        if (self.feature & FeatureBit.APTX_LOSSLESS) == FeatureBit.APTX_LOSSLESS
-                        else 0,
-                    )
-                    _wx_call_after(
-                        self.delegate.gattClientEnabledInd,
-                        1
-                        if (self.feature & FeatureBit.GATT_CLIENT) == FeatureBit.GATT_CLIENT
-                        else 0,
-                    )
-                self.lastCmd = None
-                self.pendingCmdPara = None
+                if cmd is not None:
+                    self._commandFailed(cmd)
             elif isinstance(message, FlooMsgSt):
                 logger.debug("ST message (CONNECTED): state=%s", message.state)
+                wasStreaming = self._isStreaming(self.sourceState)
                 self.sourceState = message.state
-                _wx_call_after(self.delegate.sourceStateInd, message.state)
+                self._post(self.delegate.sourceStateInd, message.state)
                 if (
                     message.state is not None
                     and message.state >= SourceState.STREAMING_START
                     and message.state != self._lastSavedState
+                    and self._deviceKey() is not None
                 ):
                     self._lastSavedState = message.state
-                    self._settings.set_item("last_streaming_state", message.state)
+                    self._settings.set_item(
+                        FlooStateMachine.STREAMING_STATE_KEY,
+                        {**self._savedStates(), self._deviceKey(): message.state},
+                    )
                     self._settings.save()
-                if message.state in (SourceState.STREAMING_START, SourceState.STREAMING):
+                if self._isStreaming(message.state) and not wasStreaming:
+                    # the device that starts streaming moves to the top of the list
                     self.getRecentlyUsedDevices()
             elif isinstance(message, FlooMsgLa):
-                _wx_call_after(self.delegate.leAudioStateInd, message.state)
+                self.leAudioState = message.state
+                self._post(self.delegate.leAudioStateInd, message.state)
+            elif isinstance(message, (FlooMsgAm, FlooMsgLf, FlooMsgBm, FlooMsgBn)):
+                # a confirmation query sent after a handshake from the snapshot
+                if cmd is not None and type(cmdMsg) is type(message):
+                    self._applySetting(message)
+                    self._saveSnapshot()
             elif isinstance(message, FlooMsgFn):
                 if message.btAddress is None:
-                    # end of the device list
-                    _wx_call_after(self.delegate.pairedDevicesUpdateInd, list(self.pairedDevices))
-                    self.lastCmd = None
+                    # end of the device list; the GUI only applies what changed
+                    edits = self._pairedListDone()
+                    if edits:
+                        self._post(
+                            self.delegate.pairedDevicesDiffInd, edits, list(self.pairedDevices)
+                        )
+                    self._confirm(FlooMsgFn)
+                    self._saveSnapshot()
                 else:
-                    with self._lock:
-                        self.pairedDevices.append(message.name)
+                    self._pairedFetch.append(FlooPairedDevice(message.btAddress, message.name))
             elif isinstance(message, FlooMsgAc):
-                _wx_call_after(
+                self.codecInUse = message
+                self._post(
                     self.delegate.audioCodecInUseInd,
                     message.codec,
                     message.rssi,
@@ -341,33 +662,87 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
                 )
             elif isinstance(message, FlooMsgFt) and message.feature is not None:
                 self.feature = message.feature
-                _wx_call_after(self.delegate.ledEnabledInd, self.feature & FeatureBit.LED)
-                _wx_call_after(
+                self._post(self.delegate.ledEnabledInd, self.feature & FeatureBit.LED)
+                self._post(
                     self.delegate.aptxLosslessEnabledInd,
                     1
                     if (self.feature & FeatureBit.APTX_LOSSLESS) == FeatureBit.APTX_LOSSLESS
                     else 0,
                 )
-                _wx_call_after(
+                self._post(
                     self.delegate.gattClientEnabledInd,
                     1 if (self.feature & FeatureBit.GATT_CLIENT) == FeatureBit.GATT_CLIENT else 0,
                 )
+                self._confirm(FlooMsgFt)
+                self._saveSnapshot()
+
+    def _applySetting(self, message: FlooMessage):
+        """Store and show an AM, LF, BM or BN report of the dongle."""
+        if isinstance(message, FlooMsgAm):
+            self.audioMode = message.mode
+            self._post(self.delegate.audioModeInd, message.mode)
+        elif isinstance(message, FlooMsgLf):
+            self.preferLea = message.mode
+            self._post(self.delegate.preferLeaInd, message.mode)
+        elif isinstance(message, FlooMsgBm):
+            self.broadcastMode = message.mode
+            self._post(self.delegate.broadcastModeInd, message.mode)
+        elif isinstance(message, FlooMsgBn):
+            self.broadcastName = message.name
+            self._post(self.delegate.broadcastNameInd, message.name)
+        self._confirm(type(message))
+
+    def _commandSucceeded(self, cmd: FlooPendingCommand):
+        """Apply the value of a setter the dongle acknowledged with OK."""
+        if isinstance(cmd.msg, FlooMsgAm):
+            self.audioMode = cmd.param
+        elif isinstance(cmd.msg, FlooMsgLf):
+            self.preferLea = cmd.param
+        elif isinstance(cmd.msg, FlooMsgBm):
+            self.broadcastMode = cmd.param
+        elif isinstance(cmd.msg, FlooMsgBn):
+            self.broadcastName = cmd.param
+        elif isinstance(cmd.msg, FlooMsgCp):
+            with self._lock:
+                self.pairedDevices = []
+                self.pairedDeviceList = FlooPairedDeviceList()
+            self._post(self.delegate.pairedDevicesUpdateInd, [])
+        elif isinstance(cmd.msg, FlooMsgFt):
+            self.feature = cmd.msg.feature
+        self._saveSnapshot()
+
+    def _commandFailed(self, cmd: FlooPendingCommand):
+        """Restore the GUI after a setter was rejected with ER or timed out."""
+        if isinstance(cmd.msg, FlooMsgAm):
+            self._post(self.delegate.audioModeInd, self.audioMode)
+        elif isinstance(cmd.msg, FlooMsgLf):
+            self._post(self.delegate.preferLeaInd, self.preferLea)
+        elif isinstance(cmd.msg, FlooMsgBm):
+            self._post(self.delegate.broadcastModeInd, self.broadcastMode)
+        elif isinstance(cmd.msg, FlooMsgBn):
+            self._post(self.delegate.broadcastNameInd, self.broadcastName)
+        elif isinstance(cmd.msg, FlooMsgFt) and self.feature is not None:
+            self._post(self.delegate.ledEnabledInd, self.feature & FeatureBit.LED)
+            self._post(
+                self.delegate.aptxLosslessEnabledInd,
+                1 if (self.feature & FeatureBit.APTX_LOSSLESS) == FeatureBit.APTX_LOSSLESS else 0,
+            )
+            self._post(
+                self.delegate.gattClientEnabledInd,
+                1 if (self.feature & FeatureBit.GATT_CLIENT) == FeatureBit.GATT_CLIENT else 0,
+            )
 
     def setAudioMode(self, mode: int):
         with self._lock:
             if self.state == FlooStateMachine.CONNECTED:
                 cmdSetAudioMode = FlooMsgAm(True, mode)
-                self.pendingCmdPara = mode
-                self.lastCmd = cmdSetAudioMode
-                self.inf.sendMsg(cmdSetAudioMode)
+                self._sendCommand(cmdSetAudioMode, mode)
 
     def setPreferLea(self, enable: bool):
         with self._lock:
             if self.state == FlooStateMachine.CONNECTED:
                 cmdPreferLea = FlooMsgLf(True, 1 if enable else 0)
-                self.pendingCmdPara = enable
-                self.lastCmd = cmdPreferLea
-                self.inf.sendMsg(cmdPreferLea)
+                self._sendCommand(cmdPreferLea, enable)
 
     def setPublicBroadcast(self, enable: bool):
         with self._lock:
@@ -375,12 +750,11 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
             oldValue = self.broadcastMode & bit != 0
             if oldValue != enable:
                 logger.debug("setPublicBroadcast")
-                self.pendingCmdPara = (self.broadcastMode & ~bit & BroadcastModeBit.ALL_MASK) | (
+                newMode = (self.broadcastMode & ~bit & BroadcastModeBit.ALL_MASK) | (
                     bit if enable else 0
                 )
-                cmdSetBroadcastMode = FlooMsgBm(True, self.pendingCmdPara)
-                self.lastCmd = cmdSetBroadcastMode
-                self.inf.sendMsg(cmdSetBroadcastMode)
+                cmdSetBroadcastMode = FlooMsgBm(True, newMode)
+                self._sendCommand(cmdSetBroadcastMode, newMode)
 
     def setBroadcastHighQuality(self, enable: bool):
         with self._lock:
@@ -388,12 +762,11 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
             oldValue = self.broadcastMode & bit != 0
             if oldValue != enable:
                 logger.debug("setBroadcastHighQuality")
-                self.pendingCmdPara = (self.broadcastMode & ~bit & BroadcastModeBit.ALL_MASK) | (
+                newMode = (self.broadcastMode & ~bit & BroadcastModeBit.ALL_MASK) | (
                     bit if enable else 0
                 )
-                cmdSetBroadcastMode = FlooMsgBm(True, self.pendingCmdPara)
-                self.lastCmd = cmdSetBroadcastMode
-                self.inf.sendMsg(cmdSetBroadcastMode)
+                cmdSetBroadcastMode = FlooMsgBm(True, newMode)
+                self._sendCommand(cmdSetBroadcastMode, newMode)
 
     def setBroadcastEncrypt(self, enable: bool):
         with self._lock:
@@ -401,12 +774,11 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
             oldValue = self.broadcastMode & bit != 0
             if oldValue != enable:
                 logger.debug("setBroadcastEncrypt old: %d, new %d", oldValue, enable)
-                self.pendingCmdPara = (self.broadcastMode & ~bit & BroadcastModeBit.ALL_MASK) | (
+                newMode = (self.broadcastMode & ~bit & BroadcastModeBit.ALL_MASK) | (
                     bit if enable else 0
                 )
-                cmdSetBroadcastMode = FlooMsgBm(True, self.pendingCmdPara)
-                self.lastCmd = cmdSetBroadcastMode
-                self.inf.sendMsg(cmdSetBroadcastMode)
+                cmdSetBroadcastMode = FlooMsgBm(True, newMode)
+                self._sendCommand(cmdSetBroadcastMode, newMode)
 
     def setBroadcastStopOnIdle(self, enable: bool):
         with self._lock:
@@ -414,12 +786,11 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
             oldValue = self.broadcastMode & bit != 0
             if oldValue != enable:
                 logger.debug("setBroadcastStopOnIdle old: %d, new %d", oldValue, enable)
-                self.pendingCmdPara = (self.broadcastMode & ~bit & BroadcastModeBit.ALL_MASK) | (
+                newMode = (self.broadcastMode & ~bit & BroadcastModeBit.ALL_MASK) | (
                     bit if enable else 0
                 )
-                cmdSetBroadcastMode = FlooMsgBm(True, self.pendingCmdPara)
-                self.lastCmd = cmdSetBroadcastMode
-                self.inf.sendMsg(cmdSetBroadcastMode)
+                cmdSetBroadcastMode = FlooMsgBm(True, newMode)
+                self._sendCommand(cmdSetBroadcastMode, newMode)
 
     def setBroadcastLatency(self, mode: int):
         with self._lock:
@@ -428,55 +799,45 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
             ) >> BroadcastModeBit.LATENCY_SHIFT
             if oldValue != mode:
                 logger.debug("setBroadcastLatency old: %d, new %d", oldValue, mode)
-                self.pendingCmdPara = (self.broadcastMode & BroadcastModeBit.FLAGS_MASK) | (
+                newMode = (self.broadcastMode & BroadcastModeBit.FLAGS_MASK) | (
                     mode << BroadcastModeBit.LATENCY_SHIFT
                 )
-                cmdSetBroadcastMode = FlooMsgBm(True, self.pendingCmdPara)
-                self.lastCmd = cmdSetBroadcastMode
-                self.inf.sendMsg(cmdSetBroadcastMode)
+                cmdSetBroadcastMode = FlooMsgBm(True, newMode)
+                self._sendCommand(cmdSetBroadcastMode, newMode)
 
     def setBroadcastName(self, name: str):
         with self._lock:
             if self.state == FlooStateMachine.CONNECTED:
                 cmdSetBroadcastName = FlooMsgBn(True, name)
-                self.pendingCmdPara = name
-                self.lastCmd = cmdSetBroadcastName
-                self.inf.sendMsg(cmdSetBroadcastName)
+                self._sendCommand(cmdSetBroadcastName, name)
 
     def setBroadcastKey(self, key: str):
         with self._lock:
             if self.state == FlooStateMachine.CONNECTED:
                 cmdSetBroadcastKey = FlooMsgBe(True, key)
-                self.pendingCmdPara = key
-                self.lastCmd = cmdSetBroadcastKey
-                self.inf.sendMsg(cmdSetBroadcastKey)
+                self._sendCommand(cmdSetBroadcastKey, key)
 
     def setNewPairing(self):
         with self._lock:
             if self.state == FlooStateMachine.CONNECTED:
                 if self.a2dpSink:
                     cmdSetDiscoverable = FlooMsgMd(True, 1)
-                    self.pendingCmdPara = 1
-                    self.lastCmd = cmdSetDiscoverable
-                    self.inf.sendMsg(cmdSetDiscoverable)
+                    self._sendCommand(cmdSetDiscoverable, 1)
                 else:
                     cmdStartNewPairing = FlooMsgIq()
-                    self.lastCmd = cmdStartNewPairing
-                    self.inf.sendMsg(cmdStartNewPairing)
+                    self._sendCommand(cmdStartNewPairing)
 
     def clearAllPairedDevices(self):
         with self._lock:
             if self.state == FlooStateMachine.CONNECTED:
                 cmdClearAllPairedDevices = FlooMsgCp()
-                self.lastCmd = cmdClearAllPairedDevices
-                self.inf.sendMsg(cmdClearAllPairedDevices)
+                self._sendCommand(cmdClearAllPairedDevices)
 
     def clearIndexedDevice(self, index: int):
         with self._lock:
             if self.state == FlooStateMachine.CONNECTED:
                 cmdClearIndexedDevice = FlooMsgCp(index)
-                self.lastCmd = cmdClearIndexedDevice
-                self.inf.sendMsg(cmdClearIndexedDevice)
+                self._sendCommand(cmdClearIndexedDevice)
 
     def _attemptAutoReconnect(self):
         prevState = self._sourceStateBeforeDisconnect
@@ -493,9 +854,13 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
             logger.debug("Auto-reconnect skipped: conditions not met")
         self._sourceStateBeforeDisconnect = None
 
-    def _clearSavedState(self):
+    def _clearSavedState(self, key: str | None = None):
         self._lastSavedState = None
-        self._settings.set_item("last_streaming_state", None)
+        key = key if key is not None else self._deviceKey()
+        states = self._savedStates()
+        if states.pop(key, None) is None:
+            return
+        self._settings.set_item(FlooStateMachine.STREAMING_STATE_KEY, states)
         self._settings.save()
 
     def _cancelReconnectTimer(self):
@@ -521,12 +886,13 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
             logger.debug("Auto-reconnect: already connected (state=%s)", self.sourceState)
             return
         self._cancelReconnectTimer()
+        self.reconnectsScheduled += 1
         delay = RETRY_DELAYS[min(self._reconnectAttempts, len(RETRY_DELAYS) - 1)]
         logger.debug(
             "Auto-reconnect: scheduling attempt %d in %dms", self._reconnectAttempts + 1, delay
         )
-        _wx_call_after(
-            lambda: setattr(self, "_reconnectTimer", _wx_call_later(delay, self._doReconnect))
+        self._post(
+            lambda: setattr(self, "_reconnectTimer", self._postLater(delay, self._doReconnect))
         )
 
     def _doReconnect(self):
@@ -540,7 +906,7 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
             return
         logger.debug("Auto-reconnect: attempt %d, toggling device 0", self._reconnectAttempts)
         self.toggleConnection(0)
-        _wx_call_after(lambda: _wx_call_later(3000, self._checkReconnectResult))
+        self._post(lambda: self._postLater(3000, self._checkReconnectResult))
 
     def _checkReconnectResult(self):
         if self.sourceState >= SourceState.STREAMING_START:
@@ -550,20 +916,25 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
             logger.debug("Auto-reconnect: still idle, scheduling retry")
             self._scheduleReconnect()
 
+    @staticmethod
+    def _isStreaming(state) -> bool:
+        return state in (SourceState.STREAMING_START, SourceState.STREAMING)
+
     def getRecentlyUsedDevices(self):
         with self._lock:
             if self.state == FlooStateMachine.CONNECTED:
-                self.pairedDevices.clear()
+                if self._commands.waiting_for("FN"):
+                    # the list on its way is at least as new
+                    return
+                self._pairedFetch = []
                 cmdGetDeviceName = FlooMsgFn(True)
-                self.lastCmd = cmdGetDeviceName
-                self.inf.sendMsg(cmdGetDeviceName)
+                self._sendQuery(cmdGetDeviceName)
 
     def toggleConnection(self, index: int):
         with self._lock:
             if self.state == FlooStateMachine.CONNECTED:
                 cmdToggleConnection = FlooMsgTc(index)
-                self.lastCmd = cmdToggleConnection
-                self.inf.sendMsg(cmdToggleConnection)
+                self._sendCommand(cmdToggleConnection)
 
     def enableLed(self, onOff: int):
         with self._lock:
@@ -574,9 +945,7 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
                     FeatureBit.LED if onOff else 0
                 )
                 cmdLedOnOff = FlooMsgFt(True, feature)
-                self.pendingCmdPara = feature
-                self.lastCmd = cmdLedOnOff
-                self.inf.sendMsg(cmdLedOnOff)
+                self._sendCommand(cmdLedOnOff, feature)
 
     def enableAptxLossless(self, onOff: int):
         with self._lock:
@@ -587,8 +956,7 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
                     FeatureBit.APTX_LOSSLESS if onOff else 0
                 )
                 cmdLosslessOnOff = FlooMsgFt(True, feature)
-                self.lastCmd = cmdLosslessOnOff
-                self.inf.sendMsg(cmdLosslessOnOff)
+                self._sendCommand(cmdLosslessOnOff)
 
     def enableGattClient(self, onOff: int):
         with self._lock:
@@ -599,8 +967,7 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
                     FeatureBit.GATT_CLIENT if onOff else 0
                 )
                 cmdGattClientOnOff = FlooMsgFt(True, feature)
-                self.lastCmd = cmdGattClientOnOff
-                self.inf.sendMsg(cmdGattClientOnOff)
+                self._sendCommand(cmdGattClientOnOff)
 
     def enableUsbInput(self, onOff: int):
         with self._lock:
@@ -611,6 +978,4 @@ class FlooStateMachine(FlooInterfaceDelegate, Thread):
                     FeatureBit.AUDIO_SOURCE if onOff else 0
                 )
                 cmdUsbInputOnOff = FlooMsgFt(True, feature)
-                self.pendingCmdPara = feature
-                self.lastCmd = cmdUsbInputOnOff
-                self.inf.sendMsg(cmdUsbInputOnOff)
+                self._sendCommand(cmdUsbInputOnOff, feature)
@@ -1,8 +1,24 @@
 class FlooStateMachineDelegate:
+    def beginStateDelta(self):
+        """Called before a batch of the indications below; a GUI can hold its layout."""
+        pass
+
+    def endStateDelta(self):
+        """Called after the batch, e.g. to lay out what changed once."""
+        pass
+
     def deviceDetected(self, flag: bool, port: str, version: str | None = None):
         """Called when FlooGoo device connection state changes."""
         pass
 
+    def cachedStateInd(self, port: str, snapshot: dict):
+        """Called with the last known state of the dongle on port, before the handshake."""
+        pass
+
+    def staleStateInd(self, fields: list[str]):
+        """Called when the set of cached values not yet confirmed by the dongle changes."""
+        pass
+
     def audioModeInd(self, mode: int):
         """Called when FlooGoo device reports current audio mode."""
         pass
@@ -31,7 +47,13 @@ class FlooStateMachineDelegate:
         """Called when FlooGoo device reports current paired devices list"""
         pass
 
-    def audioCodecInUseInd(self, codec, rssi, rate, spkSampleRate, micSampleRate):
+    def pairedDevicesDiffInd(self, edits, pairedDevices):
+        """Called with the edits that turn the last reported paired devices list into the new one"""
+        pass
+
+    def audioCodecInUseInd(
+        self, codec, rssi, rate, spkSampleRate, micSampleRate, sduInt, transportDelay, presentDelay
+    ):
         """Called when FlooGoo device reports current in use audio codec"""
         pass
 
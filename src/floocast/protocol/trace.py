@@ -0,0 +1,301 @@
+"""Binary recorder for every frame crossing the FlooInterface boundary.
+
+A trace file starts with :data:`MAGIC` and holds a sequence of records, each
+a 12-byte little-endian header followed by the frame bytes (terminator
+stripped)::
+
+    kind: u8   INBOUND, OUTBOUND or PORT
+    port: u8   port id, declared by a PORT record carrying the port name
+    size: u16  length of the data that follows
+    time: u64  time.monotonic_ns() when the frame was read or written
+
+Set ``FLOOCAST_TRACE=/path/to/file`` to record every dongle of the process
+into one trace; ``FLOOCAST_TRACE_MAX_BYTES`` and ``FLOOCAST_TRACE_BACKUPS``
+control rotation.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import struct
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from typing import BinaryIO
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"FLTR\x01"
+
+INBOUND = 0
+OUTBOUND = 1
+PORT = 2
+
+_RECORD = struct.Struct("<BBHQ")
+_MAX_DATA = 0xFFFF
+
+
+@dataclass(frozen=True)
+class FlooTraceRecord:
+    """One frame read back from a trace."""
+
+    time_ns: int
+    direction: int
+    port: str
+    data: bytes
+
+
+@dataclass
+class FlooTraceStats:
+    """Recorder counters; written under the recorder's lock, readable from any thread."""
+
+    recorded: int = 0
+    # frames thrown away because the writer thread fell behind
+    dropped: int = 0
+    written_bytes: int = 0
+    rotations: int = 0
+    # time spent in record() on the calling thread
+    record_total_ns: int = 0
+    started_ns: int = field(default_factory=time.monotonic_ns)
+
+    def mean_record_ns(self) -> float:
+        calls = self.recorded + self.dropped
+        if calls == 0:
+            return 0.0
+        return self.record_total_ns / calls
+
+
+class FlooTraceRecorder:
+    """Write frames to a rotating binary trace from a background thread.
+
+    :meth:`record` only appends to an in-memory list under a lock, so the
+    serial reader never waits for the disk. The writer thread lets frames
+    collect for up to ``FLUSH_INTERVAL`` (or ``BATCH`` frames), then packs
+    them into one buffer and writes it in a single call; waking once per
+    batch rather than once per read keeps it from competing with the reader
+    for the GIL. When more than ``max_queue`` frames are waiting, new ones
+    are dropped and counted instead of blocking the caller.
+
+    Once the file would grow past ``max_bytes`` it is renamed to
+    ``path.1`` (older files shift up to ``path.<backups>``) and a new one is
+    started, so a long session keeps the most recent
+    ``(backups + 1) * max_bytes`` of traffic.
+    """
+
+    MAX_BYTES = 16 * 1024 * 1024
+    BACKUPS = 3
+    MAX_QUEUE = 65536
+    FLUSH_INTERVAL = 0.05
+    BATCH = 4096
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = MAX_BYTES,
+        backups: int = BACKUPS,
+        max_queue: int = MAX_QUEUE,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.max_queue = max_queue
+        self.stats = FlooTraceStats()
+        self._queue: list[tuple[int, str | None, bytes, int]] = []
+        self._cond = threading.Condition()
+        self._busy = False
+        self._stopped = False
+        self._flushing = 0
+        self._thread: threading.Thread | None = None
+        self._file: BinaryIO | None = None
+        self._size = 0
+        self._ports: dict[str | None, int] = {}
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="FlooTraceRecorder", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float | None = 2.0) -> None:
+        """Write out everything queued so far and close the file."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until every queued frame is in the file; False on timeout."""
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not self._queue and not self._busy, timeout)
+            finally:
+                self._flushing -= 1
+
+    def record(self, direction: int, port: str | None, data: bytes, time_ns: int) -> None:
+        """Queue one frame; never blocks on the disk."""
+        self.record_frames(direction, port, (data,), time_ns)
+
+    def record_frames(
+        self, direction: int, port: str | None, frames: Iterable[bytes], time_ns: int
+    ) -> None:
+        """Queue a burst of frames that share one timestamp, e.g. a single read."""
+        t0 = time.monotonic_ns()
+        with self._cond:
+            queue = self._queue
+            was_empty = not queue
+            for data in frames:
+                if len(queue) >= self.max_queue:
+                    self.stats.dropped += 1
+                    continue
+                queue.append((direction, port, data, time_ns))
+                self.stats.recorded += 1
+            if was_empty or len(queue) >= FlooTraceRecorder.BATCH:
+                self._cond.notify()
+            self.stats.record_total_ns += time.monotonic_ns() - t0
+
+    def _run(self) -> None:
+        try:
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._queue or self._stopped)
+                    self._cond.wait_for(self._batch_ready, FlooTraceRecorder.FLUSH_INTERVAL)
+                    if not self._queue and self._stopped:
+                        return
+                    batch, self._queue = self._queue, []
+                    self._busy = True
+                try:
+                    self._write_batch(batch)
+                except OSError as e:
+                    logger.warning("Error writing trace %s: %s", self.path, e)
+                finally:
+                    with self._cond:
+                        self._busy = False
+                        self._cond.notify_all()
+        finally:
+            self._close()
+
+    def _batch_ready(self) -> bool:
+        return self._stopped or self._flushing > 0 or len(self._queue) >= FlooTraceRecorder.BATCH
+
+    def _write_batch(self, batch: list[tuple[int, str | None, bytes, int]]) -> None:
+        out = bytearray()
+        for direction, port, data, time_ns in batch:
+            data = data[:_MAX_DATA]
+            size = _RECORD.size + len(data)
+            if self._file is None or self._size + len(out) + size > self.max_bytes:
+                self._write(out)
+                out.clear()
+                self._rotate()
+            port_id = self._ports.get(port)
+            if port_id is None:
+                port_id = self._declare(out, port, time_ns)
+            out += _RECORD.pack(direction, port_id, len(data), time_ns)
+            out += data
+        self._write(out)
+
+    def _declare(self, out: bytearray, port: str | None, time_ns: int) -> int:
+        port_id = len(self._ports) & 0xFF
+        self._ports[port] = port_id
+        name = (port or "").encode("utf-8")
+        out += _RECORD.pack(PORT, port_id, len(name), time_ns)
+        out += name
+        return port_id
+
+    def _write(self, data: bytearray) -> None:
+        if data and self._file is not None:
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+            with self._cond:
+                self.stats.written_bytes += len(data)
+
+    def _rotate(self) -> None:
+        rotating = self._file is not None
+        self._close()
+        # a trace left by an earlier session is kept as the first backup
+        if self.backups > 0 and os.path.exists(self.path):
+            for i in range(self.backups - 1, 0, -1):
+                older = f"{self.path}.{i}"
+                if os.path.exists(older):
+                    os.replace(older, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        if rotating:
+            with self._cond:
+                self.stats.rotations += 1
+        self._file = open(self.path, "wb")  # noqa: SIM115
+        self._file.write(MAGIC)
+        self._size = len(MAGIC)
+        # port ids are per file, so every file can be read on its own
+        self._ports = {}
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_shared_lock = threading.Lock()
+_shared: FlooTraceRecorder | None = None
+
+
+def recorder_from_environ() -> FlooTraceRecorder | None:
+    """The process-wide recorder configured by ``FLOOCAST_TRACE``, started on first use."""
+    global _shared
+    path = os.environ.get("FLOOCAST_TRACE")
+    if not path:
+        return None
+    with _shared_lock:
+        if _shared is None:
+            _shared = FlooTraceRecorder(
+                path,
+                max_bytes=int(
+                    os.environ.get("FLOOCAST_TRACE_MAX_BYTES", FlooTraceRecorder.MAX_BYTES)
+                ),
+                backups=int(os.environ.get("FLOOCAST_TRACE_BACKUPS", FlooTraceRecorder.BACKUPS)),
+            )
+            _shared.start()
+            logger.info("Recording protocol trace to %s", path)
+        return _shared
+
+
+def trace_files(path: str) -> list[str]:
+    """``path`` and its rotated predecessors, oldest first."""
+    files = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        files.append(f"{path}.{i}")
+        i += 1
+    files.reverse()
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def read_trace(path: str) -> Iterator[FlooTraceRecord]:
+    """Yield every frame in one trace file; a record cut short at the end is ignored."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a FlooCast trace")
+    ports: dict[int, str] = {}
+    pos = len(MAGIC)
+    header = _RECORD.size
+    while pos + header <= len(data):
+        kind, port_id, size, time_ns = _RECORD.unpack_from(data, pos)
+        pos += header
+        if pos + size > len(data):
+            break
+        payload = data[pos : pos + size]
+        pos += size
+        if kind == PORT:
+            ports[port_id] = payload.decode("utf-8")
+        else:
+            yield FlooTraceRecord(time_ns, kind, ports.get(port_id, ""), payload)
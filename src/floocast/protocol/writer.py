@@ -0,0 +1,236 @@
+"""Outbound command queue drained by a single writer thread."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+from floocast.protocol.messages import FlooMessage
+from floocast.protocol.pool import FlooWorkerPool
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FlooWriterStats:
+    """Writer counters for queue depth and enqueue-to-wire latency.
+
+    Counters are written under the writer's lock; other threads may read
+    them at any time for display or logging.
+    """
+
+    enqueued: int = 0
+    written: int = 0
+    writes: int = 0
+    coalesced: int = 0
+    dropped: int = 0
+    max_depth: int = 0
+    write_latency_total_ns: int = 0
+    write_latency_max_ns: int = 0
+    started_ns: int = field(default_factory=time.monotonic_ns)
+
+    def record_enqueue(self, depth: int) -> None:
+        self.enqueued += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def record_write(self, frames: int, latencies_ns: list[int]) -> None:
+        self.writes += 1
+        self.written += frames
+        for latency_ns in latencies_ns:
+            self.write_latency_total_ns += latency_ns
+            if latency_ns > self.write_latency_max_ns:
+                self.write_latency_max_ns = latency_ns
+
+    def frames_per_write(self) -> float:
+        if self.writes == 0:
+            return 0.0
+        return self.written / self.writes
+
+    def mean_write_latency_ms(self) -> float:
+        if self.written == 0:
+            return 0.0
+        return self.write_latency_total_ns / self.written / 1e6
+
+    def max_write_latency_ms(self) -> float:
+        return self.write_latency_max_ns / 1e6
+
+    def reset(self) -> None:
+        self.enqueued = 0
+        self.written = 0
+        self.writes = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self.write_latency_total_ns = 0
+        self.write_latency_max_ns = 0
+        self.started_ns = time.monotonic_ns()
+
+
+@dataclass(eq=False)
+class _QueuedFrame:
+    msg: FlooMessage
+    key: str | None
+    enqueued_ns: int
+
+
+class FlooWriter:
+    """Serialize every outbound frame through one thread.
+
+    Callers only append to a queue, so a slow or stalled serial write can
+    no longer block the GUI or the reader thread. The writer takes every
+    frame queued since its last write and sends them in a single
+    ``write()``. A setter that carries an absolute value (``BM=``, ``AM=``...)
+    drops an older write of the same setting that has not reached the wire
+    yet; ``on_superseded`` is told about the dropped message so the caller
+    can stop waiting for its reply. With a ``pool`` the writes run as one
+    job at a time on the pool's threads instead.
+    """
+
+    # setters whose latest value is all that matters; toggles (TC), pairing
+    # commands and queries are never coalesced
+    COALESCE_HEADERS = frozenset({"AM", "BE", "BM", "BN", "FT", "LF", "MD"})
+
+    def __init__(
+        self,
+        write: Callable[[bytes], Any],
+        on_superseded: Callable[[FlooMessage], None] | None = None,
+        pool: FlooWorkerPool | None = None,
+    ):
+        self._write = write
+        self._on_superseded = on_superseded
+        self._queue: list[_QueuedFrame] = []
+        self._cond = threading.Condition()
+        self._busy = False
+        self._stopped = False
+        self._thread: threading.Thread | None = None
+        self._pool = pool
+        # pooled: a write job is queued or running
+        self._scheduled = False
+        self.stats = FlooWriterStats()
+
+    @property
+    def depth(self) -> int:
+        """Frames queued but not yet handed to ``write()``."""
+        return len(self._queue)
+
+    def start(self) -> None:
+        with self._cond:
+            if self._pool is not None:
+                self._stopped = False
+                self._kick()
+                return
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="FlooWriter", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float | None = 1.0) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+            if self._pool is not None:
+                # let a write that is under way finish
+                self._cond.wait_for(lambda: not self._busy, timeout)
+                return
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    @staticmethod
+    def coalesce_key(msg: FlooMessage) -> str | None:
+        header: str = msg.header
+        if msg.isSend and header in FlooWriter.COALESCE_HEADERS and b"=" in msg.bytes:
+            return header
+        return None
+
+    def submit(self, msg: FlooMessage) -> None:
+        """Queue ``msg`` for the writer thread."""
+        key = FlooWriter.coalesce_key(msg)
+        superseded = None
+        with self._cond:
+            if key is not None:
+                for i, frame in enumerate(self._queue):
+                    if frame.key == key:
+                        # move to the back so the wire order matches the order of
+                        # submission, which is how replies are matched to commands
+                        del self._queue[i]
+                        superseded = frame.msg
+                        self.stats.coalesced += 1
+                        break
+            self._queue.append(_QueuedFrame(msg, key, time.monotonic_ns()))
+            self.stats.record_enqueue(len(self._queue))
+            self._cond.notify()
+            self._kick()
+        if superseded is not None:
+            logger.debug("coalesced %s", key)
+            if self._on_superseded is not None:
+                self._on_superseded(superseded)
+
+    def clear(self) -> None:
+        """Drop everything that has not been written, e.g. when the port closes."""
+        with self._cond:
+            self.stats.dropped += len(self._queue)
+            self._queue.clear()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until every queued frame has been written; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._busy, timeout)
+
+    def _kick(self) -> None:
+        """Queue a write job on the pool unless one is pending (lock held)."""
+        if self._pool is None or self._stopped or self._scheduled or not self._queue:
+            return
+        self._scheduled = True
+        self._pool.submit(self._drain)
+
+    def _drain(self) -> None:
+        """Pool job: write until the queue is empty."""
+        while True:
+            with self._cond:
+                if self._stopped or not self._queue:
+                    self._scheduled = False
+                    return
+                batch, self._queue = self._queue, []
+                self._busy = True
+            try:
+                self._write_batch(batch)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._stopped)
+                if self._stopped:
+                    return
+                batch, self._queue = self._queue, []
+                self._busy = True
+            try:
+                self._write_batch(batch)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write_batch(self, batch: list[_QueuedFrame]) -> None:
+        data = b"".join(frame.msg.bytes for frame in batch)
+        logger.debug("send %s", " ".join(frame.msg.header for frame in batch))
+        try:
+            self._write(data)
+        except Exception as e:
+            logger.warning("Error sending %d frame(s): %s", len(batch), e)
+            with self._cond:
+                self.stats.dropped += len(batch)
+            return
+        now_ns = time.monotonic_ns()
+        with self._cond:
+            self.stats.record_write(len(batch), [now_ns - f.enqueued_ns for f in batch])
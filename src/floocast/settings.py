@@ -1,17 +1,45 @@
 from __future__ import annotations
 
+import atexit
 import json
 import logging
 import os
 import stat
 import tempfile
+import threading
 from pathlib import Path
 from typing import Any
 
+from floocast.file_watch import FlooFileWatch
+
 logger = logging.getLogger(__name__)
 
 SETTINGS_FILE_MODE = stat.S_IRUSR | stat.S_IWUSR
 
+# seconds of changes the app's stores write at once
+DEFAULT_WRITE_BEHIND = 1.0
+
+# journal size past which FlooJournaledSettings rewrites its snapshot
+DEFAULT_COMPACT_BYTES = 64 * 1024
+
+# write-behind stores with a running flusher, closed at exit
+_flushing: set[FlooSettings] = set()
+
+# the store of each settings path, see FlooSettings.shared
+_shared: dict[Path, FlooSettings] = {}
+_shared_lock = threading.Lock()
+
+
+@atexit.register
+def _close_all() -> None:
+    for settings in list(_flushing):
+        settings.close()
+
+
+def _signature(st: os.stat_result) -> tuple[int, int, int]:
+    # an atomic replace changes the inode, an in-place edit mtime and size
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
 
 class FlooSettings:
     """
@@ -20,34 +48,152 @@ class FlooSettings:
     - Arbitrary key/value storage (use any string as the key)
     - Persisted to ~/.config/FlooCast/ (XDG_CONFIG_HOME)
     - Includes helpers for saving/loading dict-based device info
+    - Saves are skipped when nothing changed since the last write
+
+    With ``write_behind`` (seconds), changes are not written on the caller's
+    thread: every change marks the store dirty, and a background flusher
+    writes all changes made within that window at once. :meth:`save` then
+    only makes sure a flush is coming; :meth:`flush` writes now and
+    :meth:`close` (also run at exit) writes what is left.
+
+    With ``watch``, the file is watched (inotify, or its stat where that is
+    missing) and an edit from outside, e.g. another FlooCast, is merged in
+    on the next access; keys changed here and not yet written win.
     """
 
-    def __init__(self, app_name: str = "FlooCast", filename: str = "settings.json"):
+    def __init__(
+        self,
+        app_name: str = "FlooCast",
+        filename: str = "settings.json",
+        write_behind: float | None = None,
+        watch: bool = False,
+    ):
         self.app_name = app_name
         self.filename = filename
         self.path: Path = self._default_settings_path(app_name, filename)
+        self.write_behind = write_behind
         self._data: dict[str, Any] = {}
+        # the JSON last read from or written to path, None if there is none
+        self._persisted: str | None = None
+        # keys changed since the last write
+        self._unsaved: set[str] = set()
+        # the stat signature of the files as we last read or wrote them
+        self._seen: Any = None
+        self._lock = threading.RLock()
+        self._dirty = threading.Condition(self._lock)
+        # one write at a time, without holding up changes while it runs
+        self._write_lock = threading.Lock()
+        self._pending = False
+        self._closed = False
+        self._flusher: threading.Thread | None = None
+        self._watching = watch
+        self._watch: FlooFileWatch | None = None
+        if watch:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # before loading, so no edit falls in between
+            self._watch = FlooFileWatch.open(*self._files())
         self.load()
 
+    @classmethod
+    def shared(
+        cls,
+        app_name: str = "FlooCast",
+        filename: str = "settings.json",
+        write_behind: float | None = None,
+    ) -> FlooSettings:
+        """The watched store of this settings path, shared by everyone in the process.
+
+        ``write_behind`` applies when the store is created by this call, as
+        a FlooJournaledSettings if ``FLOOCAST_SETTINGS_JOURNAL`` is set.
+        """
+        backend = cls
+        if cls is FlooSettings and os.environ.get("FLOOCAST_SETTINGS_JOURNAL"):
+            backend = FlooJournaledSettings
+        path = cls._default_settings_path(app_name, filename)
+        with _shared_lock:
+            settings = _shared.get(path)
+            if settings is None or settings._closed:
+                settings = backend(app_name, filename, write_behind=write_behind, watch=True)
+                _shared[path] = settings
+            return settings
+
     # ---------- Core I/O ----------
 
     def load(self) -> None:
         self.path.parent.mkdir(parents=True, exist_ok=True)
-        if self.path.exists():
-            try:
-                self._data = json.loads(self.path.read_text(encoding="utf-8"))
-                if not isinstance(self._data, dict):
-                    self._data = {}
-            except (json.JSONDecodeError, OSError) as e:
-                logger.warning("Failed to load settings from %s: %s", self.path, e)
-                self._data = {}
+        with self._lock:
+            self._unsaved.clear()
+            self._merge_file()
 
     def save(self) -> None:
+        if self.write_behind is None or self._closed:
+            self.flush()
+        else:
+            self._changed()
+
+    def flush(self) -> None:
+        """Write the settings now, unless the file already holds them."""
+        with self._write_lock:
+            if self._watching:
+                # merge an outside edit first rather than overwrite it
+                self._reload_if_changed()
+            with self._lock:
+                self._pending = False
+                written, self._unsaved = self._unsaved, set()
+                change = self._prepare(written)
+                if change is None:
+                    return
+            try:
+                self._commit(change)
+            except OSError:
+                with self._lock:
+                    self._unsaved |= written
+                raise
+
+    def close(self) -> None:
+        """Stop the write-behind flusher and write what it had not written yet."""
+        with self._lock:
+            self._closed = True
+            self._dirty.notify_all()
+            flusher, self._flusher = self._flusher, None
+        if flusher is not None:
+            flusher.join()
+            _flushing.discard(self)
+        try:
+            self.flush()
+        finally:
+            with _shared_lock:
+                if _shared.get(self.path) is self:
+                    del _shared[self.path]
+            if self._watch is not None:
+                self._watch.close()
+                self._watch = None
+
+    def _dumps(self) -> str:
+        return json.dumps(self._data, indent=2, ensure_ascii=False)
+
+    def _prepare(self, written: set[str]) -> Any:
+        """What :meth:`_commit` writes for the ``written`` keys, None if the file has it."""
+        text = self._dumps()
+        return None if text == self._persisted else text
+
+    def _commit(self, text: Any) -> None:
+        seen = self._write(text)
+        with self._lock:
+            self._persisted = text
+            self._seen = seen
+
+    def _write(self, text: str) -> tuple[int, int, int]:
+        # a crash leaves either the old file or the new one, never a mix
         self.path.parent.mkdir(parents=True, exist_ok=True)
         fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", dir=str(self.path.parent))
         try:
             with os.fdopen(fd, "w", encoding="utf-8") as f:
-                json.dump(self._data, f, indent=2, ensure_ascii=False)
+                f.write(text)
+                f.flush()
+                os.fsync(f.fileno())
+                # what the file will look like once replaced, before anyone else can edit it
+                seen = _signature(os.fstat(f.fileno()))
             os.replace(tmp_path, self.path)
             os.chmod(self.path, SETTINGS_FILE_MODE)
         except OSError as e:
@@ -57,33 +203,139 @@ class FlooSettings:
             except OSError as cleanup_err:
                 logger.warning("Failed to remove temp file %s: %s", tmp_path, cleanup_err)
             raise
+        return seen
+
+    # ---------- File watching ----------
+
+    def _refresh(self) -> None:
+        if not self._watching or not self._write_lock.acquire(blocking=False):
+            # not watched, or a write is under way; the change waits for the next access
+            return
+        try:
+            self._reload_if_changed()
+        finally:
+            self._write_lock.release()
+
+    def _reload_if_changed(self) -> None:
+        if self._watch is not None and not self._watch.changed():
+            return
+        seen = self._disk_signature()
+        with self._lock:
+            if seen != self._seen:
+                logger.info("Settings changed on disk, reloading %s", self.path)
+                self._merge_file()
+
+    def _files(self) -> list[Path]:
+        return [self.path]
+
+    def _disk_signature(self) -> Any:
+        try:
+            return _signature(os.stat(self.path))
+        except OSError:
+            return None
+
+    def _read_file(self) -> dict[str, Any]:
+        """The settings on disk; sets what _prepare and _reload_if_changed compare to."""
+        data: dict[str, Any] = {}
+        self._persisted = None
+        self._seen = None
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self._seen = _signature(os.fstat(f.fileno()))
+                loaded = json.loads(f.read())
+            if isinstance(loaded, dict):
+                data = loaded
+                self._persisted = json.dumps(data, indent=2, ensure_ascii=False)
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning("Failed to load settings from %s: %s", self.path, e)
+        return data
+
+    def _merge_file(self) -> None:
+        """Read the file, keeping the unsaved keys; the caller holds the lock."""
+        data = self._read_file()
+        for key in self._unsaved:
+            if key in self._data:
+                data[key] = self._data[key]
+            else:
+                data.pop(key, None)
+        self._data = data
+
+    # ---------- Write-behind ----------
+
+    def _changed(self) -> None:
+        if self.write_behind is None:
+            return
+        with self._lock:
+            if self._closed:
+                return
+            self._pending = True
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._run, name="FlooSettingsFlusher", daemon=True
+                )
+                self._flusher.start()
+                _flushing.add(self)
+            self._dirty.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                self._dirty.wait_for(lambda: self._pending or self._closed)
+                # let the changes of one window pile up, then write them once
+                if self._dirty.wait_for(lambda: self._closed, self.write_behind):
+                    return
+            try:
+                self.flush()
+            except OSError:
+                # logged by _write; the file is unchanged and the next change retries
+                pass
+            except (TypeError, ValueError):
+                logger.exception("Failed to serialize settings for %s", self.path)
 
     # ---------- Generic get/set ----------
 
     def get(self, key: str, default: Any = None) -> Any:
-        return self._data.get(key, default)
+        self._refresh()
+        with self._lock:
+            return self._data.get(key, default)
 
     def set(self, key: str, value: Any) -> None:
-        self._data[key] = value
+        with self._lock:
+            self._data[key] = value
+            self._unsaved.add(key)
+            self._changed()
 
     def update(self, mapping: dict[str, Any]) -> None:
-        self._data.update(mapping)
+        with self._lock:
+            self._data.update(mapping)
+            self._unsaved.update(mapping)
+            self._changed()
 
     def remove(self, key: str) -> None:
-        self._data.pop(key, None)
+        with self._lock:
+            self._data.pop(key, None)
+            self._unsaved.add(key)
+            self._changed()
 
     # ---------- Named helpers for dict-based items ----------
 
     def set_item(self, name, item):
-        if isinstance(item, dict):
-            # shallow copy so the caller can't mutate stored dicts
-            self._data[name] = dict(item)
-        else:
-            # store scalars (bool, int, str, list, etc.) directly
-            self._data[name] = item
+        with self._lock:
+            if isinstance(item, dict):
+                # shallow copy so the caller can't mutate stored dicts
+                self._data[name] = dict(item)
+            else:
+                # store scalars (bool, int, str, list, etc.) directly
+                self._data[name] = item
+            self._unsaved.add(name)
+            self._changed()
 
     def get_item(self, name, default=None):
-        value = self._data.get(name, default)
+        self._refresh()
+        with self._lock:
+            value = self._data.get(name, default)
         if isinstance(value, dict):
             # return a copy so caller can’t mutate our stored copy
             return dict(value)
@@ -95,3 +347,176 @@ class FlooSettings:
     def _default_settings_path(app_name: str, filename: str) -> Path:
         cfg = os.getenv("XDG_CONFIG_HOME", str(Path.home() / ".config"))
         return Path(cfg) / app_name / filename
+
+
+class FlooJournaledSettings(FlooSettings):
+    """
+    FlooSettings that appends changes to a journal instead of rewriting the file.
+
+    A save appends one JSON line per changed key to ``<file>.journal``,
+    e.g. ``{"set": "last_streaming_state", "value": 6}`` or
+    ``{"remove": "aux_input"}``. Loading replays the journal over the JSON
+    snapshot, which stays readable by FlooSettings. Once the journal passes
+    ``compact_bytes`` the snapshot is rewritten atomically and the journal
+    emptied; a crash in between only replays records the snapshot already
+    holds. A torn last record, from a crash mid-append, is dropped.
+    """
+
+    def __init__(
+        self,
+        app_name: str = "FlooCast",
+        filename: str = "settings.json",
+        write_behind: float | None = None,
+        watch: bool = False,
+        compact_bytes: int = DEFAULT_COMPACT_BYTES,
+    ):
+        self.compact_bytes = compact_bytes
+        # the JSON of each value on disk, snapshot and journal replayed
+        self._on_disk: dict[str, str] = {}
+        # bytes of the journal that hold whole records
+        self._journal_size = 0
+        super().__init__(app_name, filename, write_behind=write_behind, watch=watch)
+
+    @property
+    def journal_path(self) -> Path:
+        return self.path.with_name(self.path.name + ".journal")
+
+    def compact(self) -> None:
+        """Rewrite the snapshot with the journal applied and empty the journal."""
+        with self._write_lock:
+            with self._lock:
+                self._reload_if_stale(set())
+            self._compact()
+
+    def _files(self) -> list[Path]:
+        return [self.path, self.journal_path]
+
+    def _disk_signature(self) -> Any:
+        try:
+            journal: tuple[int, int, int] | None = _signature(os.stat(self.journal_path))
+        except OSError:
+            journal = None
+        return (super()._disk_signature(), journal)
+
+    def _read_file(self) -> dict[str, Any]:
+        data = super()._read_file()
+        journal = None
+        self._journal_size = 0
+        try:
+            with open(self.journal_path, "rb") as f:
+                journal = _signature(os.fstat(f.fileno()))
+                records = f.read()
+        except FileNotFoundError:
+            records = b""
+        except OSError as e:
+            logger.warning("Failed to read settings journal %s: %s", self.journal_path, e)
+            records = b""
+        data, self._journal_size = self._replay(data, records)
+        self._seen = (self._seen, journal)
+        self._on_disk = {key: json.dumps(value, ensure_ascii=False) for key, value in data.items()}
+        return data
+
+    def _replay(self, snapshot: dict[str, Any], records: bytes) -> tuple[dict[str, Any], int]:
+        """``snapshot`` with the journal applied, and the bytes of whole, valid records."""
+        if records.endswith(b"\n"):
+            data = dict(snapshot)
+            try:
+                # one parse for the whole journal, the common case
+                for record in json.loads(b"[" + records[:-1].replace(b"\n", b",") + b"]"):
+                    self._apply(data, record)
+                return data, len(records)
+            except (ValueError, TypeError, KeyError):
+                pass
+        data = dict(snapshot)
+        size = 0
+        for line in records.splitlines(keepends=True):
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("incomplete record")
+                self._apply(data, json.loads(line))
+            except (ValueError, TypeError, KeyError) as e:
+                # the next append truncates the journal here
+                logger.warning(
+                    "Dropping settings journal %s past a bad record: %s", self.journal_path, e
+                )
+                break
+            size += len(line)
+        return data, size
+
+    @staticmethod
+    def _apply(data: dict[str, Any], record: dict[str, Any]) -> None:
+        if "remove" in record:
+            data.pop(record["remove"], None)
+        else:
+            data[record["set"]] = record["value"]
+
+    def _reload_if_stale(self, written: set[str]) -> None:
+        """Merge the files if another store wrote them since we read them, watched or not.
+
+        Appending after records we never read is fine, but another store may
+        have compacted the journal, leaving ``_journal_size`` past its end.
+        """
+        if self._disk_signature() == self._seen:
+            return
+        logger.info("Settings changed on disk, reloading %s", self.path)
+        # the keys being written win, as unsaved keys do
+        self._unsaved |= written
+        try:
+            self._merge_file()
+        finally:
+            self._unsaved -= written
+
+    def _prepare(self, written: set[str]) -> Any:
+        self._reload_if_stale(written)
+        # (key, JSON of the new value or None if removed, journal line)
+        records: list[tuple[str, str | None, str]] = []
+        for key in sorted(written):
+            if key in self._data:
+                value = json.dumps(self._data[key], ensure_ascii=False)
+                if self._on_disk.get(key) != value:
+                    records.append((key, value, f'{{"set": {json.dumps(key)}, "value": {value}}}'))
+            elif key in self._on_disk:
+                records.append((key, None, json.dumps({"remove": key})))
+        return records or None
+
+    def _commit(self, records: Any) -> None:
+        text = "".join(line + "\n" for _key, _value, line in records).encode("utf-8")
+        fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, SETTINGS_FILE_MODE)
+        try:
+            # drop a torn record before appending after it; a shorter journal
+            # was compacted since _prepare, and our records go after what is left
+            if os.fstat(fd).st_size > self._journal_size:
+                os.ftruncate(fd, self._journal_size)
+            os.write(fd, text)
+            os.fsync(fd)
+            journal = _signature(os.fstat(fd))
+        except OSError as e:
+            logger.exception("Failed to append to settings journal %s: %s", self.journal_path, e)
+            raise
+        finally:
+            os.close(fd)
+        with self._lock:
+            for key, value, _line in records:
+                if value is None:
+                    self._on_disk.pop(key, None)
+                else:
+                    self._on_disk[key] = value
+            self._journal_size += len(text)
+            self._seen = (self._seen[0] if self._seen else None, journal)
+        if self._journal_size > self.compact_bytes:
+            self._compact()
+
+    def _compact(self) -> None:
+        with self._lock:
+            data = {key: json.loads(value) for key, value in self._on_disk.items()}
+            text = json.dumps(data, indent=2, ensure_ascii=False)
+        snapshot = self._write(text)
+        try:
+            os.truncate(self.journal_path, 0)
+            journal = _signature(os.stat(self.journal_path))
+        except FileNotFoundError:
+            journal = None
+        with self._lock:
+            self._persisted = text
+            self._journal_size = 0
+            self._seen = (snapshot, journal)
@@ -0,0 +1,192 @@
+"""Tests for the asyncio protocol client."""
+
+import asyncio
+import os
+
+import pytest
+
+from floocast.protocol.async_client import FlooAsyncClient
+from floocast.protocol.command_tracker import FlooCommandError, FlooCommandTimeout
+from floocast.protocol.messages import FlooMsgSt
+
+
+class FakeTransport:
+    def __init__(self):
+        self.written = []
+        self.closed = False
+
+    def write(self, data):
+        self.written.append(bytes(data))
+
+    def close(self):
+        self.closed = True
+
+
+def make_client(**kwargs):
+    client = FlooAsyncClient(**kwargs)
+    client.connection_made(FakeTransport())
+    return client
+
+
+async def reply_after_send(client, data):
+    while not client.transport.written:
+        await asyncio.sleep(0)
+    client.data_received(data)
+
+
+class TestFlooAsyncClientDispatch:
+    def test_setter_resolves_on_ok(self):
+        async def scenario():
+            client = make_client()
+            task = asyncio.ensure_future(client.set_audio_mode(2))
+            await reply_after_send(client, b"OK\r\n")
+            await task
+            assert client.transport.written == [b"BC:AM=02\r\n"]
+            assert client.audioMode == 2
+
+        asyncio.run(scenario())
+
+    def test_setter_raises_on_er(self):
+        async def scenario():
+            client = make_client()
+            task = asyncio.ensure_future(client.set_broadcast_name("Hall"))
+            await reply_after_send(client, b"ER=03\r\n")
+            with pytest.raises(FlooCommandError) as info:
+                await task
+            assert info.value.header == "BN"
+            assert info.value.error == 3
+
+        asyncio.run(scenario())
+
+    def test_query_resolves_with_matching_reply(self):
+        async def scenario():
+            client = make_client()
+            task = asyncio.ensure_future(client.read_source_state())
+            await reply_after_send(client, b"LA=02\r\nST=06\r\n")
+            assert await task == 6
+
+        asyncio.run(scenario())
+
+    def test_paired_devices_collects_until_terminator(self):
+        async def scenario():
+            client = make_client()
+            task = asyncio.ensure_future(client.read_paired_devices())
+            await reply_after_send(
+                client, b"FN=00,001122334455,Headset\r\nFN=01,66778899AABB,Car\r\nFN=02\r\n"
+            )
+            devices = await task
+            assert [d.name for d in devices] == ["Headset", "Car"]
+            assert devices[0].btAddress == "001122334455"
+
+        asyncio.run(scenario())
+
+    def test_timeout(self):
+        async def scenario():
+            client = make_client(timeout=0.01)
+            with pytest.raises(FlooCommandTimeout) as excinfo:
+                await client.read_version()
+            assert excinfo.value.timeout == 0.01
+            assert not isinstance(excinfo.value, OSError)
+
+        asyncio.run(scenario())
+
+    def test_listener_sees_unsolicited_messages(self):
+        async def scenario():
+            client = make_client()
+            seen = []
+            client.add_listener(seen.append)
+            client.data_received(b"ST=04\r\n")
+            assert isinstance(seen[0], FlooMsgSt)
+            assert seen[0].state == 4
+
+        asyncio.run(scenario())
+
+    def test_raising_listener_does_not_lose_the_reply(self):
+        async def scenario():
+            client = make_client()
+            seen = []
+
+            def broken(msg):
+                raise RuntimeError("listener bug")
+
+            client.add_listener(broken)
+            client.add_listener(seen.append)
+            task = asyncio.ensure_future(client.read_source_state())
+            await reply_after_send(client, b"ST=04\r\n")
+            assert await task == 4
+            assert [msg.header for msg in seen] == ["ST"]
+
+        asyncio.run(scenario())
+
+    def test_broadcast_flag_uses_cached_mode(self):
+        async def scenario():
+            client = make_client()
+            client.broadcastMode = 0x30
+            task = asyncio.ensure_future(client.set_public_broadcast(True))
+            await reply_after_send(client, b"OK\r\n")
+            await task
+            assert client.transport.written == [b"BC:BM=32\r\n"]
+            assert client.broadcastMode == 0x32
+
+        asyncio.run(scenario())
+
+    def test_connection_lost_fails_pending_command(self):
+        async def scenario():
+            client = make_client()
+            task = asyncio.ensure_future(client.read_version())
+            while not client.transport.written:
+                await asyncio.sleep(0)
+            client.connection_lost(None)
+            with pytest.raises(ConnectionError):
+                await task
+
+        asyncio.run(scenario())
+
+
+class TestFlooAsyncClientOverPty:
+    @pytest.mark.parametrize("pipelined", [True, False])
+    def test_handshake_over_pty(self, pipelined):
+        replies = {
+            b"BC:VR\r\n": b"VR=1.0.0\r\n",
+            b"BC:AM\r\n": b"AM=02\r\n",
+            b"BC:ST\r\n": b"ST=01\r\n",
+            b"BC:LA\r\n": b"LA=00\r\n",
+            b"BC:LF\r\n": b"LF=01\r\n",
+            b"BC:BM\r\n": b"BM=36\r\n",
+            b"BC:BN\r\n": b"BN=Hall\r\n",
+            b"BC:FN\r\n": b"FN=00,001122334455,Headset\r\nFN=01\r\n",
+            b"BC:FT\r\n": b"FT=05\r\n",
+            b"BC:AC\r\n": b"AC=07\r\n",
+        }
+
+        async def scenario():
+            master, slave = os.openpty()
+            loop = asyncio.get_running_loop()
+            pending = bytearray()
+
+            def on_master_readable():
+                pending.extend(os.read(master, 1024))
+                while b"\r\n" in pending:
+                    idx = pending.index(b"\r\n") + 2
+                    cmd = bytes(pending[:idx])
+                    del pending[:idx]
+                    os.write(master, replies[cmd])
+
+            loop.add_reader(master, on_master_readable)
+            try:
+                client = await FlooAsyncClient.connect(os.ttyname(slave))
+                snapshot = await client.handshake(pipelined=pipelined)
+                client.close()
+                await client.wait_closed()
+            finally:
+                loop.remove_reader(master)
+                os.close(master)
+                os.close(slave)
+            assert snapshot["version"] == "1.0.0"
+            assert snapshot["audioMode"] == 2
+            assert snapshot["broadcastName"] == "Hall"
+            assert snapshot["pairedDevices"] == ["Headset"]
+            assert snapshot["feature"] == 5
+            assert snapshot["codec"].codec == 7
+
+        asyncio.run(scenario())
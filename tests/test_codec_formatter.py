@@ -2,6 +2,9 @@ import importlib.util
 import sys
 from pathlib import Path
 
+from floocast import metrics
+from floocast.protocol import messages
+
 spec = importlib.util.spec_from_file_location(
     "codec_formatter", Path(__file__).parent.parent / "src/floocast/gui/codec_formatter.py"
 )
@@ -38,6 +41,10 @@ class TestCodecFormatterConstants:
     def test_rssi_offset(self):
         assert RSSI_OFFSET == 0x100
 
+    def test_rssi_offset_is_shared_with_metrics(self):
+        assert RSSI_OFFSET is messages.RSSI_OFFSET
+        assert metrics.RSSI_OFFSET is messages.RSSI_OFFSET
+
     def test_aptx_adaptive_codec(self):
         assert APTX_ADAPTIVE_CODEC == 6
 
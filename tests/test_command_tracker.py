@@ -0,0 +1,282 @@
+"""Tests for request/response correlation."""
+
+import pytest
+
+from floocast.protocol.command_tracker import (
+    FlooCommandError,
+    FlooCommandTimeout,
+    FlooCommandTracker,
+    FlooLatencyHistogram,
+    RetryPolicy,
+)
+from floocast.protocol.messages import (
+    FlooMsgAm,
+    FlooMsgBm,
+    FlooMsgEr,
+    FlooMsgFn,
+    FlooMsgLa,
+    FlooMsgOk,
+    FlooMsgSt,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def sent():
+    return []
+
+
+@pytest.fixture
+def tracker(clock, sent):
+    return FlooCommandTracker(sent.append, clock=clock, policy=RetryPolicy(timeout=1.0))
+
+
+class TestSubmitAndMatch:
+    def test_submit_sends(self, tracker, sent):
+        msg = FlooMsgAm(True, 1)
+        tracker.submit(msg)
+        assert sent == [msg]
+        assert len(tracker) == 1
+
+    def test_replies_are_credited_in_order(self, tracker):
+        first = tracker.submit(FlooMsgAm(True, 1), param=1)
+        second = tracker.submit(FlooMsgBm(True, 0x30), param=0x30)
+        assert tracker.match(FlooMsgOk(False)) is first
+        assert tracker.match(FlooMsgOk(False)) is second
+        assert first.future.done() and second.future.done()
+        assert len(tracker) == 0
+
+    def test_error_fails_oldest(self, tracker):
+        first = tracker.submit(FlooMsgAm(True, 1))
+        tracker.submit(FlooMsgBm(True, 0))
+        assert tracker.match(FlooMsgEr(False, 3)) is first
+        with pytest.raises(FlooCommandError) as info:
+            first.future.result()
+        assert info.value.error == 3
+        assert tracker.head().header == "BM"
+
+    def test_unsolicited_message_is_not_matched(self, tracker):
+        tracker.submit(FlooMsgAm(True, 1))
+        assert tracker.match(FlooMsgSt.create_valid_msg(b"ST=06")) is None
+        assert len(tracker) == 1
+
+    def test_query_matches_reply_header(self, tracker):
+        cmd = tracker.submit(FlooMsgSt(True), reply_header="ST")
+        assert tracker.match(FlooMsgOk(False)) is None
+        reply = FlooMsgSt.create_valid_msg(b"ST=01")
+        assert tracker.match(reply) is cmd
+        assert cmd.future.result() is reply
+
+    def test_lost_reply_in_pipelined_burst(self, tracker, clock):
+        am = tracker.submit(FlooMsgAm(True), reply_header="AM")
+        st = tracker.submit(FlooMsgSt(True), reply_header="ST")
+        la = tracker.submit(FlooMsgLa(True), reply_header="LA")
+        clock.now += 0.01
+        # the AM reply never arrives; the later replies still match
+        assert tracker.match(FlooMsgSt.create_valid_msg(b"ST=01")) is st
+        assert tracker.match(FlooMsgLa.create_valid_msg(b"LA=03")) is la
+        with pytest.raises(FlooCommandTimeout):
+            am.future.result(timeout=0)
+        assert tracker.time_until_deadline() == 0.0
+        assert tracker.expire() == [am]
+        assert tracker.expire() == []
+        assert len(tracker) == 0
+        stats = tracker.command_stats()
+        assert stats["AM"].timeouts == 1
+        assert stats["ST"].ok == 1
+
+    def test_unsolicited_header_does_not_fail_earlier_commands(self, clock, sent):
+        tracker = FlooCommandTracker(sent.append, clock=clock, unsolicited={"ST"})
+        am = tracker.submit(FlooMsgAm(True), reply_header="AM")
+        st = tracker.submit(FlooMsgSt(True), reply_header="ST")
+        # an ST pushed by the dongle before the AM reply is not ST's answer
+        assert tracker.match(FlooMsgSt.create_valid_msg(b"ST=03")) is None
+        assert not am.future.done()
+        assert tracker.match(FlooMsgAm.create_valid_msg(b"AM=02")) is am
+        assert tracker.match(FlooMsgSt.create_valid_msg(b"ST=01")) is st
+        assert tracker.expire() == []
+
+    def test_ok_and_error_only_answer_the_oldest(self, tracker):
+        st = tracker.submit(FlooMsgSt(True), reply_header="ST")
+        tracker.submit(FlooMsgAm(True, 1))
+        assert tracker.match(FlooMsgOk(False)) is None
+        assert tracker.match(FlooMsgEr.create_valid_msg(b"ER=01")) is st
+        assert len(tracker) == 1
+
+    def test_partial_reply_keeps_command_pending(self, tracker, clock):
+        cmd = tracker.submit(FlooMsgFn(True), reply_header="FN")
+        clock.now += 0.9
+        assert tracker.match(FlooMsgFn(False, 0, "001122334455", "Headset"), final=False) is cmd
+        assert not cmd.future.done()
+        assert tracker.next_deadline() == pytest.approx(clock.now + 1.0)
+        assert tracker.match(FlooMsgFn(False, 1), final=True) is cmd
+        assert cmd.future.done()
+
+    def test_tail_is_most_recent(self, tracker):
+        tracker.submit(FlooMsgAm(True, 1))
+        tracker.submit(FlooMsgBm(True, 0))
+        assert tracker.head().header == "AM"
+        assert tracker.tail().header == "BM"
+
+    def test_waiting_for(self, tracker):
+        tracker.submit(FlooMsgAm(True, 1))
+        tracker.submit(FlooMsgFn(True), reply_header="FN")
+        assert tracker.waiting_for("FN")
+        assert not tracker.waiting_for("BM")
+        tracker.match(FlooMsgOk(False))
+        tracker.match(FlooMsgFn(False, 0))
+        assert not tracker.waiting_for("FN")
+
+    def test_rtt(self, tracker, clock):
+        cmd = tracker.submit(FlooMsgAm(True, 1))
+        assert cmd.rtt is None
+        clock.now += 0.25
+        tracker.match(FlooMsgOk(False))
+        assert cmd.rtt == pytest.approx(0.25)
+
+
+class TestExpire:
+    def test_nothing_expires_before_deadline(self, tracker, clock):
+        tracker.submit(FlooMsgAm(True, 1))
+        clock.now += 0.5
+        assert tracker.expire() == []
+        assert tracker.time_until_deadline() == pytest.approx(0.5)
+
+    def test_timeout_without_retries(self, tracker, clock):
+        cmd = tracker.submit(FlooMsgAm(True, 1))
+        clock.now += 1.0
+        assert tracker.expire() == [cmd]
+        with pytest.raises(FlooCommandTimeout):
+            cmd.future.result()
+        assert len(tracker) == 0
+
+    def test_retry_resends(self, tracker, clock, sent):
+        cmd = tracker.submit(FlooMsgSt(True), reply_header="ST", policy=RetryPolicy(1.0, 1))
+        clock.now += 1.0
+        assert tracker.expire() == []
+        assert sent == [cmd.msg, cmd.msg]
+        assert cmd.attempts == 2
+        clock.now += 1.0
+        assert tracker.expire() == [cmd]
+        assert cmd.future.exception().attempts == 2
+
+    def test_next_command_gets_full_window(self, tracker, clock):
+        tracker.submit(FlooMsgAm(True, 1))
+        second = tracker.submit(FlooMsgBm(True, 0))
+        clock.now += 1.0
+        tracker.expire()
+        assert tracker.head() is second
+        assert tracker.next_deadline() == pytest.approx(clock.now + 1.0)
+
+    def test_clear_fails_everything(self, tracker):
+        first = tracker.submit(FlooMsgAm(True, 1))
+        second = tracker.submit(FlooMsgBm(True, 0))
+        tracker.clear("gone")
+        assert len(tracker) == 0
+        assert isinstance(first.future.exception(), ConnectionError)
+        assert isinstance(second.future.exception(), ConnectionError)
+
+    def test_cancelled_future_is_ignored(self, tracker):
+        cmd = tracker.submit(FlooMsgAm(True, 1))
+        cmd.future.cancel()
+        assert tracker.match(FlooMsgOk(False)) is cmd
+
+
+class TestDiscard:
+    def test_discard_removes_and_cancels(self, tracker):
+        first = tracker.submit(FlooMsgAm(True, 1))
+        second = tracker.submit(FlooMsgBm(True, 0))
+        assert tracker.discard(first.msg) is first
+        assert first.future.cancelled()
+        assert tracker.head() is second
+
+    def test_discard_from_middle(self, tracker):
+        first = tracker.submit(FlooMsgAm(True, 1))
+        second = tracker.submit(FlooMsgBm(True, 0))
+        third = tracker.submit(FlooMsgBm(True, 1))
+        tracker.discard(second.msg)
+        assert tracker.match(FlooMsgOk(False)) is first
+        assert tracker.match(FlooMsgOk(False)) is third
+
+    def test_discard_unknown_message(self, tracker):
+        assert tracker.discard(FlooMsgAm(True, 1)) is None
+
+
+class TestFlooLatencyHistogram:
+    def test_buckets(self):
+        histogram = FlooLatencyHistogram()
+        for seconds in (0.0005, 0.001, 0.003, 0.040, 5.0):
+            histogram.record(seconds)
+        # <=1 ms twice, <=5 ms, <=50 ms, and past the last bound
+        assert histogram.counts[0] == 2
+        assert histogram.counts[2] == 1
+        assert histogram.counts[5] == 1
+        assert histogram.counts[-1] == 1
+        assert histogram.count == 5
+        assert histogram.max_ms == pytest.approx(5000)
+
+    def test_percentiles(self):
+        histogram = FlooLatencyHistogram()
+        assert histogram.percentile_ms(0.5) is None
+        for _ in range(98):
+            histogram.record(0.0015)
+        histogram.record(0.150)
+        histogram.record(3.0)
+        assert histogram.percentile_ms(0.5) == 2
+        assert histogram.percentile_ms(0.99) == 200
+        assert histogram.percentile_ms(1.0) == pytest.approx(3000)
+        assert histogram.mean_ms() == pytest.approx((98 * 1.5 + 150 + 3000) / 100)
+
+
+class TestCommandStats:
+    def test_round_trips_per_header(self, tracker, clock):
+        tracker.submit(FlooMsgAm(True, 1))
+        clock.now += 0.003
+        tracker.match(FlooMsgOk(False))
+        tracker.submit(FlooMsgBm(True, 0))
+        clock.now += 0.4
+        tracker.match(FlooMsgEr(False, 2))
+        stats = tracker.command_stats()
+        assert stats["AM"].ok == 1
+        assert stats["AM"].latency.counts[2] == 1
+        assert stats["BM"].errors == 1
+        assert stats["BM"].latency.max_ms == pytest.approx(400)
+
+    def test_partial_replies_are_not_round_trips(self, tracker, clock):
+        tracker.submit(FlooMsgFn(True), reply_header="FN")
+        tracker.match(FlooMsgFn(False, 0, "001122334455", "Headset"), final=False)
+        assert tracker.command_stats() == {}
+        clock.now += 0.01
+        tracker.match(FlooMsgFn(False, 1))
+        assert tracker.command_stats()["FN"].latency.count == 1
+
+    def test_counts_retries_and_timeouts(self, tracker, clock):
+        tracker.submit(FlooMsgSt(True), reply_header="ST", policy=RetryPolicy(1.0, 1))
+        clock.now += 1.0
+        tracker.expire()
+        clock.now += 1.0
+        tracker.expire()
+        stats = tracker.command_stats()["ST"]
+        assert (stats.retries, stats.timeouts, stats.latency.count) == (1, 1, 0)
+        assert "to=1" in stats.summary()
+
+    def test_snapshot_is_a_copy(self, tracker):
+        tracker.submit(FlooMsgAm(True, 1))
+        tracker.match(FlooMsgOk(False))
+        snapshot = tracker.command_stats()
+        snapshot["AM"].ok = 99
+        assert tracker.command_stats()["AM"].ok == 1
+        tracker.reset_stats()
+        assert tracker.command_stats() == {}
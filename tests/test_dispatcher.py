@@ -0,0 +1,246 @@
+"""Tests for the reader-to-delegate dispatch queue."""
+
+import threading
+import time
+
+import pytest
+
+from floocast.protocol.dispatcher import FlooDispatcher
+from floocast.protocol.messages import FlooMsgAm, FlooMsgOk, FlooMsgSt
+from floocast.protocol.pool import FlooWorkerPool
+
+
+def st(state):
+    return FlooMsgSt.create_valid_msg(b"ST=%02X" % state)
+
+
+class Recorder:
+    """Handler that records messages and can be held to back up the queue."""
+
+    def __init__(self):
+        self.messages = []
+        self.threads = set()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, msg, received_ns):
+        self.gate.wait(2)
+        self.threads.add(threading.current_thread())
+        self.messages.append(msg)
+
+
+@pytest.fixture
+def handler():
+    return Recorder()
+
+
+@pytest.fixture
+def pool():
+    pool = FlooWorkerPool(2)
+    yield pool
+    pool.stop()
+
+
+@pytest.fixture(params=["thread", "pool"])
+def dispatcher(request, handler, pool):
+    dispatcher = FlooDispatcher(handler, maxsize=4, pool=pool if request.param == "pool" else None)
+    yield dispatcher
+    handler.gate.set()
+    dispatcher.stop()
+
+
+def hold(dispatcher, handler):
+    """Start the worker and keep it busy inside the handler."""
+    handler.gate.clear()
+    dispatcher.start()
+    dispatcher.put(FlooMsgOk(False), time.monotonic_ns())
+    deadline = time.monotonic() + 2
+    while dispatcher.depth and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+class TestDispatch:
+    def test_messages_run_on_worker_in_order(self, dispatcher, handler):
+        dispatcher.start()
+        msgs = [FlooMsgOk(False), st(1), FlooMsgAm(False, 2)]
+        for msg in msgs:
+            dispatcher.put(msg, time.monotonic_ns())
+        assert dispatcher.flush(2)
+        assert handler.messages == msgs
+        workers = set(dispatcher._pool._threads) if dispatcher._pool else {dispatcher._thread}
+        assert handler.threads <= workers
+        assert dispatcher.stats.dispatched == 3
+
+    def test_call_runs_inline_without_worker(self, dispatcher):
+        calls = []
+        dispatcher.call(calls.append, 1)
+        assert calls == [1]
+
+    def test_call_is_ordered_with_messages(self, dispatcher, handler):
+        order = []
+        hold(dispatcher, handler)
+        dispatcher.put(st(1), time.monotonic_ns())
+        dispatcher.call(lambda: order.append(list(handler.messages)))
+        handler.gate.set()
+        assert dispatcher.flush(2)
+        assert len(order[0]) == 2
+
+    def test_records_queue_latency(self, dispatcher, handler):
+        hold(dispatcher, handler)
+        dispatcher.put(st(1), time.monotonic_ns())
+        time.sleep(0.01)
+        handler.gate.set()
+        assert dispatcher.flush(2)
+        assert dispatcher.stats.max_queue_latency_ms() >= 10
+
+    def test_handler_error_does_not_stop_worker(self, handler):
+        def failing(msg, received_ns):
+            if isinstance(msg, FlooMsgOk):
+                raise RuntimeError("boom")
+            handler(msg, received_ns)
+
+        dispatcher = FlooDispatcher(failing)
+        dispatcher.start()
+        dispatcher.put(FlooMsgOk(False), 0)
+        dispatcher.put(st(1), 0)
+        assert dispatcher.flush(2)
+        dispatcher.stop()
+        assert len(handler.messages) == 1
+
+
+class TestTimers:
+    def test_timers_run_after_messages(self, handler):
+        events = []
+        dispatcher = FlooDispatcher(
+            lambda msg, ns: events.append("msg"), poll_timers=lambda: events.append("timers")
+        )
+        dispatcher.start()
+        dispatcher.put(FlooMsgOk(False), 0)
+        assert dispatcher.flush(2)
+        dispatcher.stop()
+        assert events[:2] == ["msg", "timers"]
+
+    def test_wake_rereads_timeout(self):
+        due = []
+        fired = threading.Event()
+
+        def poll_timeout():
+            return 0.0 if due else None
+
+        dispatcher = FlooDispatcher(lambda m, ns: None, poll_timeout, lambda: due and fired.set())
+        dispatcher.start()
+        time.sleep(0.02)
+        due.append(True)
+        dispatcher.wake()
+        assert fired.wait(2)
+        dispatcher.stop()
+
+
+class TestPooled:
+    def test_no_thread_of_its_own(self, handler, pool):
+        dispatcher = FlooDispatcher(handler, pool=pool)
+        dispatcher.start()
+        dispatcher.put(FlooMsgOk(False), 0)
+        assert dispatcher.flush(2)
+        dispatcher.stop()
+        assert dispatcher._thread is None
+        assert handler.threads <= set(pool._threads)
+
+    def test_worker_is_known_while_draining(self, pool):
+        seen = []
+        dispatcher = FlooDispatcher(lambda m, ns: None, pool=pool)
+        dispatcher.start()
+        dispatcher.call(lambda: seen.append(dispatcher.on_worker_thread()))
+        assert dispatcher.flush(2)
+        dispatcher.stop()
+        assert seen == [True]
+        assert not dispatcher.on_worker_thread()
+
+    def test_timer_fires_on_the_pool(self, pool):
+        due = [time.monotonic() + 0.05]
+        fired = threading.Event()
+
+        def poll_timeout():
+            return max(0.0, due[0] - time.monotonic()) if due else None
+
+        def poll_timers():
+            if due and time.monotonic() >= due[0]:
+                due.clear()
+                fired.set()
+
+        dispatcher = FlooDispatcher(lambda m, ns: None, poll_timeout, poll_timers, pool=pool)
+        dispatcher.start()
+        assert fired.wait(2)
+        dispatcher.stop()
+
+    def test_dongles_share_the_pool(self, pool):
+        handlers = [Recorder() for _ in range(6)]
+        dispatchers = [FlooDispatcher(h, pool=pool) for h in handlers]
+        for dispatcher in dispatchers:
+            dispatcher.start()
+            for state in range(3):
+                dispatcher.put(st(state), 0)
+        for dispatcher in dispatchers:
+            assert dispatcher.flush(2)
+            dispatcher.stop()
+        assert all([m.state for m in h.messages] == [0, 1, 2] for h in handlers)
+        assert set().union(*(h.threads for h in handlers)) <= set(pool._threads)
+
+
+class TestOverflow:
+    def test_drops_superseded_status_first(self, dispatcher, handler):
+        hold(dispatcher, handler)
+        for msg in (st(1), FlooMsgAm(False, 1), st(4), FlooMsgAm(False, 2)):
+            dispatcher.put(msg, 0)
+        dispatcher.put(st(6), 0)
+        assert dispatcher.stats.dropped == 1
+        assert dispatcher.stats.coalesced == 1
+        handler.gate.set()
+        assert dispatcher.flush(2)
+        states = [m.state for m in handler.messages if isinstance(m, FlooMsgSt)]
+        assert states == [4, 6]
+
+    def test_drops_oldest_without_status(self, dispatcher, handler):
+        hold(dispatcher, handler)
+        for mode in range(5):
+            dispatcher.put(FlooMsgAm(False, mode), 0)
+        assert dispatcher.depth == 4
+        assert dispatcher.stats.dropped == 1
+        assert dispatcher.stats.coalesced == 0
+        handler.gate.set()
+        assert dispatcher.flush(2)
+        assert [m.mode for m in handler.messages[1:]] == [1, 2, 3, 4]
+
+    def test_block_policy_waits_for_room(self, handler):
+        dispatcher = FlooDispatcher(handler, maxsize=1, overflow=FlooDispatcher.OVERFLOW_BLOCK)
+        hold(dispatcher, handler)
+        dispatcher.put(st(1), 0)
+        reader = threading.Thread(target=dispatcher.put, args=(st(2), 0))
+        reader.start()
+        reader.join(0.05)
+        assert reader.is_alive()
+        handler.gate.set()
+        reader.join(2)
+        assert not reader.is_alive()
+        assert dispatcher.flush(2)
+        dispatcher.stop()
+        assert dispatcher.stats.dropped == 0
+        assert len(handler.messages) == 3
+
+    def test_high_water_mark(self, dispatcher, handler):
+        hold(dispatcher, handler)
+        for mode in range(3):
+            dispatcher.put(FlooMsgAm(False, mode), 0)
+        assert dispatcher.stats.high_water == 3
+        assert dispatcher.stats.high_water_events == 1
+
+    def test_clear_keeps_posted_calls(self, dispatcher, handler):
+        calls = []
+        hold(dispatcher, handler)
+        dispatcher.put(st(1), 0)
+        dispatcher.call(calls.append, "closed")
+        assert dispatcher.clear() == 1
+        handler.gate.set()
+        assert dispatcher.flush(2)
+        assert calls == ["closed"]
+        assert len(handler.messages) == 1
@@ -0,0 +1,172 @@
+"""Tests for the pty FMA120 emulator."""
+
+import asyncio
+import time
+
+import pytest
+import serial
+
+from floocast.protocol.async_client import FlooAsyncClient
+from floocast.protocol.emulator import FlooEmulator, FlooEmulatorProfile, FlooEmulatorState
+from floocast.protocol.interface import find_ports
+from floocast.protocol.manager import _call_inline, _call_later_thread
+from floocast.protocol.state_machine import FlooStateMachine
+from floocast.protocol.state_machine_delegate import FlooStateMachineDelegate
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+@pytest.fixture
+def emulator():
+    emulator = FlooEmulator(FlooEmulatorProfile(latency=0.001, seed=1))
+    emulator.start()
+    yield emulator
+    emulator.close()
+
+
+@pytest.fixture
+def host(emulator):
+    port = serial.Serial(emulator.path, baudrate=921600, timeout=1)
+    yield port
+    port.close()
+
+
+def ask(host, command: bytes, lines: int = 1) -> list[bytes]:
+    host.write(b"BC:" + command + b"\r\n")
+    return [host.readline().rstrip(b"\r\n") for _ in range(lines)]
+
+
+class TestQueries:
+    def test_version(self, host):
+        assert ask(host, b"VR") == [b"VR=1.0.0"]
+
+    def test_paired_device_list(self, host, emulator):
+        emulator.state.pairedDevices.append(("66778899AABB", "Speaker"))
+        assert ask(host, b"FN", 3) == [
+            b"FN=00,001122334455,Headset",
+            b"FN=01,66778899AABB,Speaker",
+            b"FN=02",
+        ]
+
+    def test_broadcast_name(self, host):
+        assert ask(host, b"BN") == [b"BN=FlooCast"]
+
+
+class TestCommands:
+    def test_setter_is_acknowledged_and_read_back(self, host, emulator):
+        assert ask(host, b"AM=01") == [b"OK"]
+        assert emulator.state.audioMode == 1
+        assert ask(host, b"AM") == [b"AM=01"]
+
+    def test_bad_and_unknown_commands_are_rejected(self, host, emulator):
+        assert ask(host, b"AM=zz") == [b"ER=01"]
+        assert ask(host, b"QQ") == [b"ER=01"]
+        assert ask(host, b"TC=05") == [b"ER=01"]
+        assert emulator.stats.errors == 3
+
+    def test_clear_paired_devices(self, host, emulator):
+        assert ask(host, b"CP=00") == [b"OK"]
+        assert emulator.state.pairedDevices == []
+
+    def test_toggle_connection_reports_source_state(self, host):
+        assert ask(host, b"TC=00") == [b"OK"]
+        assert [host.readline().rstrip() for _ in range(2)] == [b"ST=04", b"ST=06"]
+        assert ask(host, b"TC=00") == [b"OK"]
+        assert host.readline().rstrip() == b"ST=01"
+
+
+class TestAnswer:
+    def test_answers_without_the_pty(self):
+        emulator = FlooEmulator(FlooEmulatorProfile(seed=1))
+        try:
+            assert emulator.answer(b"BC:VR") == b"VR=1.0.0\r\n"
+            assert emulator.answer(b"BC:AM=zz") == b"ER=01\r\n"
+            # lines that are not commands get no reply
+            assert emulator.answer(b"VR=1.0.0") == b""
+            assert emulator.stats.commands == 2
+        finally:
+            emulator.close()
+
+
+class TestProfile:
+    def test_reply_latency(self):
+        with FlooEmulator(FlooEmulatorProfile(latency=0.05)) as emulator:
+            port = serial.Serial(emulator.path, timeout=1)
+            start = time.monotonic()
+            assert ask(port, b"VR") == [b"VR=1.0.0"]
+            assert time.monotonic() - start >= 0.05
+            port.close()
+
+    def test_jitter_keeps_reply_order(self):
+        profile = FlooEmulatorProfile(latency=0.005, jitter=0.005, seed=3)
+        with FlooEmulator(profile) as emulator:
+            port = serial.Serial(emulator.path, timeout=1)
+            port.write(b"".join(b"BC:%s\r\n" % h for h in (b"VR", b"AM", b"ST", b"LA") * 5))
+            headers = [port.readline()[:2] for _ in range(20)]
+            assert headers == [b"VR", b"AM", b"ST", b"LA"] * 5
+            port.close()
+
+    def test_error_injection(self):
+        with FlooEmulator(FlooEmulatorProfile(error_rate=1.0, error_code=7)) as emulator:
+            port = serial.Serial(emulator.path, timeout=1)
+            assert ask(port, b"VR") == [b"ER=07"]
+            port.close()
+
+    def test_dropped_command_gets_no_reply(self):
+        with FlooEmulator(FlooEmulatorProfile(drop_rate=1.0)) as emulator:
+            port = serial.Serial(emulator.path, timeout=0.1)
+            assert ask(port, b"VR") == [b""]
+            assert emulator.stats.dropped == 1
+            port.close()
+
+    def test_unsolicited_bursts(self):
+        profile = FlooEmulatorProfile(burst_rate=100, burst_size=4)
+        with FlooEmulator(profile) as emulator:
+            port = serial.Serial(emulator.path, timeout=1)
+            lines = [port.readline() for _ in range(8)]
+            assert all(line.startswith(b"AC=07,") for line in lines)
+            assert emulator.stats.unsolicited >= 8
+            port.close()
+
+
+class TestHosts:
+    def test_find_ports_targets_emulator(self, emulator, monkeypatch):
+        monkeypatch.setenv("FLOOCAST_PORT", emulator.path)
+        [info] = find_ports()
+        assert info.device == emulator.path
+        monkeypatch.setenv("FLOOCAST_PORT", emulator.path + "-gone")
+        assert find_ports() == []
+
+    def test_state_machine_connects(self, emulator, monkeypatch, tmp_path):
+        monkeypatch.setenv("FLOOCAST_PORT", emulator.path)
+        monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+        sm = FlooStateMachine(FlooStateMachineDelegate(), _call_inline, _call_later_thread)
+        sm.inf.hotplug_factory = None
+        sm.start()
+        try:
+            assert wait_until(lambda: sm.state == FlooStateMachine.CONNECTED)
+            assert sm.pairedDevices == ["Headset"]
+            assert sm.timeToReady is not None
+        finally:
+            sm.inf.stop()
+
+    def test_async_client_handshake(self, emulator):
+        emulator.state = FlooEmulatorState(version="AS2.0.0", broadcastName="Hall")
+
+        async def scenario():
+            client = await FlooAsyncClient.connect(emulator.path)
+            snapshot = await client.handshake()
+            client.close()
+            return snapshot
+
+        snapshot = asyncio.run(scenario())
+        assert snapshot["version"] == "AS2.0.0"
+        assert snapshot["broadcastName"] == "Hall"
+        assert snapshot["pairedDevices"] == ["Headset"]
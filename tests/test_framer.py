@@ -0,0 +1,88 @@
+"""Tests for the serial line framer."""
+
+import os
+
+import pytest
+
+from floocast.protocol.framer import FlooFramer
+
+
+class TestFlooFramerFeed:
+    def test_single_frame(self):
+        framer = FlooFramer()
+        assert framer.feed(b"ST=06\r\n") == [b"ST=06"]
+        assert framer.pending == 0
+
+    def test_burst_is_split_in_one_call(self):
+        framer = FlooFramer()
+        frames = framer.feed(b"FN=00,001122334455,Headset\r\nFN=01,66778899AABB,Car\r\nFN=02\r\n")
+        assert frames == [b"FN=00,001122334455,Headset", b"FN=01,66778899AABB,Car", b"FN=02"]
+
+    def test_partial_tail_is_kept(self):
+        framer = FlooFramer()
+        assert framer.feed(b"OK\r\nST=0") == [b"OK"]
+        assert framer.pending == 4
+        assert framer.feed(b"6\r\n") == [b"ST=06"]
+        assert framer.pending == 0
+
+    def test_terminator_split_across_reads(self):
+        framer = FlooFramer()
+        assert framer.feed(b"AC=07\r") == []
+        assert framer.feed(b"\nLA=02\r\n") == [b"AC=07", b"LA=02"]
+
+    def test_empty_frame(self):
+        framer = FlooFramer()
+        assert framer.feed(b"\r\nOK\r\n") == [b"", b"OK"]
+
+    def test_byte_at_a_time(self):
+        framer = FlooFramer()
+        frames = []
+        for b in b"ST=04\r\nST=06\r\n":
+            frames.extend(framer.feed(bytes([b])))
+        assert frames == [b"ST=04", b"ST=06"]
+
+    def test_oversized_garbage_is_dropped(self):
+        framer = FlooFramer(max_frame_size=8)
+        assert framer.feed(b"0123456789") == []
+        assert framer.pending == 0
+        assert framer.dropped_bytes == 10
+        assert framer.feed(b"OK\r\n") == [b"OK"]
+
+    def test_clear(self):
+        framer = FlooFramer()
+        framer.feed(b"ST=0")
+        framer.clear()
+        assert framer.feed(b"OK\r\n") == [b"OK"]
+
+
+class TestFlooFramerReadFrom:
+    @pytest.fixture
+    def pipe(self):
+        r, w = os.pipe()
+        yield r, w
+        os.close(r)
+        os.close(w)
+
+    def test_reads_all_available_frames(self, pipe):
+        r, w = pipe
+        os.write(w, b"ST=06\r\nAC=07\r\nLA=0")
+        framer = FlooFramer()
+        assert framer.read_from(r) == [b"ST=06", b"AC=07"]
+        os.write(w, b"2\r\n")
+        assert framer.read_from(r) == [b"LA=02"]
+
+    def test_small_read_size(self, pipe):
+        r, w = pipe
+        os.write(w, b"ST=06\r\n")
+        framer = FlooFramer(read_size=4)
+        assert framer.read_from(r) == []
+        assert framer.read_from(r) == [b"ST=06"]
+
+    def test_eof_raises(self):
+        r, w = os.pipe()
+        os.close(w)
+        try:
+            with pytest.raises(EOFError):
+                FlooFramer().read_from(r)
+        finally:
+            os.close(r)
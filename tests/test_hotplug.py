@@ -0,0 +1,168 @@
+"""Tests for hotplug uevent parsing and event-driven port scanning."""
+
+import os
+import socket
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from floocast.protocol.hotplug import FlooUEvent, NetlinkUeventSource, parse_uevent
+from floocast.protocol.interface import FlooInterface
+from floocast.protocol.interface_delegate import FlooInterfaceDelegate
+
+TTY_ADD = (
+    b"add@/devices/pci0000:00/0000:00:14.0/usb1/1-2/1-2:1.0/tty/ttyACM0\0"
+    b"ACTION=add\0DEVPATH=/devices/pci0000:00/0000:00:14.0/usb1/1-2/1-2:1.0/tty/ttyACM0\0"
+    b"SUBSYSTEM=tty\0MAJOR=166\0MINOR=0\0DEVNAME=ttyACM0\0SEQNUM=4711\0"
+)
+
+
+class FakeUeventSource:
+    """In-memory uevent source with a real fd so it can be selected on."""
+
+    def __init__(self):
+        self._r, self._w = os.pipe()
+        os.set_blocking(self._r, False)
+        self._events = []
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def push(self, event):
+        with self._lock:
+            self._events.append(event)
+        os.write(self._w, b"\0")
+
+    def fileno(self):
+        return self._r
+
+    def read_events(self):
+        try:
+            os.read(self._r, 1024)
+        except BlockingIOError:
+            pass
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+    def close(self):
+        self.closed = True
+        os.close(self._r)
+        os.close(self._w)
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+class TestParseUevent:
+    def test_parses_tty_add(self):
+        event = parse_uevent(TTY_ADD)
+        assert event.action == "add"
+        assert event.subsystem == "tty"
+        assert event.devname == "ttyACM0"
+        assert event.devpath.endswith("/tty/ttyACM0")
+        assert event.is_tty_change()
+
+    def test_usb_event_is_not_tty_change(self):
+        event = parse_uevent(b"add@/devices/usb1/1-2\0ACTION=add\0SUBSYSTEM=usb\0")
+        assert event is not None
+        assert not event.is_tty_change()
+
+    def test_tty_change_action_is_ignored(self):
+        event = FlooUEvent("change", "/x", {"SUBSYSTEM": "tty"})
+        assert not event.is_tty_change()
+
+    def test_libudev_message_is_rejected(self):
+        assert parse_uevent(b"libudev\0\xfe\xed\xca\xfe") is None
+
+
+class TestNetlinkUeventSource:
+    def test_read_events_drains_socket(self):
+        rx, tx = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        rx.setblocking(False)
+        source = NetlinkUeventSource(rx)
+        try:
+            tx.send(TTY_ADD)
+            tx.send(b"remove@/devices/x/tty/ttyACM0\0SUBSYSTEM=tty\0DEVNAME=ttyACM0\0")
+            events = source.read_events()
+            assert [e.action for e in events] == ["add", "remove"]
+            assert source.read_events() == []
+        finally:
+            source.close()
+            tx.close()
+
+    def test_open_closes_socket_when_bind_fails(self, monkeypatch):
+        sock = MagicMock()
+        sock.bind.side_effect = PermissionError("not allowed")
+        monkeypatch.setattr(socket, "AF_NETLINK", 16, raising=False)
+        monkeypatch.setattr(socket, "socket", lambda *args: sock)
+        assert NetlinkUeventSource.open() is None
+        sock.close.assert_called_once_with()
+
+
+def idle_delegate():
+    delegate = MagicMock(spec=FlooInterfaceDelegate)
+    delegate.pollTimeout.return_value = None
+    return delegate
+
+
+class TestHotplugDrivenScan:
+    @pytest.fixture
+    def source(self):
+        return FakeUeventSource()
+
+    @pytest.fixture
+    def inf(self, source, monkeypatch):
+        monkeypatch.setattr(FlooInterface, "HOTPLUG_SETTLE", 0)
+        inf = FlooInterface(idle_delegate(), hotplug_factory=lambda: source)
+        inf.monitor_port = MagicMock(return_value=False)
+        return inf
+
+    def test_scans_once_then_waits_for_events(self, inf, source):
+        thread = threading.Thread(target=inf.run, daemon=True)
+        thread.start()
+        assert wait_until(lambda: inf.monitor_port.call_count == 1)
+        time.sleep(0.1)
+        assert inf.monitor_port.call_count == 1
+        source.push(parse_uevent(TTY_ADD))
+        assert wait_until(lambda: inf.monitor_port.call_count == 2)
+        inf.stop()
+        thread.join(timeout=2)
+        assert not thread.is_alive()
+        assert source.closed
+
+    def test_unrelated_events_do_not_rescan(self, inf, source):
+        thread = threading.Thread(target=inf.run, daemon=True)
+        thread.start()
+        assert wait_until(lambda: inf.monitor_port.call_count == 1)
+        source.push(FlooUEvent("add", "/devices/usb1/1-2", {"SUBSYSTEM": "usb"}))
+        time.sleep(0.1)
+        assert inf.monitor_port.call_count == 1
+        inf.stop()
+        thread.join(timeout=2)
+
+    def test_wake_from_sleep_rescans(self, inf, source):
+        thread = threading.Thread(target=inf.run, daemon=True)
+        thread.start()
+        assert wait_until(lambda: inf.monitor_port.call_count == 1)
+        inf.setSleep(False)
+        assert wait_until(lambda: inf.monitor_port.call_count == 2)
+        inf.stop()
+        thread.join(timeout=2)
+
+    def test_falls_back_to_polling_without_source(self):
+        inf = FlooInterface(idle_delegate(), hotplug_factory=lambda: None)
+        inf.monitor_port = MagicMock(return_value=False)
+        thread = threading.Thread(target=inf.run, daemon=True)
+        thread.start()
+        assert wait_until(lambda: inf.monitor_port.call_count == 1)
+        inf.stop()
+        thread.join(timeout=2)
+        assert not thread.is_alive()
@@ -0,0 +1,289 @@
+"""Tests for the serial interface reader loop."""
+
+import os
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+import serial
+
+from floocast.protocol.interface import FlooInterface, FlooInterfaceStats
+from floocast.protocol.interface_delegate import FlooInterfaceDelegate
+from floocast.protocol.messages import FlooMsgOk, FlooMsgSt
+from floocast.protocol.trace import INBOUND, OUTBOUND, FlooTraceRecorder, read_trace
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+@pytest.fixture
+def pty_port():
+    master, slave = os.openpty()
+    port = serial.Serial(os.ttyname(slave), baudrate=921600, timeout=2)
+    yield master, port
+    port.close()
+    os.close(master)
+    os.close(slave)
+
+
+@pytest.fixture
+def delegate():
+    delegate = MagicMock(spec=FlooInterfaceDelegate)
+    delegate.pollTimeout.return_value = None
+    return delegate
+
+
+def start_reader(inf, port):
+    inf.port = port
+    inf.port_opened = True
+    thread = threading.Thread(target=inf._read_loop, daemon=True)
+    thread.start()
+    return thread
+
+
+class TestFlooInterfaceStats:
+    def test_record_wakeup_counts_idle(self):
+        stats = FlooInterfaceStats()
+        stats.record_wakeup(True)
+        stats.record_wakeup(False)
+        assert stats.wakeups == 2
+        assert stats.idle_wakeups == 1
+
+    def test_idle_wakeups_per_second(self):
+        stats = FlooInterfaceStats(started_ns=0)
+        stats.idle_wakeups = 10
+        assert stats.idle_wakeups_per_second(now_ns=2_000_000_000) == 5.0
+
+    def test_dispatch_latency(self):
+        stats = FlooInterfaceStats()
+        stats.record_dispatch(1_000_000)
+        stats.record_dispatch(3_000_000)
+        assert stats.mean_dispatch_latency_ms() == 2.0
+        assert stats.max_dispatch_latency_ms() == 3.0
+
+    def test_reset(self):
+        stats = FlooInterfaceStats()
+        stats.record_wakeup(True)
+        stats.record_dispatch(5)
+        stats.reset()
+        assert stats.wakeups == 0
+        assert stats.dispatched == 0
+        assert stats.mean_dispatch_latency_ms() == 0.0
+
+    def test_lifetime_counters(self, delegate):
+        inf = FlooInterface(delegate)
+        port = MagicMock(is_open=True)
+        inf.attach(port, "ttyACM0")
+        inf.attach(port, "ttyACM0")
+        assert inf._handle_frames([b"ST=zz", b"ST=06", b"QQ"], 0)
+        inf.stats.reset()
+        assert inf.stats.port_opens == 2
+        assert inf.stats.parse_failures == 1
+        inf.stop()
+
+
+class TestSelectReader:
+    def test_dispatches_messages(self, pty_port, delegate):
+        master, port = pty_port
+        inf = FlooInterface(delegate)
+        thread = start_reader(inf, port)
+        os.write(master, b"OK\r\nST=06\r\n")
+        assert wait_until(lambda: delegate.handleMessage.call_count == 2)
+        first, second = (c.args[0] for c in delegate.handleMessage.call_args_list)
+        assert isinstance(first, FlooMsgOk)
+        assert isinstance(second, FlooMsgSt)
+        assert second.state == 6
+        inf.stop()
+        thread.join(timeout=2)
+        assert not thread.is_alive()
+
+    def test_partial_line_is_completed_by_next_read(self, pty_port, delegate):
+        master, port = pty_port
+        inf = FlooInterface(delegate)
+        thread = start_reader(inf, port)
+        os.write(master, b"ST=0")
+        assert wait_until(lambda: inf.framer.pending == 4)
+        delegate.handleMessage.assert_not_called()
+        os.write(master, b"6\r\n")
+        assert wait_until(lambda: delegate.handleMessage.call_count == 1)
+        assert delegate.handleMessage.call_args.args[0].state == 6
+        inf.stop()
+        thread.join(timeout=2)
+
+    def test_idle_reader_does_not_spin(self, pty_port, delegate):
+        _, port = pty_port
+        inf = FlooInterface(delegate)
+        thread = start_reader(inf, port)
+        time.sleep(0.2)
+        inf.stop()
+        thread.join(timeout=2)
+        assert not thread.is_alive()
+        # the polling reader would have woken ~20 times in the same window
+        assert inf.stats.wakeups <= 1
+
+    def test_set_sleep_wakes_reader(self, pty_port, delegate):
+        _, port = pty_port
+        inf = FlooInterface(delegate)
+        thread = start_reader(inf, port)
+        time.sleep(0.05)
+        inf.setSleep(True)
+        thread.join(timeout=2)
+        assert not thread.is_alive()
+
+    def test_records_dispatch_latency(self, pty_port, delegate):
+        master, port = pty_port
+        inf = FlooInterface(delegate)
+        thread = start_reader(inf, port)
+        os.write(master, b"OK\r\n")
+        assert wait_until(lambda: inf.stats.dispatched == 1)
+        assert inf.stats.dispatch_latency_max_ns > 0
+        inf.stop()
+        thread.join(timeout=2)
+
+
+class TestPollReader:
+    def test_dispatches_messages(self, pty_port, delegate):
+        master, port = pty_port
+        inf = FlooInterface(delegate, reader_mode=FlooInterface.READER_POLL)
+        thread = start_reader(inf, port)
+        os.write(master, b"OK\r\n")
+        assert wait_until(lambda: delegate.handleMessage.call_count == 1)
+        inf.stop()
+        thread.join(timeout=2)
+        assert not thread.is_alive()
+
+
+class TestSendMsg:
+    def test_send_goes_through_writer(self, pty_port, delegate):
+        master, port = pty_port
+        inf = FlooInterface(delegate)
+        inf.port = port
+        inf.sendMsg(FlooMsgSt(True))
+        assert inf.writer.flush(2)
+        assert os.read(master, 64) == b"BC:ST\r\n"
+        inf.stop()
+
+    def test_superseded_write_is_reported(self, delegate):
+        inf = FlooInterface(delegate)
+        msg = FlooMsgSt(True)
+        inf._superseded(msg)
+        delegate.messageSuperseded.assert_called_once_with(msg)
+
+    def test_send_without_port_is_dropped(self, delegate):
+        inf = FlooInterface(delegate)
+        inf.sendMsg(FlooMsgSt(True))
+        assert inf.writer.depth == 0
+        assert inf.writer.stats.enqueued == 0
+
+
+class TestDispatchHandoff:
+    def test_slow_handler_does_not_stall_reader(self, pty_port, delegate):
+        master, port = pty_port
+        release = threading.Event()
+        delegate.handleMessage.side_effect = lambda msg: release.wait(2)
+        inf = FlooInterface(delegate)
+        thread = start_reader(inf, port)
+        os.write(master, b"OK\r\n")
+        assert wait_until(lambda: delegate.handleMessage.call_count == 1)
+        os.write(master, b"ST=06\r\nST=01\r\n")
+        # the reader keeps reading while the handler is still busy
+        assert wait_until(lambda: inf.dispatcher.depth == 2)
+        release.set()
+        assert wait_until(lambda: delegate.handleMessage.call_count == 3)
+        inf.stop()
+        thread.join(timeout=2)
+
+    def test_timers_run_on_dispatch_worker(self, pty_port, delegate):
+        master, port = pty_port
+        threads = []
+        delegate.pollTimers.side_effect = lambda: threads.append(threading.current_thread())
+        inf = FlooInterface(delegate)
+        thread = start_reader(inf, port)
+        os.write(master, b"OK\r\n")
+        assert wait_until(lambda: threads)
+        assert threads[0] is inf.dispatcher._thread
+        inf.stop()
+        thread.join(timeout=2)
+
+    def test_reset_drops_stale_messages(self, delegate):
+        inf = FlooInterface(delegate)
+        inf.dispatcher.put(FlooMsgOk(False), 0)
+        inf.reset()
+        assert inf.dispatcher.depth == 0
+        delegate.interfaceState.assert_called_once_with(False, None)
+
+
+class TestAttach:
+    def test_port_key_follows_the_dongle(self, delegate):
+        inf = FlooInterface(delegate)
+        port = MagicMock(is_open=True)
+        inf.attach(port, "ttyACM0", key="SN0")
+        assert (inf.port_name, inf.port_key) == ("ttyACM0", "SN0")
+        inf.attach(port, "ttyACM1")
+        assert inf.port_key == "ttyACM1"
+        inf.stop()
+
+
+class TestTraceRecording:
+    def test_records_both_directions(self, pty_port, delegate, tmp_path):
+        master, port = pty_port
+        path = str(tmp_path / "trace.fltr")
+        recorder = FlooTraceRecorder(path)
+        recorder.start()
+        inf = FlooInterface(delegate, recorder=recorder)
+        inf.port_name = "ttyACM0"
+        thread = start_reader(inf, port)
+        inf.sendMsg(FlooMsgSt(True))
+        assert inf.writer.flush(2)
+        assert os.read(master, 64) == b"BC:ST\r\n"
+        os.write(master, b"ST=06\r\n")
+        assert wait_until(lambda: delegate.handleMessage.call_count == 1)
+        inf.stop()
+        thread.join(timeout=2)
+        recorder.stop()
+        records = list(read_trace(path))
+        assert [(r.direction, r.port, r.data) for r in records] == [
+            (OUTBOUND, "ttyACM0", b"BC:ST"),
+            (INBOUND, "ttyACM0", b"ST=06"),
+        ]
+        assert records[0].time_ns < records[1].time_ns
+
+    def test_off_without_recorder(self, delegate, monkeypatch):
+        monkeypatch.delenv("FLOOCAST_TRACE", raising=False)
+        assert FlooInterface(delegate).recorder is None
+
+
+class TestClose:
+    def fd_is_open(self, fd):
+        try:
+            os.fstat(fd)
+        except OSError:
+            return False
+        return True
+
+    def test_close_releases_wake_pipe(self, delegate):
+        inf = FlooInterface(delegate)
+        fds = (inf._wake_r, inf._wake_w)
+        inf.close()
+        assert not any(self.fd_is_open(fd) for fd in fds)
+        # waking or closing again after close is harmless
+        inf.setSleep(False)
+        inf.close()
+
+    def test_close_waits_for_reader(self, delegate):
+        inf = FlooInterface(delegate, hotplug_factory=lambda: None)
+        inf.isSleep = True
+        reader = threading.Thread(target=inf.run, daemon=True)
+        reader.start()
+        assert wait_until(lambda: inf._reader is reader)
+        fds = (inf._wake_r, inf._wake_w)
+        inf.close()
+        assert not reader.is_alive()
+        assert not any(self.fd_is_open(fd) for fd in fds)
@@ -0,0 +1,210 @@
+"""Tests for the multi-dongle manager."""
+
+import os
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+import serial
+
+from floocast.protocol.manager import FlooDongleManager
+from floocast.protocol.pool import FlooWorkerPool
+from floocast.protocol.state_machine import FlooStateMachine
+from floocast.protocol.state_machine_delegate import FlooStateMachineDelegate
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+def read_line(fd, timeout=2.0):
+    buf = b""
+    deadline = time.monotonic() + timeout
+    while not buf.endswith(b"\r\n") and time.monotonic() < deadline:
+        try:
+            buf += os.read(fd, 64)
+        except BlockingIOError:
+            time.sleep(0.005)
+    return buf
+
+
+class FakeDongle:
+    """A pty standing in for one FMA120."""
+
+    def __init__(self, serial_number):
+        self.master, self.slave = os.openpty()
+        os.set_blocking(self.master, False)
+        self.info = SimpleNamespace(
+            serial_number=serial_number,
+            location=None,
+            name=os.path.basename(os.ttyname(self.slave)),
+            device=os.ttyname(self.slave),
+        )
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+@pytest.fixture(autouse=True)
+def no_settings():
+    settings = MagicMock()
+    settings.get_item.return_value = None
+    with patch("floocast.protocol.state_machine.FlooSettings.shared", return_value=settings):
+        yield
+
+
+@pytest.fixture
+def fakes():
+    fakes = [FakeDongle("SN%d" % i) for i in range(3)]
+    yield fakes
+    for fake in fakes:
+        fake.close()
+
+
+@pytest.fixture
+def delegates():
+    return {}
+
+
+@pytest.fixture
+def present(fakes):
+    return list(fakes)
+
+
+@pytest.fixture
+def manager(present, delegates):
+    def delegate_factory(key):
+        delegates[key] = MagicMock(spec=FlooStateMachineDelegate)
+        return delegates[key]
+
+    def opener(path):
+        return serial.Serial(path, baudrate=921600, timeout=2)
+
+    manager = FlooDongleManager(
+        delegate_factory,
+        hotplug_factory=None,
+        scan=lambda: [fake.info for fake in present],
+        opener=opener,
+    )
+    yield manager
+    manager.stop()
+
+
+class TestFlooDongleManager:
+    def test_opens_every_dongle(self, manager, fakes):
+        manager.start()
+        assert wait_until(lambda: len(manager.dongles()) == 3)
+        assert set(manager.dongles()) == {"SN0", "SN1", "SN2"}
+        for fake in fakes:
+            # each dongle gets its own handshake
+            assert read_line(fake.master) == b"BC:VR\r\n"
+
+    def test_dongles_are_independent(self, manager, fakes, delegates):
+        manager.start()
+        assert wait_until(lambda: len(manager.dongles()) == 3)
+        for fake in fakes:
+            assert read_line(fake.master) == b"BC:VR\r\n"
+        os.write(fakes[1].master, b"VR=1.2.3\r\n")
+        assert wait_until(lambda: delegates["SN1"].deviceDetected.called)
+        delegates["SN1"].deviceDetected.assert_called_with(True, fakes[1].info.name, "1.2.3")
+        delegates["SN0"].deviceDetected.assert_not_called()
+        assert manager.get("SN1").state_machine.a2dpSink is False
+
+    def test_uses_one_reader_thread(self, manager, fakes):
+        manager.start()
+        assert wait_until(lambda: len(manager.dongles()) == 3)
+        # no dongle runs FlooInterface.run(); the manager thread reads for all of them
+        assert all(not d.state_machine.is_alive() for d in manager.dongles().values())
+
+    def test_threads_do_not_grow_with_dongles(self, manager, fakes):
+        manager.start()
+        assert wait_until(lambda: len(manager.dongles()) == 3)
+        for fake in fakes:
+            # every dongle has written its handshake and dispatched interfaceState
+            assert read_line(fake.master) == b"BC:VR\r\n"
+        for dongle in manager.dongles().values():
+            assert dongle.interface.writer._thread is None
+            assert dongle.interface.dispatcher._thread is None
+        pooled = [t for t in threading.enumerate() if t in manager.pool._threads]
+        assert len(pooled) == FlooWorkerPool.SIZE
+
+    def test_state_machines_are_keyed_by_dongle(self, manager, fakes):
+        manager.start()
+        assert wait_until(lambda: len(manager.dongles()) == 3)
+        for key, dongle in manager.dongles().items():
+            assert dongle.state_machine.key == key
+            assert dongle.interface.port_key == key
+
+    def test_stop_closes_wake_pipes(self, manager, fakes):
+        manager.start()
+        assert wait_until(lambda: len(manager.dongles()) == 3)
+        interfaces = [d.interface for d in manager.dongles().values()]
+        fds = [manager._wake_r, manager._wake_w]
+        fds += [fd for inf in interfaces for fd in (inf._wake_r, inf._wake_w)]
+        manager.stop()
+        for fd in fds:
+            with pytest.raises(OSError):
+                os.fstat(fd)
+
+    def test_removed_dongle_is_released(self, manager, fakes, present, delegates):
+        manager.start()
+        assert wait_until(lambda: len(manager.dongles()) == 3)
+        present.remove(fakes[0])
+        manager.request_rescan()
+        assert wait_until(lambda: not manager.get("SN0").connected)
+        assert wait_until(lambda: delegates["SN0"].deviceDetected.called)
+        delegates["SN0"].deviceDetected.assert_called_with(False, None)
+        assert manager.get("SN1").connected
+
+    def test_snapshot(self, manager, fakes):
+        manager.start()
+        assert wait_until(lambda: len(manager.dongles()) == 3)
+        snapshot = manager.snapshot()
+        assert snapshot["SN2"]["connected"] is True
+        assert snapshot["SN2"]["path"] == fakes[2].info.device
+        assert snapshot["SN2"]["ready"] is False
+
+    def test_max_dongles(self, manager):
+        manager.max_dongles = 2
+        manager.rescan()
+        assert sum(d.connected for d in manager.dongles().values()) == 2
+
+    def test_busy_port_reports_error(self, fakes, delegates):
+        def busy(path):
+            raise serial.SerialException("Port is busy")
+
+        manager = FlooDongleManager(
+            lambda key: delegates.setdefault(key, MagicMock(spec=FlooStateMachineDelegate)),
+            hotplug_factory=None,
+            scan=lambda: [fakes[0].info],
+            opener=busy,
+        )
+        manager.rescan()
+        assert not manager.get("SN0").connected
+        delegates["SN0"].connectionErrorInd.assert_called_once_with("port_busy")
+
+    def test_key_falls_back_to_location(self, manager, present, fakes):
+        fakes[0].info.serial_number = None
+        fakes[0].info.location = "1-1.2:1.0"
+        manager.rescan()
+        assert "1-1.2:1.0" in manager.dongles()
+
+
+class TestStateMachineHooks:
+    def test_call_after_hook_replaces_wx(self):
+        delegate = MagicMock(spec=FlooStateMachineDelegate)
+        posted = []
+        with patch("floocast.protocol.state_machine.FlooInterface"):
+            sm = FlooStateMachine(delegate, callAfter=lambda f, *a: posted.append((f, a)))
+        sm.connectionError("port_error")
+        [(flush, args)] = posted
+        flush(*args)
+        delegate.connectionErrorInd.assert_called_once_with("port_error")
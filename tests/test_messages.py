@@ -4,6 +4,7 @@ from floocast.protocol.messages import (
     FlooMessage,
     FlooMsgAc,
     FlooMsgBm,
+    FlooMsgFn,
     FlooMsgOk,
     FlooMsgPl,
     FlooMsgSt,
@@ -23,6 +24,22 @@ class TestFlooMessage:
         msg = FlooMessage(False, "ST")
         assert msg.bytes == b"ST\r\n"
 
+    def test_messages_have_no_instance_dict(self):
+        assert not hasattr(FlooMsgSt(False, 6), "__dict__")
+        assert not hasattr(FlooMsgAc(False, 7, 1, 2, 3, 4, 5, 6, 7), "__dict__")
+        assert not hasattr(FlooMsgFn(False, 0, "001122334455", "Headset"), "__dict__")
+
+    def test_received_message_is_not_encoded(self):
+        msg = FlooMsgSt.create_valid_msg(b"ST=06")
+        assert msg._bytes is None
+        assert msg.bytes == b"ST=06\r\n"
+        assert msg.bytes is msg.bytes
+
+    def test_encoding_uses_current_fields(self):
+        msg = FlooMsgAc(False, 7, 0xC4, 0x100, 0x177, 0x64, 0x2710, 0xBB8, 0x9C40)
+        assert msg.spkSampleRate == 0x177 * 10
+        assert msg.bytes == b"AC=07,C4,0100,0177,0064,2710,0BB8,9C40\r\n"
+
 
 class TestFlooMsgOk:
     def test_create_valid_msg(self):
@@ -0,0 +1,161 @@
+"""Tests for the Prometheus metrics rendering and exporters."""
+
+import os
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+
+import pytest
+
+from floocast.metrics import (
+    FlooMetrics,
+    FlooMetricsServer,
+    FlooMetricsTextfile,
+    exporters_from_environ,
+)
+from floocast.protocol.interface import FlooInterfaceStats
+from floocast.protocol.replay import FlooReplay
+from floocast.protocol.trace import INBOUND, FlooTraceRecord
+
+S = 1_000_000_000
+
+HANDSHAKE = [
+    b"VR=1.0.0",
+    b"AM=02",
+    b"ST=01",
+    b"LA=03",
+    b"LF=00",
+    b"BM=00",
+    b"BN=Test",
+    b"FN=00,001122334455,Headset",
+    b"FN=01",
+    b"FT=01",
+    b"AC=07,C4,0258,4800,0000,7530,1234,9C40",
+]
+
+
+def inbound(frames, start_ns=0, port="ttyACM0"):
+    return [
+        FlooTraceRecord(start_ns + i * 1_000_000, INBOUND, port, data)
+        for i, data in enumerate(frames)
+    ]
+
+
+def samples(text):
+    """Metric lines of ``text`` as {name{labels}: value}."""
+    result = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            key, value = line.rsplit(" ", 1)
+            result[key] = float(value)
+    return result
+
+
+@pytest.fixture
+def replay():
+    replay = FlooReplay(inbound(HANDSHAKE))
+    replay.run()
+    replay.interface.stats = FlooInterfaceStats(port_opens=2, parse_failures=5)
+    return replay
+
+
+class TestFlooMetrics:
+    def test_dongle_state(self, replay):
+        metrics = samples(FlooMetrics(replay.stateMachine).render())
+        port = '{port="ttyACM0"}'
+        assert metrics["floocast_connected" + port] == 1
+        assert metrics["floocast_source_state" + port] == 1
+        assert metrics["floocast_le_audio_state" + port] == 3
+        assert metrics["floocast_codec" + port] == 7
+        assert metrics["floocast_rssi_dbm" + port] == 0xC4 - 0x100
+        assert metrics["floocast_codec_rate" + port] == 0x0258
+        assert metrics["floocast_transport_delay" + port] == 0x1234
+        assert metrics["floocast_presentation_delay" + port] == 0x9C40
+        assert metrics["floocast_serial_opens_total" + port] == 2
+        assert metrics["floocast_parse_failures_total" + port] == 5
+
+    def test_command_histograms(self, replay):
+        metrics = samples(FlooMetrics(replay.stateMachine).render())
+        labels = 'port="ttyACM0",command="VR"'
+        assert metrics[f"floocast_command_rtt_seconds_count{{{labels}}}"] == 1
+        assert metrics[f'floocast_command_rtt_seconds_bucket{{{labels},le="+Inf"}}'] == 1
+        assert metrics[f"floocast_command_errors_total{{{labels}}}"] == 0
+
+    def test_unknown_values_are_left_out(self):
+        replay = FlooReplay(inbound(HANDSHAKE[:3]))
+        replay.run()
+        text = FlooMetrics(replay.stateMachine).render()
+        assert "floocast_codec" not in text
+        assert "floocast_le_audio_state" not in text
+        assert "# TYPE floocast_source_state gauge" in text
+
+    def test_reconnect_attempts(self):
+        streaming = [*HANDSHAKE[:2], b"ST=06", *HANDSHAKE[3:]]
+        records = inbound(streaming) + inbound(HANDSHAKE, start_ns=S, port="ttyACM1")
+        records += inbound([b"ST=01"], start_ns=10 * S, port="ttyACM1")
+        replay = FlooReplay(records)
+        replay.run()
+        metrics = samples(FlooMetrics(replay.stateMachine).render())
+        assert metrics['floocast_reconnect_attempts_total{port="ttyACM1"}'] >= 1
+
+    def test_aux_input_xruns(self):
+        text = FlooMetrics(aux_input=SimpleNamespace(xruns=4)).render()
+        assert samples(text) == {"floocast_audio_xruns_total": 4}
+
+    def test_label_values_are_escaped(self, replay):
+        replay.interface.port_name = 'a"b\\c'
+        text = FlooMetrics(replay.stateMachine).render()
+        assert 'floocast_connected{port="a\\"b\\\\c"} 1' in text
+
+    def test_nothing_to_render(self):
+        assert FlooMetrics().render() == ""
+
+
+class TestExporters:
+    @pytest.fixture
+    def metrics(self):
+        return FlooMetrics(aux_input=SimpleNamespace(xruns=1))
+
+    def test_server(self, metrics):
+        server = FlooMetricsServer(metrics, 0)
+        server.start()
+        try:
+            url = f"http://127.0.0.1:{server.port}"
+            with urllib.request.urlopen(url + "/metrics", timeout=2) as response:
+                assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+                assert b"floocast_audio_xruns_total 1" in response.read()
+            with pytest.raises(urllib.error.HTTPError):
+                urllib.request.urlopen(url + "/", timeout=2)
+        finally:
+            server.stop()
+
+    def test_textfile(self, metrics, tmp_path):
+        path = tmp_path / "floocast.prom"
+        FlooMetricsTextfile(metrics, str(path)).write()
+        assert path.read_text() == metrics.render()
+        assert os.listdir(tmp_path) == ["floocast.prom"]
+
+    def test_from_environ(self, metrics, tmp_path):
+        assert exporters_from_environ(metrics, {}) == []
+        path = tmp_path / "floocast.prom"
+        exporters = exporters_from_environ(
+            metrics, {"FLOOCAST_METRICS_PORT": "0", "FLOOCAST_METRICS_FILE": str(path)}
+        )
+        try:
+            assert [type(e) for e in exporters] == [FlooMetricsServer, FlooMetricsTextfile]
+        finally:
+            for exporter in exporters:
+                exporter.stop()
+        assert path.exists()
+
+    def test_bad_interval_falls_back(self, metrics, tmp_path, caplog):
+        path = tmp_path / "floocast.prom"
+        exporters = exporters_from_environ(
+            metrics, {"FLOOCAST_METRICS_FILE": str(path), "FLOOCAST_METRICS_INTERVAL": "15s"}
+        )
+        try:
+            [exporter] = exporters
+            assert exporter.interval == FlooMetricsTextfile.INTERVAL
+        finally:
+            exporter.stop()
+        assert "FLOOCAST_METRICS_INTERVAL" in caplog.text
@@ -0,0 +1,62 @@
+"""Tests for the paired device list and its diffs."""
+
+import random
+
+import pytest
+
+from floocast.protocol.paired_devices import (
+    ADD,
+    MOVE,
+    REMOVE,
+    RENAME,
+    FlooPairedDevice,
+    FlooPairedDeviceEdit,
+    FlooPairedDeviceList,
+    apply_edits,
+)
+
+
+def devices(*names):
+    return FlooPairedDeviceList(FlooPairedDevice(name.lower(), name) for name in names)
+
+
+class TestFlooPairedDeviceList:
+    def test_indexed_by_address(self):
+        paired = devices("Headset", "Speaker")
+        assert paired.index("speaker") == 1
+        assert "headset" in paired
+        assert paired.index("car") is None
+        assert paired.names() == ["Headset", "Speaker"]
+
+    def test_duplicate_address_keeps_first(self):
+        paired = FlooPairedDeviceList([FlooPairedDevice("a", "Old"), FlooPairedDevice("a", "New")])
+        assert paired.names() == ["Old"]
+
+
+class TestDiff:
+    def test_unchanged_list_has_no_edits(self):
+        assert devices("Headset", "Speaker").diff(devices("Headset", "Speaker")) == []
+
+    def test_most_recent_device_moves_to_top(self):
+        edits = devices("Headset", "Speaker", "Car").diff(devices("Car", "Headset", "Speaker"))
+        assert edits == [FlooPairedDeviceEdit(MOVE, 0, "Car", 2)]
+
+    def test_add_and_remove(self):
+        edits = devices("Headset", "Speaker").diff(devices("Car", "Headset"))
+        assert edits == [
+            FlooPairedDeviceEdit(REMOVE, 1, "Speaker"),
+            FlooPairedDeviceEdit(ADD, 0, "Car"),
+        ]
+
+    def test_rename_keeps_position(self):
+        old = devices("Headset")
+        new = FlooPairedDeviceList([FlooPairedDevice("headset", "My Headset")])
+        assert old.diff(new) == [FlooPairedDeviceEdit(RENAME, 0, "My Headset")]
+
+    @pytest.mark.parametrize("seed", range(20))
+    def test_edits_reproduce_the_new_list(self, seed):
+        rng = random.Random(seed)
+        pool = [f"Device{i}" for i in range(10)]
+        old = devices(*rng.sample(pool, rng.randint(0, 8)))
+        new = devices(*rng.sample(pool, rng.randint(0, 8)))
+        assert apply_edits(old.names(), old.diff(new)) == new.names()
@@ -1,7 +1,12 @@
 """Tests for protocol parser."""
 
+import io
+
+import pytest
+
+from floocast.protocol.framer import FlooFramer
 from floocast.protocol.messages import FlooMsgOk
-from floocast.protocol.parser import FlooParser
+from floocast.protocol.parser import FlooParser, header_key
 
 
 class TestFlooParser:
@@ -26,3 +31,153 @@ class TestFlooParser:
         msg = creator(b"OK")
         assert msg is not None
         assert isinstance(msg, FlooMsgOk)
+
+
+CORPUS = [
+    b"OK",
+    b"OKX",
+    b"ST=06",
+    b"ST=6",
+    b"ST=0G",
+    b"ST=0a",
+    b"AM=02",
+    b"AM=02XX",
+    b"AM=",
+    b"LA=03",
+    b"LA=0A",
+    b"LF=01",
+    b"FT=0F",
+    b"BM=36",
+    b"BN=Living Room",
+    b"BN=",
+    b"BN=\xc3\xa9t\xc3\xa9",
+    b"BN=\xff",
+    b"VR=AS1.2.3",
+    b"ER=04",
+    b"ER=4",
+    b"AC=07",
+    b"AC=7",
+    b"AC=",
+    b"AC=07,C4,0100",
+    b"AC=07,C4,0100,1770",
+    b"AC=07,C4,0100,1770,0640",
+    b"AC=07,C4,0100,1770,0640,2710,0BB8,9C40",
+    b"AC=07,C4,01X0,1770,0640,2710,0BB8,9C40",
+    b"AC=07,C4,0100,17",
+    b"FN=01",
+    b"FN=0A",
+    b"FN=00,001122334455",
+    b"FN=00,001122334455,Headset",
+    b"FN=00,001122334455,\xffBad",
+    b"FN=00,0011223344",
+    b"PL=01,001122334455,Speaker",
+    b"PL=01,0011",
+    b"AD=001122334455",
+    b"AD=0011",
+    b"ZZ=00",
+    b"\xff\xfe",
+    b"S",
+]
+
+
+def fields(msg):
+    return {
+        name: getattr(msg, name)
+        for cls in type(msg).__mro__
+        for name in getattr(cls, "__slots__", ())
+        if name != "_bytes"
+    }
+
+
+def same_message(a, b):
+    if a is None or b is None:
+        return a is b
+    return type(a) is type(b) and fields(a) == fields(b) and a.bytes == b.bytes
+
+
+class TestZeroCopyParse:
+    @pytest.mark.parametrize("line", CORPUS)
+    def test_matches_reference_parser(self, line):
+        parser = FlooParser()
+        expected = parser.create_valid_message(line)
+        assert same_message(parser.parse(line), expected)
+        assert same_message(parser.parse(memoryview(line)), expected)
+        assert same_message(parser.parse(bytearray(line)), expected)
+
+    def test_every_header_has_a_decoder(self):
+        assert {header_key(h) for h in FlooParser.MSG_HEADERS} == set(FlooParser.DISPATCH)
+
+    def test_header_key(self):
+        assert header_key("ST") == header_key(b"ST") == 0x5354
+
+    def test_run_uses_fast_path(self):
+        msg = FlooParser().run(memoryview(b"xxST=06")[2:])
+        assert msg.state == 6
+
+
+STREAM = b"ST=04\r\nAC=07,C4,0100,1770,0640,2710,0BB8,9C40\r\n\r\nST=zz\r\nXX=1\r\nFN=02\r\nST=0"
+
+
+class TestParseStream:
+    def test_parses_every_complete_line(self):
+        messages, consumed = FlooParser().parse_stream(STREAM)
+        assert [m.header for m in messages] == ["ST", "AC", "~~", "FN"]
+        assert messages[1].presentDelay == 0x9C40
+        assert consumed == len(STREAM) - len(b"ST=0")
+
+    def test_matches_line_by_line_parse(self):
+        parser = FlooParser()
+        messages, _ = parser.parse_stream(b"".join(line + b"\r\n" for line in CORPUS))
+        expected = [parser.parse(line) for line in CORPUS]
+        expected = [m for m in expected if m is not None]
+        assert len(messages) == len(expected)
+        assert all(same_message(a, b) for a, b in zip(messages, expected, strict=True))
+
+    @pytest.mark.parametrize("buffer_type", [bytes, bytearray, memoryview])
+    def test_accepts_any_buffer(self, buffer_type):
+        messages, consumed = FlooParser().parse_stream(buffer_type(STREAM))
+        assert len(messages) == 4
+        assert consumed == len(STREAM) - 4
+
+    def test_resumes_from_consumed(self):
+        parser = FlooParser()
+        _, consumed = parser.parse_stream(STREAM)
+        messages, consumed = parser.parse_stream(STREAM[consumed:] + b"6\r\n")
+        assert [m.state for m in messages] == [6]
+        assert consumed == 7
+
+    def test_no_terminator_consumes_nothing(self):
+        assert FlooParser().parse_stream(b"ST=0") == ([], 0)
+
+
+class TestIterStream:
+    def test_lines_split_across_chunks(self):
+        data = STREAM + b"6\r\n"
+        for chunk_size in (1, 3, 7, len(data)):
+            messages = list(FlooParser().iter_stream(io.BytesIO(data), chunk_size))
+            assert [m.header for m in messages] == ["ST", "AC", "~~", "FN", "ST"]
+            assert messages[-1].state == 6
+
+    def test_trailing_partial_line_is_ignored(self):
+        assert [m.state for m in FlooParser().iter_stream(io.BytesIO(b"ST=06\r\nST=0"))] == [6]
+
+    def test_runaway_tail_is_dropped(self, caplog):
+        data = b"x" * (FlooFramer.MAX_FRAME_SIZE * 3) + b"\r\nST=06\r\n"
+        messages = list(FlooParser().iter_stream(io.BytesIO(data), chunk_size=64))
+        assert "Dropping" in caplog.text
+        # the rest of the run up to its terminator is dropped too
+        assert [m.header for m in messages] == ["ST"]
+
+    @pytest.mark.parametrize("chunk_size", [1, 7, 64, FlooFramer.MAX_FRAME_SIZE + 1])
+    def test_resyncs_after_dropping_a_runaway_tail(self, chunk_size):
+        garbage = b"ST=0" + b"1" * (FlooFramer.MAX_FRAME_SIZE + 50)
+        data = b"ST=04\r\n" + garbage + b"\r\nST=06\r\nOK\r\n"
+        messages = list(FlooParser().iter_stream(io.BytesIO(data), chunk_size))
+        assert [m.header for m in messages] == ["ST", "ST", "OK"]
+        assert [m.state for m in messages[:2]] == [4, 6]
+
+    def test_is_lazy(self):
+        stream = io.BytesIO(b"ST=06\r\n" * 1000)
+        it = FlooParser().iter_stream(stream, chunk_size=70)
+        assert next(it).state == 6
+        assert stream.tell() == 70
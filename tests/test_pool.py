@@ -0,0 +1,59 @@
+"""Tests for the worker pool shared by many dongles."""
+
+import threading
+import time
+
+import pytest
+
+from floocast.protocol.pool import FlooWorkerPool
+
+
+@pytest.fixture
+def pool():
+    pool = FlooWorkerPool(2)
+    yield pool
+    pool.stop()
+
+
+class TestFlooWorkerPool:
+    def test_threads_start_with_the_first_job(self, pool):
+        assert pool._threads == []
+        done = threading.Event()
+        pool.submit(done.set)
+        assert done.wait(2)
+        assert len(pool._threads) == 2
+
+    def test_jobs_run_on_pool_threads(self, pool):
+        threads = []
+        done = threading.Event()
+        pool.submit(lambda: threads.append(threading.current_thread()))
+        pool.submit(done.set)
+        assert done.wait(2)
+        assert threads[0] in pool._threads
+
+    def test_call_at_waits_for_its_time(self, pool):
+        fired = []
+        done = threading.Event()
+        start = time.monotonic()
+        pool.call_at(start + 0.05, lambda: (fired.append(time.monotonic()), done.set()))
+        pool.call_at(start + 0.01, lambda: fired.append(time.monotonic()))
+        assert done.wait(2)
+        assert len(fired) == 2
+        assert fired[0] <= fired[1]
+        assert fired[1] - start >= 0.05
+
+    def test_failing_job_does_not_kill_the_thread(self, pool):
+        done = threading.Event()
+        pool.submit(lambda: 1 / 0)
+        pool.submit(done.set)
+        assert done.wait(2)
+        assert all(thread.is_alive() for thread in pool._threads)
+
+    def test_stop_drops_pending_timers(self, pool):
+        fired = []
+        pool.call_at(time.monotonic() + 0.05, lambda: fired.append(1))
+        threads = list(pool._threads)
+        pool.stop()
+        assert not any(thread.is_alive() for thread in threads)
+        time.sleep(0.1)
+        assert fired == []
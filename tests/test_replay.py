@@ -0,0 +1,156 @@
+"""Tests for replaying traces through the state machine in virtual time."""
+
+from unittest.mock import MagicMock
+
+import pytest
+
+from floocast.protocol.replay import (
+    REALTIME,
+    FlooReplay,
+    FlooReplayScheduler,
+    FlooVirtualClock,
+)
+from floocast.protocol.state_machine import FlooStateMachine
+from floocast.protocol.state_machine_delegate import FlooStateMachineDelegate
+from floocast.protocol.trace import INBOUND, OUTBOUND, FlooTraceRecord, FlooTraceRecorder
+
+S = 1_000_000_000
+
+HANDSHAKE = [
+    b"VR=1.0.0",
+    b"AM=02",
+    b"ST=01",
+    b"LA=00",
+    b"LF=00",
+    b"BM=00",
+    b"BN=Test",
+    b"FN=00,001122334455,Headset",
+    b"FN=01",
+    b"FT=01",
+    b"AC=00",
+]
+
+
+def inbound(frames, start_ns=0, step_ns=1_000_000, port="ttyACM0"):
+    return [
+        FlooTraceRecord(start_ns + i * step_ns, INBOUND, port, data)
+        for i, data in enumerate(frames)
+    ]
+
+
+class TestFlooReplayScheduler:
+    @pytest.fixture
+    def clock(self):
+        return FlooVirtualClock()
+
+    @pytest.fixture
+    def scheduler(self, clock):
+        return FlooReplayScheduler(clock)
+
+    def test_runs_in_due_order(self, scheduler, clock):
+        calls = []
+        scheduler.callLater(2000, lambda: calls.append(("late", clock.now)))
+        scheduler.callAfter(calls.append, ("now", clock.now))
+        scheduler.callLater(1000, lambda: calls.append(("soon", clock.now)))
+        scheduler.run_until(1.5)
+        assert calls == [("now", 0.0), ("soon", 1.0)]
+        scheduler.run_until(10)
+        assert calls[-1] == ("late", 2.0)
+        assert scheduler.fired == 3
+
+    def test_stopped_timer_never_fires(self, scheduler):
+        func = MagicMock()
+        timer = scheduler.callLater(100, func)
+        timer.Stop()
+        assert not timer.IsRunning()
+        scheduler.run_until(1)
+        func.assert_not_called()
+
+    def test_calls_posted_while_running_are_run(self, scheduler):
+        func = MagicMock()
+        scheduler.callAfter(lambda: scheduler.callAfter(func))
+        scheduler.run_until(0)
+        func.assert_called_once()
+
+
+class TestFlooReplay:
+    def test_handshake_reaches_connected(self):
+        replay = FlooReplay(inbound(HANDSHAKE))
+        stats = replay.run()
+        sm = replay.stateMachine
+        assert sm.state == FlooStateMachine.CONNECTED
+        assert sm.pairedDevices == ["Headset"]
+        assert stats.messages == len(HANDSHAKE)
+        assert stats.sent == len(FlooStateMachine.INIT_SEQUENCE)
+        # measured on the virtual clock: ten frames 1 ms apart
+        assert sm.timeToReady == pytest.approx(0.010)
+
+    def test_delegate_calls_go_through_scheduler(self):
+        delegate = MagicMock(spec=FlooStateMachineDelegate)
+        stats = FlooReplay(inbound(HANDSHAKE), delegate=delegate).run()
+        delegate.deviceDetected.assert_called_once_with(True, "ttyACM0", "1.0.0")
+        delegate.pairedDevicesUpdateInd.assert_called_with(["Headset"])
+        assert stats.callbacks > 0
+
+    def test_silent_dongle_times_out_in_virtual_time(self):
+        # only the version is answered; a frame a minute later lets every query expire
+        records = inbound([b"VR=1.0.0"]) + inbound([b"ST=01"], start_ns=120 * S)
+        replay = FlooReplay(records)
+        stats = replay.run()
+        assert replay.stateMachine.state == FlooStateMachine.CONNECTED
+        retries = FlooStateMachine.QUERY_POLICY.retries
+        queries = len(FlooStateMachine.INIT_SEQUENCE) - 1
+        assert stats.sent == 1 + queries * (1 + retries)
+        assert stats.wall_seconds < 60
+
+    def test_replug_replays_reconnect(self):
+        streaming = [*HANDSHAKE[:2], b"ST=06", *HANDSHAKE[3:]]
+        records = inbound(streaming) + inbound(HANDSHAKE, start_ns=S, port="ttyACM1")
+        records += inbound([b"ST=01"], start_ns=10 * S, port="ttyACM1")
+        replay = FlooReplay(records)
+        stats = replay.run()
+        assert stats.reconnects == 1
+        toggles = [(t, msg) for t, msg in replay.interface.sent if msg.header == "TC"]
+        # auto-reconnect after the first back-off step of 2 s, then again once unanswered
+        assert toggles[0][0] == pytest.approx(1.010 + 2.0)
+        assert len(toggles) > 1
+
+    def test_counts_bad_and_outbound_frames(self):
+        records = inbound([b"VR=1.0.0", b"ST=zz", b"QQ=01"])
+        records.append(FlooTraceRecord(5, OUTBOUND, "ttyACM0", b"BC:VR"))
+        stats = FlooReplay(records).run()
+        assert stats.invalid == 1
+        assert stats.unknown == 1
+        assert stats.recorded_sent == 1
+
+    def test_paced_replay_sleeps_scaled_gaps(self):
+        slept = []
+        records = inbound([b"VR=1.0.0", b"AM=02", b"ST=01"], step_ns=S)
+        FlooReplay(records, speed=REALTIME * 100, sleep=slept.append).run()
+        # the sleeps aim at wall time of the frame: 10 ms and 20 ms after the start
+        assert len(slept) == 2
+        assert slept[-1] == pytest.approx(0.02, abs=5e-3)
+
+    def test_rejects_bad_speed(self):
+        with pytest.raises(ValueError):
+            FlooReplay([], speed=0)
+
+    def test_settings_stay_in_memory(self):
+        replay = FlooReplay(
+            inbound(HANDSHAKE),
+            settings={"handshake_mode": FlooStateMachine.HANDSHAKE_SEQUENTIAL},
+        )
+        replay.run()
+        assert replay.stateMachine.handshakeMode == FlooStateMachine.HANDSHAKE_SEQUENTIAL
+        assert replay.stateMachine.state == FlooStateMachine.CONNECTED
+
+    def test_from_trace_reads_rotated_files(self, tmp_path):
+        path = str(tmp_path / "session.fltr")
+        recorder = FlooTraceRecorder(path, max_bytes=120)
+        recorder.start()
+        for record in inbound(HANDSHAKE):
+            recorder.record(record.direction, record.port, record.data, record.time_ns)
+            assert recorder.flush(2)
+        recorder.stop()
+        stats = FlooReplay.from_trace(path).run()
+        assert stats.messages == len(HANDSHAKE)
@@ -0,0 +1,211 @@
+"""Tests for the declarative message schema compiler."""
+
+import struct
+from binascii import unhexlify
+
+import pytest
+
+from floocast.protocol import messages
+from floocast.protocol.messages import (
+    FlooMessage,
+    FlooMsgAc,
+    FlooMsgFn,
+    FlooMsgPl,
+    FlooMsgSt,
+)
+from floocast.protocol.parser import FlooParser
+from floocast.protocol.schema import DEC, HEX, RAW, UTF8, Field, Layout, Schema, compile_schema
+
+
+class _Sample(FlooMessage):
+    __slots__ = ("a", "b", "text")
+
+    HEADER = "SM"
+    SCHEMA = Schema(
+        (
+            Layout(
+                (
+                    Field("a", 3, 2, HEX),
+                    Field("b", 6, 4, DEC, scale=10),
+                    Field("text", 11, None, UTF8),
+                ),
+                min_length=12,
+            ),
+            Layout((Field("a", 3, 2, HEX),), length=5, defaults={"b": 0, "text": "none"}),
+        )
+    )
+
+
+class TestField:
+    def test_rejects_unknown_kind(self):
+        with pytest.raises(ValueError):
+            Field("x", 3, 2, "octal")
+
+    def test_numeric_field_needs_width(self):
+        with pytest.raises(ValueError):
+            Field("x", 3, None, HEX)
+
+    def test_text_field_may_run_to_end(self):
+        assert Field("x", 3, None, RAW).width is None
+
+
+class TestCompileSchema:
+    def test_requires_slots_for_every_field(self):
+        class NoSlot(FlooMessage):
+            __slots__ = ()
+            HEADER = "NS"
+
+        with pytest.raises(TypeError, match="value"):
+            compile_schema(NoSlot, Schema((Layout((Field("value", 3, 2),), length=5),)))
+
+    def test_subclass_gets_compiled_functions(self):
+        assert _Sample.create_valid_msg.__qualname__ == "_Sample.create_valid_msg"
+        assert "def parse(p)" in _Sample.create_valid_msg.__source__
+
+    def test_parses_first_matching_layout(self):
+        msg = _Sample.create_valid_msg(b"SM=1F,0048,hi")
+        assert (msg.a, msg.b, msg.text) == (0x1F, 480, "hi")
+        assert msg.isSend is False
+        assert msg.header == "SM"
+
+    def test_layout_defaults(self):
+        msg = _Sample.create_valid_msg(b"SM=1F")
+        assert (msg.a, msg.b, msg.text) == (0x1F, 0, "none")
+
+    @pytest.mark.parametrize("line", [b"SM=1", b"SM=1G", b"SM=1F,00x8,hi", b"SM=1F,0048,\xff"])
+    def test_rejects_bad_lines(self, line):
+        assert _Sample.create_valid_msg(line) is None
+
+    def test_accepts_memoryview(self):
+        msg = _Sample.create_valid_msg(memoryview(b"SM=0a,0001,text"))
+        assert (msg.a, msg.b, msg.text) == (10, 10, "text")
+
+    def test_encode_uses_first_complete_layout(self):
+        msg = _Sample.create_valid_msg(b"SM=1F,0048,hi")
+        assert msg.bytes == b"SM=1F,0048,hi\r\n"
+        msg.text = None
+        msg._bytes = None
+        assert msg.bytes == b"SM=1F\r\n"
+
+
+RECEIVED_LINES = [
+    b"OK",
+    b"ST=06",
+    b"BM=03",
+    b"AM=01",
+    b"LF=01",
+    b"FT=02",
+    b"LA=09",
+    b"ER=12",
+    b"VR=1.2.3",
+    b"AC=07,C4,0100,1770,0640,2710,0BB8,9C40",
+    b"FN=02",
+    b"FN=00,001122334455,Headset",
+    b"PL=00,001122334455,Headset",
+    b"AD=001122334455",
+]
+
+
+class TestMessageSchemas:
+    def test_every_message_class_is_declared(self):
+        for name in messages.__all__:
+            cls = getattr(messages, name)
+            if cls in (FlooMessage, messages.FlooMsgUnknown):
+                continue
+            assert "SCHEMA" in cls.__dict__, name
+
+    @pytest.mark.parametrize("line", RECEIVED_LINES)
+    def test_received_lines_round_trip(self, line):
+        msg = FlooParser().parse(line)
+        assert msg is not None
+        assert bytes(msg.bytes) == line + b"\r\n"
+
+    def test_packed_ac_rejects_stray_separator(self):
+        assert FlooMsgAc.create_valid_msg(b"AC=07,,4,0100,1770,0640,2710,0BB8,9C40") is None
+        assert FlooMsgAc.create_valid_msg(b"AC=07,C4,0100,1770,0640,2710,0BB8,9C4G") is None
+
+    def test_ac_with_other_separators_uses_digit_path(self):
+        msg = FlooMsgAc.create_valid_msg(b"AC=07;C4;0100;1770;0640;2710;0BB8;9C40")
+        assert (msg.codec, msg.rssi, msg.presentDelay) == (7, 0xC4, 0x9C40)
+
+    def test_constructor_and_parser_agree(self):
+        built = FlooMsgAc(False, 7, 0xC4, 0x100, 0x177, 0x64, 0x2710, 0xBB8, 0x9C40)
+        parsed = FlooMsgAc.create_valid_msg(built.bytes[:-2])
+        for name in FlooMsgAc.__slots__:
+            assert getattr(parsed, name) == getattr(built, name)
+
+
+# The hand-written decoders the schema replaced; the compiled parsers must
+# decode the same messages. benchmarks/bench_schema.py times them.
+_HEX = [-1] * 256
+for _i, _c in enumerate(b"0123456789ABCDEF"):
+    _HEX[_c] = _i
+for _i, _c in enumerate(b"abcdef", start=10):
+    _HEX[_c] = _i
+_DEC = [d if d < 10 else -1 for d in _HEX]
+
+
+def _hex2(pkt, i):
+    hi = _HEX[pkt[i]]
+    lo = _HEX[pkt[i + 1]]
+    if hi < 0 or lo < 0:
+        raise ValueError("invalid hex digit")
+    return hi << 4 | lo
+
+
+def _dec2(pkt, i):
+    hi = _DEC[pkt[i]]
+    lo = _DEC[pkt[i + 1]]
+    if hi < 0 or lo < 0:
+        raise ValueError("invalid decimal digit")
+    return hi * 10 + lo
+
+
+def _hand_st(pkt):
+    return FlooMsgSt(False, _hex2(pkt, 3)) if len(pkt) == 5 else None
+
+
+_AC_COMMAS = (5, 8, 13, 18, 23, 28, 33)
+_AC_STRUCT = struct.Struct(">BBHHHHHH")
+
+
+def _hand_ac(pkt):
+    if len(pkt) != 38:
+        return None
+    if all(pkt[i] == 0x2C for i in _AC_COMMAS):
+        return FlooMsgAc(False, *_AC_STRUCT.unpack(unhexlify(bytes(pkt[3:]).replace(b",", b""))))
+    return None
+
+
+def _hand_fn(pkt):
+    if len(pkt) > 19:
+        return FlooMsgFn(
+            False, _dec2(pkt, 3), str(pkt[6:18], "utf-8"), str(pkt[19:], "utf-8", "ignore")
+        )
+    return None
+
+
+def _hand_pl(pkt):
+    if len(pkt) < 20:
+        return None
+    return FlooMsgPl(False, _dec2(pkt, 3), bytes(pkt[6:18]), bytes(pkt[19:]), bytes(pkt[3:]))
+
+
+class TestHandWrittenEquivalence:
+    @pytest.mark.parametrize(
+        "line, hand_written, compiled",
+        [
+            (b"ST=06", _hand_st, FlooMsgSt.create_valid_msg),
+            (b"AC=07,C4,0100,1770,0640,2710,0BB8,9C40", _hand_ac, FlooMsgAc.create_valid_msg),
+            (b"FN=01,66778899AABB,Living Room Speaker", _hand_fn, FlooMsgFn.create_valid_msg),
+            (b"PL=01,66778899AABB,Living Room Speaker", _hand_pl, FlooMsgPl.create_valid_msg),
+        ],
+        ids=["ST", "AC", "FN", "PL"],
+    )
+    def test_compiled_parse_matches(self, line, hand_written, compiled):
+        view = memoryview(line)
+        expected = hand_written(view)
+        parsed = compiled(view)
+        assert parsed.bytes == expected.bytes
+        for name in type(parsed).__slots__:
+            assert getattr(parsed, name) == getattr(expected, name)
@@ -1,4 +1,11 @@
-from floocast.settings import FlooSettings
+import json
+import os
+import time
+
+import pytest
+
+from floocast.file_watch import FlooFileWatch
+from floocast.settings import FlooJournaledSettings, FlooSettings
 
 
 class TestFlooSettingsGetSet:
@@ -142,3 +149,285 @@ class TestFlooSettingsPath:
         monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
         settings = FlooSettings(filename="config.json")
         assert settings.path == tmp_path / "FlooCast" / "config.json"
+
+
+class TestFlooSettingsWriteBehind:
+    @pytest.fixture
+    def writes(self, monkeypatch):
+        writes = []
+        original = FlooSettings._write
+
+        def counting_write(self, text):
+            writes.append(json.loads(text))
+            original(self, text)
+
+        monkeypatch.setattr(FlooSettings, "_write", counting_write)
+        return writes
+
+    def test_unchanged_settings_are_not_rewritten(self, tmp_path, monkeypatch, writes):
+        monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+        settings = FlooSettings()
+        settings.set("key", "value")
+        settings.save()
+        settings.save()
+        assert FlooSettings().get("key") == "value"
+        FlooSettings().save()
+        assert writes == [{"key": "value"}]
+
+    def test_changes_within_window_are_written_once(self, tmp_path, monkeypatch, writes):
+        monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+        settings = FlooSettings(write_behind=0.05)
+        try:
+            for i in range(10):
+                settings.set_item("count", i)
+                settings.save()
+            assert writes == []
+            deadline = time.monotonic() + 2
+            while not writes and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.1)
+            assert writes == [{"count": 9}]
+        finally:
+            settings.close()
+        assert writes == [{"count": 9}]
+
+    def test_close_flushes_pending_changes(self, tmp_path, monkeypatch, writes):
+        monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+        settings = FlooSettings(write_behind=60)
+        settings.set_item("start_minimized", True)
+        settings.close()
+        assert writes == [{"start_minimized": True}]
+        assert FlooSettings().get_item("start_minimized") is True
+        # closed stores write synchronously again
+        settings.set_item("start_minimized", False)
+        settings.save()
+        assert FlooSettings().get_item("start_minimized") is False
+
+    def test_failed_write_keeps_old_file_and_retries(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+        settings = FlooSettings()
+        settings.set("key", "old")
+        settings.save()
+
+        def failing_replace(src, dst):
+            raise OSError("disk full")
+
+        with monkeypatch.context() as m:
+            m.setattr(os, "replace", failing_replace)
+            settings.set("key", "new")
+            with pytest.raises(OSError):
+                settings.save()
+        assert FlooSettings().get("key") == "old"
+        assert os.listdir(tmp_path / "FlooCast") == ["settings.json"]
+        settings.save()
+        assert FlooSettings().get("key") == "new"
+
+
+def edit_externally(path, data):
+    """Replace the settings file the way another process would."""
+    tmp = path.with_suffix(".other")
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, path)
+
+
+class TestFlooSettingsShared:
+    @pytest.fixture(params=["inotify", "stat"])
+    def shared(self, request, tmp_path, monkeypatch):
+        monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+        if request.param == "stat":
+            monkeypatch.setattr(FlooFileWatch, "open", classmethod(lambda cls, path: None))
+        settings = FlooSettings.shared()
+        yield settings
+        settings.close()
+
+    def test_one_store_per_path(self, shared):
+        assert FlooSettings.shared() is shared
+        assert FlooSettings.shared(filename="other.json") is not shared
+        FlooSettings.shared(filename="other.json").close()
+
+    def test_closed_store_is_replaced(self, shared):
+        shared.close()
+        assert FlooSettings.shared() is not shared
+        FlooSettings.shared().close()
+
+    def test_external_edit_is_picked_up(self, shared):
+        shared.set("mine", 1)
+        shared.save()
+        edit_externally(shared.path, {"mine": 1, "theirs": 2})
+        assert shared.get("theirs") == 2
+
+    def test_unsaved_keys_survive_external_edit(self, shared):
+        shared.set("mine", 1)
+        shared.save()
+        shared.set("mine", 3)
+        shared.remove("gone")
+        edit_externally(shared.path, {"mine": 2, "theirs": 2, "gone": 1})
+        assert shared.get("mine") == 3
+        assert shared.get("theirs") == 2
+        assert shared.get("gone") is None
+        shared.save()
+        assert json.loads(shared.path.read_text()) == {"mine": 3, "theirs": 2}
+
+    def test_save_merges_instead_of_clobbering(self, shared):
+        shared.set("mine", 1)
+        shared.save()
+        edit_externally(shared.path, {"mine": 1, "theirs": 2})
+        shared.set("mine", 4)
+        shared.save()
+        assert json.loads(shared.path.read_text()) == {"mine": 4, "theirs": 2}
+
+    def test_reads_do_not_reload_unchanged_file(self, shared, monkeypatch):
+        shared.set("mine", 1)
+        shared.save()
+        shared.get("mine")
+        reloads = []
+        monkeypatch.setattr(FlooSettings, "_merge_file", lambda self: reloads.append(1))
+        for _ in range(100):
+            shared.get("mine")
+        assert reloads == []
+
+
+class TestFlooFileWatch:
+    def test_reports_changes_to_its_file_only(self, tmp_path):
+        path = tmp_path / "settings.json"
+        watch = FlooFileWatch.open(path)
+        if watch is None:
+            pytest.skip("inotify not available")
+        try:
+            assert not watch.changed()
+            (tmp_path / "other.json").write_text("{}")
+            assert not watch.changed()
+            edit_externally(path, {})
+            assert watch.changed()
+            assert not watch.changed()
+        finally:
+            watch.close()
+
+
+class TestFlooJournaledSettings:
+    @pytest.fixture(autouse=True)
+    def config_home(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path))
+
+    def journal(self, settings):
+        return [json.loads(line) for line in settings.journal_path.read_text().splitlines()]
+
+    def test_roundtrip(self):
+        settings = FlooJournaledSettings()
+        settings.set_item("device", {"name": "test"})
+        settings.set("count", 1)
+        settings.save()
+        reloaded = FlooJournaledSettings()
+        assert reloaded.get_item("device") == {"name": "test"}
+        assert reloaded.get("count") == 1
+
+    def test_save_appends_only_changed_keys(self):
+        settings = FlooJournaledSettings()
+        settings.set("start_minimized", True)
+        settings.set_item("last_streaming_state", 6)
+        settings.save()
+        settings.set_item("last_streaming_state", 6)
+        settings.save()
+        settings = FlooJournaledSettings()
+        settings.set("start_minimized", True)
+        settings.save()
+        settings.set_item("last_streaming_state", None)
+        settings.remove("start_minimized")
+        settings.save()
+        assert self.journal(settings) == [
+            {"set": "last_streaming_state", "value": 6},
+            {"set": "start_minimized", "value": True},
+            {"set": "last_streaming_state", "value": None},
+            {"remove": "start_minimized"},
+        ]
+        assert not settings.path.exists()
+        assert FlooJournaledSettings().get("start_minimized") is None
+
+    def test_journal_is_replayed_over_snapshot(self):
+        snapshot = FlooSettings()
+        snapshot.update({"a": 1, "b": 2})
+        snapshot.save()
+        settings = FlooJournaledSettings()
+        settings.set("b", 3)
+        settings.save()
+        assert FlooJournaledSettings().get("a") == 1
+        assert FlooJournaledSettings().get("b") == 3
+        # the snapshot alone is still plain settings JSON
+        assert FlooSettings().get("b") == 2
+
+    def test_compacts_past_threshold(self):
+        settings = FlooJournaledSettings(compact_bytes=200)
+        settings.set("keep", "x")
+        for state in range(20):
+            settings.set_item("last_streaming_state", state)
+            settings.save()
+        assert settings.journal_path.stat().st_size <= 200
+        assert FlooSettings().get("keep") == "x"
+        reloaded = FlooJournaledSettings()
+        assert reloaded.get_item("last_streaming_state") == 19
+        assert reloaded.get("keep") == "x"
+
+    def test_torn_record_is_dropped(self):
+        settings = FlooJournaledSettings()
+        settings.set("a", 1)
+        settings.save()
+        with open(settings.journal_path, "a") as f:
+            f.write('{"set": "a", "val')
+        settings = FlooJournaledSettings()
+        assert settings.get("a") == 1
+        settings.set("b", 2)
+        settings.save()
+        assert self.journal(settings) == [{"set": "a", "value": 1}, {"set": "b", "value": 2}]
+
+    def test_shared_store_from_environ(self, monkeypatch):
+        monkeypatch.setenv("FLOOCAST_SETTINGS_JOURNAL", "1")
+        settings = FlooSettings.shared()
+        try:
+            assert isinstance(settings, FlooJournaledSettings)
+        finally:
+            settings.close()
+
+    def test_watch_sees_appends_from_another_store(self):
+        settings = FlooJournaledSettings(watch=True)
+        try:
+            other = FlooJournaledSettings()
+            other.set("theirs", 1)
+            other.save()
+            assert settings.get("theirs") == 1
+        finally:
+            settings.close()
+
+    def test_unchanged_non_ascii_value_is_not_appended(self):
+        settings = FlooJournaledSettings()
+        settings.set("broadcast_name", "Wohnzimmer Lautsprecher ♪")
+        settings.save()
+        settings = FlooJournaledSettings()
+        settings.set("broadcast_name", "Wohnzimmer Lautsprecher ♪")
+        settings.save()
+        assert len(self.journal(settings)) == 1
+
+    def test_two_stores_survive_each_others_compaction(self):
+        first = FlooJournaledSettings(compact_bytes=100)
+        second = FlooJournaledSettings(compact_bytes=100)
+        first.set("a", 1)
+        first.save()
+        for state in range(5):
+            second.set_item("last_streaming_state", state)
+            second.save()
+        first.set("b", 2)
+        first.save()
+        assert not first.journal_path.read_bytes().startswith(b"\0")
+        reloaded = FlooJournaledSettings()
+        assert reloaded.get("a") == 1
+        assert reloaded.get("b") == 2
+        assert reloaded.get_item("last_streaming_state") == 4
+
+    def test_torn_tail_left_by_another_writer_is_dropped(self):
+        first = FlooJournaledSettings()
+        first.set("a", 1)
+        first.save()
+        with open(first.journal_path, "a") as f:
+            f.write('{"set": "a", "val')
+        first.set("b", 2)
+        first.save()
+        assert self.journal(first) == [{"set": "a", "value": 1}, {"set": "b", "value": 2}]
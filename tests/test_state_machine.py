@@ -45,7 +45,7 @@ def mock_settings():
 @pytest.fixture
 def state_machine(mock_delegate, mock_settings):
     with (
-        patch("floocast.protocol.state_machine.FlooSettings", return_value=mock_settings),
+        patch("floocast.protocol.state_machine.FlooSettings.shared", return_value=mock_settings),
         patch("floocast.protocol.state_machine.FlooInterface"),
         patch("floocast.protocol.state_machine._wx_call_after", sync_call_after),
     ):
@@ -77,6 +77,11 @@ class TestInterfaceStateCallback:
 
 
 class TestHandshakeSequence:
+    @pytest.fixture
+    def state_machine(self, state_machine):
+        state_machine.handshakeMode = FlooStateMachine.HANDSHAKE_SEQUENTIAL
+        return state_machine
+
     def test_vr_response_triggers_am_query(self, state_machine):
         with patch("floocast.protocol.state_machine._wx_call_after", sync_call_after):
             state_machine.interfaceState(True, "ttyUSB0")
@@ -205,20 +210,20 @@ class TestUnsolicitedMessages:
 
     def test_unsolicited_st_updates_source_state(self, connected_sm, mock_delegate):
         with patch("floocast.protocol.state_machine._wx_call_after", sync_call_after):
-            connected_sm.lastCmd = None
+            assert connected_sm.lastCmd is None
             connected_sm.handleMessage(FlooMsgSt.create_valid_msg(b"ST=04"))
             assert connected_sm.sourceState == 4
             mock_delegate.sourceStateInd.assert_called_with(4)
 
     def test_unsolicited_la_updates_lea_state(self, connected_sm, mock_delegate):
         with patch("floocast.protocol.state_machine._wx_call_after", sync_call_after):
-            connected_sm.lastCmd = None
+            assert connected_sm.lastCmd is None
             connected_sm.handleMessage(FlooMsgLa.create_valid_msg(b"LA=02"))
             mock_delegate.leAudioStateInd.assert_called_with(2)
 
     def test_unsolicited_ac_updates_codec(self, connected_sm, mock_delegate):
         with patch("floocast.protocol.state_machine._wx_call_after", sync_call_after):
-            connected_sm.lastCmd = None
+            assert connected_sm.lastCmd is None
             connected_sm.handleMessage(FlooMsgAc.create_valid_msg(b"AC=05"))
             mock_delegate.audioCodecInUseInd.assert_called()
 
@@ -255,6 +260,59 @@ class TestAutoReconnect:
             mock_clear.assert_called_once()
 
 
+class TestSavedStreamingState:
+    """Two dongles, each with its own state machine, share one settings store."""
+
+    @pytest.fixture
+    def settings(self):
+        return _MemorySettings()
+
+    def machine(self, mock_delegate, settings, port, key):
+        interface = MagicMock()
+        interface.port_name = port
+        return FlooStateMachine(
+            mock_delegate,
+            callAfter=sync_call_after,
+            interface=interface,
+            settings=settings,
+            key=key,
+        )
+
+    def stream(self, sm, port):
+        sm.interfaceState(True, port)
+        sm.state = FlooStateMachine.CONNECTED
+        sm.handleMessage(FlooMsgSt.create_valid_msg(b"ST=06"))
+
+    def test_streaming_state_is_kept_per_dongle(self, mock_delegate, settings):
+        first = self.machine(mock_delegate, settings, "ttyACM0", "SN0")
+        second = self.machine(mock_delegate, settings, "ttyACM1", "SN1")
+        self.stream(first, "ttyACM0")
+        self.stream(second, "ttyACM1")
+        assert settings.data[FlooStateMachine.STREAMING_STATE_KEY] == {
+            "SN0": SourceState.STREAMING,
+            "SN1": SourceState.STREAMING,
+        }
+
+    def test_restart_restores_only_its_own_dongle(self, mock_delegate, settings):
+        settings.data[FlooStateMachine.STREAMING_STATE_KEY] = {"SN0": SourceState.STREAMING}
+        # after a replug the kernel gave SN0's old tty name to SN1
+        second = self.machine(mock_delegate, settings, "ttyACM0", "SN1")
+        second.interfaceState(True, "ttyACM0")
+        assert second._sourceStateBeforeDisconnect is None
+        first = self.machine(mock_delegate, settings, "ttyACM1", "SN0")
+        first.interfaceState(True, "ttyACM1")
+        assert first._sourceStateBeforeDisconnect == SourceState.STREAMING
+        assert settings.data[FlooStateMachine.STREAMING_STATE_KEY] == {}
+
+    def test_key_defaults_to_the_interface_port_key(self, mock_delegate, settings):
+        sm = self.machine(mock_delegate, settings, "ttyACM0", None)
+        sm.inf.port_key = "1-1.2:1.0"
+        self.stream(sm, "ttyACM0")
+        assert settings.data[FlooStateMachine.STREAMING_STATE_KEY] == {
+            "1-1.2:1.0": SourceState.STREAMING
+        }
+
+
 class TestReset:
     def test_reset_clears_state(self, state_machine):
         state_machine.state = FlooStateMachine.CONNECTED
@@ -302,3 +360,517 @@ class TestBroadcastSettings:
     def test_set_broadcast_key_sends_command(self, connected_sm):
         connected_sm.setBroadcastKey("secret")
         assert connected_sm.lastCmd.header == "BE"
+
+
+class TestCommandCorrelation:
+    @pytest.fixture
+    def connected_sm(self, state_machine):
+        state_machine.state = FlooStateMachine.CONNECTED
+        state_machine.broadcastMode = 0
+        state_machine.audioMode = 0
+        return state_machine
+
+    def test_second_setter_does_not_overwrite_first(self, connected_sm):
+        with patch("floocast.protocol.state_machine._wx_call_after", sync_call_after):
+            connected_sm.setAudioMode(2)
+            connected_sm.setPublicBroadcast(True)
+            connected_sm.handleMessage(FlooMsgOk(False))
+            assert connected_sm.audioMode == 2
+            assert connected_sm.broadcastMode == 0
+            connected_sm.handleMessage(FlooMsgOk(False))
+            assert connected_sm.broadcastMode & BroadcastModeBit.PUBLIC
+
+    def test_error_is_credited_to_oldest_command(self, connected_sm, mock_delegate):
+        with patch("floocast.protocol.state_machine._wx_call_after", sync_call_after):
+            connected_sm.setAudioMode(2)
+            connected_sm.setPublicBroadcast(True)
+            connected_sm.handleMessage(FlooMsgEr(False, 1))
+            mock_delegate.audioModeInd.assert_called_with(0)
+            connected_sm.handleMessage(FlooMsgOk(False))
+            assert connected_sm.broadcastMode & BroadcastModeBit.PUBLIC
+
+    def test_timeout_reverts_gui(self, connected_sm, mock_delegate):
+        with patch("floocast.protocol.state_machine._wx_call_after", sync_call_after):
+            connected_sm.setAudioMode(2)
+            head = connected_sm._commands.head()
+            head.deadline = 0
+            connected_sm.pollTimers()
+            mock_delegate.audioModeInd.assert_called_with(0)
+            assert connected_sm.lastCmd is None
+
+    def test_poll_timeout_reports_pending_deadline(self, connected_sm):
+        assert connected_sm.pollTimeout() is None
+        connected_sm.setAudioMode(2)
+        assert 0 < connected_sm.pollTimeout() <= FlooStateMachine.SET_POLICY.timeout
+
+
+class TestHandshakeFailures:
+    def test_rejected_query_is_skipped(self, state_machine):
+        state_machine.handshakeMode = FlooStateMachine.HANDSHAKE_SEQUENTIAL
+        with patch("floocast.protocol.state_machine._wx_call_after", sync_call_after):
+            state_machine.interfaceState(True, "ttyUSB0")
+            state_machine.handleMessage(FlooMsgVr(False, "1.0.0"))
+            state_machine.handleMessage(FlooMsgEr(False, 1))
+            assert state_machine.lastCmd.header == "ST"
+
+    def test_rejected_codec_query_completes_handshake(self, state_machine):
+        with patch("floocast.protocol.state_machine._wx_call_after", sync_call_after):
+            state_machine.interfaceState(True, "ttyUSB0")
+            state_machine._commands.clear()
+            state_machine._sendInitQuery(FlooMsgAc)
+            state_machine.handleMessage(FlooMsgEr(False, 1))
+            assert state_machine.state == FlooStateMachine.CONNECTED
+
+    def test_lost_version_reply_restarts(self, state_machine):
+        with patch("floocast.protocol.state_machine._wx_call_after", sync_call_after):
+            state_machine.interfaceState(True, "ttyUSB0")
+            for _ in range(FlooStateMachine.QUERY_POLICY.retries + 1):
+                state_machine._commands.head().deadline = 0
+                state_machine.pollTimers()
+            assert state_machine.lastCmd.header == "VR"
+            assert state_machine.state == FlooStateMachine.INIT
+
+
+class TestPipelinedHandshake:
+    REPLIES = (
+        FlooMsgAm.create_valid_msg(b"AM=02"),
+        FlooMsgSt.create_valid_msg(b"ST=01"),
+        FlooMsgLa.create_valid_msg(b"LA=00"),
+        FlooMsgLf.create_valid_msg(b"LF=00"),
+        FlooMsgBm.create_valid_msg(b"BM=00"),
+        FlooMsgBn.create_valid_msg(b"BN=Test"),
+        FlooMsgFn(False, 0, "001122334455", "Headset"),
+        FlooMsgFn(False, 1),
+        FlooMsgFt.create_valid_msg(b"FT=01"),
+        FlooMsgAc.create_valid_msg(b"AC=00"),
+    )
+
+    @pytest.fixture(autouse=True)
+    def sync_wx(self):
+        with patch("floocast.protocol.state_machine._wx_call_after", sync_call_after):
+            yield
+
+    def test_is_default(self, state_machine):
+        assert state_machine.handshakeMode == FlooStateMachine.HANDSHAKE_PIPELINED
+
+    def test_mode_from_settings(self, mock_delegate, mock_settings):
+        mock_settings.get_item.side_effect = lambda name: (
+            FlooStateMachine.HANDSHAKE_SEQUENTIAL if name == "handshake_mode" else None
+        )
+        with (
+            patch(
+                "floocast.protocol.state_machine.FlooSettings.shared", return_value=mock_settings
+            ),
+            patch("floocast.protocol.state_machine.FlooInterface"),
+        ):
+            sm = FlooStateMachine(mock_delegate)
+        assert sm.handshakeMode == FlooStateMachine.HANDSHAKE_SEQUENTIAL
+
+    def test_version_reply_sends_remaining_queries_at_once(self, state_machine):
+        state_machine.interfaceState(True, "ttyUSB0")
+        assert len(state_machine._commands) == 1
+        state_machine.handleMessage(FlooMsgVr(False, "1.0.0"))
+        sent = [call.args[0].header for call in state_machine.inf.sendMsg.call_args_list]
+        assert sent == [msgClass(True).header for msgClass in FlooStateMachine.INIT_SEQUENCE]
+
+    def test_replies_build_snapshot(self, state_machine, mock_delegate):
+        state_machine.interfaceState(True, "ttyUSB0")
+        state_machine.handleMessage(FlooMsgVr(False, "1.0.0"))
+        for reply in self.REPLIES:
+            assert state_machine.state == FlooStateMachine.INIT
+            state_machine.handleMessage(reply)
+        assert state_machine.state == FlooStateMachine.CONNECTED
+        assert state_machine.audioMode == 2
+        assert state_machine.broadcastName == "Test"
+        assert state_machine.feature == 1
+        assert state_machine.pairedDevices == ["Headset"]
+        mock_delegate.pairedDevicesUpdateInd.assert_called_with(["Headset"])
+
+    def test_rejected_query_is_skipped(self, state_machine):
+        state_machine.interfaceState(True, "ttyUSB0")
+        state_machine.handleMessage(FlooMsgVr(False, "1.0.0"))
+        state_machine.handleMessage(FlooMsgEr(False, 1))
+        for reply in self.REPLIES[1:]:
+            state_machine.handleMessage(reply)
+        assert state_machine.state == FlooStateMachine.CONNECTED
+        assert state_machine.audioMode is None
+
+    def test_reports_time_to_ready(self, state_machine):
+        assert state_machine.timeToReady is None
+        state_machine.interfaceState(True, "ttyUSB0")
+        state_machine.handleMessage(FlooMsgVr(False, "1.0.0"))
+        for reply in self.REPLIES:
+            state_machine.handleMessage(reply)
+        assert state_machine.timeToReady is not None
+        assert state_machine.timeToReady >= 0
+
+
+class TestPipelinedHandshakeLostReply:
+    """One reply of the pipelined burst never arrives."""
+
+    @pytest.fixture
+    def now(self):
+        return [0.0]
+
+    @pytest.fixture
+    def sm(self, mock_delegate, mock_settings, now):
+        with (
+            patch(
+                "floocast.protocol.state_machine.FlooSettings.shared", return_value=mock_settings
+            ),
+            patch("floocast.protocol.state_machine.FlooInterface"),
+            patch("floocast.protocol.state_machine._wx_call_after", sync_call_after),
+        ):
+            sm = FlooStateMachine(mock_delegate, clock=lambda: now[0])
+            yield sm
+
+    def receive(self, sm, now, message):
+        # as the dispatch worker does: the message, then the timers
+        now[0] += 0.005
+        sm.handleMessage(message)
+        sm.pollTimers()
+
+    def test_lost_reply_mid_burst_does_not_stall_the_rest(self, sm, now):
+        sm.interfaceState(True, "ttyUSB0")
+        self.receive(sm, now, FlooMsgVr(False, "1.0.0"))
+        for reply in TestPipelinedHandshake.REPLIES:
+            if reply.header != "LA":
+                self.receive(sm, now, reply)
+        assert sm.state == FlooStateMachine.CONNECTED
+        assert sm.timeToReady < FlooStateMachine.QUERY_POLICY.timeout
+        assert sm.leAudioState is None
+
+    def test_lost_last_reply_costs_one_timeout(self, sm, now):
+        sm.interfaceState(True, "ttyUSB0")
+        self.receive(sm, now, FlooMsgVr(False, "1.0.0"))
+        for reply in TestPipelinedHandshake.REPLIES[:-1]:
+            self.receive(sm, now, reply)
+        sends = sm.inf.sendMsg.call_count
+        while sm.inf.sendMsg.call_count == sends:
+            now[0] += 0.1
+            sm.pollTimers()
+        # the AC query was resent; this time the reply makes it
+        self.receive(sm, now, TestPipelinedHandshake.REPLIES[-1])
+        assert sm.state == FlooStateMachine.CONNECTED
+        timeout = FlooStateMachine.QUERY_POLICY.timeout
+        assert timeout <= sm.timeToReady < timeout + 0.5
+
+    def test_unsolicited_report_mid_burst_fails_no_step(self, sm, now):
+        sm.interfaceState(True, "ttyUSB0")
+        self.receive(sm, now, FlooMsgVr(False, "1.0.0"))
+        # the headset starts streaming before the dongle answered AM
+        self.receive(sm, now, FlooMsgSt.create_valid_msg(b"ST=03"))
+        for reply in TestPipelinedHandshake.REPLIES:
+            self.receive(sm, now, reply)
+        assert sm.state == FlooStateMachine.CONNECTED
+        assert sm.audioMode == 2
+        assert sm.sourceState == 1
+        assert all(stats.timeouts == 0 for stats in sm.commandStats().values())
+
+
+class TestSupersededSetters:
+    def test_superseded_setter_is_forgotten(self, state_machine):
+        state_machine.state = FlooStateMachine.CONNECTED
+        state_machine.setAudioMode(1)
+        first = state_machine._commands.tail()
+        state_machine.setAudioMode(2)
+        state_machine.messageSuperseded(first.msg)
+        assert len(state_machine._commands) == 1
+        state_machine.handleMessage(FlooMsgOk(False))
+        assert state_machine.audioMode == 2
+
+
+class TestCommandStats:
+    @pytest.fixture(autouse=True)
+    def sync_wx(self):
+        with patch("floocast.protocol.state_machine._wx_call_after", sync_call_after):
+            yield
+
+    def test_round_trips_by_header(self, state_machine):
+        state_machine.state = FlooStateMachine.CONNECTED
+        state_machine.setAudioMode(1)
+        state_machine.handleMessage(FlooMsgOk(False))
+        stats = state_machine.commandStats()
+        assert stats["AM"].ok == 1
+        assert stats["AM"].latency.count == 1
+
+    def test_periodic_summary(self, state_machine, monkeypatch, caplog):
+        state_machine.state = FlooStateMachine.CONNECTED
+        state_machine.setAudioMode(1)
+        monkeypatch.setattr(FlooStateMachine, "STATS_LOG_INTERVAL", 0.0)
+        with caplog.at_level("INFO", logger="floocast.protocol.state_machine"):
+            state_machine.handleMessage(FlooMsgOk(False))
+            state_machine.handleMessage(FlooMsgSt.create_valid_msg(b"ST=01"))
+        assert "Command round trips: AM ok=1" in caplog.text
+
+
+class _MemorySettings:
+    def __init__(self, data=None):
+        self.data = dict(data or {})
+        self.saves = 0
+
+    def get_item(self, key):
+        return self.data.get(key)
+
+    def set_item(self, key, value):
+        self.data[key] = value
+
+    def save(self):
+        self.saves += 1
+
+
+class TestDeviceSnapshot:
+    SNAPSHOT = {
+        "version": "1.0.0",
+        "audioMode": 2,
+        "preferLea": 0,
+        "broadcastMode": 0,
+        "broadcastName": "Test",
+        "pairedDevices": ["Headset"],
+        "feature": 1,
+        "pairedAddresses": ["001122334455"],
+    }
+
+    @pytest.fixture
+    def settings(self):
+        return _MemorySettings()
+
+    @pytest.fixture
+    def sm(self, mock_delegate, settings):
+        interface = MagicMock()
+        interface.port_name = "ttyUSB0"
+        interface.port_key = "SN0"
+        return FlooStateMachine(
+            mock_delegate, callAfter=sync_call_after, interface=interface, settings=settings
+        )
+
+    def handshake(self, sm, replies, version="1.0.0"):
+        sm.interfaceState(True, "ttyUSB0")
+        sm.handleMessage(FlooMsgVr(False, version))
+        for reply in replies:
+            sm.handleMessage(reply)
+
+    def sent(self, sm):
+        return [call.args[0].header for call in sm.inf.sendMsg.call_args_list]
+
+    def test_full_handshake_saves_snapshot(self, sm, settings):
+        self.handshake(sm, TestPipelinedHandshake.REPLIES)
+        assert sm.state == FlooStateMachine.CONNECTED
+        assert settings.data[FlooStateMachine.SNAPSHOT_KEY] == {"SN0": self.SNAPSHOT}
+        assert sm.staleFields == set()
+
+    def test_unchanged_snapshot_is_not_rewritten(self, sm, settings):
+        self.handshake(sm, TestPipelinedHandshake.REPLIES)
+        saves = settings.saves
+        sm.getRecentlyUsedDevices()
+        sm.handleMessage(FlooMsgFn(False, 0, "001122334455", "Headset"))
+        sm.handleMessage(FlooMsgFn(False, 1))
+        assert settings.saves == saves
+        sm.setAudioMode(1)
+        sm.handleMessage(FlooMsgOk(False))
+        assert settings.saves == saves + 1
+        assert settings.data[FlooStateMachine.SNAPSHOT_KEY]["SN0"]["audioMode"] == 1
+
+    def test_cached_state_is_shown_before_the_handshake(self, sm, settings, mock_delegate):
+        settings.data[FlooStateMachine.SNAPSHOT_KEY] = {"SN0": self.SNAPSHOT}
+        sm.interfaceState(True, "ttyUSB0")
+        mock_delegate.cachedStateInd.assert_called_once_with("ttyUSB0", self.SNAPSHOT)
+        mock_delegate.staleStateInd.assert_called_with(sorted(FlooStateMachine.SNAPSHOT_FIELDS))
+        assert sm.broadcastName == "Test"
+        assert sm.pairedDevices == ["Headset"]
+        assert sm.state == FlooStateMachine.INIT
+
+    def test_same_firmware_skips_settings_until_connected(self, sm, settings, mock_delegate):
+        settings.data[FlooStateMachine.SNAPSHOT_KEY] = {"SN0": self.SNAPSHOT}
+        volatile = [
+            FlooMsgSt.create_valid_msg(b"ST=01"),
+            FlooMsgLa.create_valid_msg(b"LA=00"),
+            FlooMsgFn(False, 0, "001122334455", "Headset"),
+            FlooMsgFn(False, 1),
+            FlooMsgAc.create_valid_msg(b"AC=00"),
+        ]
+        self.handshake(sm, volatile)
+        assert sm.state == FlooStateMachine.CONNECTED
+        fast = [m(True).header for m in FlooStateMachine.FAST_INIT_SEQUENCE]
+        confirm = [m(True).header for m in FlooStateMachine.CONFIRM_SEQUENCE]
+        assert self.sent(sm) == fast + confirm
+        assert sm.staleFields == {
+            "audioMode",
+            "preferLea",
+            "broadcastMode",
+            "broadcastName",
+            "feature",
+        }
+        sm.handleMessage(FlooMsgAm.create_valid_msg(b"AM=01"))
+        assert sm.audioMode == 1
+        mock_delegate.audioModeInd.assert_called_with(1)
+        assert "audioMode" not in sm.staleFields
+        sm.handleMessage(FlooMsgLf.create_valid_msg(b"LF=00"))
+        sm.handleMessage(FlooMsgBm.create_valid_msg(b"BM=00"))
+        sm.handleMessage(FlooMsgBn.create_valid_msg(b"BN=Test"))
+        sm.handleMessage(FlooMsgFt.create_valid_msg(b"FT=01"))
+        assert sm.staleFields == set()
+        mock_delegate.staleStateInd.assert_called_with([])
+        assert settings.data[FlooStateMachine.SNAPSHOT_KEY]["SN0"]["audioMode"] == 1
+
+    def test_new_firmware_runs_full_handshake(self, sm, settings):
+        settings.data[FlooStateMachine.SNAPSHOT_KEY] = {"SN0": self.SNAPSHOT}
+        sm.interfaceState(True, "ttyUSB0")
+        sm.handleMessage(FlooMsgVr(False, "1.1.0"))
+        assert self.sent(sm) == [m(True).header for m in FlooStateMachine.INIT_SEQUENCE]
+
+    def test_other_dongle_has_no_snapshot(self, sm, settings, mock_delegate):
+        settings.data[FlooStateMachine.SNAPSHOT_KEY] = {"SN1": self.SNAPSHOT}
+        sm.interfaceState(True, "ttyUSB0")
+        mock_delegate.cachedStateInd.assert_not_called()
+        assert sm.staleFields == set()
+
+    def test_restored_list_is_the_base_of_the_next_diff(self, sm, settings, mock_delegate):
+        settings.data[FlooStateMachine.SNAPSHOT_KEY] = {"SN0": self.SNAPSHOT}
+        sm.interfaceState(True, "ttyUSB0")
+        assert [device.address for device in sm.pairedDeviceList] == ["001122334455"]
+        sm.state = FlooStateMachine.CONNECTED
+        sm.getRecentlyUsedDevices()
+        sm.handleMessage(FlooMsgFn(False, 0, "66778899AABB", "Car"))
+        sm.handleMessage(FlooMsgFn(False, 1, "001122334455", "Headset"))
+        sm.handleMessage(FlooMsgFn(False, 2))
+        [(edits, names)] = [c.args for c in mock_delegate.pairedDevicesDiffInd.call_args_list]
+        assert [edit.op for edit in edits] == ["add"]
+        assert names == ["Car", "Headset"]
+
+    def test_disconnect_clears_stale_fields(self, sm, settings, mock_delegate):
+        settings.data[FlooStateMachine.SNAPSHOT_KEY] = {"SN0": self.SNAPSHOT}
+        sm.interfaceState(True, "ttyUSB0")
+        sm.interfaceState(False, None)
+        assert sm.staleFields == set()
+        mock_delegate.staleStateInd.assert_called_with([])
+
+
+class TestPairedDeviceSync:
+    @pytest.fixture
+    def sm(self, mock_delegate):
+        interface = MagicMock()
+        interface.port_name = "ttyUSB0"
+        sm = FlooStateMachine(
+            mock_delegate,
+            callAfter=sync_call_after,
+            interface=interface,
+            settings=_MemorySettings(),
+        )
+        sm.interfaceState(True, "ttyUSB0")
+        sm.handleMessage(FlooMsgVr(False, "1.0.0"))
+        for reply in TestPipelinedHandshake.REPLIES:
+            if isinstance(reply, FlooMsgFn) and reply.btAddress is None:
+                sm.handleMessage(FlooMsgFn(False, 1, "66778899AABB", "Speaker"))
+                reply = FlooMsgFn(False, 2)
+            sm.handleMessage(reply)
+        assert sm.state == FlooStateMachine.CONNECTED
+        interface.sendMsg.reset_mock()
+        return sm
+
+    def fn_queries(self, sm):
+        return [c for c in sm.inf.sendMsg.call_args_list if c.args[0].header == "FN"]
+
+    def reply_list(self, sm, *entries):
+        for i, (address, name) in enumerate(entries):
+            sm.handleMessage(FlooMsgFn(False, i, address, name))
+        sm.handleMessage(FlooMsgFn(False, len(entries)))
+
+    def test_handshake_keeps_addresses(self, sm):
+        assert sm.pairedDevices == ["Headset", "Speaker"]
+        assert sm.pairedDeviceList.index("66778899AABB") == 1
+
+    def test_stream_start_refetches_once(self, sm):
+        sm.handleMessage(FlooMsgSt.create_valid_msg(b"ST=04"))
+        sm.handleMessage(FlooMsgSt.create_valid_msg(b"ST=06"))
+        assert len(self.fn_queries(sm)) == 1
+        self.reply_list(sm, ("001122334455", "Headset"), ("66778899AABB", "Speaker"))
+        sm.handleMessage(FlooMsgSt.create_valid_msg(b"ST=06"))
+        assert len(self.fn_queries(sm)) == 1
+        sm.handleMessage(FlooMsgSt.create_valid_msg(b"ST=01"))
+        sm.handleMessage(FlooMsgSt.create_valid_msg(b"ST=04"))
+        assert len(self.fn_queries(sm)) == 2
+
+    def test_pending_refetch_is_not_repeated(self, sm):
+        sm.getRecentlyUsedDevices()
+        sm.getRecentlyUsedDevices()
+        assert len(self.fn_queries(sm)) == 1
+
+    def test_reorder_posts_only_the_diff(self, sm, mock_delegate):
+        mock_delegate.pairedDevicesUpdateInd.reset_mock()
+        sm.getRecentlyUsedDevices()
+        # the list stays whole while the new one arrives
+        sm.handleMessage(FlooMsgFn(False, 0, "66778899AABB", "Speaker"))
+        assert sm.pairedDevices == ["Headset", "Speaker"]
+        sm.handleMessage(FlooMsgFn(False, 1, "001122334455", "Headset"))
+        sm.handleMessage(FlooMsgFn(False, 2))
+        assert sm.pairedDevices == ["Speaker", "Headset"]
+        [edit], names = mock_delegate.pairedDevicesDiffInd.call_args.args
+        assert (edit.op, edit.index, edit.source) == ("move", 0, 1)
+        assert names == ["Speaker", "Headset"]
+        mock_delegate.pairedDevicesUpdateInd.assert_not_called()
+
+    def test_unchanged_list_posts_nothing(self, sm, mock_delegate):
+        sm.getRecentlyUsedDevices()
+        self.reply_list(sm, ("001122334455", "Headset"), ("66778899AABB", "Speaker"))
+        mock_delegate.pairedDevicesDiffInd.assert_not_called()
+
+
+class TestStateDelta:
+    @pytest.fixture
+    def posted(self):
+        return []
+
+    @pytest.fixture
+    def sm(self, mock_delegate, posted):
+        interface = MagicMock()
+        interface.port_name = "ttyUSB0"
+        return FlooStateMachine(
+            mock_delegate,
+            callAfter=lambda func, *args: posted.append((func, args)),
+            interface=interface,
+            settings=_MemorySettings(),
+        )
+
+    def flush(self, posted):
+        while posted:
+            func, args = posted.pop(0)
+            func(*args)
+
+    def test_one_event_per_message(self, sm, mock_delegate, posted):
+        sm.state = FlooStateMachine.CONNECTED
+        sm.handleMessage(FlooMsgFt.create_valid_msg(b"FT=07"))
+        assert len(posted) == 1
+        self.flush(posted)
+        mock_delegate.beginStateDelta.assert_called_once()
+        mock_delegate.endStateDelta.assert_called_once()
+        mock_delegate.ledEnabledInd.assert_called_once_with(1)
+        mock_delegate.aptxLosslessEnabledInd.assert_called_once_with(1)
+        mock_delegate.gattClientEnabledInd.assert_called_once_with(1)
+
+    def test_later_value_replaces_earlier(self, sm, mock_delegate, posted):
+        sm.state = FlooStateMachine.CONNECTED
+        for state in (b"ST=04", b"ST=06", b"ST=01"):
+            sm.handleMessage(FlooMsgSt.create_valid_msg(state))
+        sm.handleMessage(FlooMsgLa.create_valid_msg(b"LA=02"))
+        assert len(posted) == 1
+        self.flush(posted)
+        mock_delegate.sourceStateInd.assert_called_once_with(1)
+        mock_delegate.leAudioStateInd.assert_called_once_with(2)
+
+    def test_transitions_are_all_delivered_in_order(self, sm, mock_delegate, posted):
+        sm.interfaceState(True, "ttyUSB0")
+        sm.handleMessage(FlooMsgVr(False, "1.0.0"))
+        sm.interfaceState(False, None)
+        self.flush(posted)
+        detected = [c.args for c in mock_delegate.deviceDetected.call_args_list]
+        assert detected == [(True, "ttyUSB0", "1.0.0"), (False, None)]
+
+    def test_failing_call_does_not_drop_the_rest(self, sm, mock_delegate, posted):
+        sm.state = FlooStateMachine.CONNECTED
+        mock_delegate.sourceStateInd.side_effect = RuntimeError("widget gone")
+        sm.handleMessage(FlooMsgSt.create_valid_msg(b"ST=01"))
+        sm.handleMessage(FlooMsgLa.create_valid_msg(b"LA=02"))
+        self.flush(posted)
+        mock_delegate.leAudioStateInd.assert_called_once_with(2)
+        mock_delegate.endStateDelta.assert_called_once()
@@ -0,0 +1,149 @@
+"""Tests for the binary protocol trace recorder."""
+
+import os
+
+import pytest
+
+from floocast.protocol import trace
+from floocast.protocol.trace import (
+    INBOUND,
+    MAGIC,
+    OUTBOUND,
+    FlooTraceRecord,
+    FlooTraceRecorder,
+    read_trace,
+    recorder_from_environ,
+    trace_files,
+)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "session.fltr")
+
+
+@pytest.fixture
+def recorder(path):
+    recorder = FlooTraceRecorder(path)
+    recorder.start()
+    yield recorder
+    recorder.stop()
+
+
+class TestFlooTraceRecorder:
+    def test_round_trip(self, recorder, path):
+        recorder.record_frames(INBOUND, "ttyACM0", [b"OK", b"ST=06"], 100)
+        recorder.record(OUTBOUND, "ttyACM0", b"BC:ST", 200)
+        assert recorder.flush(2)
+        assert list(read_trace(path)) == [
+            FlooTraceRecord(100, INBOUND, "ttyACM0", b"OK"),
+            FlooTraceRecord(100, INBOUND, "ttyACM0", b"ST=06"),
+            FlooTraceRecord(200, OUTBOUND, "ttyACM0", b"BC:ST"),
+        ]
+        assert recorder.stats.recorded == 3
+
+    def test_ports_are_told_apart(self, recorder, path):
+        recorder.record(INBOUND, "ttyACM0", b"ST=06", 1)
+        recorder.record(INBOUND, "ttyACM1", b"ST=04", 2)
+        recorder.record(INBOUND, None, b"OK", 3)
+        assert recorder.flush(2)
+        assert [(r.port, r.data) for r in read_trace(path)] == [
+            ("ttyACM0", b"ST=06"),
+            ("ttyACM1", b"ST=04"),
+            ("", b"OK"),
+        ]
+
+    def test_file_layout(self, recorder, path):
+        recorder.record(INBOUND, "p", b"OK", 0x0102030405060708)
+        assert recorder.flush(2)
+        with open(path, "rb") as f:
+            data = f.read()
+        # magic, the port declaration, then kind/port/size/time and the frame
+        assert data.startswith(MAGIC)
+        assert data.endswith(b"\x00\x00\x02\x00\x08\x07\x06\x05\x04\x03\x02\x01OK")
+        assert recorder.stats.written_bytes == len(data) - len(MAGIC)
+
+    def test_rotates_by_size(self, path):
+        recorder = FlooTraceRecorder(path, max_bytes=200, backups=2)
+        recorder.start()
+        for i in range(40):
+            recorder.record(INBOUND, "ttyACM0", b"ST=%02d" % i, i)
+            assert recorder.flush(2)
+        recorder.stop()
+        files = trace_files(path)
+        assert files == [f"{path}.2", f"{path}.1", path]
+        assert all(os.path.getsize(f) <= 200 for f in files)
+        times = [r.time_ns for f in files for r in read_trace(f)]
+        # the oldest file fell off the end, the rest is contiguous and in order
+        assert times == list(range(times[0], 40))
+        assert recorder.stats.rotations >= 3
+        # every file declares its own ports
+        assert {r.port for r in read_trace(files[0])} == {"ttyACM0"}
+
+    def test_previous_session_is_kept(self, path):
+        for session in (1, 2):
+            recorder = FlooTraceRecorder(path)
+            recorder.start()
+            recorder.record(INBOUND, "p", b"ST=0%d" % session, session)
+            recorder.stop()
+        assert [r.data for r in read_trace(path + ".1")] == [b"ST=01"]
+        assert [r.data for r in read_trace(path)] == [b"ST=02"]
+
+    def test_full_queue_drops_instead_of_blocking(self, path):
+        recorder = FlooTraceRecorder(path, max_queue=3)
+        recorder.record_frames(INBOUND, "p", [b"OK"] * 5, 0)
+        assert recorder.stats.recorded == 3
+        assert recorder.stats.dropped == 2
+        recorder.start()
+        recorder.stop()
+        assert len(list(read_trace(path))) == 3
+
+    def test_stop_writes_out_queue(self, path):
+        recorder = FlooTraceRecorder(path)
+        recorder.record(INBOUND, "p", b"OK", 1)
+        recorder.start()
+        recorder.stop()
+        assert [r.data for r in read_trace(path)] == [b"OK"]
+
+    def test_measures_record_overhead(self, recorder):
+        recorder.record_frames(INBOUND, "p", [b"OK"] * 10, 0)
+        assert recorder.stats.record_total_ns > 0
+        assert recorder.stats.mean_record_ns() > 0
+
+
+class TestReadTrace:
+    def test_rejects_other_files(self, tmp_path):
+        other = tmp_path / "other"
+        other.write_bytes(b"not a trace")
+        with pytest.raises(ValueError):
+            list(read_trace(str(other)))
+
+    def test_ignores_truncated_tail(self, recorder, path):
+        recorder.record_frames(INBOUND, "p", [b"OK", b"ST=06"], 0)
+        assert recorder.flush(2)
+        recorder.stop()
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) - 2)
+        assert [r.data for r in read_trace(path)] == [b"OK"]
+
+
+class TestRecorderFromEnviron:
+    @pytest.fixture(autouse=True)
+    def fresh(self, monkeypatch):
+        monkeypatch.setattr(trace, "_shared", None)
+        yield
+        if trace._shared is not None:
+            trace._shared.stop()
+
+    def test_off_by_default(self, monkeypatch):
+        monkeypatch.delenv("FLOOCAST_TRACE", raising=False)
+        assert recorder_from_environ() is None
+
+    def test_shared_by_every_interface(self, monkeypatch, path):
+        monkeypatch.setenv("FLOOCAST_TRACE", path)
+        monkeypatch.setenv("FLOOCAST_TRACE_MAX_BYTES", "4096")
+        recorder = recorder_from_environ()
+        assert recorder is not None
+        assert recorder is recorder_from_environ()
+        assert recorder.path == path
+        assert recorder.max_bytes == 4096
@@ -0,0 +1,152 @@
+"""Tests for the outbound writer queue."""
+
+import threading
+import time
+
+import pytest
+
+from floocast.protocol.messages import FlooMsgAm, FlooMsgBm, FlooMsgSt, FlooMsgTc
+from floocast.protocol.pool import FlooWorkerPool
+from floocast.protocol.writer import FlooWriter
+
+
+class BlockingWrite:
+    """Records writes; the first one blocks until released."""
+
+    def __init__(self):
+        self.writes = []
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, data):
+        self.entered.set()
+        self.release.wait(2)
+        self.writes.append(bytes(data))
+
+
+@pytest.fixture
+def port_write():
+    return BlockingWrite()
+
+
+@pytest.fixture
+def superseded():
+    return []
+
+
+@pytest.fixture
+def pool():
+    pool = FlooWorkerPool(2)
+    yield pool
+    pool.stop()
+
+
+@pytest.fixture(params=["thread", "pool"])
+def writer(request, port_write, superseded, pool):
+    writer = FlooWriter(
+        port_write,
+        on_superseded=superseded.append,
+        pool=pool if request.param == "pool" else None,
+    )
+    writer.start()
+    yield writer
+    port_write.release.set()
+    writer.stop()
+
+
+def stall(writer, port_write):
+    """Put one frame on the wire and keep the writer busy writing it."""
+    writer.submit(FlooMsgSt(True))
+    assert port_write.entered.wait(2)
+
+
+class TestFlooWriter:
+    def test_writes_frame(self, writer, port_write):
+        port_write.release.set()
+        writer.submit(FlooMsgAm(True, 1))
+        assert writer.flush(2)
+        assert port_write.writes == [b"BC:AM=01\r\n"]
+
+    def test_batches_queued_frames_into_one_write(self, writer, port_write):
+        stall(writer, port_write)
+        writer.submit(FlooMsgAm(True, 1))
+        writer.submit(FlooMsgTc(0))
+        assert writer.depth == 2
+        port_write.release.set()
+        assert writer.flush(2)
+        assert port_write.writes == [b"BC:ST\r\n", b"BC:AM=01\r\nBC:TC=00\r\n"]
+        assert writer.stats.writes == 2
+        assert writer.stats.written == 3
+        assert writer.stats.max_depth == 2
+
+    def test_coalesces_superseded_setter(self, writer, port_write, superseded):
+        stall(writer, port_write)
+        first = FlooMsgBm(True, 0x01)
+        second = FlooMsgBm(True, 0x03)
+        third = FlooMsgBm(True, 0x07)
+        writer.submit(first)
+        writer.submit(FlooMsgAm(True, 2))
+        writer.submit(second)
+        writer.submit(third)
+        assert superseded == [first, second]
+        assert writer.stats.coalesced == 2
+        port_write.release.set()
+        assert writer.flush(2)
+        # the surviving write moves behind the AM so replies arrive in submit order
+        assert port_write.writes[1] == b"BC:AM=02\r\nBC:BM=07\r\n"
+
+    def test_toggles_and_queries_are_not_coalesced(self, writer, port_write, superseded):
+        stall(writer, port_write)
+        writer.submit(FlooMsgTc(0))
+        writer.submit(FlooMsgTc(0))
+        writer.submit(FlooMsgBm(True))
+        writer.submit(FlooMsgBm(True))
+        assert superseded == []
+        assert writer.depth == 4
+
+    def test_clear_drops_queue(self, writer, port_write):
+        stall(writer, port_write)
+        writer.submit(FlooMsgAm(True, 1))
+        writer.clear()
+        port_write.release.set()
+        assert writer.flush(2)
+        assert port_write.writes == [b"BC:ST\r\n"]
+        assert writer.stats.dropped == 1
+
+    def test_write_error_is_counted(self, superseded):
+        def failing_write(data):
+            raise OSError("gone")
+
+        writer = FlooWriter(failing_write)
+        writer.start()
+        writer.submit(FlooMsgAm(True, 1))
+        assert writer.flush(2)
+        writer.stop()
+        assert writer.stats.dropped == 1
+        assert writer.stats.written == 0
+
+    def test_records_write_latency(self, writer, port_write):
+        stall(writer, port_write)
+        writer.submit(FlooMsgAm(True, 1))
+        time.sleep(0.01)
+        port_write.release.set()
+        assert writer.flush(2)
+        assert writer.stats.max_write_latency_ms() >= 10
+        assert writer.stats.mean_write_latency_ms() > 0
+        assert writer.stats.frames_per_write() == 1.0
+
+    def test_stop_ends_thread(self, port_write):
+        writer = FlooWriter(port_write)
+        writer.start()
+        writer.stop()
+        assert not writer._thread.is_alive()
+
+    def test_pooled_writer_has_no_thread(self, port_write, pool):
+        writer = FlooWriter(port_write, pool=pool)
+        writer.start()
+        port_write.release.set()
+        writer.submit(FlooMsgSt(True))
+        assert writer.flush(2)
+        writer.stop()
+        assert writer._thread is None
+        assert port_write.writes == [b"BC:ST\r\n"]